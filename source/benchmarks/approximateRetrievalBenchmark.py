@@ -0,0 +1,127 @@
+import argparse
+import os
+import random
+import sys
+import time
+import uuid
+
+from texttable import Texttable
+
+from benchmarks.payloads import sample_fields
+from recommender.catalog.catalogColumns import compile_catalog
+from recommender.catalog.catalogSharedMemory import publish_catalog, unlink_catalog, SharedCatalogRegistry
+from recommender.preferences.preferenceEmbedding import APPROXIMATE_CANDIDATES_ENV, embedding_cache
+from recommender.recommenderFunctionality import additional_validation, compile_components, rank_components
+from recommender.typedefs.io_types import Input, SupplierInformation
+from recommender.typedefs.record_layout import get_record_layout
+from recommender.typedefs.type_definition import current_type_definition
+
+# Recall@K and latency of approximate requests (see recommender/preferences/preferenceEmbedding.py) compared to the
+# exact ranking of the same catalog. The recall counts the approximate results scoring at least the K-th exact score,
+# i.e. ties at the boundary count as found. The exit code is 1 if the mean recall is below --min-recall.
+#
+#   RECOMMENDER_TYPE_DEFINITION=Meta_Fields_Recommender.csv python -m benchmarks.approximateRetrievalBenchmark \
+#       [--suppliers 100000] [--demands 20] [--top-k 10 100] [--candidates 2000] [--min-recall 0.9]
+
+
+def synthetic_catalog(production_method: str, n_suppliers: int, rng: random.Random, fill: float):
+    definition = current_type_definition()
+    supplier_type = definition.parameter_input_types['Supplier'][production_method]
+    preferences = definition.preference_input_types[production_method]
+    suppliers = [SupplierInformation(production_method, id=f"supplier_{i}",
+                                     parameters=sample_fields(supplier_type, rng, fill),
+                                     preferences=sample_fields(preferences, rng, fill)) for i in range(n_suppliers)]
+    return compile_catalog(production_method, suppliers, definition)
+
+
+def demand_payload(production_method: str, catalog: str, rng: random.Random, fill: float, parameter_fill: float,
+                   top_k: int, approximate: bool) -> dict:
+    definition = current_type_definition()
+    demand = {"parameters": sample_fields(definition.parameter_input_types['Demand'][production_method], rng,
+                                          parameter_fill),
+              "preferences": sample_fields(definition.preference_input_types[production_method], rng, fill)}
+    return {"components": [{"name": "component", "type": production_method, "demand": demand, "catalog": catalog}],
+            "diagnostics": False, "top_k": top_k, "min_score": 0.0, "approximate": approximate}
+
+
+def recommend(payload: dict):
+    started = time.perf_counter()
+    output = rank_components(compile_components(additional_validation(Input(**payload))), diagnostics=False,
+                             min_score=payload["min_score"], top_k=payload["top_k"])
+    return output.components[0], time.perf_counter() - started
+
+
+def recall(exact, approximate) -> float:
+    if len(exact.scores) == 0:
+        return 1.0
+    threshold = exact.scores[-1].score
+    found = sum(1 for s in approximate.scores if s.score >= threshold)
+    return min(found, len(exact.scores)) / len(exact.scores)
+
+
+def main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(description="Recall of the approximate retrieval compared to the exact ranking")
+    parser.add_argument("--suppliers", type=int, default=100000)
+    parser.add_argument("--demands", type=int, default=20)
+    parser.add_argument("--top-k", type=int, nargs="+", default=[10, 100])
+    parser.add_argument("--candidates", type=int, default=None,
+                        help=f"Candidates of the approximate search, default {APPROXIMATE_CANDIDATES_ENV}")
+    parser.add_argument("--production-method", default="CUTTING")
+    parser.add_argument("--fill", type=float, default=0.5, help="Share of the given fields")
+    parser.add_argument("--parameter-fill", type=float, default=0.1, help="Share of the given demand parameters")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--min-recall", type=float, default=None)
+    args = parser.parse_args(argv)
+    if args.candidates is not None:
+        os.environ[APPROXIMATE_CANDIDATES_ENV] = str(args.candidates)
+
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    catalog = synthetic_catalog(args.production_method, args.suppliers, rng, args.fill)
+    print(f"Compiled {len(catalog)} suppliers in {time.perf_counter() - started:.1f}s", flush=True)
+
+    name = f"benchmark_{uuid.uuid4().hex[:12]}"
+    publish_catalog(name, catalog)
+    try:
+        started = time.perf_counter()
+        layout = get_record_layout(current_type_definition(), args.production_method)
+        embedding = embedding_cache.get(layout, SharedCatalogRegistry.get(name))
+        print(f"Embedded into {embedding.dimensions} dimensions in {time.perf_counter() - started:.1f}s", flush=True)
+
+        rows = []
+        mean_recalls = []
+        for top_k in args.top_k:
+            recalls, exact_seconds, approximate_seconds, candidates = [], [], [], []
+            for _ in range(args.demands):
+                seed = rng.getrandbits(32)
+                exact, exact_time = recommend(demand_payload(args.production_method, name, random.Random(seed),
+                                                             args.fill, args.parameter_fill, top_k, False))
+                approximate, approximate_time = recommend(demand_payload(
+                    args.production_method, name, random.Random(seed), args.fill, args.parameter_fill, top_k, True))
+                recalls.append(recall(exact, approximate))
+                exact_seconds.append(exact_time)
+                approximate_seconds.append(approximate_time)
+                candidates.append(approximate.candidates)
+            mean_recalls.append(sum(recalls) / len(recalls))
+            rows.append([top_k, sum(candidates) / len(candidates), mean_recalls[-1], min(recalls),
+                         sum(exact_seconds) / len(exact_seconds), sum(approximate_seconds) / len(approximate_seconds),
+                         sum(exact_seconds) / sum(approximate_seconds)])
+    finally:
+        SharedCatalogRegistry.detach_all()
+        unlink_catalog(name)
+
+    table = Texttable(max_width=2000)
+    table.set_cols_dtype(["i", "f", "f", "f", "e", "e", "f"])
+    table.set_precision(3)
+    table.add_rows([["K", "Candidates mean", "Recall@K mean", "Recall@K min", "Exact [s]", "Approximate [s]",
+                     "Speedup"]] + rows)
+    print(table.draw())
+
+    if args.min_recall is not None and min(mean_recalls) < args.min_recall:
+        print(f"Recall {min(mean_recalls):.3f} below {args.min_recall}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
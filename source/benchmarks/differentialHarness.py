@@ -0,0 +1,371 @@
+import argparse
+import math
+import random
+import sys
+import time
+import typing
+from collections import Counter
+from collections.abc import Callable
+from dataclasses import asdict, dataclass, fields, replace
+from typing import Optional
+
+from texttable import Texttable
+
+from common.typedef import Range, BaseRange
+from recommender.preferences.preferenceComparison import distance_preference
+from recommender.preferences.preferenceImportance import instantiate_preferences
+from recommender.preferences.preferenceTypes import CustomType, CustomTypeInstance
+from recommender.recommenderFunctionality import additional_validation, perform_recommendation, compile_components, \
+    rank_components, rank_components_paged, page_components, rank_components_deadline
+from recommender.typedefs.io_types import Input, Output, Score, ComponentScore
+from recommender.typedefs.type_definition import TypeDefinition, current_type_definition
+from recommender.typedefs.typedef import ScoreErrors, ComparisonErrors, NO_CATEGORY
+
+
+# Differential test of the scoring engines against a plain reference implementation on random requests
+#
+#   RECOMMENDER_TYPE_DEFINITION=Meta_Fields_Recommender.csv python -m benchmarks.differentialHarness [--cases n]
+#
+# The reference evaluates the validated input dataclasses field by field, like the recommender did before the scoring
+# was moved to records. Each engine is compared by scores, order of the suppliers, scores per category and failures.
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# reference implementation
+
+
+def reference_recommendation(inp: Input) -> Output:
+    """
+    Straightforward scoring of the validated input, independent of records, layouts and pruning
+    """
+    definition = current_type_definition()
+    output = Output()
+    for component in inp.components:
+        scores: list[Score] = []
+        for supplier in component.suppliers:
+            valid, errors_parameters = _reference_parameters(definition, component.demand.parameters,
+                                                             supplier.parameters, component.type)
+            score, score_category, errors_preferences = _reference_preferences(definition, component.demand.preferences,
+                                                                               supplier.preferences, component.type)
+            scores.append(Score(score=score if valid else -1.0, supplier_id=supplier.id,
+                                scores_per_category=score_category,
+                                failures=ScoreErrors(parameters=errors_parameters, preferences=errors_preferences)))
+
+        scores.sort(key=lambda x: x.score, reverse=True)
+        output.components.append(ComponentScore(name=component.name, scores=scores))
+    return output
+
+
+def _reference_value(value):
+    # unbounded sides of ranges are -inf/inf
+    if isinstance(value, BaseRange):
+        return Range(**asdict(value))
+    return value
+
+
+def _reference_parameters(definition: TypeDefinition, demand_parameters, supplier_parameters, production_method: str):
+    metadata = definition.parameters()
+    errors = {c: ComparisonErrors() for c in definition.categories}
+    valid = True
+    for f in fields(demand_parameters):
+        p = f.name
+        meta = getattr(metadata, p)
+        demand = _reference_value(getattr(demand_parameters, p))
+        supplier = _reference_value(getattr(supplier_parameters, p))
+        if demand is None or supplier is None:
+            errors[meta.category].skipped[
+                p] = f"Skipped, since either demand or supplier parameter is not provided, got demand: {demand} and suppler: {supplier}"
+            continue
+        if production_method not in meta.production_method:
+            errors[meta.category].skipped[
+                p] = f"Skipped, since parameter is not applicable for production method '{production_method}', however values are provided."
+            continue
+        try:
+            result = meta.cmp_fnc(demand, supplier)
+            valid = valid and result.valid
+            if result.error is not None:
+                errors[meta.category].failures[p] = result.error
+        except RuntimeError as e:
+            errors[meta.category].failures[p] = f"Failed to evaluate parameter, error: {e}"
+
+    return valid, {c: e for c, e in errors.items() if e.skipped or e.failures}
+
+
+def _reference_preferences(definition: TypeDefinition, demand_preferences, supplier_preferences,
+                           production_method: str):
+    metadata = instantiate_preferences(definition.preferences, demand_preferences, supplier_preferences,
+                                       production_method)
+    errors = {c: ComparisonErrors() for c in definition.categories}
+    scores_category: dict[str, list[float]] = {c: [] for c in definition.categories}
+    for f in fields(demand_preferences):
+        p = f.name
+        meta = getattr(metadata, p)
+        if production_method not in meta.production_method:
+            errors[meta.category].skipped[
+                p] = f"Skipped, since preference is not applicable for production method '{production_method}', however values are provided."
+            continue
+        if not isinstance(meta.preference_type, CustomType):
+            raise RuntimeError("Unknown preference type, must be derived from CustomType")
+
+        demand = CustomTypeInstance(value=_reference_value(getattr(demand_preferences, p)),
+                                    base_type=meta.preference_type)
+        supplier = CustomTypeInstance(value=_reference_value(getattr(supplier_preferences, p)),
+                                      base_type=meta.preference_type)
+        if demand.value is None or supplier.value is None:
+            errors[meta.category].skipped[
+                p] = f"Skipped, since either demand or supplier preference is not provided, got demand: {demand.value} and suppler: {supplier.value}"
+            continue
+        try:
+            scores_category[meta.category].append(1 - distance_preference(demand, supplier))
+        except RuntimeError as e:
+            errors[meta.category].failures[p] = f"Error in computing preference distance: {e}"
+
+    score_per_category = {c: sum(v) / len(v) for c, v in scores_category.items() if len(v) > 0}
+    if len(score_per_category) == 0:
+        errors[NO_CATEGORY].failures["ALL"] = f"No preferences given, returning valid 1.0 for preferences"
+        score = 1.0
+    else:
+        score = sum(score_per_category.values()) / len(score_per_category)
+
+    return score, score_per_category, {c: e for c, e in errors.items() if e.skipped or e.failures}
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# engines
+
+
+@dataclass
+class Engine:
+    """
+    A scoring path under test. expected derives the output the engine has to produce from the full reference ranking,
+    e.g. the first k suppliers. Engines without diagnostics are not compared by their failures.
+    """
+    name: str
+    run: Callable[[Input], Output]
+    expected: Callable[[Output], Output] = lambda reference: reference
+    diagnostics: bool = True
+
+
+def truncated(reference: Output, min_score: Optional[float] = None, top_k: Optional[int] = None) -> Output:
+    return Output(components=[replace(c, scores=[s for s in c.scores if min_score is None or s.score >= min_score][
+                                                :top_k]) for c in reference.components])
+
+
+def paged(inp: Input, page_size: int) -> Output:
+    components = compile_components(inp)
+    rankings = rank_components_paged(components)
+    output = Output(components=[ComponentScore(name=c.name, scores=[]) for c in components])
+    for offset in range(0, max((len(r) for r in rankings), default=0), page_size):
+        page = page_components(components, rankings, offset, page_size, diagnostics=True)
+        for component, part in zip(output.components, page.components):
+            component.scores.extend(part.scores)
+    return output
+
+
+# number of suppliers kept by the bounded engines
+TOP_K: int = 3
+MIN_SCORE: float = 0.5
+
+ENGINES: list[Engine] = [
+    Engine("records", perform_recommendation),
+    Engine("records_no_diagnostics", lambda inp: rank_components(compile_components(inp), diagnostics=False),
+           diagnostics=False),
+    Engine("top_k", lambda inp: rank_components(compile_components(inp), top_k=TOP_K),
+           lambda reference: truncated(reference, top_k=TOP_K)),
+    Engine("min_score_top_k", lambda inp: rank_components(compile_components(inp), diagnostics=False,
+                                                          min_score=MIN_SCORE, top_k=TOP_K),
+           lambda reference: truncated(reference, MIN_SCORE, TOP_K), diagnostics=False),
+    Engine("paged", lambda inp: paged(inp, page_size=4)),
+    Engine("deadline", lambda inp: rank_components_deadline(compile_components(inp), time.monotonic() + 3600.0)),
+]
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# random requests
+
+
+# values of the generated fields, small domains such that ranges and demands overlap frequently
+NUMBERS: list[int] = [0, 1, 2, 3, 5, 8]
+WORDS: list[str] = ["a", "b", "c"]
+CHOICE_OPTIONS: int = 4
+
+
+def random_value(tp, rng: random.Random, edge_rate: float):
+    """
+    Random value of a field of the generated input types. With probability edge_rate an edge case is produced instead:
+    None, unbounded ranges, empty or mismatching choice lists and zeros.
+    """
+    edge = rng.random() < edge_rate
+    args = [a for a in typing.get_args(tp) if a is not type(None)]
+    if typing.get_origin(tp) is typing.Union:
+        if edge and len(args) < len(typing.get_args(tp)) and rng.random() < 0.5:
+            return None
+        return random_value(rng.choice(args), rng, edge_rate)
+
+    if typing.get_origin(tp) is list:
+        if args[0] is bool:
+            n = rng.choice([0, 1, CHOICE_OPTIONS + 1]) if edge else CHOICE_OPTIONS
+            values = [False] * n
+            # mostly single choices, otherwise any combination
+            for i in ([rng.randrange(n)] if n > 0 and rng.random() < 0.7 else range(n)):
+                values[i] = values[i] or rng.random() < 0.8
+            return values
+        return [] if edge else [random_value(args[0], rng, 0.0) for _ in range(rng.randint(1, 3))]
+
+    if isinstance(tp, type) and issubclass(tp, BaseRange):
+        number = typing.get_args(typing.get_type_hints(tp)["min"])[0]
+        low = random_value(number, rng, 0.0)
+        bounds = {"min": low, "max": low + random_value(number, rng, 0.0)}
+        if edge:
+            # one or both sides unbounded, or an empty range at zero
+            return rng.choice([{"min": None, "max": bounds["max"]}, {"min": bounds["min"], "max": None}, {},
+                               {"min": number(0), "max": number(0)}])
+        return bounds
+
+    if tp is bool:
+        return rng.random() < 0.5
+    if isinstance(tp, type) and issubclass(tp, int):
+        return 0 if edge else rng.choice(NUMBERS)
+    if isinstance(tp, type) and issubclass(tp, float):
+        if tp is not float:
+            # constrained floats, i.e. the weights of range preferences in [0, 1]
+            return rng.choice([0.0, 1.0]) if edge else round(rng.random(), 3)
+        return 0.0 if edge else rng.choice(NUMBERS) + round(rng.random(), 3)
+    if tp is str:
+        return rng.choice(WORDS)
+    raise RuntimeError(f"Unsupported field type {tp}")
+
+
+def random_fields(datatype, rng: random.Random, fill: float, edge_rate: float) -> dict:
+    return {f.name: random_value(f.type, rng, edge_rate) for f in fields(datatype) if rng.random() < fill}
+
+
+def random_request(definition: TypeDefinition, rng: random.Random, max_components: int = 2, max_suppliers: int = 12,
+                   fill: float = 0.4, edge_rate: float = 0.15) -> dict:
+    """
+    Request with random production methods, demands and suppliers, including a few identical suppliers for ties
+    """
+    components = []
+    for c in range(rng.randint(1, max_components)):
+        method = rng.choice(definition.production_methods)
+        demand_type = definition.parameter_input_types['Demand'][method]
+        supplier_type = definition.parameter_input_types['Supplier'][method]
+        preference_type = definition.preference_input_types[method]
+        suppliers = [{"id": f"s{i}", "parameters": random_fields(supplier_type, rng, fill, edge_rate),
+                      "preferences": random_fields(preference_type, rng, fill, edge_rate)}
+                     for i in range(rng.randint(0, max_suppliers))]
+        suppliers += [dict(s, id=f"{s['id']}_copy") for s in suppliers[:rng.randint(0, 2)]]
+        components.append({"name": f"c{c}", "type": method, "suppliers": suppliers,
+                           "demand": {"parameters": random_fields(demand_type, rng, fill, edge_rate),
+                                      "preferences": random_fields(preference_type, rng, fill, edge_rate)}})
+    return {"components": components}
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# comparison
+
+
+def _close(a: float, b: float, tolerance: float) -> bool:
+    return a == b or math.isclose(a, b, rel_tol=0.0, abs_tol=tolerance)
+
+
+def diff_outputs(expected: Output, actual: Output, tolerance: float = 0.0, failures: bool = True) -> list[str]:
+    """
+    Differences of two outputs. Scores have to be equal up to the tolerance (0 for bit-for-bit equality) and suppliers
+    have to be in the same order, except for suppliers whose scores are within the tolerance of each other.
+    :param failures: compare the skipped and failed parameters and preferences, too
+    """
+    if len(expected.components) != len(actual.components):
+        return [f"number of components: expected {len(expected.components)}, got {len(actual.components)}"]
+
+    differences = []
+    for e, a in zip(expected.components, actual.components):
+        prefix = f"component '{e.name}'"
+        if e.name != a.name:
+            differences.append(f"{prefix}: got component '{a.name}'")
+        if len(e.scores) != len(a.scores):
+            differences.append(f"{prefix}: expected {len(e.scores)} scores, got {len(a.scores)}")
+
+        actual_scores = {s.supplier_id: s for s in a.scores}
+        for position, (se, sa) in enumerate(zip(e.scores, a.scores)):
+            if se.supplier_id != sa.supplier_id:
+                swapped = actual_scores.get(se.supplier_id)
+                if swapped is None or not _close(se.score, sa.score, tolerance):
+                    differences.append(f"{prefix}: position {position} expected '{se.supplier_id}' ({se.score!r}), "
+                                       f"got '{sa.supplier_id}' ({sa.score!r})")
+                    continue
+                # tie within the tolerance, the same supplier is compared
+                sa = swapped
+            if not _close(se.score, sa.score, tolerance):
+                differences.append(f"{prefix}: score of '{se.supplier_id}' expected {se.score!r}, got {sa.score!r}")
+            if se.scores_per_category.keys() != sa.scores_per_category.keys() or not all(
+                    _close(v, sa.scores_per_category[c], tolerance) for c, v in se.scores_per_category.items()):
+                differences.append(f"{prefix}: scores per category of '{se.supplier_id}' expected "
+                                   f"{se.scores_per_category}, got {sa.scores_per_category}")
+            if failures and se.failures != sa.failures:
+                differences.append(f"{prefix}: failures of '{se.supplier_id}' expected {se.failures}, "
+                                   f"got {sa.failures}")
+    return differences
+
+
+def _outcome(fnc: Callable[[], Output]):
+    try:
+        return fnc()
+    except Exception as e:
+        return e
+
+
+def run_case(payload: dict, engines: list[Engine] = None, tolerance: float = 0.0) -> dict[str, list[str]]:
+    """
+    Scores a request with the reference and each engine
+    :return: differences per engine, an engine has to fail with the same exception as the reference, if any
+    """
+    engines = ENGINES if engines is None else engines
+    inp = additional_validation(Input(**payload))
+    reference = _outcome(lambda: reference_recommendation(inp))
+
+    result = {}
+    for engine in engines:
+        actual = _outcome(lambda: engine.run(inp))
+        if isinstance(reference, Exception) or isinstance(actual, Exception):
+            same = type(reference) is type(actual) and str(reference) == str(actual)
+            result[engine.name] = [] if same else [f"expected {reference!r}, got {actual!r}"]
+        else:
+            result[engine.name] = diff_outputs(engine.expected(reference), actual, tolerance, engine.diagnostics)
+    return result
+
+
+# characters of the reported difference per engine
+EXAMPLE_LENGTH: int = 300
+
+
+def main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(description="Compares the scoring engines with the reference implementation")
+    parser.add_argument("--cases", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--tolerance", type=float, default=0.0)
+    parser.add_argument("--edge-rate", type=float, default=0.15)
+    args = parser.parse_args(argv)
+
+    definition = current_type_definition()
+    mismatches: Counter = Counter()
+    examples: dict[str, tuple[int, str]] = {}
+    for case in range(args.cases):
+        payload = random_request(definition, random.Random(args.seed + case), edge_rate=args.edge_rate)
+        for name, differences in run_case(payload, tolerance=args.tolerance).items():
+            if differences:
+                mismatches[name] += 1
+                examples.setdefault(name, (args.seed + case, differences[0][:EXAMPLE_LENGTH]))
+
+    table = Texttable(max_width=160)
+    table.header(["engine", "cases", "mismatches", "first mismatch (seed: difference)"])
+    for engine in ENGINES:
+        example = examples.get(engine.name)
+        table.add_row([engine.name, args.cases, mismatches[engine.name],
+                       "" if example is None else f"{example[0]}: {example[1]}"])
+    print(table.draw())
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,59 @@
+import random
+import typing
+from dataclasses import fields
+
+from common.typedef import Range
+from recommender.typedefs.type_definition import TypeDefinition
+
+# number of options of generated choice preferences
+CHOICE_OPTIONS: int = 4
+
+
+def sample_value(tp, rng: random.Random):
+    """
+    Random value for a field of the generated input types, None for unsupported types
+    """
+    args = [a for a in typing.get_args(tp) if a is not type(None)]
+    if typing.get_origin(tp) is typing.Union:
+        return sample_value(rng.choice(args), rng)
+    if typing.get_origin(tp) is list:
+        n = CHOICE_OPTIONS if args[0] is bool else rng.randint(1, 5)
+        return [sample_value(args[0], rng) for _ in range(n)]
+    if isinstance(tp, type) and issubclass(tp, Range):
+        low = sample_value(typing.get_type_hints(tp)["min"], rng)
+        return {"min": low, "max": low + sample_value(typing.get_type_hints(tp)["max"], rng)}
+    if tp is bool:
+        return rng.random() < 0.5
+    if isinstance(tp, type) and issubclass(tp, int):
+        return rng.randint(0, 100)
+    if isinstance(tp, type) and issubclass(tp, float):
+        # constrained floats (e.g. weights of range preferences) are in [0, 1]
+        return rng.random() if tp is not float else rng.uniform(0, 100)
+    return None
+
+
+def sample_fields(datatype, rng: random.Random, fill: float) -> dict:
+    values = {}
+    for f in fields(datatype):
+        if rng.random() < fill:
+            value = sample_value(f.type, rng)
+            if value is not None:
+                values[f.name] = value
+    return values
+
+
+def recommend_payload(definition: TypeDefinition, production_method: str, n_suppliers: int, seed: int = 0,
+                      fill: float = 0.5) -> dict:
+    """
+    Request of a single component with randomly filled demand and suppliers
+    :param fill: share of the fields which are given
+    """
+    rng = random.Random(seed)
+    preferences = definition.preference_input_types[production_method]
+    demand = {"parameters": sample_fields(definition.parameter_input_types['Demand'][production_method], rng, fill),
+              "preferences": sample_fields(preferences, rng, fill)}
+    supplier_type = definition.parameter_input_types['Supplier'][production_method]
+    suppliers = [{"id": f"supplier_{i}", "parameters": sample_fields(supplier_type, rng, fill),
+                  "preferences": sample_fields(preferences, rng, fill)} for i in range(n_suppliers)]
+    return {"components": [{"name": "component", "type": production_method, "suppliers": suppliers,
+                            "demand": demand}]}
@@ -0,0 +1,197 @@
+import argparse
+import asyncio
+import importlib
+import json
+import math
+import os
+import sys
+import time
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from texttable import Texttable
+
+from common.capture import encode_body, response_hash, Redactor
+
+# Replays captured requests (see common/capture.py) against an in-process app and reports latency percentiles,
+# throughput and responses which differ from the captured ones. The exit code is 1 if a gate is exceeded.
+#
+#   RECOMMENDER_TYPE_DEFINITION=Meta_Fields_Recommender.csv python -m benchmarks.replayBenchmark <capture file or dir> \
+#       [--concurrency 8] [--repeat 1] [--max-p99 <ms>] [--max-mismatches 0]
+
+# module of the app of each service, its traffic_capture provides the redaction used for the capture
+SERVICE_MODULES: dict[str, str] = {"recommender": "recommender.__main__", "extractor": "extractor.__main__"}
+
+# requests which create state used by other requests, replayed in order before everything else
+SETUP_PATHS: tuple[str, ...] = ("/demands/",)
+
+PERCENTILES: tuple[float, ...] = (50.0, 90.0, 99.0)
+
+
+@dataclass
+class ReplayResult:
+    path: str
+    latency: float
+    status: int
+    # None if the response is not compared, e.g. requests with a deadline
+    matched: Optional[bool]
+
+
+def load_capture(paths: list[str]) -> list[dict]:
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(os.path.join(path, f) for f in os.listdir(path) if f.endswith(".jsonl")))
+        else:
+            files.append(path)
+    entries = []
+    for file in files:
+        with open(file, encoding="utf-8") as f:
+            entries.extend(json.loads(line) for line in f if line.strip())
+    return sorted(entries, key=lambda e: e["time"])
+
+
+async def asgi_post(app, path: str, headers: dict[str, str], body: bytes) -> tuple[int, Optional[str], bytes]:
+    """
+    Sends a single POST request directly to the ASGI app, without a network in between
+    """
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST", "scheme": "http",
+             "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "",
+             "headers": [(k.encode("latin-1"), v.encode("latin-1")) for k, v in headers.items()] +
+                        [(b"content-length", str(len(body)).encode())],
+             "client": ("127.0.0.1", 0), "server": ("replay", 80)}
+    done = asyncio.Event()
+    sent = False
+    status, content_type, chunks = 0, None, []
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status, content_type
+        if message["type"] == "http.response.start":
+            status = message["status"]
+            for name, value in message.get("headers", []):
+                if name.lower() == b"content-type":
+                    content_type = value.decode("latin-1")
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                done.set()
+
+    await app(scope, receive, send)
+    done.set()
+    return status, content_type, b"".join(chunks)
+
+
+async def replay_entry(app, entry: dict, redact: Optional[Redactor]) -> ReplayResult:
+    headers = entry["headers"]
+    body = encode_body(headers.get("content-type"), entry["body"])
+    start = time.perf_counter()
+    status, content_type, response = await asgi_post(app, entry["path"], headers, body)
+    latency = time.perf_counter() - start
+
+    matched = None
+    if "x-deadline-ms" not in headers:
+        # partial results of requests with a deadline depend on the timing
+        matched = status == entry["status"] and (
+                status != 200 or response_hash(content_type, response, redact) == entry["response_hash"])
+    return ReplayResult(entry["path"], latency, status, matched)
+
+
+async def replay(app, entries: list[dict], concurrency: int = 1, redact: Optional[Redactor] = None) -> tuple[
+        list[ReplayResult], float]:
+    """
+    :return: results in the order of the entries and the duration of the concurrent part in seconds
+    """
+    await app.router.startup()
+    try:
+        results: list[Optional[ReplayResult]] = [None] * len(entries)
+        for i, entry in enumerate(entries):
+            if entry["path"] in SETUP_PATHS:
+                results[i] = await replay_entry(app, entry, redact)
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def limited(i: int, entry: dict):
+            async with semaphore:
+                results[i] = await replay_entry(app, entry, redact)
+
+        start = time.perf_counter()
+        await asyncio.gather(*[limited(i, e) for i, e in enumerate(entries) if e["path"] not in SETUP_PATHS])
+        return results, time.perf_counter() - start
+    finally:
+        await app.router.shutdown()
+
+
+def percentile(values: list[float], q: float) -> float:
+    # nearest rank
+    if not values:
+        return math.nan
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100.0 * len(ordered)) - 1)]
+
+
+def summarize(results: list[ReplayResult], elapsed: float) -> list[dict[str, Any]]:
+    """
+    Statistics per path and in total, latencies in milliseconds
+    """
+    rows = []
+    groups = {p: [r for r in results if r.path == p] for p in sorted({r.path for r in results})}
+    for path, group in list(groups.items()) + [("total", results)]:
+        latencies = [r.latency * 1000.0 for r in group]
+        row = {"path": path, "requests": len(group), "mismatches": sum(r.matched is False for r in group),
+               "not_compared": sum(r.matched is None for r in group)}
+        row.update({f"p{q:g}": percentile(latencies, q) for q in PERCENTILES})
+        row["max"] = max(latencies, default=math.nan)
+        row["throughput"] = len(group) / elapsed if elapsed > 0 else math.nan
+        rows.append(row)
+    return rows
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Replays captured requests against an in-process app")
+    parser.add_argument("captures", nargs="+", help="capture files or directories")
+    parser.add_argument("--service", choices=sorted(SERVICE_MODULES), default=None,
+                        help="app to replay against, by default the service of the captured requests")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=1, help="number of times the capture is replayed")
+    parser.add_argument("--max-p99", type=float, default=None, help="gate on the total p99 latency in ms")
+    parser.add_argument("--max-mismatches", type=int, default=0, help="gate on the number of mismatches")
+    args = parser.parse_args(argv)
+
+    entries = load_capture(args.captures)
+    if not entries:
+        print("No captured requests found", file=sys.stderr)
+        return 1
+    service = args.service or entries[0]["service"]
+    entries = [e for e in entries if e["service"] == service] * args.repeat
+    module = importlib.import_module(SERVICE_MODULES[service])
+
+    results, elapsed = asyncio.run(replay(module.app, entries, args.concurrency, module.traffic_capture.redact))
+    rows = summarize(results, elapsed)
+
+    table = Texttable(max_width=2000)
+    table.set_cols_dtype(["t", "i", "i", "i"] + ["f"] * (len(PERCENTILES) + 2))
+    table.set_precision(2)
+    header = ["Path", "Requests", "Mismatches", "Not compared"] + [f"p{q:g} [ms]" for q in PERCENTILES] + \
+             ["Max [ms]", "Throughput [1/s]"]
+    table.add_rows([header] + [list(r.values()) for r in rows])
+    print(table.draw())
+
+    total = rows[-1]
+    failed = total["mismatches"] > args.max_mismatches
+    if args.max_p99 is not None and total["p99"] > args.max_p99:
+        failed = True
+    print(f"{'FAILED' if failed else 'PASSED'}: {total['mismatches']} mismatches, p99 {total['p99']:.2f} ms, "
+          f"{total['throughput']:.1f} requests/s at concurrency {args.concurrency}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,68 @@
+import json
+import sys
+import time
+
+import msgpack
+from fastapi.encoders import jsonable_encoder
+from fastapi.testclient import TestClient
+from texttable import Texttable
+
+from benchmarks.payloads import recommend_payload
+from recommender.__main__ import app
+from recommender.recommenderFunctionality import perform_recommendation, additional_validation
+from recommender.service.msgpackTransport import MsgPackResponse, MSGPACK_MEDIA_TYPES
+from recommender.typedefs.io_types import Input
+from recommender.typedefs.type_definition import current_type_definition
+
+
+# Payload size and (de)serialization time of json and MessagePack for recommend requests of different size
+#
+#   RECOMMENDER_TYPE_DEFINITION=Meta_Fields_Recommender.csv python -m benchmarks.transportBenchmark [n_suppliers ...]
+
+
+def best_of(fnc, repeat: int = 5) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fnc()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def benchmark(n_suppliers: int, client: TestClient) -> list:
+    payload = recommend_payload(current_type_definition(), "CUTTING", n_suppliers)
+    json_body = json.dumps(payload).encode()
+    msgpack_body = msgpack.packb(payload)
+
+    output = perform_recommendation(additional_validation(Input(**payload)))
+
+    def json_output():
+        return json.dumps(jsonable_encoder(output)).encode()
+
+    def msgpack_output():
+        return MsgPackResponse(output).body
+
+    def request(body: bytes, content_type: str, accept: str):
+        return lambda: client.post("/recommend/", data=body, headers={"content-type": content_type, "accept": accept})
+
+    return [n_suppliers,
+            len(json_body), len(msgpack_body),
+            best_of(lambda: json.loads(json_body)), best_of(lambda: msgpack.unpackb(msgpack_body)),
+            len(json_output()), len(msgpack_output()),
+            best_of(json_output), best_of(msgpack_output),
+            best_of(request(json_body, "application/json", "application/json"), 3),
+            best_of(request(msgpack_body, MSGPACK_MEDIA_TYPES[0], MSGPACK_MEDIA_TYPES[0]), 3)]
+
+
+if __name__ == "__main__":
+    sizes = [int(n) for n in sys.argv[1:]] or [100, 1000, 5000]
+    client = TestClient(app)
+
+    table = Texttable(max_width=2000)
+    table.set_cols_dtype(["i", "i", "i", "e", "e", "i", "i", "e", "e", "e", "e"])
+    table.set_precision(2)
+    header = ["Suppliers", "Request json [B]", "Request msgpack [B]", "Parse json [s]", "Parse msgpack [s]",
+              "Output json [B]", "Output msgpack [B]", "Encode json [s]", "Encode msgpack [s]",
+              "Recommend json [s]", "Recommend msgpack [s]"]
+    table.add_rows([header] + [benchmark(n, client) for n in sizes])
+    print(table.draw())
@@ -0,0 +1,21 @@
+import hmac
+import os
+from typing import Optional
+
+from fastapi import Header, HTTPException
+
+# admin endpoints are disabled as long as no token is configured
+ADMIN_TOKEN_ENV: str = "HEDY_ADMIN_TOKEN"
+ADMIN_TOKEN_HEADER: str = "X-Admin-Token"
+
+
+def verify_admin_token(token: Optional[str]) -> bool:
+    expected = os.environ.get(ADMIN_TOKEN_ENV, "")
+    if expected == "" or token is None:
+        return False
+    return hmac.compare_digest(token.encode(), expected.encode())
+
+
+def require_admin_token(x_admin_token: Optional[str] = Header(default=None)):
+    if not verify_admin_token(x_admin_token):
+        raise HTTPException(status_code=403, detail="Admin endpoints require a valid admin token")
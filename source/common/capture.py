@@ -0,0 +1,282 @@
+import glob
+import hashlib
+import json
+import os
+import queue
+import random
+import tempfile
+import threading
+import time
+from collections.abc import Callable, Iterable
+from typing import Any, Optional
+
+# share of the requests which are captured, 0 (default) disables the capture
+CAPTURE_RATE_ENV: str = "HEDY_CAPTURE_RATE"
+# directory of the capture files, default <tmp>/hedy_captures
+CAPTURE_DIR_ENV: str = "HEDY_CAPTURE_DIR"
+# size in bytes after which a new capture file is started and number of files kept per service
+CAPTURE_FILE_SIZE_ENV: str = "HEDY_CAPTURE_FILE_SIZE"
+CAPTURE_FILES_ENV: str = "HEDY_CAPTURE_FILES"
+DEFAULT_CAPTURE_FILE_SIZE: int = 64 * 1024 * 1024
+DEFAULT_CAPTURE_FILES: int = 10
+# secret mixed into the pseudonyms of redacted values, such that they cannot be looked up
+CAPTURE_SALT_ENV: str = "HEDY_CAPTURE_SALT"
+
+# request headers which are recorded and replayed, everything else (e.g. X-Admin-Token) is dropped
+CAPTURED_HEADERS: tuple[str, ...] = ("content-type", "accept", "x-priority", "x-deadline-ms")
+# fields of the responses which differ between identical requests and are not part of the response hash
+VOLATILE_FIELDS: frozenset[str] = frozenset({"context_id", "next"})
+# captured entries waiting to be written, further entries are dropped
+CAPTURE_QUEUE_SIZE: int = 1000
+
+REDACTED_PREFIX: str = "redacted-"
+
+# replaces sensitive values of a parsed request or response body, applied to both before recording
+Redactor = Callable[[Any], Any]
+
+
+def capture_directory() -> str:
+    return os.environ.get(CAPTURE_DIR_ENV, os.path.join(tempfile.gettempdir(), "hedy_captures"))
+
+
+def pseudonym(value: str) -> str:
+    # deterministic, such that the redacted requests reproduce the redacted responses, and idempotent
+    if value.startswith(REDACTED_PREFIX):
+        return value
+    digest = hashlib.blake2b((os.environ.get(CAPTURE_SALT_ENV, "") + value).encode(), digest_size=8).hexdigest()
+    return REDACTED_PREFIX + digest
+
+
+def redact_keys(keys: Iterable[str]) -> Redactor:
+    """
+    Redactor replacing the string values (or lists of strings) of the given keys anywhere in a body by pseudonyms, e.g.
+    redact_keys({"id", "supplier_id", "supplier_ids"}) for the supplier ids of the recommender
+    """
+    keys = frozenset(keys)
+
+    def redact(value: Any) -> Any:
+        if isinstance(value, dict):
+            return {k: _pseudonyms(v) if k in keys else redact(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [redact(v) for v in value]
+        return value
+
+    return redact
+
+
+def _pseudonyms(value: Any) -> Any:
+    if isinstance(value, str):
+        return pseudonym(value)
+    if isinstance(value, list):
+        return [pseudonym(v) if isinstance(v, str) else v for v in value]
+    return value
+
+
+# msgpack is imported on demand, it is only a dependency of the services supporting the msgpack transport (not e.g. of
+# the extractor)
+def decode_body(content_type: Optional[str], body: bytes) -> Any:
+    if content_type is not None and "msgpack" in content_type:
+        import msgpack
+        return msgpack.unpackb(body, raw=False)
+    return json.loads(body)
+
+
+def encode_body(content_type: Optional[str], content: Any) -> bytes:
+    if content_type is not None and "msgpack" in content_type:
+        import msgpack
+        return msgpack.packb(content)
+    return json.dumps(content).encode()
+
+
+def response_hash(content_type: Optional[str], body: bytes, redact: Optional[Redactor] = None) -> str:
+    """
+    Hash of the canonical form of a response without the volatile fields, equal for equal results independent of the
+    transport. Bodies which cannot be parsed are hashed as they are.
+    """
+    try:
+        content = decode_body(content_type, body)
+    except ValueError:
+        return hashlib.blake2b(body, digest_size=16).hexdigest()
+    if redact is not None:
+        content = redact(content)
+    canonical = json.dumps(_without_volatile(content), sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.blake2b(canonical.encode(), digest_size=16).hexdigest()
+
+
+def _without_volatile(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {k: _without_volatile(v) for k, v in value.items() if k not in VOLATILE_FIELDS}
+    if isinstance(value, list):
+        return [_without_volatile(v) for v in value]
+    return value
+
+
+class TrafficCapture:
+    """
+    Samples requests of a service and records them together with their duration and the hash of the response into
+    rotating JSONL files <service>-<start>-<pid>.jsonl, which are replayed by benchmarks/replayBenchmark.py. The files
+    are written by a background thread, the requests only pay for copying the bodies.
+    """
+
+    def __init__(self, service: str, rate: float = 0.0, directory: Optional[str] = None,
+                 paths: Iterable[str] = (), redact: Optional[Redactor] = None,
+                 file_size: int = DEFAULT_CAPTURE_FILE_SIZE, max_files: int = DEFAULT_CAPTURE_FILES):
+        self.service = service
+        self.rate = rate
+        self.directory = directory or capture_directory()
+        self.paths = frozenset(paths)
+        self.redact = redact
+        self.file_size = file_size
+        self.max_files = max_files
+        self.captured = 0
+        self.dropped = 0
+        self._queue: "queue.Queue[Optional[dict]]" = queue.Queue(CAPTURE_QUEUE_SIZE)
+        self._writer: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._file = None
+        self._path: Optional[str] = None
+
+    @staticmethod
+    def from_environment(service: str, paths: Iterable[str], redact: Optional[Redactor] = None) -> "TrafficCapture":
+        return TrafficCapture(service, float(os.environ.get(CAPTURE_RATE_ENV, 0.0)), capture_directory(), paths,
+                              redact, int(os.environ.get(CAPTURE_FILE_SIZE_ENV, DEFAULT_CAPTURE_FILE_SIZE)),
+                              int(os.environ.get(CAPTURE_FILES_ENV, DEFAULT_CAPTURE_FILES)))
+
+    def sample(self, method: str, path: str) -> bool:
+        return self.rate > 0 and method == "POST" and path in self.paths and random.random() < self.rate
+
+    def record(self, path: str, headers: dict[str, str], body: bytes, status: int, response_content_type: Optional[str],
+               response_body: bytes, duration: float):
+        entry = {"service": self.service, "time": time.time(), "path": path, "headers": headers, "status": status,
+                 "duration": duration, "body": body, "response_content_type": response_content_type,
+                 "response_body": response_body}
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_entries, daemon=True)
+                self._writer.start()
+
+    def flush(self):
+        """
+        Waits until all captured entries are written
+        """
+        self._queue.join()
+
+    def close(self):
+        with self._lock:
+            writer, self._writer = self._writer, None
+        if writer is not None:
+            self._queue.put(None)
+            writer.join()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _write_entries(self):
+        while True:
+            entry = self._queue.get()
+            try:
+                if entry is None:
+                    return
+                line = self._serialize(entry)
+                if line is not None:
+                    self._write(line)
+            except Exception as e:
+                # the capture must never affect the service
+                print(f"Could not capture a {self.service} request: {type(e).__name__}: {e}", flush=True)
+            finally:
+                self._queue.task_done()
+
+    def _serialize(self, entry: dict) -> Optional[str]:
+        # parsing and redacting happens in the writer thread, not while serving the request
+        content_type = entry["headers"].get("content-type")
+        try:
+            body = decode_body(content_type, entry.pop("body"))
+        except ValueError:
+            with self._lock:
+                self.dropped += 1
+            return None
+        if self.redact is not None:
+            body = self.redact(body)
+        entry["body"] = body
+        entry["response_hash"] = response_hash(entry.pop("response_content_type"), entry.pop("response_body"),
+                                               self.redact)
+        with self._lock:
+            self.captured += 1
+        return json.dumps(entry, separators=(",", ":"), default=str) + "\n"
+
+    def _write(self, line: str):
+        if self._file is None or self._file.tell() + len(line) > self.file_size:
+            self._rotate()
+        self._file.write(line)
+        self._file.flush()
+
+    def _rotate(self):
+        if self._file is not None:
+            self._file.close()
+        os.makedirs(self.directory, exist_ok=True)
+        self._path = os.path.join(self.directory, f"{self.service}-{time.strftime('%Y%m%d-%H%M%S')}-"
+                                                  f"{time.time_ns() % 1_000_000:06d}-{os.getpid()}.jsonl")
+        self._file = open(self._path, "w", encoding="utf-8")
+        # oldest files of this service are removed first
+        files = sorted(glob.glob(os.path.join(self.directory, f"{self.service}-*.jsonl")), key=os.path.getmtime)
+        for path in files[:max(0, len(files) - self.max_files)]:
+            if path != self._path:
+                os.remove(path)
+
+    def metrics(self) -> dict[str, Any]:
+        with self._lock:
+            return {"rate": self.rate, "captured": self.captured, "dropped": self.dropped, "file": self._path}
+
+
+class CaptureMiddleware:
+    """
+    ASGI middleware recording the sampled requests of a TrafficCapture. The body is passed through unchanged, hence it
+    is still available to the endpoints.
+    """
+
+    def __init__(self, app, capture: TrafficCapture):
+        self.app = app
+        self.capture = capture
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.capture.sample(scope["method"], scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        request_body = bytearray()
+        response_body = bytearray()
+        response: dict[str, Any] = {"status": 0, "content_type": None}
+
+        async def capturing_receive():
+            message = await receive()
+            if message["type"] == "http.request":
+                request_body.extend(message.get("body", b""))
+            return message
+
+        async def capturing_send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                for name, value in message.get("headers", []):
+                    if name.lower() == b"content-type":
+                        response["content_type"] = value.decode("latin-1")
+            elif message["type"] == "http.response.body":
+                response_body.extend(message.get("body", b""))
+            await send(message)
+
+        start = time.perf_counter()
+        await self.app(scope, capturing_receive, capturing_send)
+        duration = time.perf_counter() - start
+
+        headers = {}
+        for name, value in scope.get("headers", []):
+            name = name.decode("latin-1").lower()
+            if name in CAPTURED_HEADERS:
+                headers[name] = value.decode("latin-1")
+        self.capture.record(scope["path"], headers, bytes(request_body), response["status"], response["content_type"],
+                            bytes(response_body), duration)
@@ -0,0 +1,178 @@
+import cProfile
+import os
+import secrets
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from collections.abc import Callable, Iterator
+from typing import Optional, TypeVar
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import FileResponse
+
+from common.admin import require_admin_token, verify_admin_token
+
+T = TypeVar("T")
+
+# header to request profiling of a single request, only honored together with a valid admin token
+PROFILE_HEADER: str = "X-Profile"
+PROFILE_ID_HEADER: str = "X-Profile-Id"
+
+# directory of the stored profiles and interval of the stack sampling in seconds
+PROFILE_DIR_ENV: str = "HEDY_PROFILE_DIR"
+PROFILE_SAMPLE_INTERVAL_ENV: str = "HEDY_PROFILE_SAMPLE_INTERVAL"
+DEFAULT_PROFILE_SAMPLE_INTERVAL: float = 0.005
+
+# number of allocation sites reported
+PROFILE_TOP_ALLOCATIONS: int = 30
+
+# file suffixes of the stored results of a profile
+PROFILE_FILES: dict[str, str] = {"collapsed": ".collapsed.txt", "pstats": ".pstats", "allocations": ".allocations.txt"}
+
+# tracemalloc is global to the process, hence only one request is profiled at a time
+_profiling_lock = threading.Lock()
+
+
+def profile_directory() -> str:
+    return os.environ.get(PROFILE_DIR_ENV, os.path.join(tempfile.gettempdir(), "hedy_profiles"))
+
+
+class StackSampler(threading.Thread):
+    """
+    Samples the stack of a single thread in a fixed interval and counts the collapsed stacks
+    """
+
+    def __init__(self, thread_id: int, interval: float):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+
+class RequestProfiler:
+    """
+    Profiles the work of a single request with cProfile, a stack sampler and tracemalloc. It has to be entered in the
+    thread which does the work. The results are stored in the profile directory as <profile_id><suffix>, see
+    PROFILE_FILES.
+    """
+
+    def __init__(self, service: str):
+        self.profile_id = f"{service}-{time.strftime('%Y%m%d-%H%M%S')}-{secrets.token_hex(4)}"
+        self.interval = float(os.environ.get(PROFILE_SAMPLE_INTERVAL_ENV, DEFAULT_PROFILE_SAMPLE_INTERVAL))
+        self._profile: Optional[cProfile.Profile] = None
+        self._sampler: Optional[StackSampler] = None
+        self._started_tracemalloc = False
+        self._start = 0.0
+
+    def __enter__(self) -> "RequestProfiler":
+        self._started_tracemalloc = not tracemalloc.is_tracing()
+        if self._started_tracemalloc:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        self._sampler = StackSampler(threading.get_ident(), self.interval)
+        self._sampler.start()
+        self._start = time.perf_counter()
+        self._profile = cProfile.Profile()
+        self._profile.enable()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._profile.disable()
+        duration = time.perf_counter() - self._start
+        self._sampler.stop()
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+        self.store(duration, peak, snapshot)
+
+    def path(self, kind: str) -> str:
+        return os.path.join(profile_directory(), self.profile_id + PROFILE_FILES[kind])
+
+    def store(self, duration: float, peak: int, snapshot: tracemalloc.Snapshot):
+        os.makedirs(profile_directory(), exist_ok=True)
+        self._profile.dump_stats(self.path("pstats"))
+        with open(self.path("collapsed"), "w", encoding="utf-8") as fd:
+            for stack, count in self._sampler.stacks.most_common():
+                fd.write(f"{stack} {count}\n")
+
+        snapshot = snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+        with open(self.path("allocations"), "w", encoding="utf-8") as fd:
+            fd.write(f"duration: {duration:.4f}s, peak traced memory: {peak / 1024:.1f} KiB, "
+                     f"stack samples: {sum(self._sampler.stacks.values())}\n\n")
+            for stat in snapshot.statistics("lineno")[:PROFILE_TOP_ALLOCATIONS]:
+                fd.write(f"{stat}\n")
+
+
+def request_profiler(service: str):
+    """
+    Dependency factory, the dependency returns a RequestProfiler if the request asks for profiling
+    """
+
+    def dependency(x_profile: Optional[str] = Header(default=None),
+                   x_admin_token: Optional[str] = Header(default=None)) -> Iterator[Optional[RequestProfiler]]:
+        if x_profile is None or x_profile.lower() in ("", "0", "false"):
+            yield None
+            return
+        if not verify_admin_token(x_admin_token):
+            raise HTTPException(status_code=403, detail="Profiling requires a valid admin token")
+        if not _profiling_lock.acquire(blocking=False):
+            raise HTTPException(status_code=409, detail="Another request is profiled at the moment")
+        try:
+            yield RequestProfiler(service)
+        finally:
+            _profiling_lock.release()
+
+    return dependency
+
+
+def profiled(profiler: Optional[RequestProfiler], fnc: Callable[..., T]) -> Callable[..., T]:
+    """
+    Wraps fnc such that it runs under the profiler, if given
+    """
+    if profiler is None:
+        return fnc
+
+    def wrapper(*args, **kwargs):
+        with profiler:
+            return fnc(*args, **kwargs)
+
+    return wrapper
+
+
+profiling_router = APIRouter(prefix="/admin/profiles", dependencies=[Depends(require_admin_token)])
+
+
+@profiling_router.get("/")
+async def list_profiles():
+    directory = profile_directory()
+    if not os.path.isdir(directory):
+        return {"profiles": []}
+    return {"profiles": sorted(f for f in os.listdir(directory) if any(f.endswith(s) for s in PROFILE_FILES.values()))}
+
+
+@profiling_router.get("/{filename}")
+async def download_profile(filename: str):
+    path = os.path.join(profile_directory(), filename)
+    if os.path.basename(filename) != filename or not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail=f"Profile {filename} does not exist")
+    return FileResponse(path, filename=filename)
@@ -1,5 +1,9 @@
-from fastapi import FastAPI
+from typing import Optional
 
+from fastapi import FastAPI, Depends, Response
+
+from common.capture import TrafficCapture, CaptureMiddleware
+from common.profiling import profiling_router, request_profiler, profiled, RequestProfiler, PROFILE_ID_HEADER
 from extractor.input_processor import process_input
 from extractor.typedefs.io_types import Input, Output
 
@@ -12,6 +16,16 @@ You can extract parameters given a list of input files.
 """
 
 app = FastAPI(description=description, version="0.2.0")
+app.include_router(profiling_router)
+
+# sampled requests are recorded for benchmarks/replayBenchmark.py, see common/capture.py
+traffic_capture = TrafficCapture.from_environment("extractor", ["/extract/"])
+app.add_middleware(CaptureMiddleware, capture=traffic_capture)
+
+
+@app.on_event("shutdown")
+async def close_traffic_capture():
+    traffic_capture.close()
 
 
 @app.get("/")
@@ -20,8 +34,11 @@ async def root():
 
 
 @app.post("/extract/", response_model=Output)
-async def extract(inp: Input):
-    out = process_input(inp)
+async def extract(inp: Input, response: Response,
+                  profiler: Optional[RequestProfiler] = Depends(request_profiler("extractor"))):
+    out = profiled(profiler, process_input)(inp)
+    if profiler is not None:
+        response.headers[PROFILE_ID_HEADER] = profiler.profile_id
     return out
 
 
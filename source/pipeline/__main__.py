@@ -0,0 +1,83 @@
+from fastapi import FastAPI, Request, HTTPException
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+
+from extractor.input_processor import process_input
+from extractor.typedefs.io_types import Input as ExtractorInput
+from pipeline.io_types import PipelineInput, PipelineOutput
+from pipeline.pipelineFunctionality import pipeline_components, recommend_components
+from recommender.catalog.catalogSharedMemory import validate_tenant
+from recommender.catalog.catalogTenants import tenant_scope, TENANT_HEADER
+from recommender.recommenderFunctionality import estimate_cost, CatalogReferenceError
+from recommender.service.admission import admission
+from recommender.typedefs.generated_input_types import add_input_type_schemas
+from recommender.typedefs.io_types import Input
+from recommender.typedefs.type_definition import pinned_type_definition
+
+description = """
+Extraction and recommendation in a single request
+
+## recommend
+
+Extracts the demand parameters from the files of each component and ranks the given suppliers against them. The
+extracted parameters are passed to the recommender directly, instead of a round trip through both services. Parameters
+which could not be extracted are skipped, i.e. not part of the demand, and reported with the reason.
+
+Requires the environment of the extractor and the requirements of the recommender.
+"""
+
+app = FastAPI(description=description, version="0.2.0")
+# the preferences are described by the union of the input types, see recommender/typedefs/io_types.py
+app.openapi = lambda: add_input_type_schemas(FastAPI.openapi(app))
+
+
+@app.middleware("http")
+async def pin_type_definition(request: Request, call_next):
+    # each request is validated and evaluated with the type definition which was active when it arrived
+    with pinned_type_definition():
+        return await call_next(request)
+
+
+@app.middleware("http")
+async def scope_tenant(request: Request, call_next):
+    # the catalogs of the tenant given by the header, like in the recommender
+    tenant = request.headers.get(TENANT_HEADER)
+    if tenant is not None:
+        try:
+            validate_tenant(tenant)
+        except ValueError as e:
+            return JSONResponse(status_code=400, content={"detail": str(e)})
+    with tenant_scope(tenant):
+        return await call_next(request)
+
+
+@app.exception_handler(CatalogReferenceError)
+async def invalid_catalog_reference(request: Request, exc: CatalogReferenceError):
+    # like in the recommender, the catalogs are resolved by the admitted request
+    return JSONResponse(status_code=422, content={"detail": str(exc)})
+
+
+@app.get("/")
+async def root():
+    return {"message": "Pipeline is up and running."}
+
+
+@app.post("/recommend/", response_model=PipelineOutput)
+async def recommend(inp: PipelineInput):
+    extracted = await run_in_threadpool(process_input, ExtractorInput(components=[c.extraction for c in
+                                                                                  inp.components]))
+    try:
+        components, extraction = pipeline_components(inp, extracted)
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=422, detail=f"Invalid demand: {e}") from e
+
+    # the scoring is scheduled like the requests of the recommender, see recommender/service/admission.py
+    output = await admission.run(admission.default_class, estimate_cost(Input(components=components)),
+                                 recommend_components, components, inp.diagnostics, inp.min_score, inp.top_k)
+    return PipelineOutput(components=output.components, extraction=extraction)
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host="0.0.0.0", port=8070)
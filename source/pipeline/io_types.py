@@ -0,0 +1,79 @@
+from typing import Any, Optional, Union
+
+from pydantic import Field, conint
+from pydantic.dataclasses import dataclass
+
+from extractor.typedefs.io_types import Component, SupportedFileTypes
+from extractor.typedefs.typedef import Failures, ParameterWarnings, ProductionMethod
+from recommender.typedefs.generated_input_types import InputPreferences, all_production_methods, INPUT_TYPES_SCHEMA_KEY
+from recommender.typedefs.io_types import SupplierInformation, ComponentScore, validate_production_method
+from recommender.typedefs.type_definition import current_type_definition
+
+
+@dataclass(init=False)
+class PipelineComponent:
+    name: str = Field(description="Name of the component")
+    type: str = Field(description="Type of the production method of the recommendation", enum=all_production_methods)
+    files: list[SupportedFileTypes] = Field(description="List of files the demand parameters are extracted from")
+    # see recommender.typedefs.io_types, validated with the pinned type definition
+    preferences: Any = Field(..., description="Preferences from the demand",
+                             **{INPUT_TYPES_SCHEMA_KEY: "Preferences"})
+    method: Optional[ProductionMethod] = Field(None, description="Production method of the extraction, by default "
+                                                                 "PCB_ASSEMBLY for PCB_ASSEMBLY and GENERIC otherwise")
+    parameters: dict[str, Any] = Field(default_factory=dict,
+                                       description="Demand parameters which are not extracted from the files, these "
+                                                   "take precedence over extracted values")
+    suppliers: list[SupplierInformation] = Field(default_factory=list,
+                                                 description="List of all appropriate supplier parameters")
+    catalog: Optional[str] = Field(None, description="Name of a published supplier catalog, whose suppliers are "
+                                                     "ranked in addition to the given suppliers")
+
+    def __init__(self, name: str, type: str, files: list, preferences: Union[dict, InputPreferences],
+                 method: Optional[ProductionMethod] = None, parameters: Optional[dict[str, Any]] = None,
+                 suppliers: Union[list[dict], list[SupplierInformation]] = None, catalog: Optional[str] = None):
+        definition = current_type_definition()
+        validate_production_method(type)
+        if method is None:
+            method = ProductionMethod.PCB_ASSEMBLY if type == ProductionMethod.PCB_ASSEMBLY else \
+                ProductionMethod.GENERIC
+        self.name = name
+        self.type = type
+        self.method = method
+        # input of the extractor, validates the files
+        self.extraction = Component(name=name, method=method, files=files)
+        self.files = self.extraction.files
+        self.parameters = parameters or {}
+        pref_inp_type = definition.preference_input_types[type]
+        self.preferences = pref_inp_type(**preferences) if isinstance(preferences, dict) else preferences
+        self.suppliers = [s if isinstance(s, SupplierInformation) else SupplierInformation(type, **s) for s in
+                          (suppliers or [])]
+        self.catalog = catalog
+
+
+@dataclass
+class PipelineInput:
+    components: list[PipelineComponent] = Field(description="List of all components")
+    diagnostics: Optional[bool] = Field(default=None, description="Report the failures of each supplier (default)")
+    min_score: Optional[float] = Field(default=None, description="Only suppliers with at least this score are returned")
+    top_k: Optional[conint(ge=1)] = Field(default=None, description="Only the best top_k suppliers of each component "
+                                                                    "are returned")
+
+
+@dataclass
+class ExtractionResult:
+    name: str = Field(description="Name of the component")
+    parameters: dict[str, Any] = Field(default_factory=dict,
+                                       description="Demand parameters taken from the extracted parameters")
+    skipped: dict[str, str] = Field(default_factory=dict,
+                                    description="Demand parameters which could not be extracted, mapped to the reason. "
+                                                "These are not part of the demand")
+    failures: Failures = Field(default_factory=Failures, description="Failures of the extraction")
+    warnings: ParameterWarnings = Field(default_factory=list, description="Warnings of the extraction")
+
+
+@dataclass
+class PipelineOutput:
+    components: list[ComponentScore] = Field(default_factory=list,
+                                             description="Scores for each component for each supplier")
+    extraction: list[ExtractionResult] = Field(default_factory=list,
+                                               description="Demand parameters extracted for each component")
@@ -0,0 +1,164 @@
+import math
+from dataclasses import fields
+from typing import Any, Optional
+
+from common.typedef import Range
+from extractor.typedefs.io_types import Output as ExtractorOutput, ComponentParameters
+from extractor.typedefs.parameters import PCBParameters
+from extractor.typedefs.typedef import PackagingType
+from pipeline.io_types import PipelineInput, PipelineComponent, ExtractionResult
+from recommender.recommenderFunctionality import additional_validation, compile_components, rank_components
+from recommender.typedefs.io_types import Input, Output, ComponentInformation, DemandInformation
+from recommender.typedefs.type_definition import current_type_definition
+
+# extracted parameter -> demand parameter and the bound of an extracted range, which is used if the demand expects a
+# single value (e.g. the smallest drill decides whether a supplier is capable), None if a range cannot be reduced
+EXTRACTED_PARAMETERS: dict[str, tuple[str, Optional[str]]] = {
+    "length": ("length", None),
+    "width": ("width", None),
+    "height": ("height", None),
+    "assembly_sides": ("assembly_sides", None),
+    "n_layers": ("number_layers", None),
+    "inner_milling": ("inner_milling", None),
+    "drill_size": ("drill_sizes", "min"),
+    "drill_size_PTH": ("drill_size_PTH", "min"),
+    "drill_size_NPTH": ("drill_size_NPTH", "min"),
+    "drill_size_via": ("drill_size_via", "min"),
+    "trace_width": ("trace_width", "min"),
+    "trace_clearance": ("clearance", None),
+    "solder_mask_clearance": ("solder_mask_clearance", "min"),
+    "copper_thickness": ("copper_layer_thickness", "max"),
+    "core_thickness": ("core_thickness", None),
+    "prepreg_thickness": ("prepreg_thickness", None),
+    "n_NPTH": ("n_NPTH", None),
+}
+
+# packaging types present on a board -> demand parameter flagging the required assembly capability
+PACKAGING_PARAMETERS: dict[PackagingType, str] = {
+    PackagingType.TWO_TERMINAL: "two_terminal",
+    PackagingType.THROUGH_HOLE: "through_hole",
+    PackagingType.SURFACE_MOUNT: "surface_mount",
+    PackagingType.CHIP_CARRIER: "chip_carrier",
+    PackagingType.PIN_GRID_ARRAY: "pin_grid_array",
+    PackagingType.FLAT_PACKAGE: "flat_package_supplier",
+    PackagingType.SMALL_OUTLINE_IC: "small_outline_ic",
+    PackagingType.CHIP_SCALE: "chip_scale",
+    PackagingType.BALL_GRID_ARRAY: "ball_grid_array",
+    PackagingType.TRAN_DIO_SMALL_PIN_IC: "small_count",
+    PackagingType.MULTI_CHIP: "multi_chip",
+    PackagingType.T_CAPACITOR: "t_capacitor",
+    PackagingType.A_CAPACITOR: "a_capacitor",
+    PackagingType.NON_PACKAGED: "non_packaged",
+}
+
+
+def _bound(value: float) -> Optional[float]:
+    # unbounded sides of the extracted ranges are -inf/inf, the demand input omits them
+    return None if math.isinf(value) else value
+
+
+def demand_value(value: Any, demand_type: Any, bound: Optional[str]) -> Any:
+    """
+    Converts an extracted value into the input representation of the demand parameter
+    :raises ValueError: if the value cannot be represented
+    """
+    expects_range = demand_type in (Range[int], Range[float])
+    if isinstance(value, Range):
+        if expects_range:
+            return {"min": _bound(value.min), "max": _bound(value.max)}
+        if bound is None:
+            raise ValueError("a single value is expected, but a range was extracted")
+        single = _bound(getattr(value, bound))
+        if single is None:
+            raise ValueError(f"the {bound} of the extracted range is unbounded")
+        return single
+    if expects_range:
+        return {"min": value, "max": value}
+    return value
+
+
+def map_extracted_parameters(extracted: ComponentParameters, production_method: str) -> tuple[
+        dict[str, Any], dict[str, str]]:
+    """
+    Maps the parameters of the extractor to the demand parameters of the production method. Parameters which could not
+    be extracted or are not accepted by the demand are skipped, i.e. they are not part of the demand.
+    :return: demand parameters in their input representation and the reason for each skipped demand parameter
+    """
+    definition = current_type_definition()
+    par_inp_type_d = definition.parameter_input_types['Demand'][production_method]
+    demand_fields = par_inp_type_d.__pydantic_model__.__fields__
+    names = {f.name for f in fields(par_inp_type_d)}
+    parameters: dict[str, Any] = {}
+    skipped: dict[str, str] = {}
+
+    if extracted.parameters is None:
+        # the files could not be processed at all
+        errors = extracted.failures.parsing
+        reason = f"extraction failed: {errors[0].error}" if errors else "extraction failed"
+        for target, _ in EXTRACTED_PARAMETERS.values():
+            if target in names:
+                skipped[target] = reason
+        return parameters, skipped
+
+    for name, (target, bound) in EXTRACTED_PARAMETERS.items():
+        if target not in names or not hasattr(extracted.parameters, name):
+            continue
+        errors = extracted.failures.extracting.get(name)
+        if errors:
+            skipped[target] = f"extraction failed: {errors[0].error}"
+            continue
+        value = getattr(extracted.parameters, name)
+        if value is None:
+            skipped[target] = "not extracted"
+            continue
+        try:
+            value = demand_value(value, getattr(definition.parameters, target).demand_type, bound)
+        except ValueError as e:
+            skipped[target] = str(e)
+            continue
+        _, error = demand_fields[target].validate(value, {}, loc=target)
+        if error is not None:
+            skipped[target] = f"not accepted by the demand: {error.exc}"
+            continue
+        parameters[target] = value
+
+    if isinstance(extracted.parameters, PCBParameters) and extracted.parameters.packaging_count is not None:
+        # only the required capabilities are set, the demand does not exclude suppliers of other packaging types
+        for packaging_type, count in extracted.parameters.packaging_count.items():
+            target = PACKAGING_PARAMETERS.get(PackagingType(packaging_type))
+            if target in names and count > 0:
+                parameters[target] = True
+    return parameters, skipped
+
+
+def pipeline_components(inp: PipelineInput, extracted: ExtractorOutput) -> tuple[
+        list[ComponentInformation], list[ExtractionResult]]:
+    """
+    Creates the components of a recommendation from the output of the extractor. The demand is validated once from the
+    extracted values, without the serialization in between the services.
+    """
+    components, extraction = [], []
+    for component, component_parameters in zip(inp.components, extracted.components):
+        parameters, skipped = map_extracted_parameters(component_parameters, component.type)
+        # parameters given explicitly replace the extracted ones
+        extracted_parameters = {k: v for k, v in parameters.items() if k not in component.parameters}
+        skipped = {k: v for k, v in skipped.items() if k not in component.parameters}
+        extraction.append(ExtractionResult(name=component.name, parameters=extracted_parameters, skipped=skipped,
+                                           failures=component_parameters.failures,
+                                           warnings=component_parameters.additional_info.warnings))
+        components.append(pipeline_component(component, dict(extracted_parameters, **component.parameters)))
+    return components, extraction
+
+
+def pipeline_component(component: PipelineComponent, parameters: dict[str, Any]) -> ComponentInformation:
+    demand = DemandInformation(component.type, parameters, component.preferences)
+    return ComponentInformation(component.name, component.type, demand, component.suppliers, component.catalog)
+
+
+def recommend_components(components: list[ComponentInformation], diagnostics: Optional[bool] = None,
+                         min_score: Optional[float] = None, top_k: Optional[int] = None) -> Output:
+    validated_input = additional_validation(Input(components=components, diagnostics=diagnostics,
+                                                  min_score=min_score, top_k=top_k))
+    return rank_components(compile_components(validated_input), diagnostics=validated_input.diagnostics is not False,
+                           min_score=validated_input.min_score, top_k=validated_input.top_k)
+
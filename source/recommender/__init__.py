@@ -1,3 +1,7 @@
 import os
+import time
 
 RECOMMENDER_ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# reference point for measuring the time from the first import until the recommender is ready to serve requests
+RECOMMENDER_IMPORT_TIME = time.perf_counter()
@@ -1,17 +1,174 @@
-from fastapi import FastAPI
+import contextvars
+import os
+import time
+from dataclasses import asdict
+from collections.abc import Awaitable
+from typing import Optional
 
-from recommender.recommenderFunctionality import perform_recommendation, additional_validation
-from recommender.typedefs.io_types import Input, Output
+from fastapi import FastAPI, Depends, Request, HTTPException, Header, Response
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+
+from common.admin import require_admin_token
+from common.capture import TrafficCapture, CaptureMiddleware, redact_keys
+from common.profiling import profiling_router, request_profiler, profiled, RequestProfiler, PROFILE_ID_HEADER
+from recommender import RECOMMENDER_IMPORT_TIME
+from recommender.catalog.catalogSharedMemory import CatalogNotFoundError, validate_tenant
+from recommender.catalog.catalogSnapshot import write_snapshot, restore_catalogs
+from recommender.catalog.catalogTenants import tenant_catalogs, tenant_scope, TENANT_HEADER
+from recommender.catalog.catalogUpdates import upsert_suppliers, patch_supplier, delete_suppliers, compact_catalog, \
+    CatalogUpdate
+from recommender.parameters.parameterSelectivity import selectivity
+from recommender.recommenderFunctionality import additional_validation, compile_components, rank_components, \
+    explain_components, rank_components_paged, page_components, CompiledComponent, ComponentRanking, estimate_cost, \
+    rank_components_deadline, catalog_generations, compile_shard, rank_shard, check_catalogs, CatalogReferenceError
+from recommender.service.admission import admission, AdmissionRejected
+from recommender.service.msgpackTransport import MsgPackRoute, output_response, accepts_msgpack, MSGPACK_MEDIA_TYPES
+from recommender.service.responseCache import response_cache, request_key, etag, etag_matches
+from recommender.service.rankingContext import RankingContextStore, encode_cursor, decode_cursor
+from recommender.service.sharding import ShardCoordinator, ShardError
+from recommender.service.openapiCache import install_openapi_cache
+from recommender.typedefs.generated_input_types import type_generation_timings, type_definition_hash, \
+    add_input_type_schemas
+from recommender.service.preparedDemands import PreparedDemandStore
+from recommender.service.supplierCache import supplier_cache
+from recommender.typedefs.io_types import Input, Output, ExplainRequest, NextPageRequest, ShardRequest, ShardOutput, \
+    DemandRegistration, RegisteredDemand, prepare_demand, CatalogUpsert, CatalogSupplierPatch, CatalogUpdateResult
+from recommender.typedefs.type_definition import TypeDefinitionRegistry, TypeDefinitionWatcher, \
+    pinned_type_definition, current_type_definition
 
 description = """
 Recommender for given parameter sets
 
 ## recommend
 
-Allows you to rank the given demand parameters with the given supplier parameters
+Allows you to rank the given demand parameters with the given supplier parameters. With page_size set, further pages of
+the ranking are served from recommend/next without scoring again
+
+## demands
+
+Registers a demand which is ranked repeatedly against different suppliers, recommend references it by the returned
+demand_id instead of sending the demand again
+
+## explain
+
+Reports the failures of single suppliers of a previous recommendation
+
+All endpoints accept MessagePack bodies (Content-Type: application/msgpack) and return MessagePack if requested by the
+Accept header
+
+Requests to recommend are scheduled by priority class, selected by the header X-Priority (interactive by default,
+batch for bulk jobs). Queue depth and wait times are reported at metrics/admission
+
+Identical requests are computed once and answered from a short-lived cache, conditional requests (If-None-Match) are
+supported
+
+With the header X-Deadline-Ms, the suppliers scored within this budget are returned, incomplete components are flagged
+
+## shard/recommend
+
+Ranks a part of the suppliers on behalf of a coordinator. An instance with RECOMMENDER_SHARDS set is a coordinator, it
+distributes the suppliers of each recommendation over these shards and merges their rankings
 """
 
 app = FastAPI(description=description, version="0.2.0")
+# request bodies may be sent as MessagePack as well
+app.router.route_class = MsgPackRoute
+app.include_router(profiling_router)
+
+# the outputs are returned as MessagePack, if requested by the Accept header
+MSGPACK_RESPONSE = {200: {"content": {MSGPACK_MEDIA_TYPES[0]: {}}}}
+
+# import-to-ready time of this worker and the share of the type generation, see recommenderTypeArtifact.py
+startup_timings: dict[str, float] = {}
+
+# poll interval in seconds for changes of the type definition file, disabled if not set
+TYPE_DEFINITION_WATCH_ENV = "RECOMMENDER_TYPE_DEFINITION_WATCH_INTERVAL"
+type_definition_watcher: Optional[TypeDefinitionWatcher] = None
+
+# scatter-gather over other instances, see recommender/service/sharding.py
+shard_coordinator: Optional[ShardCoordinator] = ShardCoordinator.from_environment()
+
+# sampled requests are recorded with pseudonymous supplier ids for benchmarks/replayBenchmark.py, see common/capture.py
+traffic_capture = TrafficCapture.from_environment("recommender", ["/demands/", "/recommend/"],
+                                                  redact_keys({"id", "supplier_id", "supplier_ids"}))
+app.add_middleware(CaptureMiddleware, capture=traffic_capture)
+
+# the schema of the generated input types is created once per type definition and served from memory, see
+# recommender/service/openapiCache.py
+app.openapi = lambda: add_input_type_schemas(FastAPI.openapi(app))
+openapi_cache = install_openapi_cache(app, type_definition_hash)
+
+
+@app.middleware("http")
+async def pin_type_definition(request: Request, call_next):
+    # each request is validated and evaluated with the type definition which was active when it arrived
+    with pinned_type_definition():
+        return await call_next(request)
+
+
+@app.middleware("http")
+async def scope_tenant(request: Request, call_next):
+    # catalogs are resolved to the catalogs of the tenant given by the header, see recommender/catalog/catalogTenants.py
+    tenant = request.headers.get(TENANT_HEADER)
+    if tenant is not None:
+        try:
+            validate_tenant(tenant)
+        except ValueError as e:
+            return JSONResponse(status_code=400, content={"detail": str(e)})
+    with tenant_scope(tenant):
+        return await call_next(request)
+
+
+@app.on_event("startup")
+async def start_type_definition_watcher():
+    global type_definition_watcher
+    interval = os.environ.get(TYPE_DEFINITION_WATCH_ENV)
+    if interval is not None and type_definition_watcher is None:
+        type_definition_watcher = TypeDefinitionWatcher(float(interval))
+        type_definition_watcher.start()
+
+
+@app.on_event("shutdown")
+async def stop_type_definition_watcher():
+    global type_definition_watcher
+    if type_definition_watcher is not None:
+        type_definition_watcher.stop()
+        type_definition_watcher = None
+
+
+@app.on_event("startup")
+async def prepare_openapi_schema():
+    openapi_cache.warm_up()
+
+
+@app.on_event("shutdown")
+async def save_parameter_selectivity():
+    selectivity.save()
+
+
+@app.on_event("shutdown")
+async def close_traffic_capture():
+    traffic_capture.close()
+
+
+@app.on_event("startup")
+async def restore_catalog_snapshots():
+    # after a restart of the node the shared catalogs are mapped from their snapshots instead of being published again
+    # tenant catalogs are restored on their first use, within their quota
+    restored = await run_in_threadpool(restore_catalogs, TypeDefinitionRegistry.active.version, None, False)
+    if restored:
+        print(f"Restored catalogs from snapshots: {restored}", flush=True)
+
+
+@app.on_event("startup")
+async def measure_startup():
+    startup_timings["import_to_ready"] = time.perf_counter() - RECOMMENDER_IMPORT_TIME
+    startup_timings.update({f"type_generation_{k}": v for k, v in type_generation_timings.items()})
+    print(f"Recommender ready after {startup_timings['import_to_ready']:.3f}s, type generation took "
+          f"{type_generation_timings['total']:.3f}s (reading the type definition "
+          f"{type_generation_timings['read_definition']:.3f}s, the input types are generated per production method "
+          f"on first use)", flush=True)
 
 
 @app.get("/")
@@ -19,11 +176,300 @@ async def root():
     return {"message": "Recommender is up and running."}
 
 
-@app.post("/recommend/", response_model=Output)
-async def recommend(inp: Input):
+def request_priority(x_priority: Optional[str] = Header(default=None)) -> str:
+    if x_priority is None:
+        return admission.default_class
+    if x_priority not in admission.classes:
+        raise HTTPException(status_code=400, detail=f"Unknown priority class {x_priority}, expected one of "
+                                                    f"{list(admission.classes)}")
+    return x_priority
+
+
+def request_deadline(x_deadline_ms: Optional[float] = Header(default=None)) -> Optional[float]:
+    # relative budget of the request in milliseconds, converted into an absolute time.monotonic() deadline
+    if x_deadline_ms is None:
+        return None
+    if x_deadline_ms <= 0:
+        raise HTTPException(status_code=400, detail="X-Deadline-Ms must be positive")
+    return time.monotonic() + x_deadline_ms / 1000.0
+
+
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected(request: Request, exc: AdmissionRejected):
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "1"})
+
+
+@app.exception_handler(CatalogReferenceError)
+async def invalid_catalog_reference(request: Request, exc: CatalogReferenceError):
+    # resolved by the admitted request instead of the validation, still an invalid request
+    return JSONResponse(status_code=422, content={"detail": str(exc)})
+
+
+@app.exception_handler(ShardError)
+async def shards_unavailable(request: Request, exc: ShardError):
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "1"})
+
+
+@app.post("/recommend/", response_model=Output, responses=MSGPACK_RESPONSE)
+async def recommend(inp: Input, request: Request, response: Response, priority: str = Depends(request_priority),
+                    deadline: Optional[float] = Depends(request_deadline),
+                    profiler: Optional[RequestProfiler] = Depends(request_profiler("recommender"))):
+    if deadline is not None and inp.page_size is not None:
+        raise HTTPException(status_code=400, detail="A deadline is not supported for paged recommendations")
+    payload = await request.json()
+    if shard_coordinator is not None:
+        payload = expand_prepared_demands(payload, inp)
+
+    async def coordinate() -> Output:
+        # invalid catalog references are rejected before the dispatch, instead of failing on every shard
+        await run_in_threadpool(contextvars.copy_context().run, check_catalogs, inp)
+        return await shard_coordinator.recommend(payload, priority, deadline)
+
+    def compute() -> Awaitable[Output]:
+        if shard_coordinator is not None:
+            return coordinate()
+        # the scoring runs in the threadpool once the request is admitted, see recommender/service/admission.py
+        return admission.run(priority, estimate_cost(inp), profiled(profiler, recommend_input), inp, deadline)
+
+    if shard_coordinator is not None and (inp.page_size is not None or profiler is not None):
+        raise HTTPException(status_code=400, detail="Paging and profiling are not supported by a coordinator, the "
+                                                    "rankings are not kept")
+
+    if profiler is not None or deadline is not None:
+        # neither profiled nor partial results are shared with other requests
+        result = output_response(request, await compute())
+        if profiler is not None:
+            response_headers(result, response)[PROFILE_ID_HEADER] = profiler.profile_id
+        return result
+
+    # identical requests are computed once, see recommender/service/responseCache.py
+    key = request_key(payload, current_type_definition().version, catalog_generations(inp))
+    tag = etag(key, "-msgpack" if accepts_msgpack(request) else "")
+    if etag_matches(request.headers.get("if-none-match"), tag):
+        return Response(status_code=304, headers={"ETag": tag})
+
+    # only requests of the same priority class share a computation, otherwise a request could wait for the computation
+    # of a lower priority class
+    output = await response_cache.get_or_compute(key, compute, valid=reusable, flight=priority)
+    result = output_response(request, output)
+    response_headers(result, response)["ETag"] = tag
+    return result
+
+
+def expand_prepared_demands(payload: dict, inp: Input) -> dict:
+    # the shards do not know the demands registered at the coordinator
+    components = []
+    for c, component in zip(payload["components"], inp.components):
+        if component.prepared is not None:
+            c = {k: v for k, v in c.items() if k != "demand_id"}
+            c.update(type=component.type, demand={"parameters": component.prepared.parameters,
+                                                  "preferences": component.prepared.preferences})
+        components.append(c)
+    return dict(payload, components=components)
+
+
+def reusable(output: Output) -> bool:
+    # cached outputs must be complete (e.g. no shard failed) and their context, if any, still available
+    return all(c.complete for c in output.components) and (
+            output.context_id is None or RankingContextStore.get(output.context_id) is not None)
+
+
+def response_headers(result, response: Response):
+    # headers of a response returned directly (e.g. msgpack) or of the response fastapi renders the output into
+    return result.headers if isinstance(result, Response) else response.headers
+
+
+def recommend_input(inp: Input, deadline: Optional[float] = None) -> Output:
     validated_input = additional_validation(inp)
 
-    return perform_recommendation(validated_input)
+    components = compile_components(validated_input)
+    diagnostics = validated_input.diagnostics is not False
+    # the compiled components are only kept if the client asks for explanations, they take as much memory as the request
+    explainable = validated_input.explainable if validated_input.explainable is not None else not diagnostics
+    if deadline is not None:
+        # whatever is scored until the deadline is returned, components are flagged as partial
+        output = rank_components_deadline(components, deadline, diagnostics=diagnostics,
+                                          min_score=validated_input.min_score, top_k=validated_input.top_k)
+        output.context_id = RankingContextStore.put(components) if explainable else None
+        return output
+
+    if validated_input.page_size is not None:
+        # only the ids and scores are kept, the details are computed per page
+        rankings = rank_components_paged(components, min_score=validated_input.min_score, top_k=validated_input.top_k)
+        context_id = RankingContextStore.put(components, rankings, validated_input.page_size, diagnostics)
+        return paged_output(context_id, components, rankings, 0, validated_input.page_size, diagnostics)
+
+    output = rank_components(components, diagnostics=diagnostics, min_score=validated_input.min_score,
+                             top_k=validated_input.top_k)
+    output.context_id = RankingContextStore.put(components) if explainable else None
+    return output
+
+
+@app.post("/shard/recommend/", response_model=ShardOutput, responses=MSGPACK_RESPONSE)
+async def shard_recommend(request: ShardRequest, http_request: Request, priority: str = Depends(request_priority)):
+    if len(request.suppliers) != len(request.input.components) or request.shard >= request.shards:
+        raise HTTPException(status_code=400, detail="Inconsistent shard request")
+    output = await admission.run(priority, estimate_cost(request.input), recommend_shard, request)
+    return output_response(http_request, output)
+
+
+def recommend_shard(request: ShardRequest) -> ShardOutput:
+    validated_input = additional_validation(request.input)
+    components, positions = compile_shard(validated_input, request.shard, request.shards, request.suppliers)
+    return rank_shard(components, positions, diagnostics=validated_input.diagnostics is not False,
+                      min_score=validated_input.min_score, top_k=validated_input.top_k)
+
+
+@app.post("/recommend/next/", response_model=Output, responses=MSGPACK_RESPONSE)
+async def recommend_next(request: NextPageRequest, http_request: Request):
+    cursor = decode_cursor(request.next)
+    context = RankingContextStore.get(cursor[0]) if cursor is not None else None
+    if context is None or context.rankings is None:
+        raise HTTPException(status_code=404, detail=f"Cursor {request.next} does not exist or expired")
+
+    page_size = request.page_size if request.page_size is not None else context.page_size
+    return output_response(http_request, paged_output(context.context_id, context.components, context.rankings,
+                                                      cursor[1], page_size, context.diagnostics))
+
+
+def paged_output(context_id: str, components: list[CompiledComponent], rankings: list[ComponentRanking], offset: int,
+                 page_size: int, diagnostics: bool) -> Output:
+    output = page_components(components, rankings, offset, page_size, diagnostics)
+    output.context_id = context_id
+    if any(len(r) > offset + page_size for r in rankings):
+        output.next = encode_cursor(context_id, offset + page_size)
+    return output
+
+
+@app.post("/explain/", response_model=Output, responses=MSGPACK_RESPONSE)
+async def explain(request: ExplainRequest, http_request: Request):
+    context = RankingContextStore.get(request.context_id)
+    if context is None:
+        raise HTTPException(status_code=404, detail=f"Ranking context {request.context_id} does not exist or expired")
+    if request.component is not None and all(c.name != request.component for c in context.components):
+        raise HTTPException(status_code=404, detail=f"Component {request.component} is not part of the ranking")
+
+    output = explain_components(context.components, request.supplier_ids, request.component)
+    found = {s.supplier_id for c in output.components for s in c.scores}
+    missing = [i for i in request.supplier_ids if i not in found]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Suppliers {missing} are not part of the ranking")
+
+    output.context_id = context.context_id
+    return output_response(http_request, output)
+
+
+@app.post("/demands/", response_model=RegisteredDemand, responses=MSGPACK_RESPONSE)
+async def register_demand(request: DemandRegistration, http_request: Request):
+    prepared = prepare_demand(request.type, request.demand)
+    return output_response(http_request, RegisteredDemand(demand_id=prepared.demand_id,
+                                                          expires_in=PreparedDemandStore.ttl))
+
+
+@app.delete("/demands/{demand_id}/", status_code=204)
+async def delete_demand(demand_id: str):
+    if not PreparedDemandStore.delete(demand_id):
+        raise HTTPException(status_code=404, detail=f"Demand {demand_id} does not exist or expired")
+    return Response(status_code=204)
+
+
+@app.get("/metrics/admission/")
+async def admission_metrics():
+    return admission.metrics()
+
+
+@app.get("/metrics/response_cache/")
+async def response_cache_metrics():
+    return response_cache.metrics()
+
+
+@app.get("/metrics/supplier_cache/")
+async def supplier_cache_metrics():
+    return supplier_cache.metrics()
+
+
+@app.get("/metrics/parameter_selectivity/")
+async def parameter_selectivity_metrics():
+    return selectivity.snapshot()
+
+
+@app.get("/metrics/catalog_tenants/")
+async def catalog_tenant_metrics():
+    return await run_in_threadpool(tenant_catalogs.metrics)
+
+
+@app.get("/metrics/shards/")
+async def shard_metrics():
+    if shard_coordinator is None:
+        raise HTTPException(status_code=404, detail="This instance is not a coordinator")
+    return shard_coordinator.metrics()
+
+
+@app.get("/admin/type_definition/", dependencies=[Depends(require_admin_token)])
+async def type_definition_status():
+    active = TypeDefinitionRegistry.active
+    return {"version": active.version, "filename": active.filename, "created": active.created,
+            "production_methods": active.production_methods,
+            "reload_in_progress": TypeDefinitionRegistry.reload_in_progress,
+            "last_reload_error": TypeDefinitionRegistry.last_reload_error}
+
+
+@app.post("/admin/type_definition/reload/", status_code=202, dependencies=[Depends(require_admin_token)])
+async def reload_type_definition(filename: Optional[str] = None):
+    if filename is not None and os.path.basename(filename) != filename:
+        raise HTTPException(status_code=400, detail="The type definition must be a file in the recommender directory")
+
+    # the new version is generated in the background, requests are served by the current version in the meantime
+    started = TypeDefinitionRegistry.reload(filename)
+    return {"reload_started": started, "active_version": TypeDefinitionRegistry.active.version}
+
+
+async def update_catalog(fnc, *args) -> CatalogUpdateResult:
+    # updates wait for other publications of the catalog, the suppliers are validated with the pinned type definition
+    context = contextvars.copy_context()
+    try:
+        update: CatalogUpdate = await run_in_threadpool(context.run, fnc, *args)
+    except CatalogNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return CatalogUpdateResult(**asdict(update))
+
+
+@app.put("/admin/catalogs/{name}/suppliers/", response_model=CatalogUpdateResult,
+         dependencies=[Depends(require_admin_token)])
+async def upsert_catalog_suppliers(name: str, request: CatalogUpsert):
+    return await update_catalog(upsert_suppliers, name, request.suppliers)
+
+
+@app.patch("/admin/catalogs/{name}/suppliers/{supplier_id}/", response_model=CatalogUpdateResult,
+           dependencies=[Depends(require_admin_token)])
+async def patch_catalog_supplier(name: str, supplier_id: str, request: CatalogSupplierPatch):
+    return await update_catalog(patch_supplier, name, supplier_id, request.parameters, request.preferences)
+
+
+@app.delete("/admin/catalogs/{name}/suppliers/{supplier_id}/", response_model=CatalogUpdateResult,
+            dependencies=[Depends(require_admin_token)])
+async def delete_catalog_supplier(name: str, supplier_id: str):
+    return await update_catalog(delete_suppliers, name, [supplier_id])
+
+
+@app.post("/admin/catalogs/{name}/compact/", dependencies=[Depends(require_admin_token)])
+async def compact_catalog_generation(name: str):
+    try:
+        generation = await run_in_threadpool(compact_catalog, name)
+    except CatalogNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return {"compacted": generation is not None, "generation": generation}
+
+
+@app.post("/admin/catalogs/{name}/snapshot/", dependencies=[Depends(require_admin_token)])
+async def snapshot_catalog(name: str):
+    try:
+        snapshot = await run_in_threadpool(write_snapshot, name)
+    except CatalogNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return asdict(snapshot)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,343 @@
+import math
+from dataclasses import dataclass, field, fields
+from enum import Enum
+from typing import Any, Optional, Union, get_origin, get_args
+
+import numpy as np
+
+from common.typedef import Range, RangeInt, RangeFloat
+from recommender.typedefs.type_definition import TypeDefinition
+
+Sections = ("parameters", "preferences")
+
+
+class ColumnKind(str, Enum):
+    """
+    Columnar encoding of a single parameter/preference, None is always encoded as a dedicated value
+    """
+    BOOL = "bool"  # int8: -1 None, 0 False, 1 True
+    INT = "int"  # float64: NaN None
+    FLOAT = "float"  # float64: NaN None
+    NUMBER = "number"  # float64 + int8 flag, whether the value was an int
+    STR = "str"  # int32 codes into a vocabulary, -1 None
+    RANGE = "range"  # float64 min/max, unbounded = +-inf, NaN None
+    ZONE = "zone"  # float64 min/max + int8 flag of the original type (int, float, RangeInt, RangeFloat), -1 None
+    LIST = "list"  # offsets + flat values (codes for str), int8 flag whether the list is present
+
+
+# type flags of ColumnKind.ZONE
+_ZONE_TYPES = (int, float, RangeInt, RangeFloat)
+
+
+@dataclass
+class ColumnSpec:
+    section: str
+    name: str
+    kind: ColumnKind
+    element: Optional[str] = None  # base type of RANGE and LIST columns
+
+    @property
+    def key(self) -> str:
+        return f"{self.section}.{self.name}"
+
+
+@dataclass
+class CatalogColumns:
+    """
+    Read-only columnar representation of all suppliers of a single production method
+    """
+    production_method: str
+    type_definition_version: str
+    ids: np.ndarray
+    columns: list[ColumnSpec]
+    arrays: dict[str, np.ndarray]
+    vocabularies: dict[str, list[str]] = field(default_factory=dict)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def value(self, column: ColumnSpec, row: int) -> Any:
+        return _decode_value(self, column, row)
+
+    def row(self, row: int) -> dict:
+        # input representation of a single supplier, i.e. as accepted by SupplierInformation
+        entry = {"id": str(self.ids[row]), "parameters": {}, "preferences": {}}
+        for c in self.columns:
+            v = _decode_value(self, c, row)
+            if v is not None:
+                entry[c.section][c.name] = v
+        return entry
+
+    def nbytes(self) -> int:
+        return int(self.ids.nbytes + sum(a.nbytes for a in self.arrays.values()))
+
+
+def column_kind(t) -> tuple[ColumnKind, Optional[str]]:
+    origin = get_origin(t)
+    if origin is list:
+        return ColumnKind.LIST, get_args(t)[0].__name__
+    if origin is Union:
+        args = get_args(t)
+        if any(a in (Range[int], Range[float]) for a in args):
+            return ColumnKind.ZONE, None
+        return ColumnKind.NUMBER, None
+    if t in (Range[int], Range[float]):
+        return ColumnKind.RANGE, get_args(t)[0].__name__
+    if t is bool:
+        return ColumnKind.BOOL, None
+    if isinstance(t, type) and issubclass(t, int):
+        return ColumnKind.INT, None
+    if isinstance(t, type) and issubclass(t, float):
+        return ColumnKind.FLOAT, None
+    if t is str:
+        return ColumnKind.STR, None
+    raise RuntimeError(f"Type {t} cannot be stored in a supplier catalog")
+
+
+def catalog_column_specs(definition: TypeDefinition, production_method: str) -> list[ColumnSpec]:
+    specs: list[ColumnSpec] = []
+    for f in fields(definition.parameter_input_types['Supplier'][production_method]):
+        kind, element = column_kind(getattr(definition.parameters, f.name).supplier_type)
+        specs.append(ColumnSpec("parameters", f.name, kind, element))
+    for f in fields(definition.preference_input_types[production_method]):
+        kind, element = column_kind(getattr(definition.preferences, f.name).preference_type.type)
+        specs.append(ColumnSpec("preferences", f.name, kind, element))
+    return specs
+
+
+def compile_catalog(production_method: str, suppliers: list, definition: TypeDefinition) -> CatalogColumns:
+    """
+    Compiles validated suppliers (SupplierInformation) into the columnar representation
+    :param production_method: Production method of all suppliers
+    :param suppliers: Suppliers validated with the input types of the given type definition
+    :param definition: Type definition the suppliers are validated with
+    """
+    specs = catalog_column_specs(definition, production_method)
+    arrays: dict[str, np.ndarray] = {}
+    vocabularies: dict[str, list[str]] = {}
+    for c in specs:
+        # read from the instance dict, such that the values shared with the supplier cache are not copied (see
+        # io_types.shared_supplier_input), the columns do not reference them
+        values = [getattr(vars(s)[c.section], c.name) for s in suppliers]
+        _encode_column(c, values, arrays, vocabularies)
+
+    ids = np.array([str(s.id) for s in suppliers], dtype=np.str_)
+    if len(ids) == 0:
+        ids = np.zeros(0, dtype="<U1")
+
+    return CatalogColumns(production_method=production_method, type_definition_version=definition.version, ids=ids,
+                          columns=specs, arrays=arrays, vocabularies=vocabularies)
+
+
+def _encode_vocabulary(key: str, values: list[Optional[str]], vocabularies: dict[str, list[str]]) -> np.ndarray:
+    vocabulary = vocabularies.setdefault(key, [])
+    index = {v: i for i, v in enumerate(vocabulary)}
+    codes = np.full(len(values), -1, dtype=np.int32)
+    for i, v in enumerate(values):
+        if v is None:
+            continue
+        if v not in index:
+            index[v] = len(vocabulary)
+            vocabulary.append(v)
+        codes[i] = index[v]
+    return codes
+
+
+def _range_bounds(v) -> tuple[float, float]:
+    low = -math.inf if v.min is None else float(v.min)
+    high = math.inf if v.max is None else float(v.max)
+    return low, high
+
+
+def _encode_column(c: ColumnSpec, values: list, arrays: dict[str, np.ndarray], vocabularies: dict[str, list[str]]):
+    n = len(values)
+    if c.kind == ColumnKind.BOOL:
+        arrays[c.key] = np.array([-1 if v is None else int(v) for v in values], dtype=np.int8)
+    elif c.kind in (ColumnKind.INT, ColumnKind.FLOAT):
+        arrays[c.key] = np.array([math.nan if v is None else v for v in values], dtype=np.float64)
+    elif c.kind == ColumnKind.NUMBER:
+        arrays[c.key] = np.array([math.nan if v is None else v for v in values], dtype=np.float64)
+        arrays[c.key + ".is_int"] = np.array([isinstance(v, int) for v in values], dtype=np.int8)
+    elif c.kind == ColumnKind.STR:
+        arrays[c.key] = _encode_vocabulary(c.key, values, vocabularies)
+    elif c.kind in (ColumnKind.RANGE, ColumnKind.ZONE):
+        low, high = np.full(n, math.nan), np.full(n, math.nan)
+        flags = np.full(n, -1, dtype=np.int8)
+        for i, v in enumerate(values):
+            if v is None:
+                continue
+            if isinstance(v, (RangeInt, RangeFloat)):
+                low[i], high[i] = _range_bounds(v)
+            else:
+                low[i], high[i] = v, v
+            flags[i] = next(j for j, t in enumerate(_ZONE_TYPES) if type(v) is t)
+        arrays[c.key + ".min"], arrays[c.key + ".max"] = low, high
+        if c.kind == ColumnKind.ZONE:
+            arrays[c.key + ".type"] = flags
+    elif c.kind == ColumnKind.LIST:
+        present = np.array([v is not None for v in values], dtype=np.int8)
+        lengths = [0 if v is None else len(v) for v in values]
+        offsets = np.zeros(n + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(lengths, dtype=np.int64)
+        flat = [e for v in values if v is not None for e in v]
+        if c.element == "str":
+            flat_values = _encode_vocabulary(c.key, flat, vocabularies)
+        else:
+            flat_values = np.array(flat, dtype={"bool": np.bool_, "int": np.int64, "float": np.float64}[c.element])
+        arrays[c.key + ".present"], arrays[c.key + ".offsets"], arrays[c.key + ".values"] = present, offsets, flat_values
+    else:
+        raise RuntimeError(f"Unknown column kind {c.kind}")
+
+
+def _decode_value(catalog: CatalogColumns, c: ColumnSpec, row: int) -> Any:
+    arrays = catalog.arrays
+    if c.kind == ColumnKind.BOOL:
+        v = arrays[c.key][row]
+        return None if v < 0 else bool(v)
+    if c.kind in (ColumnKind.INT, ColumnKind.FLOAT, ColumnKind.NUMBER):
+        v = arrays[c.key][row]
+        if math.isnan(v):
+            return None
+        if c.kind == ColumnKind.INT or (c.kind == ColumnKind.NUMBER and arrays[c.key + ".is_int"][row]):
+            return int(v)
+        return float(v)
+    if c.kind == ColumnKind.STR:
+        code = arrays[c.key][row]
+        return None if code < 0 else catalog.vocabularies[c.key][code]
+    if c.kind in (ColumnKind.RANGE, ColumnKind.ZONE):
+        low, high = float(arrays[c.key + ".min"][row]), float(arrays[c.key + ".max"][row])
+        if math.isnan(low):
+            return None
+        if c.kind == ColumnKind.ZONE:
+            t = _ZONE_TYPES[arrays[c.key + ".type"][row]]
+            if t in (int, float):
+                return t(low)
+            is_int = t is RangeInt
+        else:
+            is_int = c.element == "int"
+        cast = int if is_int else float
+        return {"min": None if math.isinf(low) else cast(low), "max": None if math.isinf(high) else cast(high)}
+    if c.kind == ColumnKind.LIST:
+        if not arrays[c.key + ".present"][row]:
+            return None
+        offsets = arrays[c.key + ".offsets"]
+        values = arrays[c.key + ".values"][offsets[row]:offsets[row + 1]]
+        if c.element == "str":
+            vocabulary = catalog.vocabularies[c.key]
+            return [vocabulary[code] for code in values]
+        return values.tolist()
+    raise RuntimeError(f"Unknown column kind {c.kind}")
+
+
+def _list_rows(offsets: np.ndarray, values: np.ndarray, rows: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    # offsets and values of the selected rows of a list column
+    lengths = offsets[rows + 1] - offsets[rows]
+    new_offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+    new_offsets[1:] = np.cumsum(lengths, dtype=np.int64)
+    positions = np.arange(new_offsets[-1], dtype=np.int64) + np.repeat(offsets[rows] - new_offsets[:-1], lengths)
+    return new_offsets, values[positions]
+
+
+def _remap_codes(codes: np.ndarray, vocabulary: list[str], merged: list[str], index: dict[str, int]) -> np.ndarray:
+    # codes of a vocabulary translated into the merged vocabulary, which is extended by unknown values
+    for v in vocabulary:
+        if v not in index:
+            index[v] = len(merged)
+            merged.append(v)
+    mapping = np.array([index[v] for v in vocabulary] + [-1], dtype=np.int32)
+    # -1 (None) selects the last entry of the mapping
+    return mapping[codes]
+
+
+def concat_catalogs(parts: list[tuple[CatalogColumns, np.ndarray]]) -> CatalogColumns:
+    """
+    Concatenates the selected rows of catalogs with the same columns without decoding them, e.g. to merge the upserted
+    suppliers into a catalog
+    :param parts: catalogs and the rows of each, in the order of the result
+    """
+    first = parts[0][0]
+    rows = [np.asarray(r, dtype=np.int64) for _, r in parts]
+    arrays: dict[str, np.ndarray] = {}
+    vocabularies: dict[str, list[str]] = {}
+    for c in first.columns:
+        if c.kind == ColumnKind.LIST:
+            offsets, values, shift = [np.zeros(1, dtype=np.int64)], [], 0
+            for (p, _), r in zip(parts, rows):
+                o, v = _list_rows(p.arrays[c.key + ".offsets"], p.arrays[c.key + ".values"], r)
+                offsets.append(o[1:] + shift)
+                values.append(v)
+                shift += len(v)
+            if c.element == "str":
+                merged, index = vocabularies.setdefault(c.key, []), {}
+                values = [_remap_codes(v, p.vocabularies.get(c.key, []), merged, index) for (p, _), v in
+                          zip(parts, values)]
+            arrays[c.key + ".offsets"] = np.concatenate(offsets)
+            arrays[c.key + ".values"] = np.concatenate(values).astype(first.arrays[c.key + ".values"].dtype)
+            arrays[c.key + ".present"] = np.concatenate([p.arrays[c.key + ".present"][r] for (p, _), r in
+                                                         zip(parts, rows)])
+        elif c.kind == ColumnKind.STR:
+            merged, index = vocabularies.setdefault(c.key, []), {}
+            arrays[c.key] = np.concatenate([_remap_codes(p.arrays[c.key][r], p.vocabularies.get(c.key, []), merged,
+                                                         index) for (p, _), r in zip(parts, rows)])
+        else:
+            for k in [k for k in first.arrays if k == c.key or k.startswith(c.key + ".")]:
+                arrays[k] = np.concatenate([p.arrays[k][r] for (p, _), r in zip(parts, rows)])
+
+    ids = np.concatenate([p.ids[r] for (p, _), r in zip(parts, rows)])
+    if len(ids) == 0:
+        ids = np.zeros(0, dtype="<U1")
+    return CatalogColumns(production_method=first.production_method,
+                          type_definition_version=first.type_definition_version, ids=ids, columns=first.columns,
+                          arrays=arrays, vocabularies=vocabularies)
+
+
+class CatalogOverlay:
+    """
+    Catalog with incremental updates: the rows of an immutable base catalog, which are not deleted (tombstones), followed
+    by the upserted rows (delta). Provides the interface of CatalogColumns used for ranking.
+    """
+
+    def __init__(self, base: CatalogColumns, base_generation: int, delta: CatalogColumns, tombstones: np.ndarray):
+        self.base = base
+        self.base_generation = base_generation
+        self.delta = delta
+        self.tombstones = tombstones
+        self.production_method = base.production_method
+        self.type_definition_version = base.type_definition_version
+        self.columns = base.columns
+        live = np.ones(len(base), dtype=np.bool_)
+        live[tombstones] = False
+        # rows of the base in the order of this catalog
+        self.live_rows = np.flatnonzero(live)
+        self._ids: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self.live_rows) + len(self.delta)
+
+    @property
+    def ids(self) -> np.ndarray:
+        if self._ids is None:
+            self._ids = np.concatenate([self.base.ids[self.live_rows], self.delta.ids])
+        return self._ids
+
+    def _locate(self, row: int) -> tuple[CatalogColumns, int]:
+        n_live = len(self.live_rows)
+        return (self.base, int(self.live_rows[row])) if row < n_live else (self.delta, row - n_live)
+
+    def value(self, column: ColumnSpec, row: int) -> Any:
+        catalog, i = self._locate(row)
+        return catalog.value(column, i)
+
+    def row(self, row: int) -> dict:
+        catalog, i = self._locate(row)
+        return catalog.row(i)
+
+    def nbytes(self) -> int:
+        return self.base.nbytes() + self.delta.nbytes() + int(self.tombstones.nbytes)
+
+    def compacted(self) -> CatalogColumns:
+        return concat_catalogs([(self.base, self.live_rows), (self.delta, np.arange(len(self.delta)))])
+
+
+# catalog as attached by the recommender, a published generation with or without incremental updates
+CatalogView = Union[CatalogColumns, CatalogOverlay]
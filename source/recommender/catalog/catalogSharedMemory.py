@@ -0,0 +1,452 @@
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from typing import Optional
+
+import numpy as np
+
+from recommender.catalog.catalogColumns import CatalogColumns, ColumnSpec, ColumnKind, CatalogOverlay, CatalogView
+
+# flock is not available on Windows, the lock files are locked with msvcrt there
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+# Layout of a catalog segment: magic | manifest length (uint64) | manifest (json) | aligned arrays
+# The control segment of a catalog only holds the currently published generation (int64).
+# A generation is either complete or a delta: the upserted rows and the deleted rows (tombstones) of a complete base
+# generation, which stays linked as long as deltas refer to it.
+# A generation restored from a snapshot only holds the manifest, its arrays are memory-mapped from the .npy files of the
+# snapshot directory, see recommender/catalog/catalogSnapshot.py.
+SHM_PREFIX: str = "hedy_catalog"
+_MAGIC: bytes = b"HEDYCAT1"
+_ALIGNMENT: int = 64
+_CATALOG_NAME = re.compile(r"^[A-Za-z0-9_\-]{1,64}$")
+# catalogs of a tenant are named <tenant>__<catalog>, the tenant itself contains no '_'
+TENANT_SEPARATOR: str = "__"
+_TENANT_NAME = re.compile(r"^[A-Za-z0-9\-]{1,32}$")
+
+
+class CatalogNotFoundError(RuntimeError):
+    pass
+
+
+def validate_catalog_name(name: str):
+    if not _CATALOG_NAME.match(name):
+        raise ValueError(f"Invalid catalog name '{name}', only letters, digits, '_' and '-' are allowed.")
+
+
+def validate_tenant(tenant: str):
+    if not _TENANT_NAME.match(tenant):
+        raise ValueError(f"Invalid tenant '{tenant}', only letters, digits and '-' are allowed.")
+
+
+def tenant_catalog_name(tenant: str, catalog: str) -> str:
+    validate_tenant(tenant)
+    name = f"{tenant}{TENANT_SEPARATOR}{catalog}"
+    validate_catalog_name(name)
+    return name
+
+
+def catalog_tenant(name: str) -> Optional[str]:
+    """
+    Tenant of a tenant scoped catalog, None for a catalog shared by all tenants
+    """
+    tenant, separator, _ = name.partition(TENANT_SEPARATOR)
+    return tenant if separator and _TENANT_NAME.match(tenant) else None
+
+
+def _segment_name(name: str, generation: int) -> str:
+    return f"{SHM_PREFIX}_{name}_{generation}"
+
+
+def _control_name(name: str) -> str:
+    return f"{SHM_PREFIX}_{name}"
+
+
+def _untrack(shm: SharedMemory):
+    # the resource tracker of python < 3.13 unlinks every segment a process created or attached to when the process
+    # exits, the lifetime of catalog segments is managed explicitly instead
+    try:
+        resource_tracker.unregister(shm._name, "shared_memory")
+    except Exception:
+        pass
+
+
+def _align(offset: int) -> int:
+    return (offset + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+
+
+def _open_control(name: str, create: bool) -> Optional[SharedMemory]:
+    try:
+        shm = SharedMemory(name=_control_name(name))
+    except FileNotFoundError:
+        if not create:
+            return None
+        shm = SharedMemory(name=_control_name(name), create=True, size=8)
+        np.ndarray((1,), dtype=np.int64, buffer=shm.buf)[0] = 0
+    _untrack(shm)
+    return shm
+
+
+def read_published_generation(name: str) -> Optional[int]:
+    control = _open_control(name, create=False)
+    if control is None:
+        return None
+    try:
+        generation = int(np.ndarray((1,), dtype=np.int64, buffer=control.buf)[0])
+    finally:
+        control.close()
+    return generation if generation > 0 else None
+
+
+@contextmanager
+def catalog_lock(name: str):
+    """
+    Serializes the publications of a catalog between the processes of a node, e.g. concurrent updates from several
+    workers. Not reentrant.
+    """
+    validate_catalog_name(name)
+    with node_lock(f"{SHM_PREFIX}_{name}.lock"):
+        yield
+
+
+@contextmanager
+def node_lock(filename: str):
+    # exclusive between all processes and threads of the node, each holder opens the lock file itself
+    with open(os.path.join(tempfile.gettempdir(), filename), "a+") as fd:
+        _lock_file(fd)
+        try:
+            yield
+        finally:
+            _unlock_file(fd)
+
+
+# seconds between the attempts to lock a file on Windows, msvcrt has no blocking lock without a timeout
+_LOCK_RETRY_INTERVAL: float = 0.01
+
+
+def _lock_file(fd):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        return
+    # the first byte of the file, it does not have to exist
+    fd.seek(0)
+    while True:
+        try:
+            msvcrt.locking(fd.fileno(), msvcrt.LK_NBLCK, 1)
+            return
+        except OSError:
+            time.sleep(_LOCK_RETRY_INTERVAL)
+
+
+def _unlock_file(fd):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        return
+    fd.seek(0)
+    msvcrt.locking(fd.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def publish_catalog(name: str, catalog: CatalogColumns) -> int:
+    """
+    Copies the catalog into a new shared memory segment and publishes it as the next generation of the catalog. The
+    previous generation is unlinked, workers which are still attached to it keep their mapping until they detach.
+    :return: The new generation
+    """
+    with catalog_lock(name):
+        return publish_generation(name, catalog)
+
+
+def publish_generation(name: str, catalog: CatalogColumns, base: Optional[int] = None,
+                       tombstones: Optional[np.ndarray] = None, snapshot: Optional[str] = None) -> int:
+    """
+    Publishes the next generation of the catalog, the caller holds the catalog_lock
+    :param base: Complete generation the catalog is a delta of, None if the catalog is complete
+    :param tombstones: Deleted rows of the base generation
+    :param snapshot: Directory of the snapshot the catalog was loaded from, its arrays are mapped from the files of the
+    snapshot instead of being copied into the segment
+    :return: The new generation
+    """
+    validate_catalog_name(name)
+    if snapshot is not None and base is not None:
+        raise ValueError("Only complete generations are published from a snapshot.")
+    control = _open_control(name, create=True)
+    try:
+        generation_view = np.ndarray((1,), dtype=np.int64, buffer=control.buf)
+        previous = int(generation_view[0])
+        generation = previous + 1
+
+        arrays = {"ids": catalog.ids, **catalog.arrays}
+        if base is not None:
+            arrays["tombstones"] = np.asarray(tombstones if tombstones is not None else [], dtype=np.int64)
+        layout = {}
+        offset = 0
+        for key, a in arrays.items():
+            if snapshot is not None:
+                layout[key] = {"dtype": a.dtype.str, "shape": list(a.shape), "file": f"{key}.npy"}
+                continue
+            offset = _align(offset)
+            layout[key] = {"dtype": a.dtype.str, "shape": list(a.shape), "offset": offset}
+            offset += a.nbytes
+
+        manifest = json.dumps({"production_method": catalog.production_method,
+                               "type_definition_version": catalog.type_definition_version,
+                               "generation": generation,
+                               "base": base,
+                               "snapshot": snapshot,
+                               "columns": [asdict(c) for c in catalog.columns],
+                               "vocabularies": catalog.vocabularies,
+                               "arrays": layout}).encode()
+        data_start = _align(len(_MAGIC) + 8 + len(manifest))
+
+        shm = SharedMemory(name=_segment_name(name, generation), create=True, size=max(data_start + offset, 1))
+        _untrack(shm)
+        try:
+            shm.buf[:len(_MAGIC)] = _MAGIC
+            shm.buf[len(_MAGIC):len(_MAGIC) + 8] = len(manifest).to_bytes(8, "little")
+            shm.buf[len(_MAGIC) + 8:len(_MAGIC) + 8 + len(manifest)] = manifest
+            for key, a in arrays.items():
+                spec = layout[key]
+                if "file" in spec:
+                    continue
+                target = np.ndarray(a.shape, dtype=a.dtype, buffer=shm.buf, offset=data_start + spec["offset"])
+                target[...] = a
+                del target
+        finally:
+            shm.close()
+
+        # publish, afterwards the previous generation is no longer reachable for newly attaching workers
+        previous_base = read_base_generation(name, previous) if previous > 0 else None
+        generation_view[0] = generation
+        del generation_view
+        for unreachable in {previous, previous_base} - {base, None, 0}:
+            unlink_segment(_segment_name(name, unreachable))
+    finally:
+        control.close()
+
+    return generation
+
+
+def read_base_generation(name: str, generation: int) -> Optional[int]:
+    """
+    Base generation of a delta generation, None for a complete generation or if the generation does not exist
+    """
+    manifest = read_generation_manifest(name, generation)
+    return manifest.get("base") if manifest is not None else None
+
+
+def read_generation_manifest(name: str, generation: int) -> Optional[dict]:
+    """
+    Manifest of a generation without mapping its arrays, None if the generation does not exist
+    """
+    try:
+        shm = SharedMemory(name=_segment_name(name, generation))
+    except FileNotFoundError:
+        return None
+    _untrack(shm)
+    try:
+        return _read_manifest(shm.buf)[0]
+    finally:
+        shm.close()
+
+
+def _read_manifest(buf) -> tuple[dict, int]:
+    manifest_length = int.from_bytes(bytes(buf[len(_MAGIC):len(_MAGIC) + 8]), "little")
+    manifest = json.loads(bytes(buf[len(_MAGIC) + 8:len(_MAGIC) + 8 + manifest_length]))
+    return manifest, _align(len(_MAGIC) + 8 + manifest_length)
+
+
+def unlink_segment(segment: str):
+    try:
+        shm = SharedMemory(name=segment)
+    except FileNotFoundError:
+        return
+    # unlink() unregisters the segment from the resource tracker again
+    shm.close()
+    shm.unlink()
+
+
+def unlink_catalog(name: str):
+    generation = read_published_generation(name)
+    if generation is not None:
+        base = read_base_generation(name, generation)
+        unlink_segment(_segment_name(name, generation))
+        if base is not None:
+            unlink_segment(_segment_name(name, base))
+    unlink_segment(_control_name(name))
+
+
+class SharedCatalog:
+    """
+    Zero-copy, read-only view of a published catalog generation. The view of a delta generation is available once the
+    base generation is attached.
+    """
+
+    def __init__(self, name: str, generation: int):
+        self.name = name
+        self.generation = generation
+        try:
+            self._shm = SharedMemory(name=_segment_name(name, generation))
+        except FileNotFoundError as e:
+            raise CatalogNotFoundError(f"Generation {generation} of catalog '{name}' does not exist.") from e
+        _untrack(self._shm)
+
+        buf = self._shm.buf
+        if bytes(buf[:len(_MAGIC)]) != _MAGIC:
+            self._shm.close()
+            raise CatalogNotFoundError(f"Shared memory segment of catalog '{name}' is not a catalog.")
+        manifest, data_start = _read_manifest(buf)
+
+        arrays: dict[str, np.ndarray] = {}
+        self.snapshot: Optional[str] = manifest.get("snapshot")
+        for key, spec in manifest["arrays"].items():
+            if self.snapshot is not None:
+                a = self._map_snapshot_file(spec)
+            else:
+                a = np.ndarray(tuple(spec["shape"]), dtype=np.dtype(spec["dtype"]), buffer=buf,
+                               offset=data_start + spec["offset"])
+            a.flags.writeable = False
+            arrays[key] = a
+
+        columns = [ColumnSpec(c["section"], c["name"], ColumnKind(c["kind"]), c["element"]) for c in
+                   manifest["columns"]]
+        ids = arrays.pop("ids")
+        self.tombstones: Optional[np.ndarray] = arrays.pop("tombstones", None)
+        self.base_generation: Optional[int] = manifest.get("base")
+        self.columns = CatalogColumns(production_method=manifest["production_method"],
+                                      type_definition_version=manifest["type_definition_version"], ids=ids,
+                                      columns=columns, arrays=arrays, vocabularies=manifest["vocabularies"])
+        self.view: Optional[CatalogView] = self.columns if self.base_generation is None else None
+
+    def _map_snapshot_file(self, spec: dict) -> np.ndarray:
+        # the pages are read from the page cache on first access, shared by all workers of the node
+        try:
+            a = np.load(os.path.join(self.snapshot, spec["file"]), mmap_mode="r", allow_pickle=False)
+        except (FileNotFoundError, ValueError) as e:
+            self._shm.close()
+            raise CatalogNotFoundError(f"Snapshot {self.snapshot} of catalog '{self.name}' is not readable: {e}") from e
+        if a.dtype.str != spec["dtype"] or list(a.shape) != spec["shape"]:
+            self._shm.close()
+            raise CatalogNotFoundError(f"Snapshot {self.snapshot} of catalog '{self.name}' was modified.")
+        return a
+
+    def attach_base(self, base: "SharedCatalog"):
+        self.view = CatalogOverlay(base.columns, base.generation, self.columns, self.tombstones)
+
+    def close(self) -> bool:
+        """
+        Releases the mapping, fails as long as arrays of this generation are still referenced
+        """
+        self.columns = None
+        self.view = None
+        self.tombstones = None
+        try:
+            self._shm.close()
+        except BufferError:
+            return False
+        return True
+
+
+class SharedCatalogRegistry:
+    """
+    Catalogs attached by this worker, always the latest published generation. The base generation of a delta is kept
+    attached, such that an update only maps the delta.
+    """
+    attached: dict[str, SharedCatalog] = {}
+    bases: dict[str, SharedCatalog] = {}
+    _retired: list[SharedCatalog] = []
+    _lock = threading.Lock()
+
+    @classmethod
+    def get(cls, name: str) -> CatalogView:
+        validate_catalog_name(name)
+        generation = read_published_generation(name)
+        if generation is None:
+            raise CatalogNotFoundError(f"Catalog '{name}' has not been published.")
+
+        with cls._lock:
+            current = cls.attached.get(name)
+            if current is None or current.generation != generation:
+                try:
+                    attached = cls._attach(name, generation)
+                except CatalogNotFoundError:
+                    # the generation was replaced in the meantime, use the latest one
+                    attached = cls._attach(name, read_published_generation(name))
+                cls.attached[name] = attached
+                if current is not None and current is not cls.bases.get(name):
+                    cls._retired.append(current)
+                current = attached
+
+            # release retired generations as soon as no request references them anymore
+            cls._retired = [r for r in cls._retired if not r.close()]
+            return current.view
+
+    @classmethod
+    def attached_rows(cls, name: str) -> int:
+        """
+        Number of rows of the generation attached by this worker, 0 if the catalog is not attached. Neither attaches nor
+        reads anything, e.g. for estimates on the event loop.
+        """
+        with cls._lock:
+            current = cls.attached.get(name)
+            return 0 if current is None else len(current.view)
+
+    @classmethod
+    def _attach(cls, name: str, generation: int) -> SharedCatalog:
+        attached = SharedCatalog(name, generation)
+        base = cls.bases.get(name)
+        if attached.base_generation is None:
+            if base is not None:
+                del cls.bases[name]
+                cls._retired.append(base)
+            return attached
+
+        if base is None or base.generation != attached.base_generation:
+            # e.g. the first delta of the generation attached so far
+            current = cls.attached.get(name)
+            try:
+                new_base = current if current is not None and current.generation == attached.base_generation else \
+                    SharedCatalog(name, attached.base_generation)
+            except CatalogNotFoundError:
+                attached.close()
+                raise
+            if base is not None:
+                cls._retired.append(base)
+            cls.bases[name] = base = new_base
+        attached.attach_base(base)
+        return attached
+
+    @classmethod
+    def detach_unpublished(cls) -> list[str]:
+        """
+        Releases the catalogs which were unlinked in the meantime, i.e. the memory of an evicted catalog is freed even
+        if this worker does not request it again
+        """
+        with cls._lock:
+            unpublished = [n for n in cls.attached if read_published_generation(n) is None]
+            for name in unpublished:
+                cls._retired.append(cls.attached.pop(name))
+                base = cls.bases.pop(name, None)
+                if base is not None and base not in cls._retired:
+                    cls._retired.append(base)
+            cls._retired = [r for r in cls._retired if not r.close()]
+        return unpublished
+
+    @classmethod
+    def detach_all(cls):
+        with cls._lock:
+            cls._retired += cls.attached.values()
+            cls._retired += [b for b in cls.bases.values() if b not in cls._retired]
+            cls.attached = {}
+            cls.bases = {}
+            cls._retired = [r for r in cls._retired if not r.close()]
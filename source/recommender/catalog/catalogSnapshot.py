@@ -0,0 +1,195 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from dataclasses import asdict, dataclass
+from typing import Optional
+
+import numpy as np
+
+from recommender.catalog.catalogColumns import CatalogColumns, CatalogOverlay, ColumnSpec, ColumnKind
+from recommender.catalog.catalogSharedMemory import SharedCatalogRegistry, catalog_lock, publish_generation, \
+    read_published_generation, read_generation_manifest, validate_catalog_name, catalog_tenant
+
+# Snapshots of compiled catalogs on disk, which survive a restart of the node (unlike the shared memory segments).
+# Layout: <snapshot dir>/<catalog name>/<created>-<type definition hash>/manifest.json + one .npy file per array
+# A snapshot is restored by publishing a generation which maps the .npy files, nothing is decoded or copied.
+CATALOG_SNAPSHOT_DIR_ENV: str = "RECOMMENDER_CATALOG_SNAPSHOT_DIR"
+# number of snapshots kept per catalog, older ones are removed unless a published generation maps them
+CATALOG_SNAPSHOTS_ENV: str = "RECOMMENDER_CATALOG_SNAPSHOTS"
+DEFAULT_CATALOG_SNAPSHOTS: int = 2
+
+SNAPSHOT_FORMAT: int = 1
+SNAPSHOT_MANIFEST: str = "manifest.json"
+
+
+@dataclass
+class CatalogSnapshot:
+    name: str
+    path: str
+    generation: int
+    suppliers: int
+    nbytes: int
+
+
+def snapshot_directory(directory: Optional[str] = None) -> str:
+    if directory is not None:
+        return directory
+    return os.environ.get(CATALOG_SNAPSHOT_DIR_ENV, os.path.join(tempfile.gettempdir(), "hedy_catalog_snapshots"))
+
+
+def snapshot_limit() -> int:
+    return max(1, int(os.environ.get(CATALOG_SNAPSHOTS_ENV, DEFAULT_CATALOG_SNAPSHOTS)))
+
+
+def write_snapshot(name: str, directory: Optional[str] = None) -> CatalogSnapshot:
+    """
+    Writes the published generation of the catalog into a new snapshot directory, a delta is compacted on the way. The
+    directory is renamed into place once it is complete, i.e. readers never see a partial snapshot.
+    """
+    validate_catalog_name(name)
+    with catalog_lock(name):
+        # the view is immutable, the files are written without blocking updates of the catalog
+        generation = read_published_generation(name)
+        view = SharedCatalogRegistry.get(name)
+    catalog = view.compacted() if isinstance(view, CatalogOverlay) else view
+
+    catalog_dir = os.path.join(snapshot_directory(directory), name)
+    os.makedirs(catalog_dir, exist_ok=True)
+    created = time.strftime("%Y%m%d-%H%M%S") + f"-{time.time_ns() % 1_000_000_000:09d}"
+    path = os.path.join(catalog_dir, f"{created}-{catalog.type_definition_version[:16]}")
+    partial = os.path.join(catalog_dir, f".partial-{uuid.uuid4().hex}")
+    os.makedirs(partial)
+    try:
+        arrays = {"ids": catalog.ids, **catalog.arrays}
+        layout = {}
+        for key, a in arrays.items():
+            np.save(os.path.join(partial, f"{key}.npy"), np.ascontiguousarray(a), allow_pickle=False)
+            layout[key] = {"dtype": a.dtype.str, "shape": list(a.shape), "file": f"{key}.npy"}
+        with open(os.path.join(partial, SNAPSHOT_MANIFEST), "w", encoding="utf-8") as fd:
+            json.dump({"format": SNAPSHOT_FORMAT,
+                       "name": name,
+                       "generation": generation,
+                       "production_method": catalog.production_method,
+                       "type_definition_version": catalog.type_definition_version,
+                       "columns": [asdict(c) for c in catalog.columns],
+                       "vocabularies": catalog.vocabularies,
+                       "arrays": layout}, fd)
+        os.rename(partial, path)
+    except BaseException:
+        shutil.rmtree(partial, ignore_errors=True)
+        raise
+
+    prune_snapshots(name, directory)
+    return CatalogSnapshot(name, path, generation, len(catalog), catalog.nbytes())
+
+
+def load_snapshot(path: str) -> CatalogColumns:
+    """
+    Memory-maps the arrays of a snapshot, the pages are only read when they are accessed
+    :raises ValueError: if the directory is not a complete snapshot
+    """
+    try:
+        with open(os.path.join(path, SNAPSHOT_MANIFEST), "r", encoding="utf-8") as fd:
+            manifest = json.load(fd)
+    except FileNotFoundError as e:
+        raise ValueError(f"{path} is not a catalog snapshot") from e
+    if manifest.get("format") != SNAPSHOT_FORMAT:
+        raise ValueError(f"Unsupported format {manifest.get('format')} of catalog snapshot {path}")
+
+    arrays: dict[str, np.ndarray] = {}
+    for key, spec in manifest["arrays"].items():
+        a = np.load(os.path.join(path, spec["file"]), mmap_mode="r", allow_pickle=False)
+        if a.dtype.str != spec["dtype"] or list(a.shape) != spec["shape"]:
+            raise ValueError(f"Array {key} of catalog snapshot {path} does not match the manifest")
+        arrays[key] = a
+    columns = [ColumnSpec(c["section"], c["name"], ColumnKind(c["kind"]), c["element"]) for c in manifest["columns"]]
+    return CatalogColumns(production_method=manifest["production_method"],
+                          type_definition_version=manifest["type_definition_version"], ids=arrays.pop("ids"),
+                          columns=columns, arrays=arrays, vocabularies=manifest["vocabularies"])
+
+
+def list_snapshots(name: str, directory: Optional[str] = None) -> list[str]:
+    """
+    Complete snapshots of the catalog, the latest one first
+    """
+    catalog_dir = os.path.join(snapshot_directory(directory), name)
+    if not os.path.isdir(catalog_dir):
+        return []
+    snapshots = [os.path.join(catalog_dir, d) for d in os.listdir(catalog_dir) if not d.startswith(".")]
+    return sorted((s for s in snapshots if os.path.isfile(os.path.join(s, SNAPSHOT_MANIFEST))), reverse=True)
+
+
+def latest_snapshot(name: str, type_definition_version: str, directory: Optional[str] = None) -> Optional[str]:
+    """
+    Latest snapshot of the catalog which was compiled for the type definition version, None if there is none
+    """
+    suffix = f"-{type_definition_version[:16]}"
+    return next((s for s in list_snapshots(name, directory) if s.endswith(suffix)), None)
+
+
+def mapped_snapshots(name: str) -> set[str]:
+    # snapshots of the published generation and its base, workers which attach later map their files
+    generation = read_published_generation(name)
+    mapped = set()
+    while generation is not None:
+        manifest = read_generation_manifest(name, generation)
+        if manifest is None:
+            break
+        if manifest.get("snapshot") is not None:
+            mapped.add(os.path.realpath(manifest["snapshot"]))
+        generation = manifest.get("base")
+    return mapped
+
+
+def prune_snapshots(name: str, directory: Optional[str] = None) -> list[str]:
+    mapped = mapped_snapshots(name)
+    removed = []
+    for path in list_snapshots(name, directory)[snapshot_limit():]:
+        if os.path.realpath(path) not in mapped:
+            shutil.rmtree(path, ignore_errors=True)
+            removed.append(path)
+    return removed
+
+
+def restore_catalog(name: str, type_definition_version: str, directory: Optional[str] = None) -> Optional[int]:
+    """
+    Publishes the latest snapshot of the catalog, unless the catalog is already published on this node (e.g. only the
+    workers were restarted). Only snapshots of the given type definition version are restored.
+    :return: The new generation, None if nothing was restored
+    """
+    validate_catalog_name(name)
+    with catalog_lock(name):
+        if read_published_generation(name) is not None:
+            return None
+        path = latest_snapshot(name, type_definition_version, directory)
+        if path is None:
+            return None
+        return publish_generation(name, load_snapshot(path), snapshot=os.path.abspath(path))
+
+
+def restore_catalogs(type_definition_version: str, directory: Optional[str] = None,
+                     tenants: bool = True) -> dict[str, int]:
+    """
+    Restores all catalogs which have a snapshot and are not published yet, e.g. after a restart of the node
+    :param tenants: Whether the catalogs of tenants are restored as well
+    :return: The restored catalogs and their generation
+    """
+    root = snapshot_directory(directory)
+    if not os.path.isdir(root):
+        return {}
+    restored = {}
+    for name in sorted(os.listdir(root)):
+        if not os.path.isdir(os.path.join(root, name)) or (not tenants and catalog_tenant(name) is not None):
+            continue
+        try:
+            generation = restore_catalog(name, type_definition_version, directory)
+        except ValueError as e:
+            # e.g. an invalid catalog name or a damaged snapshot, the remaining catalogs are restored anyway
+            print(f"Could not restore catalog {name}: {e}", flush=True)
+            continue
+        if generation is not None:
+            restored[name] = generation
+    return restored
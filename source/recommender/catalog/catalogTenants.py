@@ -0,0 +1,265 @@
+import contextvars
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Optional
+
+import numpy as np
+
+from recommender.catalog.catalogColumns import CatalogView
+from recommender.catalog.catalogSharedMemory import SharedCatalogRegistry, CatalogNotFoundError, SHM_PREFIX, \
+    catalog_lock, node_lock, catalog_tenant, tenant_catalog_name, validate_tenant, unlink_catalog, \
+    read_published_generation, read_generation_manifest
+from recommender.catalog.catalogSnapshot import write_snapshot, restore_catalog
+from recommender.typedefs.type_definition import current_type_definition
+
+# Catalogs of a tenant are only visible to the requests of that tenant, selected by the header X-Tenant. The resident
+# catalogs of a tenant are limited by its quota, all tenant catalogs of the node by the budget (bytes, 0 unlimited).
+# Least recently used catalogs are evicted to their snapshot and restored on their next use.
+TENANT_HEADER: str = "X-Tenant"
+CATALOG_TENANT_QUOTA_ENV: str = "RECOMMENDER_CATALOG_TENANT_QUOTA"
+# quotas of single tenants, e.g. "tenant-a=1000000000,tenant-b=200000000"
+CATALOG_TENANT_QUOTAS_ENV: str = "RECOMMENDER_CATALOG_TENANT_QUOTAS"
+CATALOG_MEMORY_BUDGET_ENV: str = "RECOMMENDER_CATALOG_MEMORY_BUDGET"
+# the last use of a catalog is recorded at most once per interval (seconds) and worker
+TOUCH_INTERVAL: float = 1.0
+
+_RESIDENCY_LOCK: str = f"{SHM_PREFIX}_tenants.lock"
+_RESIDENCY_FILE: str = f"{SHM_PREFIX}_tenants.json"
+
+_current_tenant: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("tenant", default=None)
+
+
+@contextmanager
+def tenant_scope(tenant: Optional[str]):
+    """
+    Catalogs referenced within the scope are resolved to the catalogs of the tenant
+    :raises ValueError: if the tenant is not a valid name
+    """
+    if tenant is not None:
+        validate_tenant(tenant)
+    token = _current_tenant.set(tenant)
+    try:
+        yield tenant
+    finally:
+        _current_tenant.reset(token)
+
+
+def current_tenant() -> Optional[str]:
+    return _current_tenant.get()
+
+
+def resolve_catalog_name(catalog: str) -> str:
+    """
+    Name of the catalog a request references, the catalogs of other tenants are not accessible
+    """
+    tenant = current_tenant()
+    if tenant is not None:
+        return tenant_catalog_name(tenant, catalog)
+    if catalog_tenant(catalog) is not None:
+        raise ValueError(f"Catalog '{catalog}' belongs to a tenant, it is referenced with the header {TENANT_HEADER}")
+    return catalog
+
+
+def tenant_quota(tenant: str) -> int:
+    for entry in os.environ.get(CATALOG_TENANT_QUOTAS_ENV, "").split(","):
+        name, _, quota = entry.strip().partition("=")
+        if name == tenant and quota:
+            return int(quota)
+    return int(os.environ.get(CATALOG_TENANT_QUOTA_ENV, 0))
+
+
+def memory_budget() -> int:
+    return int(os.environ.get(CATALOG_MEMORY_BUDGET_ENV, 0))
+
+
+def resident_nbytes(name: str) -> Optional[int]:
+    """
+    Size of the arrays of the published generation and its base, None if the catalog is not published
+    """
+    generation = read_published_generation(name)
+    if generation is None:
+        return None
+    nbytes = 0
+    while generation is not None:
+        manifest = read_generation_manifest(name, generation)
+        if manifest is None:
+            break
+        nbytes += sum(math.prod(a["shape"]) * np.dtype(a["dtype"]).itemsize for a in manifest["arrays"].values())
+        generation = manifest.get("base")
+    return nbytes
+
+
+class TenantCatalogs:
+    """
+    Residency of the tenant catalogs of the node. The last use of each catalog and the load metrics of each tenant are
+    shared by the workers in a file next to the catalog locks, the sizes are read from the published manifests.
+    """
+
+    def __init__(self):
+        self._touched: dict[str, float] = {}
+        self._swept = 0.0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _path() -> str:
+        return os.path.join(tempfile.gettempdir(), _RESIDENCY_FILE)
+
+    def _read(self) -> dict:
+        try:
+            with open(self._path(), "r", encoding="utf-8") as fd:
+                return json.load(fd)
+        except (FileNotFoundError, ValueError):
+            return {"catalogs": {}, "tenants": {}}
+
+    def _write(self, state: dict):
+        temporary = f"{self._path()}.{os.getpid()}.{threading.get_ident()}"
+        with open(temporary, "w", encoding="utf-8") as fd:
+            json.dump(state, fd)
+        os.replace(temporary, self._path())
+
+    @staticmethod
+    def _tenant_metrics(state: dict, tenant: str) -> dict:
+        return state["tenants"].setdefault(tenant, {"loads": 0, "load_seconds": 0.0, "last_load_seconds": None,
+                                                    "evictions": 0})
+
+    def get(self, name: str) -> CatalogView:
+        """
+        Latest generation of the catalog, an evicted tenant catalog is restored from its snapshot first
+        """
+        if catalog_tenant(name) is None:
+            return SharedCatalogRegistry.get(name)
+        try:
+            view = SharedCatalogRegistry.get(name)
+        except CatalogNotFoundError:
+            self.load(name)
+            view = SharedCatalogRegistry.get(name)
+        self.touch(name)
+        return view
+
+    def load(self, name: str):
+        """
+        Restores an evicted catalog from its latest snapshot, other catalogs are evicted if necessary
+        """
+        tenant = catalog_tenant(name)
+        with node_lock(_RESIDENCY_LOCK):
+            started = time.perf_counter()
+            generation = restore_catalog(name, current_type_definition().version)
+            if generation is None:
+                if read_published_generation(name) is None:
+                    raise CatalogNotFoundError(f"Catalog '{name}' has not been published.")
+                return  # restored by another worker in the meantime
+            state = self._read()
+            metrics = self._tenant_metrics(state, tenant)
+            metrics["loads"] += 1
+            metrics["last_load_seconds"] = time.perf_counter() - started
+            metrics["load_seconds"] += metrics["last_load_seconds"]
+            state["catalogs"][name] = time.time()
+            self._enforce(state, keep=name)
+            self._write(state)
+
+    def admit(self, name: str) -> list[str]:
+        """
+        Registers a published tenant catalog and evicts other catalogs if the quota or the budget is exceeded
+        :return: The evicted catalogs
+        """
+        with node_lock(_RESIDENCY_LOCK):
+            state = self._read()
+            state["catalogs"][name] = time.time()
+            evicted = self._enforce(state, keep=name)
+            self._write(state)
+        return evicted
+
+    def touch(self, name: str):
+        now = time.monotonic()
+        with self._lock:
+            if now - self._touched.get(name, -math.inf) < TOUCH_INTERVAL:
+                return
+            self._touched[name] = now
+            sweep = now - self._swept >= TOUCH_INTERVAL
+            if sweep:
+                self._swept = now
+        with node_lock(_RESIDENCY_LOCK):
+            state = self._read()
+            state["catalogs"][name] = time.time()
+            self._write(state)
+        if sweep:
+            # unmaps catalogs which were evicted by other workers
+            SharedCatalogRegistry.detach_unpublished()
+
+    def resident(self, state: dict) -> list[tuple[float, str, int]]:
+        # (last use, name, bytes) of the published tenant catalogs, the least recently used first
+        resident = []
+        for name, last_used in list(state["catalogs"].items()):
+            nbytes = resident_nbytes(name)
+            if nbytes is None:
+                continue
+            resident.append((last_used, name, nbytes))
+        return sorted(resident)
+
+    def _enforce(self, state: dict, keep: str) -> list[str]:
+        # the caller holds the residency lock, the catalog in use is never evicted, even if it exceeds the quota alone
+        resident = self.resident(state)
+        evicted = []
+
+        def evict_until(candidates: list[tuple[float, str, int]], limit: int):
+            nbytes = sum(c[2] for c in candidates)
+            for last_used, name, size in candidates:
+                if nbytes <= limit:
+                    break
+                if name == keep or name in evicted:
+                    continue
+                if self.evict(name, state):
+                    evicted.append(name)
+                    nbytes -= size
+
+        for tenant in {catalog_tenant(name) for _, name, _ in resident}:
+            quota = tenant_quota(tenant)
+            if quota > 0:
+                evict_until([r for r in resident if catalog_tenant(r[1]) == tenant], quota)
+        budget = memory_budget()
+        if budget > 0:
+            evict_until([r for r in resident if r[1] not in evicted], budget)
+        return evicted
+
+    def evict(self, name: str, state: dict) -> bool:
+        """
+        Unlinks the catalog once its published generation is part of a snapshot. Workers keep their mapping until the
+        requests in flight are finished.
+        """
+        generation = read_published_generation(name)
+        manifest = read_generation_manifest(name, generation) if generation is not None else None
+        if manifest is None:
+            return False
+        if manifest.get("snapshot") is None or manifest.get("base") is not None:
+            generation = write_snapshot(name).generation
+        with catalog_lock(name):
+            if read_published_generation(name) != generation:
+                # updated while the snapshot was written, the catalog stays resident until the next eviction
+                return False
+            unlink_catalog(name)
+        SharedCatalogRegistry.detach_unpublished()
+        self._tenant_metrics(state, catalog_tenant(name))["evictions"] += 1
+        return True
+
+    def metrics(self) -> dict[str, Any]:
+        with node_lock(_RESIDENCY_LOCK):
+            state = self._read()
+            resident = self.resident(state)
+        tenants = {}
+        for name in state["catalogs"]:
+            tenant = catalog_tenant(name)
+            entry = tenants.setdefault(tenant, dict(catalogs=0, resident_catalogs=0, resident_bytes=0,
+                                                    quota=tenant_quota(tenant), **self._tenant_metrics(state, tenant)))
+            entry["catalogs"] += 1
+        for _, name, nbytes in resident:
+            tenants[catalog_tenant(name)]["resident_catalogs"] += 1
+            tenants[catalog_tenant(name)]["resident_bytes"] += nbytes
+        return {"budget": memory_budget(), "resident_bytes": sum(r[2] for r in resident), "tenants": tenants}
+
+
+tenant_catalogs = TenantCatalogs()
@@ -0,0 +1,199 @@
+import os
+import threading
+from dataclasses import dataclass
+from typing import Any, Optional
+
+import numpy as np
+
+from recommender.catalog.catalogColumns import CatalogColumns, CatalogOverlay, CatalogView, compile_catalog, \
+    concat_catalogs
+from recommender.catalog.catalogSharedMemory import SharedCatalogRegistry, CatalogNotFoundError, catalog_lock, \
+    publish_generation, read_published_generation
+from recommender.typedefs.io_types import SupplierInformation
+from recommender.typedefs.type_definition import current_type_definition
+
+# A delta generation is compacted into a complete one in the background, as soon as its upserted and deleted rows
+# exceed this share of the base generation
+CATALOG_COMPACTION_RATIO_ENV: str = "RECOMMENDER_CATALOG_COMPACTION_RATIO"
+DEFAULT_CATALOG_COMPACTION_RATIO: float = 0.1
+
+
+class SupplierNotFoundError(CatalogNotFoundError):
+    pass
+
+
+@dataclass
+class CatalogState:
+    """
+    Published generation of a catalog split into the base generation, the rows upserted since then and the deleted rows
+    of the base
+    """
+    generation: int
+    base_generation: int
+    base: CatalogColumns
+    delta: Optional[CatalogColumns]
+    tombstones: np.ndarray
+
+    @property
+    def view(self) -> CatalogView:
+        if self.delta is None:
+            return self.base
+        return CatalogOverlay(self.base, self.base_generation, self.delta, self.tombstones)
+
+
+@dataclass
+class CatalogUpdate:
+    generation: int
+    suppliers: int
+    changed: int
+    compaction_scheduled: bool = False
+
+
+def catalog_state(name: str) -> CatalogState:
+    # the caller holds the catalog_lock, hence the published generation does not change in the meantime
+    generation = read_published_generation(name)
+    view = SharedCatalogRegistry.get(name)
+    if isinstance(view, CatalogOverlay):
+        return CatalogState(generation, view.base_generation, view.base, view.delta, view.tombstones)
+    return CatalogState(generation, generation, view, None, np.zeros(0, dtype=np.int64))
+
+
+def _check_type_definition(name: str, state: CatalogState):
+    definition = current_type_definition()
+    if state.base.type_definition_version != definition.version:
+        raise ValueError(f"Catalog '{name}' was compiled for type definition {state.base.type_definition_version}, "
+                         f"active is {definition.version}, it has to be published again")
+
+
+def _rows_without(ids: np.ndarray, removed: set[str]) -> np.ndarray:
+    return np.flatnonzero(~np.isin(ids, list(removed))) if removed else np.arange(len(ids))
+
+
+def _publish_changes(name: str, state: CatalogState, removed: set[str],
+                     upserted: Optional[CatalogColumns] = None) -> CatalogUpdate:
+    """
+    Publishes a delta generation: the rows of the suppliers with the removed ids are deleted, the upserted rows are
+    appended. The delta contains all changes since the base generation, the base is neither copied nor modified.
+    """
+    deleted = np.flatnonzero(np.isin(state.base.ids, list(removed))) if removed else np.zeros(0, dtype=np.int64)
+    tombstones = np.union1d(state.tombstones, deleted).astype(np.int64)
+    parts = []
+    if state.delta is not None:
+        parts.append((state.delta, _rows_without(state.delta.ids, removed)))
+    if upserted is not None:
+        parts.append((upserted, np.arange(len(upserted))))
+    delta = concat_catalogs(parts) if parts else concat_catalogs([(state.base, np.zeros(0, dtype=np.int64))])
+
+    generation = publish_generation(name, delta, state.base_generation, tombstones)
+    suppliers = len(state.base) - len(tombstones) + len(delta)
+    changed = len(delta) + len(tombstones)
+    update = CatalogUpdate(generation, suppliers, changed)
+    if changed > compaction_ratio() * len(state.base):
+        update.compaction_scheduled = compactor.schedule(name)
+    return update
+
+
+def upsert_suppliers(name: str, suppliers: list[dict]) -> CatalogUpdate:
+    """
+    Adds the suppliers to the catalog or replaces the suppliers with the same id. The suppliers are validated with the
+    pinned type definition.
+    """
+    with catalog_lock(name):
+        state = catalog_state(name)
+        _check_type_definition(name, state)
+        production_method = state.base.production_method
+        validated = [SupplierInformation(production_method, **s) for s in suppliers]
+        upserted = compile_catalog(production_method, validated, current_type_definition())
+        return _publish_changes(name, state, {s.id for s in validated}, upserted)
+
+
+def patch_supplier(name: str, supplier_id: str, parameters: dict[str, Any],
+                   preferences: dict[str, Any]) -> CatalogUpdate:
+    """
+    Changes single parameters and preferences of a supplier, None removes a value
+    """
+    with catalog_lock(name):
+        state = catalog_state(name)
+        _check_type_definition(name, state)
+        view = state.view
+        rows = np.flatnonzero(view.ids == supplier_id)
+        if len(rows) == 0:
+            raise SupplierNotFoundError(f"Supplier '{supplier_id}' is not part of catalog '{name}'.")
+        row = view.row(int(rows[-1]))
+        for section, changes in (("parameters", parameters), ("preferences", preferences)):
+            row[section].update(changes)
+            row[section] = {k: v for k, v in row[section].items() if v is not None}
+
+        production_method = state.base.production_method
+        validated = SupplierInformation(production_method, **row)
+        upserted = compile_catalog(production_method, [validated], current_type_definition())
+        return _publish_changes(name, state, {supplier_id}, upserted)
+
+
+def delete_suppliers(name: str, supplier_ids: list[str]) -> CatalogUpdate:
+    with catalog_lock(name):
+        state = catalog_state(name)
+        missing = set(supplier_ids) - set(state.view.ids.tolist())
+        if missing:
+            raise SupplierNotFoundError(f"Suppliers {sorted(missing)} are not part of catalog '{name}'.")
+        return _publish_changes(name, state, set(supplier_ids))
+
+
+def compact_catalog(name: str) -> Optional[int]:
+    """
+    Merges the delta into a new complete generation, without decoding the rows. Requests continue to rank the previous
+    generation until the compacted one is published.
+    :return: The new generation, None if the catalog has no delta
+    """
+    with catalog_lock(name):
+        state = catalog_state(name)
+        if state.delta is None:
+            return None
+        return publish_generation(name, state.view.compacted())
+
+
+def compaction_ratio() -> float:
+    return float(os.environ.get(CATALOG_COMPACTION_RATIO_ENV, DEFAULT_CATALOG_COMPACTION_RATIO))
+
+
+class CatalogCompactor:
+    """
+    Compacts catalogs in background threads, at most one per catalog and process
+    """
+
+    def __init__(self):
+        self.running: dict[str, threading.Thread] = {}
+        self.compactions = 0
+        self.last_error: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def schedule(self, name: str) -> bool:
+        with self._lock:
+            if name in self.running:
+                return False
+            thread = threading.Thread(target=self._compact, args=(name,), daemon=True)
+            self.running[name] = thread
+        thread.start()
+        return True
+
+    def wait(self, name: str):
+        with self._lock:
+            thread = self.running.get(name)
+        if thread is not None:
+            thread.join()
+
+    def _compact(self, name: str):
+        try:
+            if compact_catalog(name) is not None:
+                with self._lock:
+                    self.compactions += 1
+        except Exception as e:
+            # e.g. the catalog was unlinked, the next update schedules the compaction again
+            self.last_error = f"{name}: {type(e).__name__}: {e}"
+            print(f"Could not compact catalog {name}: {type(e).__name__}: {e}", flush=True)
+        finally:
+            with self._lock:
+                del self.running[name]
+
+
+compactor = CatalogCompactor()
@@ -0,0 +1,111 @@
+import hashlib
+import os
+import pickle
+from dataclasses import dataclass
+from typing import Optional, Union
+
+from recommender import RECOMMENDER_ROOT_DIR
+from recommender.importer.output import has_errors, output_import_errors
+from recommender.importer.preprocessor import preprocess_parsed_data
+from recommender.importer.reader import read_csv
+from recommender.importer.typedef import ImportErrors, ParameterData, PreferenceData
+from recommender.importer.validator import validation_read_data
+
+# Cache of the parsed, preprocessed and validated csv file. The input types are generated from the cached data by each
+# worker, those of a production method on its first use (see typedefs/lazy_types.py).
+
+# increase whenever the layout of ParameterData/PreferenceData or of the artifact itself changes
+ARTIFACT_FORMAT_VERSION: int = 1
+ARTIFACT_DIR_ENV: str = "RECOMMENDER_TYPE_ARTIFACT_DIR"
+DEFAULT_ARTIFACT_DIR: str = os.path.join(RECOMMENDER_ROOT_DIR, "type_artifacts")
+
+
+@dataclass
+class TypeDefinitionArtifact:
+    format_version: int
+    definition_hash: str
+    processed_data: list[Union[ParameterData, PreferenceData]]
+
+
+def read_type_definition(path: str, sep: str = ";") -> tuple[
+    list[Union[ParameterData, PreferenceData]], ImportErrors, list[str]]:
+    # read, preprocess and validate the csv file, i.e. everything which only depends on the file content
+    raw_data, parsing_errors = read_csv(path, sep)
+    processed_data, processing_errors = preprocess_parsed_data(raw_data)
+    invalid_names, validation_errors = validation_read_data(processed_data)
+
+    errors: ImportErrors = {"parsing": parsing_errors, "processing": processing_errors, "validation": validation_errors}
+    return processed_data, errors, invalid_names
+
+
+def compute_definition_hash(path: str) -> str:
+    with open(path, "rb") as fd:
+        return hashlib.sha256(fd.read()).hexdigest()
+
+
+def get_artifact_dir(directory: Optional[str] = None) -> str:
+    if directory is not None:
+        return directory
+    return os.environ.get(ARTIFACT_DIR_ENV, DEFAULT_ARTIFACT_DIR)
+
+
+def get_artifact_path(definition_hash: str, path: str, directory: Optional[str] = None) -> str:
+    base_name = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(get_artifact_dir(directory), f"{base_name}.{definition_hash[:16]}.pickle")
+
+
+def build_type_artifact(path: str, sep: str = ";", directory: Optional[str] = None) -> str:
+    """
+    Reads and validates the type definition and stores the processed data (not the generated input types) next to the
+    hash of the csv content.
+    :param path: Path to the type definition csv file
+    :param sep: Separator of the csv file
+    :param directory: Output directory, if None the environment variable or the default directory is used
+    :return: Path of the written artifact
+    """
+    definition_hash = compute_definition_hash(path)
+    processed_data, errors, invalid_names = read_type_definition(path, sep)
+    if has_errors(errors):
+        raise RuntimeError(f"Cannot build type artifact for invalid type definition {path}, the following errors "
+                           f"occurred:\n" + output_import_errors(errors, invalid_names))
+
+    artifact = TypeDefinitionArtifact(format_version=ARTIFACT_FORMAT_VERSION, definition_hash=definition_hash,
+                                      processed_data=processed_data)
+
+    artifact_path = get_artifact_path(definition_hash, path, directory)
+    os.makedirs(os.path.dirname(artifact_path), exist_ok=True)
+
+    # write to a temporary file first, such that concurrently starting workers never read a partial artifact
+    tmp_path = f"{artifact_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as fd:
+        pickle.dump(artifact, fd, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, artifact_path)
+
+    return artifact_path
+
+
+def load_type_artifact(path: str, directory: Optional[str] = None, definition_hash: Optional[str] = None) -> Optional[
+    list[Union[ParameterData, PreferenceData]]]:
+    """
+    Loads the processed data of the type definition instead of reading the csv file, if an artifact matching the
+    current csv content exists.
+    :return: The validated and processed data or None, if no (valid) artifact is available
+    """
+    if definition_hash is None:
+        definition_hash = compute_definition_hash(path)
+    artifact_path = get_artifact_path(definition_hash, path, directory)
+    if not os.path.isfile(artifact_path):
+        return None
+
+    try:
+        with open(artifact_path, "rb") as fd:
+            artifact = pickle.load(fd)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        return None
+
+    if not isinstance(artifact, TypeDefinitionArtifact) or artifact.format_version != ARTIFACT_FORMAT_VERSION:
+        return None
+    if artifact.definition_hash != definition_hash:
+        return None
+
+    return artifact.processed_data
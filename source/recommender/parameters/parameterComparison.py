@@ -3,6 +3,7 @@ from typing import TypeVar, overload
 
 from common.typedef import Range
 from recommender.parameters.parameterTypes import ParameterTypes, NumberTypes
+from recommender.typedefs.records import RangeTypes
 from recommender.typedefs.typedef import ComparisonType
 from recommender.typedefs.typedef import ValidityResult
 
@@ -74,13 +75,13 @@ def is_in(d: T, s: Range[T]) -> ValidityResult:
 
 
 def is_in(d, s) -> ValidityResult:
-    if isinstance(s, Range):
-        if isinstance(d, Range):
+    if isinstance(s, RangeTypes):
+        if isinstance(d, RangeTypes):
             return is_in_range_range(d, s)
         else:
             return is_in_value_range(d, s)
     if isinstance(s, list):
-        if isinstance(d, Range):
+        if isinstance(d, RangeTypes):
             raise TypeError(f"Wrong combination of Arguments, got Range and List: {d} and {s}")
         return is_in_single_list(d, s)
     raise TypeError(f"Got some other argument, got {type(d).__name__} and {type(s).__name__}: {d} and {s}")
@@ -89,7 +90,7 @@ def is_in(d, s) -> ValidityResult:
 def is_in_value_range(d: T, s: Range[T]) -> ValidityResult:
     if not isinstance(d, (float, int)):
         raise TypeError(f"Expected first parameter to be int or float, got {type(d).__name__}.")
-    if not isinstance(s, Range):
+    if not isinstance(s, RangeTypes):
         raise TypeError(f"Expected second parameter to be Range[int] or Range[float], got {type(s).__name__}.")
 
     if s.min <= d <= s.max:
@@ -103,9 +104,9 @@ def is_in_value_range(d: T, s: Range[T]) -> ValidityResult:
 
 
 def is_in_range_range(d: Range[T], s: Range[T]) -> ValidityResult:
-    if not isinstance(d, Range):
+    if not isinstance(d, RangeTypes):
         raise TypeError(f"Expected first parameter to be of type Range, got {type(d).__name__}.")
-    if not isinstance(s, Range):
+    if not isinstance(s, RangeTypes):
         raise TypeError(f"Expected second parameter to be of type Range, got {type(s).__name__}.")
 
     if d.min >= s.min and d.max <= s.max:
@@ -152,13 +153,13 @@ def is_superset(d: Range[T], s: T) -> ValidityResult:
 
 
 def is_superset(d, s) -> ValidityResult:
-    if isinstance(d, Range):
-        if isinstance(s, Range):
+    if isinstance(d, RangeTypes):
+        if isinstance(s, RangeTypes):
             return is_superset_range_range(d, s)
         else:
             return is_superset_range_value(d, s)
     if isinstance(d, list):
-        if isinstance(s, Range):
+        if isinstance(s, RangeTypes):
             raise TypeError(f"Wrong combination of Arguments, got List and Range: {d} and {s}")
         return is_around_list_single(d, s)
     raise TypeError(f"Got some other argument, got {type(d).__name__} and {type(s).__name__}: {d} and {s}")
@@ -167,7 +168,7 @@ def is_superset(d, s) -> ValidityResult:
 def is_superset_range_value(d: Range[T], s: T) -> ValidityResult:
     if not isinstance(s, (float, int)):
         raise TypeError(f"Expected second parameter to be int or float, got {type(s).__name__}.")
-    if not isinstance(d, Range):
+    if not isinstance(d, RangeTypes):
         raise TypeError(f"Expected first parameter to be Range[int] or Range[float], got {type(d).__name__}.")
 
     if d.min <= s <= d.max:
@@ -181,9 +182,9 @@ def is_superset_range_value(d: Range[T], s: T) -> ValidityResult:
 
 
 def is_superset_range_range(d: Range[T], s: Range[T]) -> ValidityResult:
-    if not isinstance(d, Range):
+    if not isinstance(d, RangeTypes):
         raise TypeError(f"Expected first parameter to be of type Range, got {type(d).__name__}.")
-    if not isinstance(s, Range):
+    if not isinstance(s, RangeTypes):
         raise TypeError(f"Expected second parameter to be of type Range, got {type(s).__name__}.")
 
     if s.min >= d.min and s.max <= d.max:
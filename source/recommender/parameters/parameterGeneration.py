@@ -1,14 +1,20 @@
+from collections.abc import Mapping
 from dataclasses import is_dataclass, field, fields, make_dataclass
+from functools import partial
 from typing import ClassVar, Type, Optional
 
 import pydantic
 
 from common.typedef import Range, RangeFloat, RangeInt
 from recommender.parameters.parameterMetadata import ParameterMetadata
+from recommender.typedefs.lazy_types import LazyInputTypes
 
 
-def generate_demand_supplier_dataclass(Metadata, production_methods: list[str]) -> tuple[
-    dict[str, Type['pydantic.dataclasses.Dataclass']], dict[str, Type['pydantic.dataclasses.Dataclass']]]:
+def generate_demand_supplier_dataclass(Metadata, production_methods: list[str], lazy: bool = False) -> tuple[
+    Mapping[str, Type['pydantic.dataclasses.Dataclass']], Mapping[str, Type['pydantic.dataclasses.Dataclass']]]:
+    """
+    :param lazy: If true, the dataclasses of a production method are generated on their first use, see LazyInputTypes
+    """
     if not is_dataclass(Metadata):
         raise RuntimeError("Input class needs to be a dataclass")
 
@@ -45,15 +51,23 @@ def generate_demand_supplier_dataclass(Metadata, production_methods: list[str])
             pairs_supplier[pm].append(
                 (p_name, s_type, pydantic.Field(default=None, description=p_type.supplier_description)))
 
-    class ModelConfig:
-        extra = "forbid"
+    demand_factories = {pm: partial(make_parameter_dataclass, base_name + pm + "Demand", f) for pm, f in
+                        pairs_demand.items()}
+    supplier_factories = {pm: partial(make_parameter_dataclass, base_name + pm + "Supplier", f) for pm, f in
+                          pairs_supplier.items()}
+    if lazy:
+        return LazyInputTypes(demand_factories), LazyInputTypes(supplier_factories)
+    return ({pm: factory() for pm, factory in demand_factories.items()},
+            {pm: factory() for pm, factory in supplier_factories.items()})
 
-    demand_data_class = {pm: pydantic.dataclasses.dataclass(make_dataclass(base_name + pm + "Demand", f), config=ModelConfig) for pm, f in
-                         pairs_demand.items()}
-    supplier_data_class = {pm: pydantic.dataclasses.dataclass(make_dataclass(base_name + pm + "Supplier", f), config=ModelConfig) for pm, f
-                           in pairs_supplier.items()}
 
-    return demand_data_class, supplier_data_class
+class ModelConfig:
+    extra = "forbid"
+
+
+def make_parameter_dataclass(name: str, fields: list[tuple[str, type, pydantic.Field]]) -> Type[
+    'pydantic.dataclasses.Dataclass']:
+    return pydantic.dataclasses.dataclass(make_dataclass(name, fields), config=ModelConfig)
 
 
 def generic_range_to_concrete(range_type: Type) -> Type:
@@ -0,0 +1,184 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Optional
+
+from recommender.typedefs.record_layout import RecordLayout
+from recommender.typedefs.records import InputRecord
+
+# file the statistics are kept in across restarts, by default none to keep them in memory only
+SELECTIVITY_FILE_ENV: str = "RECOMMENDER_SELECTIVITY_FILE"
+# minimal time in seconds between two writes of the file
+SELECTIVITY_SAVE_INTERVAL_ENV: str = "RECOMMENDER_SELECTIVITY_SAVE_INTERVAL"
+DEFAULT_SELECTIVITY_SAVE_INTERVAL: float = 60.0
+
+# evaluations of a parameter after which its counts are halved, such that the order follows changes of the workload
+SELECTIVITY_WINDOW: float = 100_000.0
+
+
+def default_selectivity_file() -> Optional[str]:
+    path = os.environ.get(SELECTIVITY_FILE_ENV)
+    return None if path is None or path.lower() in ("", "none") else path
+
+
+class ParameterPlan:
+    """
+    Order of the parameter checks for a single demand, the most selective parameters first. Parameters which are not
+    applicable or not given by the demand are skipped for all suppliers and are not part of the order. The outcomes
+    are counted here and merged into the statistics once the component is ranked.
+    """
+    __slots__ = ("production_method", "names", "order", "evaluated", "failed")
+
+    def __init__(self, production_method: str, names: tuple[str, ...], order: tuple[int, ...]):
+        self.production_method = production_method
+        self.names = names
+        self.order = order
+        self.evaluated: list[int] = [0] * len(names)
+        self.failed: list[int] = [0] * len(names)
+
+
+class SelectivityStatistics:
+    """
+    Running statistics per production method and parameter, how often a parameter check rejects a supplier. Each worker
+    adds its observations to the file at most every save_interval seconds in a background thread, the counts of other
+    workers are picked up at the same time.
+    """
+
+    def __init__(self, path: Optional[str] = None, save_interval: float = DEFAULT_SELECTIVITY_SAVE_INTERVAL):
+        self.path = path
+        self.save_interval = save_interval
+        # production method -> parameter -> [evaluated, failed]
+        self._counts: dict[str, dict[str, list[float]]] = {}
+        # observations not written to the file yet
+        self._unsaved: dict[str, dict[str, list[float]]] = {}
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._last_save = time.monotonic()
+        self._saving: Optional[threading.Thread] = None
+        if path is not None:
+            self._counts = self._read()
+
+    def failure_rate(self, production_method: str, parameter: str) -> float:
+        evaluated, failed = self._counts.get(production_method, {}).get(parameter, (0.0, 0.0))
+        # unknown parameters are assumed to reject every second supplier
+        return (failed + 1.0) / (evaluated + 2.0)
+
+    def plan(self, layout: RecordLayout, demand: InputRecord) -> ParameterPlan:
+        candidates = [i for i, (applicable, d) in enumerate(zip(layout.parameter_applicable, demand.parameters)) if
+                      applicable and d is not None]
+        with self._lock:
+            rates = {i: self.failure_rate(layout.production_method, layout.parameter_names[i]) for i in candidates}
+        # stable, parameters with equal rates keep the order of the definition
+        order = tuple(sorted(candidates, key=lambda i: -rates[i]))
+        return ParameterPlan(layout.production_method, layout.parameter_names, order)
+
+    def merge(self, plan: Optional[ParameterPlan]):
+        if plan is None or not any(plan.evaluated):
+            return
+        with self._lock:
+            for i, evaluated in enumerate(plan.evaluated):
+                if evaluated == 0:
+                    continue
+                for target in (self._counts, self._unsaved):
+                    counts = target.setdefault(plan.production_method, {}).setdefault(plan.names[i], [0.0, 0.0])
+                    counts[0] += evaluated
+                    counts[1] += plan.failed[i]
+                counts = self._counts[plan.production_method][plan.names[i]]
+                if counts[0] > SELECTIVITY_WINDOW:
+                    counts[0] /= 2.0
+                    counts[1] /= 2.0
+                plan.evaluated[i] = plan.failed[i] = 0
+        if self.path is not None and time.monotonic() - self._last_save > self.save_interval:
+            self.schedule_save()
+
+    def schedule_save(self):
+        """
+        Saves in a background thread, the scoring does not wait for the file
+        """
+        with self._lock:
+            if self._saving is not None and self._saving.is_alive():
+                return
+            self._saving = threading.Thread(target=self.save, daemon=True)
+            thread = self._saving
+        thread.start()
+
+    def wait(self):
+        with self._lock:
+            thread = self._saving
+        if thread is not None:
+            thread.join()
+
+    def save(self):
+        """
+        Adds the unsaved observations to the file and takes over the counts of the file, i.e. of all workers
+        """
+        if self.path is None or not self._save_lock.acquire(blocking=False):
+            return
+        try:
+            with self._lock:
+                unsaved, self._unsaved = self._unsaved, {}
+            counts = self._read()
+            for method, parameters in unsaved.items():
+                for name, (evaluated, failed) in parameters.items():
+                    c = counts.setdefault(method, {}).setdefault(name, [0.0, 0.0])
+                    c[0], c[1] = c[0] + evaluated, c[1] + failed
+                    if c[0] > SELECTIVITY_WINDOW:
+                        c[0], c[1] = c[0] / 2.0, c[1] / 2.0
+
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"statistics": counts}, f)
+            os.replace(tmp, self.path)
+
+            with self._lock:
+                # observations made while saving are kept for the next time
+                for method, parameters in self._unsaved.items():
+                    for name, (evaluated, failed) in parameters.items():
+                        c = counts.setdefault(method, {}).setdefault(name, [0.0, 0.0])
+                        c[0], c[1] = c[0] + evaluated, c[1] + failed
+                self._counts = counts
+                self._last_save = time.monotonic()
+        except OSError as e:
+            print(f"Could not save the parameter selectivity to {self.path}: {e}", flush=True)
+            with self._lock:
+                # written the next time, together with the observations made meanwhile
+                for method, parameters in unsaved.items():
+                    for name, (evaluated, failed) in parameters.items():
+                        c = self._unsaved.setdefault(method, {}).setdefault(name, [0.0, 0.0])
+                        c[0], c[1] = c[0] + evaluated, c[1] + failed
+                self._last_save = time.monotonic()
+        finally:
+            self._save_lock.release()
+
+    def _read(self) -> dict[str, dict[str, list[float]]]:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                content = json.load(f)
+            return {m: {p: [float(c[0]), float(c[1])] for p, c in parameters.items()} for m, parameters in
+                    content["statistics"].items()}
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError, LookupError, TypeError) as e:
+            # the statistics only affect the speed, a broken file is ignored
+            print(f"Ignoring the parameter selectivity in {self.path}: {e}", flush=True)
+            return {}
+
+    def clear(self):
+        with self._lock:
+            self._counts = {}
+            self._unsaved = {}
+
+    def snapshot(self) -> dict[str, dict[str, dict[str, Any]]]:
+        with self._lock:
+            return {m: {p: {"evaluated": c[0], "failed": c[1], "failure_rate": self.failure_rate(m, p)} for p, c in
+                        sorted(parameters.items(), key=lambda x: -self.failure_rate(m, x[0]))}
+                    for m, parameters in self._counts.items()}
+
+
+selectivity = SelectivityStatistics(default_selectivity_file(),
+                                    float(os.environ.get(SELECTIVITY_SAVE_INTERVAL_ENV,
+                                                         DEFAULT_SELECTIVITY_SAVE_INTERVAL)))
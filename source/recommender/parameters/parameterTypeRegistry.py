@@ -9,6 +9,10 @@ class ParameterTypeRegistry:
     def register(cls, method: str, type: Literal['Demand', 'Supplier'], input_class: dataclass):
         cls.registry[type][method] = input_class
 
+    @classmethod
+    def swap(cls, registry: dict[Literal['Demand', 'Supplier'], dict[str, dataclass]]):
+        cls.registry = registry
+
     @classmethod
     def get_input_type(cls, type: Literal['Demand', 'Supplier']):
         return Union[tuple(cls.registry[type].values())]
@@ -1,8 +1,12 @@
 import math
+from collections.abc import Callable
+from typing import Any, Optional
 
 from common.typedef import Range
 from recommender.preferences.preferenceTypes import BoolPreference, ChoicePreference, RangePreference, \
-    SingleChoicePreference, MultipleChoicePreference, ValueMagnitudePreference, ZonePreference, CustomTypeInstance
+    SingleChoicePreference, MultipleChoicePreference, ValueMagnitudePreference, ZonePreference, CustomTypeInstance, \
+    CustomType
+from recommender.typedefs.records import RangeRecord
 from recommender.typedefs.typedef import ComparisonType
 
 
@@ -33,13 +37,26 @@ def distance_preference(d: CustomTypeInstance, s: CustomTypeInstance) -> float:
         f"Unexpected or mixed up input type to preference comparison, got {type(d).__name__} and {type(s).__name__}.")
 
 
-def distance_range_preferences(d: RangePreference.type, s: RangePreference.type, base_type: RangePreference) -> float:
+def resolve_importance(base_type: CustomType, importance: Optional[float]) -> float:
+    """
+    Importance of a comparison. The importance of dependent preferences is deduced per comparison and passed in
+    explicitly, since the metadata holding the base types is shared by all concurrent requests.
+    :param base_type: Base type of the preference
+    :param importance: Deduced importance of a dependent preference, None to use the importance of the base type
+    :return: The importance to weight the distance with
+    """
+    return base_type.importance if importance is None else importance
+
+
+def distance_range_preferences(d: RangePreference.type, s: RangePreference.type, base_type: RangePreference,
+                               importance: Optional[float] = None) -> float:
     dist = abs(d - s)
-    weighted_distance = base_type.importance * dist
+    weighted_distance = resolve_importance(base_type, importance) * dist
     return weighted_distance
 
 
-def distance_bool_preferences(d: BoolPreference.type, s: BoolPreference.type, base_type: BoolPreference) -> float:
+def distance_bool_preferences(d: BoolPreference.type, s: BoolPreference.type, base_type: BoolPreference,
+                              importance: Optional[float] = None) -> float:
     if not isinstance(d, bool) or not isinstance(s, bool):
         raise RuntimeError(
             f"Preference values do have the expected type {base_type.type.__name__}, got {type(d).__name__} and {type(s).__name__}")
@@ -53,13 +70,14 @@ def distance_bool_preferences(d: BoolPreference.type, s: BoolPreference.type, ba
     else:
         raise RuntimeError(f"Unsupported comparison of base_type, got {base_type.comparison_type}.")
 
-    weighted_distance = dist - dist * (1 - base_type.importance) ** 2
+    weighted_distance = dist - dist * (1 - resolve_importance(base_type, importance)) ** 2
 
     return weighted_distance
 
 
 # Note, this is not a metric in the mathematical sense, cause is non-symmetric
-def distance_list_preferences(d: ChoicePreference.type, s: ChoicePreference.type, base_type: ChoicePreference) -> float:
+def distance_list_preferences(d: ChoicePreference.type, s: ChoicePreference.type, base_type: ChoicePreference,
+                              importance: Optional[float] = None) -> float:
     if not isinstance(d, list) or not isinstance(s, list):
         raise RuntimeError(
             f"Preference values do have the expected type {base_type.type}, got {type(d).__name__} and {type(s).__name__}")
@@ -72,17 +90,18 @@ def distance_list_preferences(d: ChoicePreference.type, s: ChoicePreference.type
 
     if isinstance(base_type, MultipleChoicePreference):
         # multiple choice
-        return distance_multiple_choice(d, s, base_type)
+        return distance_multiple_choice(d, s, base_type, importance)
 
     elif isinstance(base_type, SingleChoicePreference):
         # single choice
-        return distance_single_choice(d, s, base_type)
+        return distance_single_choice(d, s, base_type, importance)
     else:
         raise RuntimeError(f"Unknown base type '{type(base_type).__name__}'")
 
 
 def distance_single_choice(d: SingleChoicePreference.type, s: SingleChoicePreference.type,
-                           base_type: SingleChoicePreference) -> float:
+                           base_type: SingleChoicePreference, importance: Optional[float] = None) -> float:
+    importance = resolve_importance(base_type, importance)
     if d.count(True) != 1 or s.count(True) != 1:
         raise RuntimeError(
             f"Input value is supposed to be a single choice value, got not exactly one True entry. Got {d} and {s}")
@@ -95,17 +114,17 @@ def distance_single_choice(d: SingleChoicePreference.type, s: SingleChoicePrefer
             normalized_distance = 0.0
         else:
             normalized_distance = float(distance / (len(d) - 1))  # range 0--1
-        weighted_distance = base_type.importance * normalized_distance
+        weighted_distance = importance * normalized_distance
 
     else:
         # all entries must be equal, distance is 0 if all are equal, otherwise 1
         distance = 1 - float(all([d_val == s_val for (d_val, s_val) in zip(d, s)]))
-        weighted_distance = distance - distance * (1 - base_type.importance) ** 2
+        weighted_distance = distance - distance * (1 - importance) ** 2
     return weighted_distance
 
 
 def distance_multiple_choice(d: MultipleChoicePreference.type, s: MultipleChoicePreference.type,
-                             base_type: MultipleChoicePreference) -> float:
+                             base_type: MultipleChoicePreference, importance: Optional[float] = None) -> float:
     count_overlap = sum([int(d_val and s_val) for (d_val, s_val) in zip(d, s)])
     # count the number of overlapping d/s preferences wrt total, d or s preferences
     if base_type.comparison_type == ComparisonType.EXACT_MATCH:
@@ -120,13 +139,14 @@ def distance_multiple_choice(d: MultipleChoicePreference.type, s: MultipleChoice
     else:
         raise RuntimeError(f"Unsupported comparison of base_type, got {base_type.comparison_type}.")
 
-    weighted_distance = base_type.importance * dist
+    weighted_distance = resolve_importance(base_type, importance) * dist
     return weighted_distance
 
 
 def distance_value_magnitude_preference(d: ValueMagnitudePreference.type, s: ValueMagnitudePreference.type,
-                                        base_type: ValueMagnitudePreference) -> float:
-    e = 1 + base_type.importance
+                                        base_type: ValueMagnitudePreference,
+                                        importance: Optional[float] = None) -> float:
+    e = 1 + resolve_importance(base_type, importance)
     dval, sval = math.log(abs(d) + 1), math.log(abs(s) + 1)
 
     # dval == sval == 0, then we have a division by 0
@@ -138,21 +158,39 @@ def distance_value_magnitude_preference(d: ValueMagnitudePreference.type, s: Val
     return weighted_distance
 
 
-def distance_zone_preference(d: ZonePreference.type, s: ZonePreference.type, base_type: ZonePreference) -> float:
+def distance_zone_preference(d: ZonePreference.type, s: ZonePreference.type, base_type: ZonePreference,
+                             importance: Optional[float] = None) -> float:
     if not isinstance(d, (float, int)):
-        raise RuntimeError(f"ZonePreference requires a float or int as demand value, got '{type(d).__name__}'.")
+        # records are reported like the ranges of the input
+        type_name = Range.__name__ if isinstance(d, RangeRecord) else type(d).__name__
+        raise RuntimeError(f"ZonePreference requires a float or int as demand value, got '{type_name}'.")
 
-    s_unified = s
-    if isinstance(s, (int, float)):
-        s_unified = Range(min=s, max=s)
+    # a single value is a zone of zero width
+    low, high = (s, s) if isinstance(s, (int, float)) else (s.min, s.max)
 
-    if s_unified.min <= d <= s_unified.max:
+    if low <= d <= high:
         weighted_distance = 0.0
     else:
-        distance, boundary = (abs(s_unified.min - d), s_unified.min) if d <= s_unified.min else (
-        abs(s_unified.max - d), s_unified.max)
+        distance, boundary = (abs(low - d), low) if d <= low else (abs(high - d), high)
         relative_distance = float(distance) / boundary if boundary != 0 else float(distance)
-        e = 1 + base_type.importance
+        e = 1 + resolve_importance(base_type, importance)
         weighted_distance = 1 - 1.0 / ((1 + relative_distance) ** e)
 
     return weighted_distance
+
+
+# collect all distances, resolved once per preference instead of dispatching for each supplier
+distance_map: dict[type, Callable[[Any, Any, CustomType, Optional[float]], float]] = {
+    BoolPreference: distance_bool_preferences,
+    ChoicePreference: distance_list_preferences,
+    RangePreference: distance_range_preferences,
+    ValueMagnitudePreference: distance_value_magnitude_preference,
+    ZonePreference: distance_zone_preference
+}
+
+
+def get_distance_function(base_type: CustomType) -> Callable[[Any, Any, CustomType, Optional[float]], float]:
+    for t, fnc in distance_map.items():
+        if isinstance(base_type, t):
+            return fnc
+    raise RuntimeError(f"Unknown preference type '{type(base_type).__name__}', must be derived from CustomType")
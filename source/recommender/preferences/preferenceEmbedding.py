@@ -0,0 +1,331 @@
+import os
+import threading
+import weakref
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import Any, Optional, Union
+
+import numpy as np
+
+from recommender.catalog.catalogColumns import CatalogColumns, CatalogOverlay, CatalogView, ColumnKind
+from recommender.preferences.preferenceImportance import deduce_importances, importance_input_value
+from recommender.preferences.preferenceTypes import BoolPreference, RangePreference, SingleChoicePreference, \
+    MultipleChoicePreference, ValueMagnitudePreference, ZonePreference, CustomType
+from recommender.typedefs.record_layout import RecordLayout
+from recommender.typedefs.records import InputRecord
+from recommender.typedefs.typedef import ComparisonType, DominantParent
+
+# Two-stage ranking of huge catalogs: the preferences of each catalog row are embedded into a fixed length vector once
+# per attached catalog. The preference score of a demand is computed for all rows at once on these vectors, only the
+# best candidates are decoded and scored exactly. The parameters are not part of the embedding, see catalog_candidates
+# in recommender/recommenderFunctionality.py.
+APPROXIMATE_CANDIDATES_ENV: str = "RECOMMENDER_APPROXIMATE_CANDIDATES"
+DEFAULT_APPROXIMATE_CANDIDATES: int = 2000
+# rows per step of the vectorized scoring, bounds the temporary memory
+EMBEDDING_CHUNK: int = 65536
+
+# distances of all rows (n, width) of a preference to the demand value, vectorized counterparts of preferenceComparison.
+# The importance is a scalar, or one value per row if a dependent preference is dominated by the supplier.
+Importance = Union[float, np.ndarray]
+VectorDistance = Callable[[np.ndarray, Any, CustomType, Importance], np.ndarray]
+
+
+def _log_magnitude(values):
+    return np.log(np.abs(values) + 1)
+
+
+def _equality_weight(importance: Importance) -> Importance:
+    return 1 - (1 - importance) ** 2
+
+
+def distance_bool(x: np.ndarray, d: bool, base_type: BoolPreference, importance: Importance) -> np.ndarray:
+    s = x[:, 0]
+    if base_type.comparison_type == ComparisonType.INCLUSIVE:
+        dist = (s == 0) & d
+    elif base_type.comparison_type == ComparisonType.INV_INCLUSIVE:
+        dist = (s == 1) & (not d)
+    else:
+        dist = s != float(d)
+    return dist * _equality_weight(importance)
+
+
+def distance_range(x: np.ndarray, d: float, base_type: RangePreference, importance: Importance) -> np.ndarray:
+    return importance * np.abs(x[:, 0] - d)
+
+
+def distance_single_choice(x: np.ndarray, d: list[bool], base_type: SingleChoicePreference,
+                           importance: Importance) -> np.ndarray:
+    if base_type.ordered:
+        position = d.index(True) / (len(d) - 1) if len(d) > 1 else 0.0
+        return importance * np.abs(x[:, 0] - position)
+    return np.any(x != np.array(d, dtype=np.float64), axis=1) * _equality_weight(importance)
+
+
+def distance_multiple_choice(x: np.ndarray, d: list[bool], base_type: MultipleChoicePreference,
+                             importance: Importance) -> np.ndarray:
+    chosen = np.array(d, dtype=np.float64)
+    overlap = x @ chosen
+    if base_type.comparison_type == ComparisonType.INCLUSIVE:
+        total = np.full(len(x), chosen.sum())
+    elif base_type.comparison_type == ComparisonType.INV_INCLUSIVE:
+        total = x.sum(axis=1)
+    else:
+        total = np.maximum(x, chosen).sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        dist = np.where(total > 0, 1 - overlap / total, 0.0)
+    return importance * dist
+
+
+def distance_value_magnitude(x: np.ndarray, d, base_type: ValueMagnitudePreference,
+                             importance: Importance) -> np.ndarray:
+    e = 1 + importance
+    dval = _log_magnitude(float(d))
+    a, b = dval ** e, x[:, 0] ** e
+    with np.errstate(divide="ignore", invalid="ignore"):
+        score = np.where(x[:, 0] == dval, 1.0, 2 * np.minimum(a, b) / (a + b))
+    return 1 - score
+
+
+def distance_zone(x: np.ndarray, d, base_type: ZonePreference, importance: Importance) -> np.ndarray:
+    low, high = x[:, 0], x[:, 1]
+    below = d <= low
+    distance = np.where(below, low - d, d - high)
+    boundary = np.where(below, low, high)
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        relative = np.where(boundary != 0, distance / boundary, distance)
+        dist = 1 - 1.0 / (1 + relative) ** (1 + importance)
+    return np.where((low <= d) & (d <= high), 0.0, dist)
+
+
+@dataclass
+class EmbeddedPreference:
+    """
+    Dimensions of a single preference within the embedding
+    """
+    index: int  # position of the preference in the RecordLayout
+    start: int
+    width: int
+    distance: VectorDistance
+    options: Optional[int] = None  # length of the lists of a choice preference
+
+    @property
+    def dimensions(self) -> slice:
+        return slice(self.start, self.start + self.width)
+
+    def comparable(self, d) -> bool:
+        # demand values the exact scoring rejects (e.g. lists of another length) are not compared at all
+        if self.distance is distance_zone:
+            return isinstance(d, (int, float))
+        if self.options is None:
+            return True
+        if not isinstance(d, list) or len(d) != self.options:
+            return False
+        return self.distance is not distance_single_choice or d.count(True) == 1
+
+
+def _list_options(catalog: CatalogColumns, key: str) -> int:
+    # lists of a choice preference have the length of its options, rows of another length fail the exact scoring anyway
+    lengths = np.diff(catalog.arrays[key + ".offsets"])[catalog.arrays[key + ".present"] > 0]
+    if len(lengths) == 0:
+        return 0
+    values, counts = np.unique(lengths, return_counts=True)
+    return int(values[np.argmax(counts)])
+
+
+def _list_matrix(catalog: CatalogColumns, key: str, options: int) -> np.ndarray:
+    # dense (rows, options) matrix of boolean lists, NaN for missing lists and lists of a different length
+    arrays = catalog.arrays
+    offsets = arrays[key + ".offsets"]
+    valid = (arrays[key + ".present"] > 0) & (np.diff(offsets) == options)
+    matrix = np.full((len(catalog), options), np.nan)
+    positions = offsets[:-1][valid][:, None] + np.arange(options)
+    matrix[valid] = arrays[key + ".values"][positions]
+    return matrix
+
+
+class PreferenceEmbedding:
+    """
+    Preferences of all rows of a catalog as a matrix (rows, dimensions), missing values are NaN:
+    RangePreference, BoolPreference: the value
+    SingleChoicePreference: the relative position of the choice if ordered, otherwise the one-hot vector
+    MultipleChoicePreference: the vector of the options
+    ValueMagnitudePreference: log(|value| + 1)
+    ZonePreference: lower and upper bound of the zone
+    """
+
+    def __init__(self, layout: RecordLayout, catalog: CatalogColumns):
+        self.layout = layout
+        self.preferences: list[EmbeddedPreference] = []
+        columns = {c.name: c for c in catalog.columns if c.section == "preferences"}
+        blocks: list[np.ndarray] = []
+        start = 0
+        for i, (name, meta) in enumerate(zip(layout.preference_names, layout.preference_metadata)):
+            column = columns.get(name)
+            if not layout.preference_applicable[i] or column is None:
+                continue
+            embedded = self._embed(meta.preference_type, column.kind, column.key, catalog)
+            if embedded is None or embedded[0].shape[1] == 0:
+                continue
+            block, distance, options = embedded
+            blocks.append(block)
+            self.preferences.append(EmbeddedPreference(i, start, block.shape[1], distance, options))
+            start += block.shape[1]
+        self.matrix: np.ndarray = np.hstack(blocks) if blocks else np.zeros((len(catalog), 0))
+
+        # dependent preferences, whose importance depends on the value of the supplier: child -> (parent, dominance)
+        embedded = {p.index: p for p in self.preferences}
+        self.supplier_dependencies: dict[int, tuple[int, Optional[EmbeddedPreference], DominantParent]] = {}
+        for parent_index, child_index, parent, child in layout.preference_dependencies:
+            if child.dominant_side in (DominantParent.SUPPLIER, DominantParent.BOTH):
+                self.supplier_dependencies[child_index] = (parent_index, embedded.get(parent_index),
+                                                           child.dominant_side)
+
+    def __len__(self) -> int:
+        return len(self.matrix)
+
+    @property
+    def dimensions(self) -> int:
+        return self.matrix.shape[1]
+
+    @staticmethod
+    def _embed(preference_type, kind: ColumnKind, key: str, catalog: CatalogColumns):
+        # (values, distance, options) of a single preference, None if the preference cannot be embedded
+        arrays = catalog.arrays
+        if isinstance(preference_type, BoolPreference) and kind == ColumnKind.BOOL:
+            values = arrays[key].astype(np.float64)
+            values[values < 0] = np.nan
+            return values[:, None], distance_bool, None
+        if isinstance(preference_type, RangePreference) and kind in (ColumnKind.FLOAT, ColumnKind.INT):
+            return np.asarray(arrays[key], dtype=np.float64)[:, None], distance_range, None
+        if isinstance(preference_type, ValueMagnitudePreference) and kind in (ColumnKind.NUMBER, ColumnKind.INT,
+                                                                              ColumnKind.FLOAT):
+            values = _log_magnitude(np.asarray(arrays[key], dtype=np.float64))
+            return values[:, None], distance_value_magnitude, None
+        if isinstance(preference_type, ZonePreference) and kind in (ColumnKind.ZONE, ColumnKind.RANGE):
+            values = np.column_stack([arrays[key + ".min"], arrays[key + ".max"]]).astype(np.float64)
+            return values, distance_zone, None
+        if isinstance(preference_type, SingleChoicePreference) and kind == ColumnKind.LIST:
+            options = _list_options(catalog, key)
+            matrix = _list_matrix(catalog, key, options)
+            # not exactly one choice fails the exact comparison
+            matrix[np.nansum(matrix, axis=1) != 1] = np.nan
+            if not preference_type.ordered:
+                return matrix, distance_single_choice, options
+            position = np.argmax(np.nan_to_num(matrix), axis=1) / max(options - 1, 1)
+            position[np.isnan(matrix).any(axis=1)] = np.nan
+            return position[:, None], distance_single_choice, options
+        if isinstance(preference_type, MultipleChoicePreference) and kind == ColumnKind.LIST:
+            options = _list_options(catalog, key)
+            return _list_matrix(catalog, key, options), distance_multiple_choice, options
+        # e.g. a preference type without an embedding, it is only considered by the exact scoring
+        return None
+
+    def _importance(self, p: EmbeddedPreference, block: np.ndarray, d_values: tuple,
+                    importances: dict[int, float]) -> Importance:
+        base_type = self.layout.preference_metadata[p.index].preference_type
+        dependency = self.supplier_dependencies.get(p.index)
+        if dependency is None or dependency[1] is None:
+            # deduced from the demand, or the parent of the supplier is unknown
+            return importances.get(p.index, base_type.importance)
+        parent_index, parent, dominant_side = dependency
+        supplier_input = block[:, parent.start]
+        supplier_input = np.where(np.isnan(supplier_input), 1.0, supplier_input)
+        if dominant_side == DominantParent.BOTH:
+            supplier_input = 0.5 * (importance_input_value(d_values[parent_index]) + supplier_input)
+        # deduce_importance of the preference types supporting dependent preferences is the identity
+        return supplier_input
+
+    def scores(self, demand: InputRecord, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Preference scores of the demand and the given rows (default all), aggregated like the exact scoring: the mean of
+        the category means, only preferences given by both sides are compared.
+        """
+        layout = self.layout
+        d_values = demand.preferences
+        # dependent preferences dominated by the supplier are deduced per row, see _importance
+        importances = deduce_importances(layout.preference_dependencies, d_values, d_values)
+        active = [p for p in self.preferences if d_values[p.index] is not None and p.comparable(d_values[p.index])]
+        categories = sorted({layout.preference_metadata[p.index].category for p in active})
+        membership = np.zeros((len(active), len(categories)))
+        for j, p in enumerate(active):
+            membership[j, categories.index(layout.preference_metadata[p.index].category)] = 1
+
+        n = len(self) if rows is None else len(rows)
+        result = np.ones(n)
+        for start in range(0, n, EMBEDDING_CHUNK):
+            selected = slice(start, min(start + EMBEDDING_CHUNK, n))
+            block = self.matrix[selected] if rows is None else self.matrix[rows[selected]]
+            distances = np.zeros((len(block), len(active)))
+            present = np.zeros((len(block), len(active)))
+            for j, p in enumerate(active):
+                x = block[:, p.dimensions]
+                present[:, j] = ~np.isnan(x).any(axis=1)
+                with np.errstate(invalid="ignore"):
+                    distances[:, j] = p.distance(x, d_values[p.index], layout.preference_metadata[p.index].
+                                                 preference_type, self._importance(p, block, d_values, importances))
+            distances = np.where(present > 0, np.nan_to_num(distances, nan=1.0), 0.0)
+
+            counts = present @ membership
+            with np.errstate(divide="ignore", invalid="ignore"):
+                category_scores = np.where(counts > 0, 1 - (distances @ membership) / counts, 0.0)
+            n_categories = (counts > 0).sum(axis=1)
+            # no preference in common scores 1, like the exact scoring
+            result[selected] = np.where(n_categories > 0, category_scores.sum(axis=1) / np.maximum(n_categories, 1),
+                                        1.0)
+        return result
+
+    def ranked(self, demand: InputRecord, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        The given rows (default all) by descending preference score, ties in ascending order of the rows
+        """
+        rows = np.arange(len(self)) if rows is None else np.asarray(rows)
+        return rows[np.argsort(-self.scores(demand, rows), kind="stable")]
+
+
+class EmbeddingCache:
+    """
+    Embeddings of the catalogs attached by this worker, computed once per catalog view and record layout. An update of
+    a catalog only embeds its delta, the embedding of the base is reused.
+    """
+
+    def __init__(self):
+        self._entries: dict[int, tuple[weakref.ref, RecordLayout, PreferenceEmbedding]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, layout: RecordLayout, catalog: CatalogView) -> PreferenceEmbedding:
+        with self._lock:
+            entry = self._entries.get(id(catalog))
+            if entry is not None and entry[0]() is catalog and entry[1] is layout:
+                return entry[2]
+        if isinstance(catalog, CatalogOverlay):
+            embedding = self._overlay(layout, catalog)
+        else:
+            embedding = PreferenceEmbedding(layout, catalog)
+        with self._lock:
+            # entries of detached catalogs are dropped
+            self._entries = {k: e for k, e in self._entries.items() if e[0]() is not None}
+            self._entries[id(catalog)] = (weakref.ref(catalog), layout, embedding)
+        return embedding
+
+    def _overlay(self, layout: RecordLayout, catalog: CatalogOverlay) -> PreferenceEmbedding:
+        base = self.get(layout, catalog.base)
+        delta = PreferenceEmbedding(layout, catalog.delta)
+        if [(p.index, p.width, p.options) for p in base.preferences] != \
+                [(p.index, p.width, p.options) for p in delta.preferences]:
+            # e.g. the delta contains no value of a preference, the overlay is embedded as a whole
+            return PreferenceEmbedding(layout, catalog.compacted())
+        delta.matrix = np.vstack([base.matrix[catalog.live_rows], delta.matrix])
+        return delta
+
+    def clear(self):
+        with self._lock:
+            self._entries = {}
+
+
+def approximate_candidates(top_k: Optional[int] = None) -> int:
+    # candidates with valid parameters, which are scored exactly
+    candidates = int(os.environ.get(APPROXIMATE_CANDIDATES_ENV, DEFAULT_APPROXIMATE_CANDIDATES))
+    return max(candidates, 4 * top_k) if top_k is not None else candidates
+
+
+embedding_cache = EmbeddingCache()
@@ -1,5 +1,7 @@
 import dataclasses
+from collections.abc import Mapping
 from dataclasses import is_dataclass
+from functools import partial
 from typing import Type, Optional, ClassVar, get_origin, Union, get_args
 
 import pydantic
@@ -8,6 +10,7 @@ from common.typedef import Range
 from recommender.parameters.parameterGeneration import generic_range_to_concrete
 from recommender.preferences.preferenceMetadata import PreferenceMetadata
 from recommender.preferences.preferenceTypes import CustomType
+from recommender.typedefs.lazy_types import LazyInputTypes
 from recommender.typedefs.typedef import IsDataclass
 
 
@@ -39,11 +42,16 @@ def complete_preference_dependencies(preferences: IsDataclass):
                     f"Parent preference {metadata.depends_on} from {name} does not exist in list of preferences.")
 
             metadata.parent = parent_metadata
-            parent_metadata.children.append(metadata)
+            # the metadata objects are shared by all instances, link each child only once
+            if not any(child is metadata for child in parent_metadata.children):
+                parent_metadata.children.append(metadata)
 
 
-def generate_preference_dataclass(Metadata: IsDataclass, production_methods: list[str]) -> dict[
+def generate_preference_dataclass(Metadata: IsDataclass, production_methods: list[str], lazy: bool = False) -> Mapping[
     str, Type['pydantic.dataclasses.Dataclass']]:
+    """
+    :param lazy: If true, the dataclass of a production method is generated on its first use, see LazyInputTypes
+    """
     if not is_dataclass(Metadata):
         raise RuntimeError(f"Input class {Metadata.__class__.__name__} needs to be a dataclass")
 
@@ -71,10 +79,16 @@ def generate_preference_dataclass(Metadata: IsDataclass, production_methods: lis
             pairs_fields[pm].append(
                 (p_name, preference_type, pydantic.Field(default=None, description=p_type.description)))
 
-    data_class = {pm: pydantic.dataclasses.dataclass(dataclasses.make_dataclass("Input" + base_name + pm, fields))
-                  for pm, fields in pairs_fields.items()}
+    factories = {pm: partial(make_preference_dataclass, "Input" + base_name + pm, fields) for pm, fields in
+                 pairs_fields.items()}
+    if lazy:
+        return LazyInputTypes(factories)
+    return {pm: factory() for pm, factory in factories.items()}
 
-    return data_class
+
+def make_preference_dataclass(name: str, fields: list[tuple[str, type, pydantic.Field]]) -> Type[
+    'pydantic.dataclasses.Dataclass']:
+    return pydantic.dataclasses.dataclass(dataclasses.make_dataclass(name, fields))
 
 
 def convert_generic_types_to_concrete(t: type) -> Type:
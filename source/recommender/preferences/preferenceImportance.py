@@ -1,3 +1,4 @@
+import copy
 from dataclasses import fields
 from typing import Type
 
@@ -19,13 +20,40 @@ def extract_importance_input_for_children(child: PreferenceMetadata, demand_valu
 
 
 def read_input_value(values: InputPreferences, current_name: str) -> float:
-    value = getattr(values, current_name)
+    return importance_input_value(getattr(values, current_name))
+
+
+def importance_input_value(value) -> float:
     return 1.0 if value is None else float(value)
 
 
+def deduce_importances(dependencies: list[tuple[int, int, PreferenceMetadata, PreferenceMetadata]],
+                       demand_values: tuple, supplier_values: tuple) -> dict[int, float]:
+    """
+    Record based counterpart of instantiate_preferences, deduces the importance of all dependent preferences. The
+    metadata is shared by all concurrent requests and therefore never modified.
+    :param dependencies: (index of the parent value, index of the child, parent, child) as collected by the RecordLayout
+    :param demand_values: Preference values of the demand record
+    :param supplier_values: Preference values of the supplier record
+    :return: The importance of each dependent preference by its index
+    """
+    importances = {}
+    for index, child_index, parent, child in dependencies:
+        if child.dominant_side == DominantParent.DEMAND:
+            importance_input = importance_input_value(demand_values[index])
+        elif child.dominant_side == DominantParent.SUPPLIER:
+            importance_input = importance_input_value(supplier_values[index])
+        else:
+            importance_input = 0.5 * (importance_input_value(demand_values[index]) +
+                                      importance_input_value(supplier_values[index]))
+        importances[child_index] = parent.preference_type.deduce_importance(importance_input)
+    return importances
+
+
 def instantiate_preferences(preference_metadata: Type[PreferenceBase], demand_values: InputPreferences,
                             supplier_values: InputPreferences, production_method: str) -> PreferenceBase:
-    preference_metadata_instance = preference_metadata()
+    # the defaults of the metadata are shared by all instances, deduce the importances on a private copy
+    preference_metadata_instance = copy.deepcopy(preference_metadata())
 
     for f in fields(preference_metadata_instance):
 
@@ -9,6 +9,10 @@ class PreferenceTypeRegistry:
     def register(cls, method: str, input_class: dataclass):
         cls.registry[method] = input_class
 
+    @classmethod
+    def swap(cls, registry: dict[str, dataclass]):
+        cls.registry = registry
+
     @classmethod
     def get_input_type(cls):
         return Union[tuple(cls.registry.values())]
@@ -0,0 +1,90 @@
+import json
+import sys
+
+from recommender.catalog.catalogColumns import compile_catalog
+from recommender.catalog.catalogSharedMemory import publish_catalog, unlink_catalog, catalog_tenant
+from recommender.catalog.catalogSnapshot import write_snapshot, restore_catalog, restore_catalogs
+from recommender.catalog.catalogTenants import tenant_catalogs
+from recommender.catalog.catalogUpdates import upsert_suppliers, delete_suppliers, compact_catalog, compactor
+from recommender.typedefs.generated_input_types import startup_type_definition
+from recommender.typedefs.io_types import SupplierInformation
+from recommender.typedefs.type_definition import pinned_type_definition
+
+# Loader process of a shared supplier catalog. The suppliers are validated and compiled once and published into shared
+# memory, all recommender workers of this node attach to the published generation without copying it. Running the
+# loader again publishes a new generation, requests which are in flight finish on the previous one.
+#
+#   python -m recommender.recommenderCatalogLoader <catalog name> <suppliers json>
+#   python -m recommender.recommenderCatalogLoader --unlink <catalog name>
+#
+# Single suppliers are changed without publishing the whole catalog again, see recommender/catalog/catalogUpdates.py:
+#
+#   python -m recommender.recommenderCatalogLoader --upsert <catalog name> <suppliers json>
+#   python -m recommender.recommenderCatalogLoader --delete <catalog name> <supplier id> [<supplier id> ...]
+#   python -m recommender.recommenderCatalogLoader --compact <catalog name>
+#
+# Snapshots survive a restart of the node and are mapped instead of compiling the catalog again, see
+# recommender/catalog/catalogSnapshot.py. The recommender restores all catalogs with a snapshot on startup.
+#
+#   python -m recommender.recommenderCatalogLoader --snapshot <catalog name>
+#   python -m recommender.recommenderCatalogLoader --restore [<catalog name>]
+#
+# The catalogs of a tenant are named <tenant>__<catalog>, publishing one evicts least recently used catalogs if the
+# quota of the tenant or the memory budget is exceeded, see recommender/catalog/catalogTenants.py.
+#
+# The suppliers file contains {"type": <production method>, "suppliers": [<SupplierInformation>, ...]}.
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "--unlink":
+        unlink_catalog(sys.argv[2])
+        print(f"Unlinked catalog {sys.argv[2]}")
+        sys.exit(0)
+    if len(sys.argv) == 3 and sys.argv[1] == "--snapshot":
+        snapshot = write_snapshot(sys.argv[2])
+        print(f"Wrote generation {snapshot.generation} of catalog {snapshot.name} to {snapshot.path}: "
+              f"{snapshot.suppliers} suppliers, {snapshot.nbytes} bytes")
+        sys.exit(0)
+    if len(sys.argv) in (2, 3) and sys.argv[1] == "--restore":
+        version = startup_type_definition.version
+        if len(sys.argv) == 3:
+            generation = restore_catalog(sys.argv[2], version)
+            restored = {sys.argv[2]: generation} if generation is not None else {}
+        else:
+            restored = restore_catalogs(version)
+        print(f"Restored catalogs from snapshots: {restored}")
+        sys.exit(0)
+    if len(sys.argv) >= 3 and sys.argv[1] in ("--upsert", "--delete", "--compact"):
+        name = sys.argv[2]
+        with pinned_type_definition(startup_type_definition):
+            if sys.argv[1] == "--compact":
+                print(f"Compacted catalog {name} into generation {compact_catalog(name)}")
+                sys.exit(0)
+            if sys.argv[1] == "--upsert":
+                with open(sys.argv[3], "r", encoding="utf-8") as fd:
+                    update = upsert_suppliers(name, json.load(fd)["suppliers"])
+            else:
+                update = delete_suppliers(name, sys.argv[3:])
+        print(f"Published generation {update.generation} of catalog {name}: {update.suppliers} suppliers, "
+              f"{update.changed} rows changed since the last compaction")
+        # a scheduled compaction is finished before the loader exits
+        compactor.wait(name)
+        sys.exit(0)
+    if len(sys.argv) != 3:
+        print("Usage: python -m recommender.recommenderCatalogLoader <catalog name> <suppliers json>", file=sys.stderr)
+        sys.exit(1)
+
+    name, path = sys.argv[1], sys.argv[2]
+    with open(path, "r", encoding="utf-8") as fd:
+        data = json.load(fd)
+
+    production_method = data["type"]
+    with pinned_type_definition(startup_type_definition) as definition:
+        suppliers = [SupplierInformation(production_method, **s) for s in data["suppliers"]]
+        catalog = compile_catalog(production_method, suppliers, definition)
+
+    generation = publish_catalog(name, catalog)
+    print(f"Published generation {generation} of catalog {name}: {len(catalog)} suppliers of {production_method}, "
+          f"{catalog.nbytes()} bytes")
+    if catalog_tenant(name) is not None:
+        evicted = tenant_catalogs.admit(name)
+        if evicted:
+            print(f"Evicted catalogs to their snapshots: {evicted}")
@@ -1,49 +1,64 @@
-from dataclasses import asdict, fields, is_dataclass
-
-from common.typedef import Range
-from common.typedef import RangeInt, RangeFloat
-from recommender.parameters.parameterMetadata import ParameterMetadata
-from recommender.parameters.parameterTypeRegistry import ParameterTypeRegistry
-from recommender.preferences.preferenceBase import PreferenceBase
-from recommender.preferences.preferenceComparison import distance_preference
-from recommender.preferences.preferenceImportance import instantiate_preferences
-from recommender.preferences.preferenceMetadata import PreferenceMetadata
-from recommender.preferences.preferenceTypeRegistry import PreferenceTypeRegistry
-from recommender.preferences.preferenceTypes import CustomType, CustomTypeInstance, PreferenceTypes
-from recommender.typedefs.generated_input_types import Preferences, all_categories, InputParametersDemand, \
-    InputParametersSupplier
-from recommender.typedefs.io_types import Input, Output, Score, ComponentScore, InputPreferences
+import heapq
+import math
+import time
+from array import array
+from dataclasses import asdict, dataclass
+from collections.abc import Sequence
+from typing import Iterable, Optional
+
+import numpy as np
+
+from recommender.catalog.catalogColumns import CatalogView, ColumnSpec
+from recommender.catalog.catalogSharedMemory import read_published_generation, CatalogNotFoundError, \
+    SharedCatalogRegistry
+from recommender.catalog.catalogTenants import tenant_catalogs
+from recommender.parameters.parameterSelectivity import ParameterPlan, selectivity
+from recommender.preferences.preferenceEmbedding import embedding_cache, approximate_candidates
+from recommender.preferences.preferenceImportance import deduce_importances
+from recommender.service.admission import preemptible, admission_checkpoint
+from recommender.typedefs.io_types import Input, Output, Score, ComponentScore, ComponentInformation, ShardOutput, \
+    ShardComponentScore, SupplierInformation
+from recommender.typedefs.record_layout import RecordLayout, get_record_layout
+from recommender.typedefs.records import InputRecord, to_record_value
+from recommender.typedefs.type_definition import current_type_definition
 from recommender.typedefs.typedef import ScoreErrors, ParameterErrors, ComparisonErrors, PreferenceErrors, NO_CATEGORY
 
 
 # this function is used to evaluate the input and perform some preprocessing. Especially convert the input fields to the
 # appropriate python classes.
 def additional_validation(inp: Input) -> Input:
+    definition = current_type_definition()
     for component in inp.components:
         method = component.type
-        par_inp_type_d = ParameterTypeRegistry.registry['Demand'][method]
+        # registered demands are converted once, see recommender/service/preparedDemands.py
+        prepared = component.prepared is not None
+        par_inp_type_d = definition.parameter_input_types['Demand'][method]
         try:
-            component.demand.parameters = par_inp_type_d(**asdict(component.demand.parameters))
+            if not prepared:
+                component.demand.parameters = par_inp_type_d(**asdict(component.demand.parameters))
         except TypeError as e:
             raise RuntimeError(
                 f"Could not convert demand parameter input for component '{component.name}' using production method '{method}' to the desired input class '{par_inp_type_d.__name__}'") from e
 
-        par_inp_type_s = ParameterTypeRegistry.registry['Supplier'][method]
-        for supplier in component.suppliers:
+        par_inp_type_s = definition.parameter_input_types['Supplier'][method]
+        # suppliers from the cache are already converted, see recommender/service/supplierCache.py
+        converted = [s for s in component.suppliers if not cached_supplier(s)]
+        for supplier in converted:
             try:
                 supplier.parameters = par_inp_type_s(**asdict(supplier.parameters))
             except TypeError as e:
                 raise RuntimeError(
                     f"Could not convert supplier parameter input ({supplier.id}) for component '{component.name}' using production method '{method}' to the desired input class '{par_inp_type_s.__name__}'") from e
 
-        pref_inp_type = PreferenceTypeRegistry.registry[method]
+        pref_inp_type = definition.preference_input_types[method]
         try:
-            component.demand.preferences = pref_inp_type(**asdict(component.demand.preferences))
+            if not prepared:
+                component.demand.preferences = pref_inp_type(**asdict(component.demand.preferences))
         except TypeError as e:
             raise RuntimeError(
                 f"Could not convert demand preference input for component '{component.name}' using production method '{method}' to the desired input class '{pref_inp_type.__name__}'") from e
 
-        for supplier in component.suppliers:
+        for supplier in converted:
             try:
                 supplier.preferences = pref_inp_type(**asdict(supplier.preferences))
             except TypeError as e:
@@ -53,88 +68,605 @@ def additional_validation(inp: Input) -> Input:
     return inp
 
 
-# main routine for performing the recommendation
-def perform_recommendation(inp: Input) -> Output:
-    output = Output()
+def cached_supplier(supplier: SupplierInformation) -> bool:
+    # a supplier accessing its values is detached from the cache, see io_types.shared_supplier_input
+    return supplier.validated is not None
+
+
+def supplier_record(supplier: SupplierInformation, layout: RecordLayout) -> InputRecord:
+    if not cached_supplier(supplier):
+        return layout.record(supplier.id, supplier.parameters, supplier.preferences)
+    # the values of a cached supplier are compiled once, only the id differs between the requests
+    record = supplier.validated.record(lambda p, q: layout.record(None, p, q))
+    return InputRecord(supplier.id, record.parameters, record.preferences)
+
+
+def demand_record(component: ComponentInformation, layout: RecordLayout) -> InputRecord:
+    prepared = component.prepared
+    if prepared is None:
+        return layout.record(None, component.demand.parameters, component.demand.preferences)
+    # a registered demand is compiled by the first recommendation using it, records are never modified
+    if prepared.record is None:
+        prepared.record = layout.record(None, prepared.demand.parameters, prepared.demand.preferences)
+    return prepared.record
+
+
+class CatalogReferenceError(RuntimeError):
+    """
+    A component references a catalog which is not published or contains suppliers of another production method, an
+    invalid request like a failed validation
+    """
+    pass
+
+
+def referenced_catalog(component: ComponentInformation) -> CatalogView:
+    """
+    Attaches the catalog of a component, an evicted tenant catalog is restored first. Not part of the validation, since
+    it may read a snapshot, but of the admitted request.
+    """
+    try:
+        columns = tenant_catalogs.get(component.catalog)
+    except CatalogNotFoundError as e:
+        raise CatalogReferenceError(str(e)) from e
+    if columns.production_method != component.type:
+        raise CatalogReferenceError(f"Catalog '{component.catalog}' contains suppliers of production method "
+                                    f"'{columns.production_method}', got '{component.type}'")
+    return columns
+
+
+def check_catalogs(inp: Input):
+    """
+    Raises a CatalogReferenceError for the first invalid catalog reference of a request
+    """
+    for component in inp.components:
+        if component.catalog is not None:
+            referenced_catalog(component)
+
+
+def component_catalog(component: ComponentInformation, layout: RecordLayout) -> CatalogView:
+    columns = referenced_catalog(component)
+    if columns.type_definition_version != layout.version:
+        raise RuntimeError(f"Catalog '{component.catalog}' was compiled for type definition "
+                           f"{columns.type_definition_version}, active is {layout.version}")
+    return columns
+
+
+# estimated memory of a record given in a request: the record and its tuples, plus each value
+RECORD_BASE_SIZE: int = 200
+RECORD_VALUE_SIZE: int = 64
+# estimated memory of a selected catalog row, i.e. an int in a list
+ROW_INDEX_SIZE: int = 36
+
+
+def record_bytes(record: InputRecord) -> int:
+    return RECORD_BASE_SIZE + RECORD_VALUE_SIZE * (len(record.parameters) + len(record.preferences))
+
+
+class SupplierRecords(Sequence):
+    """
+    Records of the suppliers of a component: the suppliers given in the request, followed by the rows of the referenced
+    catalog. The catalog was validated by the loader, its rows are decoded from the columns on access only. The
+    parameter checks decode just the parameters given by the demand (see parameters), hence the rows failing them are
+    never decoded completely, unless they are reported.
+    """
+
+    def __init__(self, given: list[InputRecord], layout: RecordLayout, demand: InputRecord,
+                 columns: Optional[CatalogView] = None, rows: Sequence[int] = ()):
+        self.given = given
+        self.columns = columns
+        self.rows = rows
+        specs = {} if columns is None else {(c.section, c.name): c for c in columns.columns}
+        self._parameter_columns: list[Optional[ColumnSpec]] = [specs.get(("parameters", p)) for p in
+                                                               layout.parameter_names]
+        self._preference_columns: list[Optional[ColumnSpec]] = [specs.get(("preferences", p)) for p in
+                                                                layout.preference_names]
+        # the other parameters are skipped by the checks, see validate_parameters
+        self._checked_columns = [c if d is not None and applicable else None for c, d, applicable in
+                                 zip(self._parameter_columns, demand.parameters, layout.parameter_applicable)]
+
+    def __len__(self) -> int:
+        return len(self.given) + len(self.rows)
+
+    def __getitem__(self, index: int) -> InputRecord:
+        if index < len(self.given):
+            return self.given[index]
+        row = self.rows[index - len(self.given)]
+        return InputRecord(self.supplier_id(index), self._decode(self._parameter_columns, row),
+                           self._decode(self._preference_columns, row))
+
+    def parameters(self, index: int) -> InputRecord:
+        """
+        Record sufficient for the parameter checks against the demand, the preferences of catalog rows are missing
+        """
+        if index < len(self.given):
+            return self.given[index]
+        return InputRecord(None, self._decode(self._checked_columns, self.rows[index - len(self.given)]), ())
+
+    def supplier_id(self, index: int) -> str:
+        if index < len(self.given):
+            return self.given[index].id
+        return str(self.columns.ids[self.rows[index - len(self.given)]])
+
+    def nbytes(self) -> int:
+        """
+        Estimated memory of the given records and the selected rows, the catalog columns are shared with the catalog
+        registry and not part of it
+        """
+        rows = 0 if isinstance(self.rows, range) else ROW_INDEX_SIZE * len(self.rows)
+        return sum(record_bytes(r) for r in self.given) + rows
+
+    def _decode(self, columns: list[Optional[ColumnSpec]], row: int) -> tuple:
+        return tuple(None if c is None else to_record_value(self.columns.value(c, row)) for c in columns)
+
+
+def catalog_candidates(columns: CatalogView, layout: RecordLayout, demand: InputRecord, plan: Optional[ParameterPlan],
+                       rows: Iterable[int], top_k: Optional[int]) -> list[int]:
+    """
+    Candidates of an approximate request: the rows with valid parameters and the best preference scores in the
+    preference embedding, see recommender/preferences/preferenceEmbedding.py. The rows are checked in the order of
+    their preference score until enough of them pass the parameters, at worst all of them like in the exact ranking.
+    :return: rows in ascending order
+    """
+    rows = list(rows)
+    k = approximate_candidates(top_k)
+    if len(rows) <= k:
+        return rows
+
+    order = embedding_cache.get(layout, columns).ranked(demand, np.asarray(rows, dtype=np.int64)).tolist()
+    # only the parameters given by the demand are decoded for the check
+    records = SupplierRecords([], layout, demand, columns, order)
+    selected: list[int] = []
+    for index, row in enumerate(order):
+        if validate_parameters(layout, demand, records.parameters(index), plan):
+            selected.append(row)
+            if len(selected) == k:
+                break
+    selected.sort()
+    return selected
+
+
+def estimate_cost(inp: Input) -> int:
+    """
+    Number of demand/supplier comparisons of a request, used by the admission control. Runs before the admission, hence
+    only the catalogs already attached by this worker are counted, others are not attached here.
+    """
+    cost = 0
+    for component in inp.components:
+        cost += len(component.suppliers)
+        if component.catalog is not None:
+            cost += SharedCatalogRegistry.attached_rows(component.catalog)
+    return max(cost, 1)
+
+
+def catalog_generations(inp: Input) -> dict[str, Optional[int]]:
+    """
+    Published generations of the catalogs referenced by a request, the result of a request changes with them
+    """
+    return {c.catalog: read_published_generation(c.catalog) for c in inp.components if c.catalog is not None}
+
+
+@dataclass
+class CompiledComponent:
+    """
+    Records of a component, everything needed to score (or explain) its suppliers
+    """
+    name: str
+    layout: RecordLayout
+    demand: InputRecord
+    suppliers: SupplierRecords
+    # order of the parameter checks, see recommender/parameters/parameterSelectivity.py
+    plan: Optional[ParameterPlan] = None
+    # number of catalog rows retrieved by an approximate request, None if all rows are scored
+    candidates: Optional[int] = None
+
+
+def compile_components(inp: Input) -> list[CompiledComponent]:
+    definition = current_type_definition()
+    compiled: list[CompiledComponent] = []
     for component in inp.components:
+        # after validation, the scoring operates on plain records only
+        layout = get_record_layout(definition, component.type)
+        demand = demand_record(component, layout)
+        plan = selectivity.plan(layout, demand)
+        given = [supplier_record(s, layout) for s in component.suppliers]
+        candidates = None
+        if component.catalog is None:
+            suppliers = SupplierRecords(given, layout, demand)
+        elif inp.approximate:
+            # the given suppliers are always scored, the catalog only with the candidates of the approximate search
+            columns = component_catalog(component, layout)
+            rows = catalog_candidates(columns, layout, demand, plan, range(len(columns)), inp.top_k)
+            suppliers = SupplierRecords(given, layout, demand, columns, rows)
+            candidates = len(rows)
+        else:
+            columns = component_catalog(component, layout)
+            suppliers = SupplierRecords(given, layout, demand, columns, range(len(columns)))
+        compiled.append(CompiledComponent(name=component.name, layout=layout, demand=demand, suppliers=suppliers,
+                                          plan=plan, candidates=candidates))
+    return compiled
+
+
+def compile_shard(inp: Input, shard: int, shards: int,
+                  supplier_counts: list[int]) -> tuple[list[CompiledComponent], list[list[int]]]:
+    """
+    Compiles the part of a sharded request this shard is responsible for. The suppliers given in the request are already
+    partitioned round robin by the coordinator, the catalog rows are selected here in the same manner, since every
+    shard attaches the complete catalog.
+    :param supplier_counts: Number of suppliers given per component in the request to the coordinator
+    :return: components and the position of each supplier in the request to the coordinator
+    """
+    definition = current_type_definition()
+    compiled: list[CompiledComponent] = []
+    positions: list[list[int]] = []
+    for component, n_given in zip(inp.components, supplier_counts):
+        layout = get_record_layout(definition, component.type)
+        demand = demand_record(component, layout)
+        given = [supplier_record(s, layout) for s in component.suppliers]
+        indices = [i * shards + shard for i in range(len(given))]
+        plan = selectivity.plan(layout, demand)
+        candidates = None
+        suppliers = SupplierRecords(given, layout, demand)
+        if component.catalog is not None:
+            # catalog rows follow the given suppliers, the round robin continues over them
+            columns = component_catalog(component, layout)
+            rows = range((shard - n_given) % shards, len(columns), shards)
+            if inp.approximate:
+                # each shard retrieves the candidates among its rows
+                rows = catalog_candidates(columns, layout, demand, plan, rows, inp.top_k)
+                candidates = len(rows)
+            suppliers = SupplierRecords(given, layout, demand, columns, rows)
+            indices.extend(n_given + r for r in rows)
+        compiled.append(CompiledComponent(name=component.name, layout=layout, demand=demand, suppliers=suppliers,
+                                          plan=plan, candidates=candidates))
+        positions.append(indices)
+    return compiled, positions
+
+
+def rank_shard(components: list[CompiledComponent], positions: list[list[int]], diagnostics: bool = True,
+               min_score: Optional[float] = None, top_k: Optional[int] = None) -> ShardOutput:
+    """
+    Ranking of the suppliers of a shard, the positions allow the coordinator to break ties like a single instance
+    """
+    output = ShardOutput(version=current_type_definition().version)
+    for component, indices in zip(components, positions):
+        ranking = rank_suppliers(component, min_score, top_k)
+        page = score_page(component, ranking, len(component.suppliers) - len(ranking), diagnostics)
+        output.components.append(ShardComponentScore(name=component.name, indices=[indices[-i] for _, i, _ in ranking],
+                                                     scores=page.scores, pruned=page.pruned,
+                                                     evaluated=len(component.suppliers)))
+    return output
 
-        scores: list[Score] = []
-        for supplier in component.suppliers:
-            # evaluate parameters
-            validity_parameters, errors_parameters = compare_parameters_demand_supplier(component.demand.parameters,
-                                                                                        supplier.parameters,
-                                                                                        component.type)
 
-            # evaluate preferences
-            score_preferences, score_category, errors_preferences = compare_preferences_demand_supplier(
-                component.demand.preferences,
-                supplier.preferences,
-                component.type)
+# main routine for performing the recommendation
+def perform_recommendation(inp: Input) -> Output:
+    return rank_components(compile_components(inp), diagnostics=inp.diagnostics is not False,
+                           min_score=inp.min_score, top_k=inp.top_k)
 
-            # set final score  (-1 for invalid parameters)
-            score = score_preferences if validity_parameters else -1.0
 
-            scores.append(Score(score=score, supplier_id=supplier.id, scores_per_category=score_category,
-                                failures=ScoreErrors(parameters=errors_parameters, preferences=errors_preferences)))
+def rank_components(components: list[CompiledComponent], diagnostics: bool = True, min_score: Optional[float] = None,
+                    top_k: Optional[int] = None) -> Output:
+    if min_score is not None or top_k is not None:
+        return rank_components_bounded(components, diagnostics, min_score, top_k)
+
+    output = Output()
+    for component in components:
+        scores = [score_supplier(component, supplier, diagnostics, component.plan) for supplier in
+                  preemptible(component.suppliers)]
+        selectivity.merge(component.plan)
 
         # sort each supplier descending by the score
         scores.sort(key=lambda x: x.score, reverse=True)
+        output.components.append(ComponentScore(name=component.name, scores=scores, candidates=component.candidates))
+
+    return output
+
+
+# tolerance of the upper bounds, which are accumulated in a different order than the final score
+_BOUND_TOLERANCE: float = 1e-9
+
+
+def rank_components_bounded(components: list[CompiledComponent], diagnostics: bool, min_score: Optional[float],
+                            top_k: Optional[int]) -> Output:
+    """
+    Ranking restricted to the suppliers reaching min_score and/or the top_k, see rank_suppliers
+    """
+    output = Output()
+    for component in components:
+        ranking = rank_suppliers(component, min_score, top_k)
+        output.components.append(score_page(component, ranking, len(component.suppliers) - len(ranking), diagnostics))
+
+    return output
+
+
+def rank_suppliers(component: CompiledComponent, min_score: Optional[float] = None,
+                   top_k: Optional[int] = None) -> list[tuple[float, int, Optional[dict[str, float]]]]:
+    """
+    Sorted scores of the suppliers of a component without collecting any failures. Suppliers failing the parameters are
+    abandoned before any preference is evaluated, the others as soon as the upper bound of their score falls below
+    min_score or the score of the current k-th best supplier. The result is identical to the corresponding part of
+    the full ranking.
+    :return: score, negative index of the supplier and score per category (None for invalid parameters)
+    """
+    layout, demand = component.layout, component.demand
+    # min heap of the current top_k (score, -index, per category), ties are won by the earlier supplier
+    best: list[tuple[float, int, Optional[dict[str, float]]]] = []
+    accepted: list[tuple[float, int, Optional[dict[str, float]]]] = []
+    suppliers = component.suppliers
+    for index in preemptible(range(len(suppliers))):
+        threshold = -math.inf if min_score is None else min_score
+        if top_k is not None and len(best) == top_k:
+            threshold = max(threshold, best[0][0])
+
+        # the supplier is decoded completely only if its parameters are valid
+        if validate_parameters(layout, demand, suppliers.parameters(index), component.plan):
+            result = bounded_preference_score(layout, demand, suppliers[index], threshold)
+            if result is None:
+                continue
+            entry = (result[0], -index, result[1])
+        else:
+            # invalid parameters score -1, the preferences are only evaluated if the supplier is reported
+            entry = (-1.0, -index, None)
+
+        if min_score is not None and entry[0] < min_score:
+            continue
+        if top_k is None:
+            accepted.append(entry)
+        elif len(best) < top_k:
+            heapq.heappush(best, entry)
+        elif entry[:2] > best[0][:2]:
+            heapq.heapreplace(best, entry)
+
+    selectivity.merge(component.plan)
+    return sorted(accepted + best, key=lambda x: (-x[0], -x[1]))
+
+
+def score_page(component: CompiledComponent, ranking: Iterable[tuple[float, int, Optional[dict[str, float]]]],
+               pruned: int, diagnostics: bool) -> ComponentScore:
+    """
+    Materializes the scores of the given part of a ranking, the failures are only computed for these suppliers
+    """
+    scores: list[Score] = []
+    for score, neg_index, score_category in ranking:
+        supplier = component.suppliers[-neg_index]
+        if diagnostics or score_category is None:
+            scores.append(score_supplier(component, supplier, diagnostics))
+        else:
+            scores.append(Score(score=score, supplier_id=supplier.id, scores_per_category=score_category))
+
+    return ComponentScore(name=component.name, scores=scores, pruned=pruned, candidates=component.candidates)
+
+
+@dataclass
+class ComponentRanking:
+    """
+    Sorted supplier indices and scores of a component, the compact form of a ranking which is kept for paging
+    """
+    indices: array
+    scores: array
+    pruned: int
+
+    def __len__(self):
+        return len(self.indices)
+
+
+def rank_components_paged(components: list[CompiledComponent], min_score: Optional[float] = None,
+                          top_k: Optional[int] = None) -> list[ComponentRanking]:
+    rankings: list[ComponentRanking] = []
+    for component in components:
+        ranking = rank_suppliers(component, min_score, top_k)
+        rankings.append(ComponentRanking(indices=array('q', (-i for _, i, _ in ranking)),
+                                         scores=array('d', (score for score, _, _ in ranking)),
+                                         pruned=len(component.suppliers) - len(ranking)))
+    return rankings
+
+
+def page_components(components: list[CompiledComponent], rankings: list[ComponentRanking], offset: int,
+                    page_size: int, diagnostics: bool) -> Output:
+    """
+    Scores of the suppliers at positions [offset, offset + page_size) of each ranking
+    """
+    output = Output()
+    for component, ranking in zip(components, rankings):
+        page = [(ranking.scores[i], -ranking.indices[i], None) for i in range(offset, min(offset + page_size,
+                                                                                        len(ranking)))]
+        output.components.append(score_page(component, page, ranking.pruned, diagnostics))
+    return output
+
+
+def bounded_preference_score(layout: RecordLayout, demand: InputRecord, supplier: InputRecord,
+                             threshold: float) -> Optional[tuple[float, dict[str, float]]]:
+    """
+    Evaluates the preferences like compare_preferences_demand_supplier, but gives up as soon as the score cannot reach
+    the threshold anymore. The score is the mean of the category means, hence after each category the best achievable
+    score is known, assuming each remaining preference scores 1.
+    :return: score and score per category, None if the supplier was abandoned
+    """
+    importances = deduce_importances(layout.preference_dependencies, demand.preferences, supplier.preferences)
+
+    d_values, s_values = demand.preferences, supplier.preferences
+    # number of preferences per category, which still have to be evaluated
+    remaining: dict[str, int] = {c: 0 for c in layout.categories}
+    for i, meta in enumerate(layout.preference_metadata):
+        if not layout.preference_applicable[i]:
+            continue
+        if layout.preference_distances[i] is None:
+            raise RuntimeError("Unknown preference type, must be derived from CustomType")
+        if d_values[i] is not None and s_values[i] is not None:
+            remaining[meta.category] += 1
+
+    similarities: list[Optional[float]] = [None] * len(d_values)
+    sums: dict[str, float] = {c: 0.0 for c in layout.categories}
+    counts: dict[str, int] = {c: 0 for c in layout.categories}
+    order = layout.preference_evaluation_order
+    for position, i in enumerate(order):
+        meta = layout.preference_metadata[i]
+        d, s = d_values[i], s_values[i]
+        if not layout.preference_applicable[i] or d is None or s is None:
+            continue
+
+        remaining[meta.category] -= 1
+        try:
+            similarities[i] = 1 - layout.preference_distances[i](d, s, meta.preference_type, importances.get(i))
+            sums[meta.category] += similarities[i]
+            counts[meta.category] += 1
+        except RuntimeError:
+            pass
+
+        # check the bound as soon as a category (or the unbounded zone preferences) is completed
+        last = position + 1 == len(order)
+        if not last and (layout.preference_unbounded[order[position + 1]] or
+                         layout.preference_metadata[order[position + 1]].category == meta.category and
+                         not layout.preference_unbounded[i]):
+            continue
+        if _score_upper_bound(sums, counts, remaining) < threshold - _BOUND_TOLERANCE:
+            return None
+
+    # same accumulation as evaluate_preference_scores, i.e. in the order of the fields
+    scores_category: dict[str, list[float]] = {c: [] for c in layout.categories}
+    for i, similarity in enumerate(similarities):
+        if similarity is not None:
+            scores_category[layout.preference_metadata[i].category].append(similarity)
+
+    score_per_category = {c: sum(v) / len(v) for c, v in scores_category.items() if len(v) > 0}
+    if len(score_per_category) == 0:
+        return 1.0, {}
+    return sum(score_per_category.values()) / len(score_per_category), score_per_category
+
+
+def _score_upper_bound(sums: dict[str, float], counts: dict[str, int], remaining: dict[str, int]) -> float:
+    total, n_active, n_optional = 0.0, 0, 0
+    for c, n in counts.items():
+        if n > 0:
+            # the remaining preferences of this category score at most 1 each
+            total += max(sums[c] / n, (sums[c] + remaining[c]) / (n + remaining[c]))
+            n_active += 1
+        elif remaining[c] > 0:
+            n_optional += 1
+    if n_active == 0:
+        return 1.0
+    return max(total / n_active, (total + n_optional) / (n_active + n_optional))
+
+
+# number of suppliers scored between two checks of the deadline
+DEADLINE_CHUNK: int = 16
+
+
+def rank_components_deadline(components: list[CompiledComponent], deadline: float, diagnostics: bool = True,
+                             min_score: Optional[float] = None, top_k: Optional[int] = None) -> Output:
+    """
+    Scores as many suppliers as possible until the deadline (time.monotonic()) and ranks the ones evaluated so far.
+    The parameters are checked for all suppliers first, the suppliers with valid parameters are scored before the ones
+    which score -1 anyway. The components are served round robin chunk by chunk, such that each component receives
+    the best suppliers found in time.
+    """
+    queues: list[list[int]] = []
+    for component in components:
+        feasible, infeasible = [], []
+        for start in range(0, len(component.suppliers), DEADLINE_CHUNK):
+            if time.monotonic() >= deadline:
+                # not checked anymore, scored last
+                infeasible.extend(range(start, len(component.suppliers)))
+                break
+            for index in range(start, min(start + DEADLINE_CHUNK, len(component.suppliers))):
+                valid = validate_parameters(component.layout, component.demand,
+                                            component.suppliers.parameters(index), component.plan)
+                (feasible if valid else infeasible).append(index)
+        queues.append(feasible + infeasible)
+        selectivity.merge(component.plan)
+
+    evaluated: list[list[tuple[int, Score]]] = [[] for _ in components]
+    position = 0
+    while time.monotonic() < deadline and any(position < len(q) for q in queues):
+        for component, queue, scores in zip(components, queues, evaluated):
+            for index in queue[position:position + DEADLINE_CHUNK]:
+                scores.append((index, score_supplier(component, component.suppliers[index], diagnostics)))
+            admission_checkpoint()
+            if time.monotonic() >= deadline:
+                break
+        position += DEADLINE_CHUNK
+
+    output = Output()
+    for component, scores in zip(components, evaluated):
+        # same order as the full ranking, i.e. descending scores and ties in the order of the suppliers
+        scores.sort(key=lambda x: (-x[1].score, x[0]))
+        ranked = [s for _, s in scores if min_score is None or s.score >= min_score][:top_k]
+        output.components.append(ComponentScore(name=component.name, scores=ranked, pruned=len(scores) - len(ranked),
+                                                complete=len(scores) == len(component.suppliers),
+                                                evaluated=len(scores), candidates=component.candidates))
+    return output
+
+
+def explain_components(components: list[CompiledComponent], supplier_ids: list[str],
+                       component_name: Optional[str] = None) -> Output:
+    """
+    Full diagnostics for the given suppliers, in the order of supplier_ids
+    """
+    output = Output()
+    for component in components:
+        if component_name is not None and component.name != component_name:
+            continue
+        # only the explained suppliers are decoded
+        indices = {}
+        for index in range(len(component.suppliers)):
+            indices.setdefault(component.suppliers.supplier_id(index), []).append(index)
+        scores = [score_supplier(component, component.suppliers[index], diagnostics=True) for i in supplier_ids for
+                  index in indices.get(i, [])]
         output.components.append(ComponentScore(name=component.name, scores=scores))
 
     return output
 
 
-def compare_parameters_demand_supplier(demand_parameters: InputParametersDemand,
-                                       supplier_parameters: InputParametersSupplier,
-                                       production_method: str) -> tuple[bool, ParameterErrors]:
-    if not is_dataclass(demand_parameters):
-        raise RuntimeError("demand_parameters must be a dataclass")
-    if not is_dataclass(supplier_parameters):
-        raise RuntimeError("supplier_parameter must be a dataclass")
+def score_supplier(component: CompiledComponent, supplier: InputRecord, diagnostics: bool = True,
+                   plan: Optional[ParameterPlan] = None) -> Score:
+    """
+    :param plan: Order of the parameter checks, the outcomes are counted for the selectivity statistics
+    """
+    layout, demand = component.layout, component.demand
 
-    metadata_instance = demand_parameters.derived_from()
-    parameters = list(asdict(demand_parameters).keys())
+    # evaluate parameters
+    validity_parameters, errors_parameters = compare_parameters_demand_supplier(layout, demand, supplier, diagnostics,
+                                                                                plan)
 
-    # check if supplier and demand parameters coincide
-    if asdict(demand_parameters).keys() != asdict(supplier_parameters).keys():
-        raise RuntimeError(f"Parameters of demand datastructure {type(demand_parameters).__name__} "
-                           f"and supplier {type(supplier_parameters).__name__} do not match. "
-                           f"Got d: {asdict(demand_parameters).keys()} and s: {asdict(supplier_parameters).keys()}")
+    # evaluate preferences
+    score_preferences, score_category, errors_preferences = compare_preferences_demand_supplier(layout, demand, supplier,
+                                                                                                diagnostics)
 
-    # check if metadata_instance is a subset of demand_parameters
-    if not all(k in asdict(metadata_instance).keys() for k in parameters):
-        raise RuntimeError(f"Parameters of demand/supplier datastructure {type(demand_parameters).__name__} "
-                           f"and metadata_class {type(metadata_instance).__name__} do not match."
-                           f"Got d/s: {asdict(demand_parameters).keys()} and metadata: {asdict(metadata_instance).keys()}")
+    # set final score  (-1 for invalid parameters)
+    score = score_preferences if validity_parameters else -1.0
 
-    errors: ParameterErrors = {c: ComparisonErrors() for c in all_categories}
-    valid = True
-    #  evaluate the parameters from a given category
-    for p in parameters:
+    failures = ScoreErrors(parameters=errors_parameters, preferences=errors_preferences) if diagnostics else None
+    return Score(score=score, supplier_id=supplier.id, scores_per_category=score_category, failures=failures)
 
-        meta_info: ParameterMetadata = getattr(metadata_instance, p)
-        demand = getattr(demand_parameters, p)
-        supplier = getattr(supplier_parameters, p)
 
-        # convert RangeInt/RangeFloat to internal Range
-        if isinstance(demand, (RangeInt, RangeFloat)):
-            demand = Range(**asdict(demand))
-        if isinstance(supplier, (RangeInt, RangeFloat)):
-            supplier = Range(**asdict(supplier))
+def compare_parameters_demand_supplier(layout: RecordLayout, demand: InputRecord, supplier: InputRecord,
+                                       diagnostics: bool = True,
+                                       plan: Optional[ParameterPlan] = None) -> tuple[bool, Optional[ParameterErrors]]:
+    if not diagnostics:
+        return validate_parameters(layout, demand, supplier, plan), None
 
-        if demand is None or supplier is None:
+    production_method = layout.production_method
+    errors: ParameterErrors = {c: ComparisonErrors() for c in layout.categories}
+    valid = True
+    #  evaluate the parameters from a given category, all of them in the order of the definition
+    for i, (p, meta_info, applicable, d, s) in enumerate(zip(layout.parameter_names, layout.parameter_metadata,
+                                                             layout.parameter_applicable, demand.parameters,
+                                                             supplier.parameters)):
+        if d is None or s is None:
             errors[meta_info.category].skipped[
-                p] = f"Skipped, since either demand or supplier parameter is not provided, got demand: {demand} and suppler: {supplier}"
+                p] = f"Skipped, since either demand or supplier parameter is not provided, got demand: {d} and suppler: {s}"
             continue
 
         # evaluate
-        if production_method not in meta_info.production_method:
+        if not applicable:
             errors[meta_info.category].skipped[
                 p] = f"Skipped, since parameter is not applicable for production method '{production_method}', however values are provided."
             continue
 
         try:
-            result = meta_info.cmp_fnc(demand, supplier)
+            result = meta_info.cmp_fnc(d, s)
+            if plan is not None:
+                plan.evaluated[i] += 1
+                plan.failed[i] += not result.valid
 
             valid = valid and result.valid
             if result.error is not None:
@@ -151,36 +683,51 @@ def compare_parameters_demand_supplier(demand_parameters: InputParametersDemand,
     return valid, errors
 
 
-def compare_preferences_demand_supplier(demand_preferences: InputPreferences, supplier_preferences: InputPreferences,
-                                        production_method: str) -> tuple[float, dict[str, float], PreferenceErrors]:
-    if not is_dataclass(demand_preferences):
-        raise RuntimeError("demand_preferences must be a dataclass")
-    if not is_dataclass(supplier_preferences):
-        raise RuntimeError("supplier_preferences must be a dataclass")
-
-    # check if supplier and demand parameters coincide
-    if asdict(demand_preferences).keys() != asdict(supplier_preferences).keys():
-        raise RuntimeError(f"Preferences of demand datastructure {demand_preferences.__name__} "
-                           f"and supplier {supplier_preferences.__name__} do not match."
-                           f"Got d: {asdict(demand_preferences).keys()} and s: {asdict(supplier_preferences).keys()}")
-
-    # check if metadata_instance is a subset of demand_parameters (additional dummy variable!)
-    if not all(k in Preferences.keys() for k in asdict(demand_preferences).keys()):
-        raise RuntimeError(f"Preferences of demand/supplier datastructure {demand_preferences.__name__} "
-                           f"and metadata_class {Preferences.__name__} do not match."
-                           f"Got d/s: {asdict(demand_preferences).keys()} and metadata: {Preferences.keys()}")
-
-    preference_metadata_instance = instantiate_preferences(preference_metadata=demand_preferences.derived_from,
-                                                           demand_values=demand_preferences,
-                                                           supplier_values=supplier_preferences,
-                                                           production_method=production_method)
-    errors: PreferenceErrors = {c: ComparisonErrors() for c in all_categories}
-    scores_category = evaluate_preference_scores(demand_preferences, supplier_preferences, preference_metadata_instance,
-                                                 production_method, errors)
+def validate_parameters(layout: RecordLayout, demand: InputRecord, supplier: InputRecord,
+                        plan: Optional[ParameterPlan] = None) -> bool:
+    # same evaluation as compare_parameters_demand_supplier without collecting skip reasons and failures
+    if plan is None:
+        for meta_info, applicable, d, s in zip(layout.parameter_metadata, layout.parameter_applicable,
+                                               demand.parameters, supplier.parameters):
+            if d is None or s is None or not applicable:
+                continue
+            try:
+                if not meta_info.cmp_fnc(d, s).valid:
+                    return False
+            except RuntimeError:
+                continue
+        return True
+
+    # the most selective parameters first, stops at the first failure
+    metadata, d_values, s_values = layout.parameter_metadata, demand.parameters, supplier.parameters
+    for i in plan.order:
+        s = s_values[i]
+        if s is None:
+            continue
+        plan.evaluated[i] += 1
+        try:
+            if not metadata[i].cmp_fnc(d_values[i], s).valid:
+                plan.failed[i] += 1
+                return False
+        except RuntimeError:
+            continue
+    return True
+
+
+def compare_preferences_demand_supplier(layout: RecordLayout, demand: InputRecord, supplier: InputRecord,
+                                        diagnostics: bool = True) -> tuple[
+    float, dict[str, float], Optional[PreferenceErrors]]:
+    # importance of dependent preferences for this demand/supplier pair
+    importances = deduce_importances(layout.preference_dependencies, demand.preferences, supplier.preferences)
+
+    all_categories = layout.categories
+    errors: Optional[PreferenceErrors] = {c: ComparisonErrors() for c in all_categories} if diagnostics else None
+    scores_category = evaluate_preference_scores(layout, demand, supplier, errors, importances)
 
     n_active_category = len(list(filter(lambda x: (x > 0), [len(scores_category[c]) for c in all_categories])))
     if n_active_category == 0:
-        errors[NO_CATEGORY].failures["ALL"] = f"No preferences given, returning valid 1.0 for preferences"
+        if errors is not None:
+            errors[NO_CATEGORY].failures["ALL"] = f"No preferences given, returning valid 1.0 for preferences"
         score = 1.0
         score_per_category = {}
     else:
@@ -192,51 +739,50 @@ def compare_preferences_demand_supplier(demand_preferences: InputPreferences, su
         score = sum(score_per_category.values()) / n_active_category
 
     # remove error free dicts, note empty dicts evaluate to False
-    empty_categories = [c for c in errors.keys() if not bool(errors[c].skipped) and not bool(errors[c].failures)]
-    for c in empty_categories:
-        errors.pop(c)
+    if errors is not None:
+        empty_categories = [c for c in errors.keys() if not bool(errors[c].skipped) and not bool(errors[c].failures)]
+        for c in empty_categories:
+            errors.pop(c)
 
     return score, score_per_category, errors
 
 
-def evaluate_preference_scores(demand_preferences: InputPreferences, supplier_preferences: InputPreferences,
-                               preference_metadata_instance: PreferenceBase, production_method: str,
-                               errors: PreferenceErrors):
-    scores_category: dict[str, list[float]] = {c: [] for c in all_categories}
-    for f in fields(demand_preferences):
-        p = f.name
-
-        # fetch preference meta information
-        meta: PreferenceMetadata = getattr(preference_metadata_instance, p)
-        if meta is None:
-            raise RuntimeError(f"Metadata is None for parameter {p}, something went terribly wrong")
-
+def evaluate_preference_scores(layout: RecordLayout, demand: InputRecord, supplier: InputRecord,
+                               errors: Optional[PreferenceErrors],
+                               importances: Optional[dict[int, float]] = None) -> dict[str, list[float]]:
+    """
+    Collects the scores of all preferences per category
+    :param errors: Skip reasons and failures are added, if given
+    :param importances: Deduced importance of the dependent preferences by index, see deduce_importances
+    """
+    importances = {} if importances is None else importances
+    production_method = layout.production_method
+    scores_category: dict[str, list[float]] = {c: [] for c in layout.categories}
+    for i, (p, meta, applicable, distance, d, s) in enumerate(zip(
+            layout.preference_names, layout.preference_metadata, layout.preference_applicable,
+            layout.preference_distances, demand.preferences, supplier.preferences)):
         # if production method is not applicable skip this entry
-        if production_method not in meta.production_method:
-            if hasattr(demand_preferences, p) or hasattr(supplier_preferences, p):
+        if not applicable:
+            if errors is not None:
                 errors[meta.category].skipped[
                     p] = f"Skipped, since preference is not applicable for production method '{production_method}', however values are provided."
             continue
 
-        # create appropriate type for preference evaluation
-        if isinstance(meta.preference_type, CustomType):
-            demand: PreferenceTypes = CustomTypeInstance(value=getattr(demand_preferences, p),
-                                                         base_type=meta.preference_type)
-            supplier: PreferenceTypes = CustomTypeInstance(value=getattr(supplier_preferences, p),
-                                                           base_type=meta.preference_type)
-        else:
+        if distance is None:
             raise RuntimeError("Unknown preference type, must be derived from CustomType")
 
-        if demand.value is None or supplier.value is None:
-            errors[meta.category].skipped[
-                p] = f"Skipped, since either demand or supplier preference is not provided, got demand: {demand.value} and suppler: {supplier.value}"
+        if d is None or s is None:
+            if errors is not None:
+                errors[meta.category].skipped[
+                    p] = f"Skipped, since either demand or supplier preference is not provided, got demand: {d} and suppler: {s}"
             continue
 
         # evaluate preference and go from distance to similarity
         try:
-            score_preference = 1 - distance_preference(demand, supplier)
+            score_preference = 1 - distance(d, s, meta.preference_type, importances.get(i))
         except RuntimeError as e:
-            errors[meta.category].failures[p] = f"Error in computing preference distance: {e}"
+            if errors is not None:
+                errors[meta.category].failures[p] = f"Error in computing preference distance: {e}"
             continue
 
         # collect individual scores
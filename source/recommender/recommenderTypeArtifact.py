@@ -0,0 +1,40 @@
+import os.path
+import sys
+import time
+
+from recommender import RECOMMENDER_ROOT_DIR
+from recommender.importer.artifact import build_type_artifact, load_type_artifact, read_type_definition
+
+# Build step for the cached type definition csv and the OpenAPI schema, e.g. during the docker build. The input types
+# are not part of the artifact, a worker generates those of a production method on its first use. The artifact is keyed
+# by the hash of the csv content, hence a changed csv file is never served from an outdated artifact.
+#
+#   python -m recommender.recommenderTypeArtifact [<type definition csv>] [<output directory>]
+if __name__ == "__main__":
+    filename = sys.argv[1] if len(sys.argv) > 1 else os.environ.get('RECOMMENDER_TYPE_DEFINITION',
+                                                                    "Meta_Fields_Recommender.csv")
+    directory = sys.argv[2] if len(sys.argv) > 2 else None
+    path = os.path.join(RECOMMENDER_ROOT_DIR, filename)
+
+    artifact_path = build_type_artifact(path, sep=";", directory=directory)
+    print(f"Written type artifact for {filename} to {artifact_path}")
+
+    # compare reading the csv file with and without artifact
+    start = time.perf_counter()
+    read_type_definition(path, sep=";")
+    duration_csv = time.perf_counter() - start
+
+    start = time.perf_counter()
+    load_type_artifact(path, directory=directory)
+    duration_artifact = time.perf_counter() - start
+
+    print(f"Reading type definition from csv: {duration_csv:.4f}s, from artifact: {duration_artifact:.4f}s")
+
+    # the OpenAPI schema of the generated types is stored next to the artifact, see recommender/service/openapiCache.py
+    os.environ['RECOMMENDER_TYPE_DEFINITION'] = filename
+    from recommender.__main__ import openapi_cache
+
+    openapi_cache.directory = directory
+    start = time.perf_counter()
+    openapi_cache.body()
+    print(f"OpenAPI schema ({openapi_cache.source}) in {time.perf_counter() - start:.4f}s: {openapi_cache.path}")
@@ -0,0 +1,271 @@
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator
+from dataclasses import dataclass, field
+from typing import Any, Optional, TypeVar
+
+from starlette.concurrency import run_in_threadpool
+
+T = TypeVar("T")
+
+# header selecting the priority class of a request
+PRIORITY_HEADER: str = "X-Priority"
+
+# number of suppliers scored between two checkpoints, i.e. the longest time a preemptible request keeps the cpu after a
+# request of a higher priority class arrived
+ADMISSION_CHECKPOINT_ENV: str = "RECOMMENDER_ADMISSION_CHECKPOINT"
+DEFAULT_ADMISSION_CHECKPOINT: int = 32
+
+# number of recent wait times kept per class for the percentiles
+WAIT_TIME_SAMPLES: int = 1000
+
+
+class AdmissionRejected(RuntimeError):
+    pass
+
+
+@dataclass
+class PriorityClass:
+    """
+    Limits of a priority class, classes with a lower rank are served first
+    """
+    name: str
+    rank: int
+    # requests which are scored at the same time
+    max_concurrency: int
+    # requests waiting for admission, further requests are rejected
+    max_queue: int
+    # sum of the costs of the running requests, a single request is always admitted if the class is idle
+    max_cost: int
+    # requests of at least this cost yield to higher priority classes at each checkpoint, None to never yield
+    preemptible_cost: Optional[int] = None
+
+    @staticmethod
+    def from_environment(name: str, rank: int, max_concurrency: int, max_queue: int, max_cost: int,
+                         preemptible_cost: Optional[int]) -> "PriorityClass":
+        # e.g. RECOMMENDER_ADMISSION_BATCH_CONCURRENCY=2
+        def env(key: str, default):
+            value = os.environ.get(f"RECOMMENDER_ADMISSION_{name.upper()}_{key}")
+            if value is None:
+                return default
+            return None if value.lower() == "none" else int(value)
+
+        return PriorityClass(name=name, rank=rank, max_concurrency=env("CONCURRENCY", max_concurrency),
+                             max_queue=env("QUEUE", max_queue), max_cost=env("COST", max_cost),
+                             preemptible_cost=env("PREEMPTIBLE_COST", preemptible_cost))
+
+
+def default_priority_classes() -> list[PriorityClass]:
+    return [PriorityClass.from_environment("interactive", 0, max_concurrency=4, max_queue=64, max_cost=200_000,
+                                           preemptible_cost=None),
+            PriorityClass.from_environment("batch", 1, max_concurrency=1, max_queue=256, max_cost=1_000_000,
+                                           preemptible_cost=500)]
+
+
+@dataclass
+class AdmissionTicket:
+    priority: PriorityClass
+    cost: int
+    loop: asyncio.AbstractEventLoop
+    granted: asyncio.Future
+    enqueued: float = field(default_factory=time.monotonic)
+    paused: bool = False
+
+
+@dataclass
+class ClassMetrics:
+    queue: deque = field(default_factory=deque)
+    active: int = 0
+    paused: int = 0
+    active_cost: int = 0
+    admitted: int = 0
+    rejected: int = 0
+    preempted: int = 0
+    wait_time_total: float = 0.0
+    wait_time_max: float = 0.0
+    paused_time_total: float = 0.0
+    wait_times: deque = field(default_factory=lambda: deque(maxlen=WAIT_TIME_SAMPLES))
+
+
+class AdmissionController:
+    """
+    Scheduler in front of the scoring. Requests wait for admission per priority class, each class has limits on
+    concurrency and on the summed cost (components x suppliers) of its running requests. Lower priority classes are only
+    admitted while no request of a higher class is waiting, and large low priority requests pause at each checkpoint
+    of the scoring as long as requests of a higher class are running, hence they are scored in chunks in between.
+    """
+
+    def __init__(self, classes: list[PriorityClass], checkpoint_interval: int = DEFAULT_ADMISSION_CHECKPOINT):
+        self.classes: dict[str, PriorityClass] = {c.name: c for c in sorted(classes, key=lambda c: c.rank)}
+        self.checkpoint_interval = checkpoint_interval
+        self._metrics: dict[str, ClassMetrics] = {c: ClassMetrics() for c in self.classes}
+        self._lock = threading.Lock()
+        self._resumed = threading.Condition(self._lock)
+
+    @property
+    def default_class(self) -> str:
+        return next(iter(self.classes))
+
+    async def run(self, priority: str, cost: int, fnc: Callable[..., T], *args) -> T:
+        """
+        Waits for admission and runs fnc in the threadpool, the context (e.g. the pinned type definition) is retained
+        :raises AdmissionRejected: if the queue of the priority class is full
+        """
+        ticket = self._enqueue(self.classes[priority], cost)
+        try:
+            await ticket.granted
+        except asyncio.CancelledError:
+            self._cancel(ticket)
+            raise
+
+        context = contextvars.copy_context()
+        try:
+            return await run_in_threadpool(context.run, self._execute, ticket, fnc, *args)
+        finally:
+            self._release(ticket)
+
+    def checkpoint(self, ticket: AdmissionTicket):
+        """
+        Called by the scoring in the worker thread, blocks a preemptible request while higher priority classes are busy
+        """
+        preemptible_cost = ticket.priority.preemptible_cost
+        if preemptible_cost is None or ticket.cost < preemptible_cost:
+            return
+        with self._lock:
+            if not self._higher_busy(ticket.priority):
+                return
+            metrics = self._metrics[ticket.priority.name]
+            metrics.preempted += 1
+            metrics.paused += 1
+            ticket.paused = True
+            start = time.monotonic()
+            self._resumed.wait_for(lambda: not self._higher_busy(ticket.priority))
+            ticket.paused = False
+            metrics.paused -= 1
+            metrics.paused_time_total += time.monotonic() - start
+
+    def metrics(self) -> dict[str, dict[str, Any]]:
+        result = {}
+        with self._lock:
+            for name, m in self._metrics.items():
+                waits = sorted(m.wait_times)
+                now = time.monotonic()
+                result[name] = {
+                    "queue_depth": len(m.queue), "active": m.active, "paused": m.paused,
+                    "active_cost": m.active_cost, "admitted": m.admitted, "rejected": m.rejected,
+                    "preempted": m.preempted,
+                    "oldest_wait_time": now - m.queue[0].enqueued if m.queue else 0.0,
+                    "wait_time_total": m.wait_time_total, "wait_time_max": m.wait_time_max,
+                    "wait_time_p50": waits[int(0.5 * (len(waits) - 1))] if waits else 0.0,
+                    "wait_time_p99": waits[int(0.99 * (len(waits) - 1))] if waits else 0.0,
+                    "paused_time_total": m.paused_time_total,
+                    "limits": {"max_concurrency": self.classes[name].max_concurrency,
+                               "max_queue": self.classes[name].max_queue, "max_cost": self.classes[name].max_cost,
+                               "preemptible_cost": self.classes[name].preemptible_cost}}
+        return result
+
+    def _enqueue(self, priority: PriorityClass, cost: int) -> AdmissionTicket:
+        loop = asyncio.get_running_loop()
+        ticket = AdmissionTicket(priority=priority, cost=cost, loop=loop, granted=loop.create_future())
+        with self._lock:
+            metrics = self._metrics[priority.name]
+            if len(metrics.queue) >= priority.max_queue:
+                metrics.rejected += 1
+                raise AdmissionRejected(f"Queue of priority class '{priority.name}' is full")
+            metrics.queue.append(ticket)
+            self._dispatch()
+        return ticket
+
+    def _execute(self, ticket: AdmissionTicket, fnc: Callable[..., T], *args) -> T:
+        token = _current_ticket.set((self, ticket))
+        try:
+            return fnc(*args)
+        finally:
+            _current_ticket.reset(token)
+
+    def _release(self, ticket: AdmissionTicket):
+        with self._lock:
+            metrics = self._metrics[ticket.priority.name]
+            metrics.active -= 1
+            metrics.active_cost -= ticket.cost
+            self._dispatch()
+            self._resumed.notify_all()
+
+    def _cancel(self, ticket: AdmissionTicket):
+        with self._lock:
+            metrics = self._metrics[ticket.priority.name]
+            if ticket in metrics.queue:
+                metrics.queue.remove(ticket)
+            else:
+                # admitted, but the request was cancelled before running
+                metrics.active -= 1
+                metrics.active_cost -= ticket.cost
+            self._dispatch()
+            self._resumed.notify_all()
+
+    def _higher_busy(self, priority: PriorityClass) -> bool:
+        return any(len(m.queue) > 0 or m.active - m.paused > 0 for c, m in self._metrics.items() if
+                   self.classes[c].rank < priority.rank)
+
+    def _admissible(self, priority: PriorityClass, ticket: AdmissionTicket) -> bool:
+        metrics = self._metrics[priority.name]
+        if metrics.active >= priority.max_concurrency:
+            return False
+        return metrics.active == 0 or metrics.active_cost + ticket.cost <= priority.max_cost
+
+    def _dispatch(self):
+        # called with the lock held, admits the heads of the queues in the order of the priority classes
+        for name, priority in self.classes.items():
+            metrics = self._metrics[name]
+            while metrics.queue and self._admissible(priority, metrics.queue[0]):
+                ticket = metrics.queue.popleft()
+                wait = time.monotonic() - ticket.enqueued
+                metrics.active += 1
+                metrics.active_cost += ticket.cost
+                metrics.admitted += 1
+                metrics.wait_time_total += wait
+                metrics.wait_time_max = max(metrics.wait_time_max, wait)
+                metrics.wait_times.append(wait)
+                ticket.loop.call_soon_threadsafe(_grant, ticket.granted)
+            if metrics.queue:
+                # lower classes wait until all requests of this class are admitted
+                return
+
+
+def _grant(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+_current_ticket: contextvars.ContextVar[Optional[tuple[AdmissionController, AdmissionTicket]]] = \
+    contextvars.ContextVar("admission_ticket", default=None)
+
+
+def admission_checkpoint():
+    current = _current_ticket.get()
+    if current is not None:
+        current[0].checkpoint(current[1])
+
+
+def preemptible(items: Iterable[T]) -> Iterator[T]:
+    """
+    Iterates over the items and passes a checkpoint of the admission control every checkpoint_interval items
+    """
+    current = _current_ticket.get()
+    if current is None:
+        yield from items
+        return
+
+    controller, ticket = current
+    for i, item in enumerate(items):
+        if i % controller.checkpoint_interval == 0 and i > 0:
+            controller.checkpoint(ticket)
+        yield item
+
+
+admission = AdmissionController(default_priority_classes(),
+                                int(os.environ.get(ADMISSION_CHECKPOINT_ENV, DEFAULT_ADMISSION_CHECKPOINT)))
@@ -0,0 +1,75 @@
+import dataclasses
+from collections.abc import Callable, Coroutine
+from typing import Any
+
+import msgpack
+from fastapi import HTTPException, Request, Response
+from fastapi.routing import APIRoute
+
+# content types of MessagePack bodies, the first one is used for responses
+MSGPACK_MEDIA_TYPES: tuple[str, ...] = ("application/msgpack", "application/x-msgpack")
+
+
+def is_msgpack(content_type: str) -> bool:
+    return content_type.split(";")[0].strip().lower() in MSGPACK_MEDIA_TYPES
+
+
+def accepts_msgpack(request: Request) -> bool:
+    return any(is_msgpack(t) for t in request.headers.get("accept", "").split(","))
+
+
+def _encode_dataclass(obj):
+    # pydantic dataclasses of the output, the fields are packed recursively without intermediate copies
+    if dataclasses.is_dataclass(obj):
+        return {f.name: getattr(obj, f.name) for f in dataclasses.fields(obj)}
+    raise TypeError(f"Cannot serialize object of type {type(obj).__name__}")
+
+
+class MsgPackResponse(Response):
+    """
+    Packs the output dataclasses directly, same structure as the json response of the response_model
+    """
+    media_type = MSGPACK_MEDIA_TYPES[0]
+
+    def render(self, content: Any) -> bytes:
+        return msgpack.packb(content, default=_encode_dataclass)
+
+
+class MsgPackRoute(APIRoute):
+    """
+    Accepts MessagePack request bodies. The body is unpacked and handed to the usual validation of fastapi as if it was
+    parsed json, hence the endpoints do not differ between both transports.
+    """
+
+    def get_route_handler(self) -> Callable[[Request], Coroutine[Any, Any, Response]]:
+        handler = super().get_route_handler()
+
+        async def route_handler(request: Request) -> Response:
+            if not is_msgpack(request.headers.get("content-type", "")):
+                return await handler(request)
+
+            body = await request.body()
+            try:
+                content = msgpack.unpackb(body, raw=False)
+            except (ValueError, msgpack.ExtraData, msgpack.FormatError, msgpack.StackError) as e:
+                raise HTTPException(status_code=400, detail=f"There was an error parsing the msgpack body: {e}")
+
+            # fastapi only looks at json bodies, the parsed content is provided in its place
+            scope = dict(request.scope)
+            scope["headers"] = [(k, v) for k, v in request.scope["headers"] if k != b"content-type"] + [
+                (b"content-type", b"application/json")]
+            unpacked = Request(scope, request.receive)
+            unpacked._body = body
+            unpacked._json = content
+            return await handler(unpacked)
+
+        return route_handler
+
+
+def output_response(request: Request, output: Any):
+    """
+    Returns the output as MessagePack, if the client accepts it. Otherwise, fastapi serializes the output as json.
+    """
+    if accepts_msgpack(request):
+        return MsgPackResponse(output)
+    return output
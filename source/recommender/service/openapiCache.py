@@ -0,0 +1,107 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Any, Optional
+
+import fastapi
+import pydantic
+from fastapi import FastAPI, Request, Response
+from fastapi.routing import APIRoute
+from starlette.concurrency import run_in_threadpool
+from starlette.routing import Route
+
+from recommender.importer.artifact import get_artifact_dir
+
+
+def schema_key(app: FastAPI, definition_hash: str) -> str:
+    """
+    Identifies the schema: the startup type definition, the versions of the libraries generating it and the interface
+    of the app, e.g. a changed endpoint or description invalidates a stored schema
+    """
+    routes = sorted(f"{','.join(sorted(r.methods or []))} {r.path} {r.name} {r.description}" for r in app.routes if
+                    isinstance(r, APIRoute))
+    content = json.dumps([definition_hash, fastapi.__version__, pydantic.VERSION, app.title, app.version,
+                          app.description, routes])
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+class OpenAPICache:
+    """
+    OpenAPI schema of an app generated once per type definition. Generating the schema of the large unions of the
+    generated input types takes a noticeable time, which fastapi spends on the event loop of the first schema request.
+    The schema is stored as json in the type artifact directory, hence it is generated by the build step (see
+    recommenderTypeArtifact.py) or by the first worker, and loaded from disk by all others. Requests are served from the
+    serialized schema in memory.
+    """
+
+    def __init__(self, app: FastAPI, definition_hash: str, directory: Optional[str] = None):
+        self.app = app
+        self.definition_hash = definition_hash
+        self.directory = directory
+        self._generate = app.openapi
+        self._body: Optional[bytes] = None
+        self._lock = threading.Lock()
+        self.source: Optional[str] = None
+
+    @property
+    def path(self) -> str:
+        return os.path.join(get_artifact_dir(self.directory),
+                            f"openapi.{schema_key(self.app, self.definition_hash)[:16]}.json")
+
+    def body(self) -> bytes:
+        if self._body is None:
+            with self._lock:
+                if self._body is None:
+                    self._body = self._load() or self._build()
+        return self._body
+
+    def schema(self) -> dict[str, Any]:
+        if self.app.openapi_schema is None:
+            self.app.openapi_schema = json.loads(self.body())
+        return self.app.openapi_schema
+
+    def warm_up(self) -> threading.Thread:
+        # loads or generates the schema in the background, e.g. at startup
+        thread = threading.Thread(target=self.body, daemon=True)
+        thread.start()
+        return thread
+
+    async def endpoint(self, request: Request) -> Response:
+        body = self._body if self._body is not None else await run_in_threadpool(self.body)
+        return Response(body, media_type="application/json")
+
+    def _load(self) -> Optional[bytes]:
+        try:
+            with open(self.path, "rb") as fd:
+                body = fd.read()
+            json.loads(body)
+        except (OSError, ValueError):
+            return None
+        self.source = "file"
+        return body
+
+    def _build(self) -> bytes:
+        body = json.dumps(self._generate()).encode()
+        self.source = "generated"
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            # concurrently starting workers never read a partial schema
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as fd:
+                fd.write(body)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Could not store the OpenAPI schema in {self.path}: {e}", flush=True)
+        return body
+
+
+def install_openapi_cache(app: FastAPI, definition_hash: str, directory: Optional[str] = None) -> OpenAPICache:
+    """
+    Serves the schema of the app from an OpenAPICache, replaces the route of fastapi and app.openapi
+    """
+    cache = OpenAPICache(app, definition_hash, directory)
+    app.router.routes = [r for r in app.router.routes if not (isinstance(r, Route) and r.path == app.openapi_url)]
+    app.add_route(app.openapi_url, cache.endpoint, include_in_schema=False)
+    app.openapi = cache.schema
+    return cache
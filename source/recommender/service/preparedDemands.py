@@ -0,0 +1,97 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from recommender.typedefs.records import InputRecord
+
+# lifetime in seconds since the last use and maximal number of prepared demands kept per worker
+PREPARED_DEMAND_TTL_ENV: str = "RECOMMENDER_PREPARED_DEMAND_TTL"
+PREPARED_DEMAND_MAX_ENV: str = "RECOMMENDER_PREPARED_DEMAND_MAX"
+DEFAULT_PREPARED_DEMAND_TTL: float = 3600.0
+DEFAULT_PREPARED_DEMAND_MAX: int = 10000
+
+
+@dataclass
+class PreparedDemand:
+    demand_id: str
+    production_method: str
+    # validated values as registered, such that the demand can be prepared again after the type definition changed
+    parameters: dict[str, Any]
+    preferences: dict[str, Any]
+    # type definition version the demand is validated with
+    version: str
+    # DemandInformation of this version
+    demand: Any
+    expires: float
+    # record of the demand, compiled by the first recommendation using it
+    record: Optional[InputRecord] = None
+
+
+def demand_id(production_method: str, parameters: dict[str, Any], preferences: dict[str, Any]) -> str:
+    # derived from the content, registering the same demand again returns the same id
+    content = json.dumps([production_method, parameters, preferences], sort_keys=True, default=str)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()[:32]
+
+
+class PreparedDemandStore:
+    """
+    Demands which are ranked repeatedly against changing suppliers, e.g. regional or approved-vendor lists. The demand is
+    validated and compiled once, recommendations reference it by its demand_id. The demands are kept in the memory of
+    the worker they were registered with, each use extends their lifetime.
+    """
+    ttl: float = float(os.environ.get(PREPARED_DEMAND_TTL_ENV, DEFAULT_PREPARED_DEMAND_TTL))
+    max_demands: int = int(os.environ.get(PREPARED_DEMAND_MAX_ENV, DEFAULT_PREPARED_DEMAND_MAX))
+
+    _demands: "OrderedDict[str, PreparedDemand]" = OrderedDict()
+    _lock = threading.Lock()
+
+    @classmethod
+    def put(cls, production_method: str, parameters: dict[str, Any], preferences: dict[str, Any], demand: Any,
+            version: str) -> PreparedDemand:
+        prepared = PreparedDemand(demand_id=demand_id(production_method, parameters, preferences),
+                                  production_method=production_method, parameters=parameters,
+                                  preferences=preferences, version=version, demand=demand,
+                                  expires=time.monotonic() + cls.ttl)
+        with cls._lock:
+            cls._expire(time.monotonic())
+            cls._demands[prepared.demand_id] = prepared
+            cls._demands.move_to_end(prepared.demand_id)
+            # least recently used demands are dropped first
+            while len(cls._demands) > cls.max_demands:
+                cls._demands.popitem(last=False)
+        return prepared
+
+    @classmethod
+    def get(cls, demand_id: str) -> Optional[PreparedDemand]:
+        now = time.monotonic()
+        with cls._lock:
+            cls._expire(now)
+            prepared = cls._demands.get(demand_id)
+            if prepared is not None:
+                prepared.expires = now + cls.ttl
+                cls._demands.move_to_end(demand_id)
+            return prepared
+
+    @classmethod
+    def delete(cls, demand_id: str) -> bool:
+        with cls._lock:
+            return cls._demands.pop(demand_id, None) is not None
+
+    @classmethod
+    def clear(cls):
+        with cls._lock:
+            cls._demands.clear()
+
+    @classmethod
+    def _expire(cls, now: float):
+        # ordered by their last use, which is the order of their expiry
+        while cls._demands:
+            oldest = next(iter(cls._demands.values()))
+            if oldest.expires > now:
+                break
+            cls._demands.popitem(last=False)
@@ -0,0 +1,124 @@
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+from recommender.recommenderFunctionality import CompiledComponent, ComponentRanking, record_bytes
+
+# lifetime in seconds and maximal number of contexts kept per worker
+RANKING_CONTEXT_TTL_ENV: str = "RECOMMENDER_RANKING_CONTEXT_TTL"
+RANKING_CONTEXT_MAX_ENV: str = "RECOMMENDER_RANKING_CONTEXT_MAX"
+DEFAULT_RANKING_CONTEXT_TTL: float = 300.0
+DEFAULT_RANKING_CONTEXT_MAX: int = 1000
+# approximate memory in bytes the contexts of a worker may occupy, see context_bytes
+RANKING_CONTEXT_MAX_BYTES_ENV: str = "RECOMMENDER_RANKING_CONTEXT_MAX_BYTES"
+DEFAULT_RANKING_CONTEXT_MAX_BYTES: int = 256 * 1024 * 1024
+
+# separates the context id and the offset of a cursor, not part of the alphabet of the context ids
+CURSOR_SEPARATOR: str = "."
+
+
+@dataclass
+class RankingContext:
+    context_id: str
+    components: list[CompiledComponent]
+    expires: float
+    # sorted scores of a paged recommendation
+    rankings: Optional[list[ComponentRanking]] = None
+    page_size: Optional[int] = None
+    diagnostics: bool = True
+    # estimated memory, see context_bytes
+    size: int = 0
+
+
+def context_bytes(components: list[CompiledComponent], rankings: Optional[list[ComponentRanking]]) -> int:
+    """
+    Estimated memory of a context. The catalog rows are decoded again by the explanation, a context only references the
+    catalog generation the ranking was computed with, which stays attached until the context expires.
+    """
+    size = sum(record_bytes(c.demand) + c.suppliers.nbytes() for c in components)
+    for r in rankings or []:
+        size += r.indices.itemsize * len(r.indices) + r.scores.itemsize * len(r.scores)
+    return size
+
+
+class RankingContextStore:
+    """
+    Compiled demands and suppliers of recent recommendations, such that the failures of single suppliers can be
+    explained without sending the whole request again. The contexts are kept in the memory of the worker which
+    computed the ranking. For paged recommendations, the sorted ranking is kept as well and further pages are
+    served from it. The oldest contexts are dropped once there are more than max_contexts or their estimated memory
+    exceeds max_bytes.
+    """
+    ttl: float = float(os.environ.get(RANKING_CONTEXT_TTL_ENV, DEFAULT_RANKING_CONTEXT_TTL))
+    max_contexts: int = int(os.environ.get(RANKING_CONTEXT_MAX_ENV, DEFAULT_RANKING_CONTEXT_MAX))
+    max_bytes: int = int(os.environ.get(RANKING_CONTEXT_MAX_BYTES_ENV, DEFAULT_RANKING_CONTEXT_MAX_BYTES))
+
+    _contexts: "OrderedDict[str, RankingContext]" = OrderedDict()
+    _bytes: int = 0
+    _lock = threading.Lock()
+
+    @classmethod
+    def put(cls, components: list[CompiledComponent], rankings: Optional[list[ComponentRanking]] = None,
+            page_size: Optional[int] = None, diagnostics: bool = True) -> str:
+        context_id = secrets.token_urlsafe(16)
+        now = time.monotonic()
+        context = RankingContext(context_id=context_id, components=components, expires=now + cls.ttl,
+                                 rankings=rankings, page_size=page_size, diagnostics=diagnostics,
+                                 size=context_bytes(components, rankings))
+        with cls._lock:
+            cls._expire(now)
+            cls._contexts[context_id] = context
+            cls._bytes += context.size
+            # oldest contexts are dropped first, a single context exceeding max_bytes is not kept either
+            while len(cls._contexts) > cls.max_contexts or (cls._bytes > cls.max_bytes and cls._contexts):
+                cls._pop_oldest()
+        return context_id
+
+    @classmethod
+    def get(cls, context_id: str) -> Optional[RankingContext]:
+        with cls._lock:
+            cls._expire(time.monotonic())
+            return cls._contexts.get(context_id)
+
+    @classmethod
+    def clear(cls):
+        with cls._lock:
+            cls._contexts.clear()
+            cls._bytes = 0
+
+    @classmethod
+    def nbytes(cls) -> int:
+        with cls._lock:
+            return cls._bytes
+
+    @classmethod
+    def _expire(cls, now: float):
+        # contexts are inserted in the order of their expiry
+        while cls._contexts:
+            oldest = next(iter(cls._contexts.values()))
+            if oldest.expires > now:
+                break
+            cls._pop_oldest()
+
+    @classmethod
+    def _pop_oldest(cls):
+        _, context = cls._contexts.popitem(last=False)
+        cls._bytes -= context.size
+
+
+def encode_cursor(context_id: str, offset: int) -> str:
+    return f"{context_id}{CURSOR_SEPARATOR}{offset}"
+
+
+def decode_cursor(cursor: str) -> Optional[tuple[str, int]]:
+    """
+    :return: context id and offset of the next page, None if the cursor is malformed
+    """
+    context_id, _, offset = cursor.rpartition(CURSOR_SEPARATOR)
+    if not context_id or not offset.isdigit():
+        return None
+    return context_id, int(offset)
@@ -0,0 +1,107 @@
+import asyncio
+import functools
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from typing import Any, Optional
+
+# lifetime in seconds and maximal number of cached responses per worker, a ttl of 0 disables the cache (requests are
+# still coalesced)
+RESPONSE_CACHE_TTL_ENV: str = "RECOMMENDER_RESPONSE_CACHE_TTL"
+RESPONSE_CACHE_MAX_ENV: str = "RECOMMENDER_RESPONSE_CACHE_MAX"
+DEFAULT_RESPONSE_CACHE_TTL: float = 5.0
+DEFAULT_RESPONSE_CACHE_MAX: int = 256
+
+
+def request_key(body: Any, *versions: Any) -> str:
+    """
+    Hash of the canonical form of a request body (sorted keys, no whitespace) together with everything else the result
+    depends on, e.g. the version of the type definition
+    """
+    canonical = json.dumps([body, versions], sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.blake2b(canonical.encode(), digest_size=16).hexdigest()
+
+
+def etag(key: str, variant: str = "") -> str:
+    # the variant distinguishes the representations of the same result, e.g. json and msgpack
+    return f'"{key}{variant}"'
+
+
+def etag_matches(if_none_match: Optional[str], tag: str) -> bool:
+    if if_none_match is None:
+        return False
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return "*" in tags or tag in tags or f"W/{tag}" in tags
+
+
+class ResponseCoalescer:
+    """
+    Single-flight execution of identical requests: concurrent requests with the same key share one computation and
+    the result is kept for a short time to serve repeats, e.g. retries or several dashboards showing the same ranking.
+    The cached results are shared between the requests and must not be modified.
+    """
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[str, tuple[float, Any]]" = OrderedDict()
+        self._in_flight: dict[tuple[str, Any], asyncio.Future] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.coalesced = 0
+        self.misses = 0
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[Any]],
+                             valid: Optional[Callable[[Any], bool]] = None, flight: Any = None) -> Any:
+        """
+        :param valid: checks whether a cached result can still be used, e.g. whether referenced state still exists
+        :param flight: distinguishes the shared computations of the same key, e.g. the priority class, such that an
+                       interactive request never waits for a preempted batch computation. The results are shared.
+        """
+        now = time.monotonic()
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None and cached[0] > now and (valid is None or valid(cached[1])):
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return cached[1]
+            task = self._in_flight.get((key, flight))
+            if task is None:
+                self.misses += 1
+                task = asyncio.ensure_future(compute())
+                self._in_flight[(key, flight)] = task
+                task.add_done_callback(functools.partial(self._completed, key, flight))
+            else:
+                self.coalesced += 1
+
+        # the computation is shared, a cancelled request does not cancel it for the others
+        return await asyncio.shield(task)
+
+    def _completed(self, key: str, flight: Any, task: asyncio.Future):
+        with self._lock:
+            self._in_flight.pop((key, flight), None)
+            # failed computations are not cached, retrieving the exception avoids the warning if nobody awaits it
+            if task.cancelled() or task.exception() is not None or self.ttl <= 0:
+                return
+            self._cache[key] = (time.monotonic() + self.ttl, task.result())
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def metrics(self) -> dict[str, Any]:
+        with self._lock:
+            return {"hits": self.hits, "coalesced": self.coalesced, "misses": self.misses,
+                    "cached": len(self._cache), "in_flight": len(self._in_flight), "ttl": self.ttl,
+                    "max_entries": self.max_entries}
+
+
+response_cache = ResponseCoalescer(float(os.environ.get(RESPONSE_CACHE_TTL_ENV, DEFAULT_RESPONSE_CACHE_TTL)),
+                                   int(os.environ.get(RESPONSE_CACHE_MAX_ENV, DEFAULT_RESPONSE_CACHE_MAX)))
@@ -0,0 +1,194 @@
+import argparse
+import asyncio
+import heapq
+import os
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import Any, Optional
+
+import msgpack
+from starlette.concurrency import run_in_threadpool
+
+from recommender.catalog.catalogTenants import current_tenant, TENANT_HEADER
+from recommender.service.admission import PRIORITY_HEADER
+from recommender.service.msgpackTransport import MSGPACK_MEDIA_TYPES
+from recommender.typedefs.io_types import Output, ComponentScore, ShardOutput
+from recommender.typedefs.type_definition import current_type_definition
+
+# base urls of the shards, e.g. http://10.0.0.1:8050,http://10.0.0.2:8050, the instance is a coordinator if set
+SHARDS_ENV: str = "RECOMMENDER_SHARDS"
+# time in seconds a shard may take to answer, shorter if the request has a deadline
+SHARD_TIMEOUT_ENV: str = "RECOMMENDER_SHARD_TIMEOUT"
+DEFAULT_SHARD_TIMEOUT: float = 30.0
+
+SHARD_PATH: str = "/shard/recommend/"
+
+# posts the packed shard request to the base url of a shard and returns the packed response
+ShardTransport = Callable[[str, bytes, dict[str, str], float], bytes]
+
+
+class ShardError(RuntimeError):
+    pass
+
+
+def http_transport(url: str, body: bytes, headers: dict[str, str], timeout: float) -> bytes:
+    request = urllib.request.Request(url.rstrip("/") + SHARD_PATH, data=body, headers=headers, method="POST")
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.read()
+    except urllib.error.HTTPError as e:
+        raise ShardError(f"Shard {url} answered with status {e.code}: {e.read()[:200]!r}") from e
+    except (urllib.error.URLError, OSError) as e:
+        raise ShardError(f"Shard {url} is not reachable: {e}") from e
+
+
+@dataclass
+class ShardMetrics:
+    requests: int = 0
+    failures: int = 0
+    latency_total: float = 0.0
+    latency_max: float = 0.0
+    last_error: Optional[str] = None
+
+
+class ShardCoordinator:
+    """
+    Scatter-gather over several recommender instances. The suppliers of each component are partitioned round robin,
+    each shard returns the ranking of its suppliers (its top_k, if given) together with the position of each supplier
+    in the request, and the rankings are merged by score and position, which is the order of a single instance. Shards
+    which fail or exceed the timeout are left out, the affected components are flagged as not complete.
+    """
+
+    def __init__(self, shards: list[str], timeout: float = DEFAULT_SHARD_TIMEOUT,
+                 transport: ShardTransport = http_transport):
+        if len(shards) == 0:
+            raise ValueError("A coordinator requires at least one shard")
+        self.shards = shards
+        self.timeout = timeout
+        self.transport = transport
+        self._metrics: dict[str, ShardMetrics] = {s: ShardMetrics() for s in shards}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def from_environment() -> Optional["ShardCoordinator"]:
+        shards = [s.strip() for s in os.environ.get(SHARDS_ENV, "").split(",") if s.strip()]
+        if not shards:
+            return None
+        return ShardCoordinator(shards, float(os.environ.get(SHARD_TIMEOUT_ENV, DEFAULT_SHARD_TIMEOUT)))
+
+    def shard_requests(self, payload: dict) -> list[dict]:
+        """
+        Partitions the suppliers given in the request, the catalog rows are partitioned by the shards themselves
+        """
+        n = len(self.shards)
+        supplier_counts = [len(c.get("suppliers") or []) for c in payload["components"]]
+        requests = []
+        for shard in range(n):
+            components = [dict(c, suppliers=(c.get("suppliers") or [])[shard::n]) for c in payload["components"]]
+            requests.append({"input": dict(payload, components=components), "shard": shard, "shards": n,
+                             "suppliers": supplier_counts})
+        return requests
+
+    async def recommend(self, payload: dict, priority: Optional[str] = None,
+                        deadline: Optional[float] = None) -> Output:
+        timeout = self.timeout if deadline is None else min(self.timeout, max(deadline - time.monotonic(), 0.0))
+        headers = {"content-type": MSGPACK_MEDIA_TYPES[0], "accept": MSGPACK_MEDIA_TYPES[0]}
+        if priority is not None:
+            headers[PRIORITY_HEADER] = priority
+        # the shards resolve the catalogs of the same tenant
+        if current_tenant() is not None:
+            headers[TENANT_HEADER] = current_tenant()
+
+        # the shards have to use the type definition this request is validated with
+        version = current_type_definition().version
+        results = await asyncio.gather(*[
+            run_in_threadpool(self._call, url, msgpack.packb(body), headers, timeout, version)
+            for url, body in zip(self.shards, self.shard_requests(payload))], return_exceptions=True)
+        answered = [r for r in results if isinstance(r, ShardOutput)]
+        if len(answered) == 0:
+            raise ShardError(f"None of the {len(self.shards)} shards answered, e.g. {results[0]}")
+        return self.merge([c["name"] for c in payload["components"]], answered,
+                          complete=len(answered) == len(results), top_k=payload.get("top_k"),
+                          evaluated=deadline is not None or len(answered) < len(results))
+
+    def _call(self, url: str, body: bytes, headers: dict[str, str], timeout: float, version: str) -> ShardOutput:
+        start = time.monotonic()
+        error = None
+        try:
+            content = msgpack.unpackb(self.transport(url, body, headers, timeout), raw=False)
+            output = ShardOutput(**content)
+            if output.version != version:
+                raise ShardError(f"Shard {url} uses type definition {output.version}, expected {version}")
+            return output
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            self._record(url, time.monotonic() - start, error)
+
+    @staticmethod
+    def merge(names: list[str], results: list[ShardOutput], complete: bool = True, top_k: Optional[int] = None,
+              evaluated: bool = False) -> Output:
+        """
+        Merges the rankings of the shards, ties are broken by the position of the suppliers like on a single instance
+        """
+        output = Output()
+        for i, name in enumerate(names):
+            parts = [r.components[i] for r in results]
+            ranked = heapq.merge(*[zip(p.indices, p.scores) for p in parts], key=lambda x: (-x[1].score, x[0]))
+            scores = [score for _, score in ranked]
+            kept = scores[:top_k]
+            output.components.append(ComponentScore(
+                name=name, scores=kept, pruned=sum(p.pruned for p in parts) + len(scores) - len(kept),
+                complete=complete, evaluated=sum(p.evaluated for p in parts) if evaluated else None))
+        return output
+
+    def _record(self, url: str, latency: float, error: Optional[str]):
+        with self._lock:
+            metrics = self._metrics[url]
+            metrics.requests += 1
+            metrics.latency_total += latency
+            metrics.latency_max = max(metrics.latency_max, latency)
+            if error is not None:
+                metrics.failures += 1
+                metrics.last_error = error
+
+    def metrics(self) -> dict[str, dict[str, Any]]:
+        with self._lock:
+            return {url: {"requests": m.requests, "failures": m.failures,
+                          "latency_mean": m.latency_total / m.requests if m.requests else 0.0,
+                          "latency_max": m.latency_max, "last_error": m.last_error}
+                    for url, m in self._metrics.items()}
+
+
+def launch_local_shards(n: int, first_port: int) -> list[subprocess.Popen]:
+    """
+    Starts n recommender instances on consecutive ports of this host, e.g. to test a coordinator
+    """
+    env = {k: v for k, v in os.environ.items() if k != SHARDS_ENV}
+    return [subprocess.Popen([sys.executable, "-m", "uvicorn", "recommender.__main__:app", "--host", "127.0.0.1",
+                              "--port", str(first_port + i)], env=env) for i in range(n)]
+
+
+if __name__ == "__main__":
+    # RECOMMENDER_TYPE_DEFINITION=... python -m recommender.service.sharding --shards 4 --port 8051
+    parser = argparse.ArgumentParser(description="Starts local shards for a coordinator")
+    parser.add_argument("--shards", type=int, default=2)
+    parser.add_argument("--port", type=int, default=8051)
+    args = parser.parse_args()
+
+    processes = launch_local_shards(args.shards, args.port)
+    urls = ",".join(f"http://127.0.0.1:{args.port + i}" for i in range(args.shards))
+    print(f"Started {args.shards} shards, start the coordinator with {SHARDS_ENV}={urls}", flush=True)
+    try:
+        for p in processes:
+            p.wait()
+    except KeyboardInterrupt:
+        for p in processes:
+            p.terminate()
@@ -0,0 +1,117 @@
+import copy
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from collections.abc import Callable
+from typing import Any, Optional
+
+from recommender.typedefs.records import InputRecord
+
+# approximate memory in bytes the validated suppliers of a worker may occupy, 0 disables the cache
+SUPPLIER_CACHE_MAX_BYTES_ENV: str = "RECOMMENDER_SUPPLIER_CACHE_MAX_BYTES"
+DEFAULT_SUPPLIER_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+
+# estimated size of a validated supplier: the input type instances and the record values take roughly this much memory
+# in addition to a multiple of their json encoding
+ENTRY_BASE_SIZE: int = 1024
+ENTRY_SIZE_FACTOR: int = 4
+
+
+def supplier_key(version: str, production_method: str, parameters: Any, preferences: Any) -> tuple[str, int]:
+    """
+    Hash of the canonical form of the parameters and preferences of a supplier, the id is not part of it
+    :return: key and the length of the canonical form
+    """
+    canonical = json.dumps([version, production_method, parameters, preferences], sort_keys=True,
+                           separators=(",", ":"), default=str)
+    return hashlib.blake2b(canonical.encode(), digest_size=16).hexdigest(), len(canonical)
+
+
+class ValidatedSupplier:
+    """
+    Parameters and preferences of a supplier converted into the input types, shared by all requests sending the same
+    values. The input type instances are never modified: the recommendation only uses the compiled record, a request
+    accessing the values of its supplier receives copies (see SupplierInformation in recommender/typedefs/io_types.py).
+    """
+    __slots__ = ("parameters", "preferences", "size", "_record")
+
+    def __init__(self, parameters: Any, preferences: Any, size: int):
+        self.parameters = parameters
+        self.preferences = preferences
+        self.size = size
+        # record without id, compiled by the first recommendation
+        self._record: Optional[InputRecord] = None
+
+    def copies(self) -> tuple[Any, Any]:
+        # deep, the nested values (e.g. ranges and lists) may be modified by a request as well
+        return copy.deepcopy(self.parameters), copy.deepcopy(self.preferences)
+
+    def record(self, compile_record: Callable[[Any, Any], InputRecord]) -> InputRecord:
+        if self._record is None:
+            self._record = compile_record(self.parameters, self.preferences)
+        return self._record
+
+
+class SupplierCache:
+    """
+    Validated suppliers by the hash of their raw payload. Clients send mostly the same suppliers with each request, the
+    validation by the input types is skipped for those seen before. Least recently used suppliers are evicted once the
+    estimated memory exceeds max_bytes.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, ValidatedSupplier]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def get_or_validate(self, version: str, production_method: str, parameters: Any, preferences: Any,
+                        validate: Callable[[], tuple[Any, Any]]) -> ValidatedSupplier:
+        """
+        :param validate: converts the payload into the input types, raises on invalid payloads which are not cached
+        """
+        key, length = supplier_key(version, production_method, parameters, preferences)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        entry = ValidatedSupplier(*validate(), size=ENTRY_BASE_SIZE + ENTRY_SIZE_FACTOR * length)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous.size
+            self._entries[key] = entry
+            self._bytes += entry.size
+            while self._bytes > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.size
+                self.evictions += 1
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def metrics(self) -> dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses, "hit_ratio": self.hits / lookups if lookups else 0.0,
+                    "evictions": self.evictions, "entries": len(self._entries), "bytes": self._bytes,
+                    "max_bytes": self.max_bytes}
+
+
+supplier_cache = SupplierCache(int(os.environ.get(SUPPLIER_CACHE_MAX_BYTES_ENV, DEFAULT_SUPPLIER_CACHE_MAX_BYTES)))
@@ -1,82 +1,71 @@
 import os
-import sys
-from typing import Literal
-
-from recommender import RECOMMENDER_ROOT_DIR
-from recommender.importer.output import output_import_errors, has_errors
-from recommender.importer.preprocessor import preprocess_parsed_data
-from recommender.importer.processor import extract_global_data, generate_input_metadata_types
-from recommender.importer.reader import read_csv
-from recommender.importer.typedef import ImportErrors
-from recommender.importer.validator import validation_read_data
-from recommender.parameters.parameterGeneration import generate_demand_supplier_dataclass
-from recommender.parameters.parameterMetadata import ParameterMetadata
-from recommender.parameters.parameterTypeRegistry import ParameterTypeRegistry
-from recommender.preferences.preferenceGeneration import generate_preference_dataclass
-from recommender.preferences.preferenceMetadata import PreferenceMetadata
-from recommender.preferences.preferenceTypeRegistry import PreferenceTypeRegistry
-from recommender.typedefs.typedef import NO_CATEGORY
-
-
-def __generate() -> tuple[list[str], list[str], type, type]:
-    # 1. Read in csv file
-    sep = ";"
-    filename = os.environ['RECOMMENDER_TYPE_DEFINITION']
-    path = os.path.join(RECOMMENDER_ROOT_DIR, filename)
-    raw_data, parsing_errors = read_csv(path, sep)
-
-    # 2. Perform preprocessing
-    processed_data, processing_errors = preprocess_parsed_data(raw_data)
-
-    # 3. Validate processed data
-    invalid_names, validation_errors = validation_read_data(processed_data)
-
-    # 4. Error handling
-    errors: ImportErrors = {"parsing": parsing_errors, "processing": processing_errors, "validation": validation_errors}
-    if has_errors(errors):
-        error_table = output_import_errors(errors, invalid_names)
-        print("Fatal error in generating input types. The following error(s) occurred: \n" + error_table,
-              file=sys.stderr, flush=True)
-        raise RuntimeError(
-            f"An fatal error appeared during reading and processing of input fields of {filename}, the following fieldnames are invalid {invalid_names}. Stopping startup of recommender.")
-
-    # 5. Generate "categories" and "production_methods"
-    categories, production_methods = extract_global_data(processed_data)
-    categories.append(NO_CATEGORY)
-
-    # 6. Generate Metadataclass for parameters and preferences
-    parameter_metadata, preference_metadata = generate_input_metadata_types(data=processed_data,
-                                                                            production_methods=production_methods)
+from typing import Any, Literal
 
-    # 7. generate the preference input types for all production methods
-    preference_input_types = generate_preference_dataclass(preference_metadata, production_methods)
+import pydantic.schema
 
-    # 8. Register each preference input type in the type registry = dict: production_method => Type
-    for pm in production_methods:
-        t = preference_input_types[pm]
-        PreferenceTypeRegistry.register(pm, t)
-
-    # 9. generate the preference input types for all production methods
-    parameter_input_types_demand, parameter_input_types_supplier = generate_demand_supplier_dataclass(
-        parameter_metadata, production_methods=production_methods)
-
-    # 10. register each preference input type in the type registry = dict: production_method,'demand/supplier' => Type
-    for pm in production_methods:
-        ParameterTypeRegistry.register(pm, 'Demand', parameter_input_types_demand[pm])
-        ParameterTypeRegistry.register(pm, 'Supplier', parameter_input_types_supplier[pm])
-
-    return categories, production_methods, parameter_metadata, preference_metadata
-
-
-all_categories, all_production_methods, Parameters, Preferences = __generate()
+from recommender.parameters.parameterMetadata import ParameterMetadata
+from recommender.preferences.preferenceMetadata import PreferenceMetadata
+from recommender.typedefs.type_definition import generate_type_definition, TypeDefinitionRegistry
+
+# The module level types describe the type definition the worker was started with. They are used for the FastAPI
+# interface, the active (possibly reloaded) version is available via type_definition.current_type_definition().
+# The input types of a production method are generated on its first use, see LazyInputTypes.
+startup_type_definition = generate_type_definition(os.environ['RECOMMENDER_TYPE_DEFINITION'], lazy=True)
+TypeDefinitionRegistry.activate(startup_type_definition)
+
+# duration of each stage of the type generation in seconds, used to monitor the cold start of workers
+type_generation_timings: dict[str, float] = startup_type_definition.timings
+
+all_categories = startup_type_definition.categories
+all_production_methods = startup_type_definition.production_methods
+Parameters = startup_type_definition.parameters
+Preferences = startup_type_definition.preferences
+type_definition_hash = startup_type_definition.version
 ProductionMethods = Literal[tuple(all_production_methods)]
 
-# create union type for FastAPI interface
-InputPreferences = PreferenceTypeRegistry.get_input_type()
-
-# create union type for FastAPI interface
-InputParametersDemand = ParameterTypeRegistry.get_input_type('Demand')
-InputParametersSupplier = ParameterTypeRegistry.get_input_type('Supplier')
+# instances of the input types of any production method, the union is not created here, since it would generate the
+# types of all production methods. The schema of the FastAPI interface shows the union, see add_input_type_schemas.
+InputPreferences = Any
+InputParametersDemand = Any
+InputParametersSupplier = Any
+
+
+# key of the fields of the io types, which are typed Any (instances of a reloaded type definition are accepted) and
+# described by the union of the startup input types in the schema, see add_input_type_schemas
+INPUT_TYPES_SCHEMA_KEY: str = "input_types"
+
+
+def startup_input_types(kind: Literal['Demand', 'Supplier', 'Preferences']) -> list[type]:
+    if kind == 'Preferences':
+        return list(startup_type_definition.preference_input_types.values())
+    return list(startup_type_definition.parameter_input_types[kind].values())
+
+
+def add_input_type_schemas(openapi_schema: dict[str, Any]) -> dict[str, Any]:
+    """
+    Replaces the marked fields (Field(..., input_types=<kind>)) of the OpenAPI schema by the union of the startup input
+    types of the kind and adds the schemas of these types to the components
+    :param openapi_schema: Schema of the app, modified in place
+    :return: The completed schema
+    """
+    schemas: dict[str, Any] = openapi_schema.get("components", {}).get("schemas", {})
+    input_types: dict[str, type] = {}
+    for schema in list(schemas.values()):
+        for name, field_schema in schema.get("properties", {}).items():
+            kind = field_schema.pop(INPUT_TYPES_SCHEMA_KEY, None)
+            if kind is None:
+                continue
+            types = startup_input_types(kind)
+            input_types.update({t.__name__: t for t in types})
+            schema["properties"][name] = dict(title=field_schema.pop("title", None),
+                                              anyOf=[{"$ref": f"#/components/schemas/{t.__name__}"} for t in types],
+                                              **field_schema)
+    if input_types:
+        definitions = pydantic.schema.schema([t.__pydantic_model__ for t in input_types.values()],
+                                             ref_prefix="#/components/schemas/")["definitions"]
+        for name, definition in definitions.items():
+            schemas.setdefault(name, definition)
+    return openapi_schema
 
 
 def get_parameter_metadata(name: str, ParamMetadata: type = Parameters) -> ParameterMetadata:
@@ -1,82 +1,307 @@
-from typing import Union
+from dataclasses import asdict
+from typing import Any, Union, Optional
 
-from pydantic import Field, validator
+from pydantic import Field, conint
 from pydantic.dataclasses import dataclass
 
-from recommender.parameters.parameterTypeRegistry import ParameterTypeRegistry
-from recommender.preferences.preferenceTypeRegistry import PreferenceTypeRegistry
+from recommender.catalog.catalogSharedMemory import validate_catalog_name
+from recommender.catalog.catalogTenants import resolve_catalog_name
+from recommender.service.preparedDemands import PreparedDemandStore, PreparedDemand
+from recommender.service.supplierCache import supplier_cache, ValidatedSupplier
 from recommender.typedefs.generated_input_types import InputPreferences, InputParametersDemand, InputParametersSupplier, \
-    ProductionMethods, all_production_methods
+    all_production_methods, INPUT_TYPES_SCHEMA_KEY
+from recommender.typedefs.type_definition import current_type_definition
 from recommender.typedefs.typedef import ScoreErrors
 
 
+def validate_production_method(type: str) -> str:
+    # the production methods of the active type definition, a reload may add or remove production methods
+    production_methods = current_type_definition().production_methods
+    if type not in production_methods:
+        raise ValueError(f'type must be one of {production_methods}, got {type}')
+    return type
+
+
+# The input types are constructed from the pinned type definition and validated thereby. The fields are typed Any, such
+# that instances of a reloaded type definition are accepted, the schema shows the union of the startup input types (see
+# generated_input_types.add_input_type_schemas).
 @dataclass(init=False)
 class SupplierInformation:
     id: str = Field(description="Name/ID of the supplier")
-    parameters: InputParametersSupplier = Field(description="Parameters from the supplier")
-    preferences: InputPreferences = Field(description="Preferences from the supplier")
+    parameters: Any = Field(..., description="Parameters from the supplier", **{INPUT_TYPES_SCHEMA_KEY: "Supplier"})
+    preferences: Any = Field(..., description="Preferences from the supplier",
+                             **{INPUT_TYPES_SCHEMA_KEY: "Preferences"})
 
     def __init__(self, pm_type: str, id: str, parameters: Union[dict, InputParametersDemand],
                  preferences: Union[dict, InputPreferences]):
         self.id = id
-        par_inp_type_s = ParameterTypeRegistry.registry['Supplier'][pm_type]
-        pref_inp_type = PreferenceTypeRegistry.registry[pm_type]
-        self.parameters = par_inp_type_s(**parameters) if isinstance(parameters, dict) else parameters
-        self.preferences = pref_inp_type(**preferences) if isinstance(preferences, dict) else preferences
+        definition = current_type_definition()
+        par_inp_type_s = definition.parameter_input_types['Supplier'][pm_type]
+        pref_inp_type = definition.preference_input_types[pm_type]
+        # validated values shared with other requests sending the same supplier, see recommender/service/supplierCache.py
+        self.validated: Optional[ValidatedSupplier] = None
+        if isinstance(parameters, dict) and isinstance(preferences, dict) and supplier_cache.enabled:
+            self.validated = supplier_cache.get_or_validate(
+                definition.version, pm_type, parameters, preferences,
+                lambda: (par_inp_type_s(**parameters), pref_inp_type(**preferences)))
+            # not copied, see shared_supplier_input
+            self.__dict__["parameters"] = self.validated.parameters
+            self.__dict__["preferences"] = self.validated.preferences
+        else:
+            self.parameters = par_inp_type_s(**parameters) if isinstance(parameters, dict) else parameters
+            self.preferences = pref_inp_type(**preferences) if isinstance(preferences, dict) else preferences
+
+    def detach(self):
+        """
+        Replaces the values shared with the supplier cache by copies owned by this supplier
+        """
+        if self.validated is not None:
+            self.__dict__["parameters"], self.__dict__["preferences"] = self.validated.copies()
+            self.validated = None
+
+
+def shared_supplier_input(name: str) -> property:
+    """
+    The values of a cached supplier are shared with all requests sending the same supplier and are copied on the first
+    access only, which the recommendation never does: it uses the record compiled once per cached supplier (see
+    recommenderFunctionality.supplier_record). The values are kept in the instance dict, which pydantic validates.
+    """
+
+    def get(self: SupplierInformation) -> Any:
+        self.detach()
+        return self.__dict__[name]
+
+    def set(self: SupplierInformation, value: Any):
+        self.detach()
+        self.__dict__[name] = value
+
+    return property(get, set)
+
+
+SupplierInformation.parameters = shared_supplier_input("parameters")
+SupplierInformation.preferences = shared_supplier_input("preferences")
 
 
 @dataclass(init=False)
 class DemandInformation:
-    parameters: InputParametersDemand = Field(description="Parameters from the demand")
-    preferences: InputPreferences = Field(description="Preferences from the demand")
+    parameters: Any = Field(..., description="Parameters from the demand", **{INPUT_TYPES_SCHEMA_KEY: "Demand"})
+    preferences: Any = Field(..., description="Preferences from the demand",
+                             **{INPUT_TYPES_SCHEMA_KEY: "Preferences"})
 
     def __init__(self, pm_type: str, parameters: Union[dict, InputParametersDemand],
                  preferences: Union[dict, InputPreferences]):
-        par_inp_type_d = ParameterTypeRegistry.registry['Demand'][pm_type]
-        pref_inp_type = PreferenceTypeRegistry.registry[pm_type]
+        definition = current_type_definition()
+        par_inp_type_d = definition.parameter_input_types['Demand'][pm_type]
+        pref_inp_type = definition.preference_input_types[pm_type]
         self.parameters = par_inp_type_d(**parameters) if isinstance(parameters, dict) else parameters
         self.preferences = pref_inp_type(**preferences) if isinstance(preferences, dict) else preferences
 
 
+def prepare_demand(type: str, demand: DemandInformation) -> PreparedDemand:
+    """
+    Registers a validated demand, see recommender/service/preparedDemands.py
+    """
+    return PreparedDemandStore.put(type, asdict(demand.parameters), asdict(demand.preferences), demand,
+                                   current_type_definition().version)
+
+
+def resolve_prepared_demand(demand_id: str, type: Optional[str]) -> PreparedDemand:
+    prepared = PreparedDemandStore.get(demand_id)
+    if prepared is None:
+        raise ValueError(f"demand_id {demand_id} does not exist or expired")
+    if type is not None and type != prepared.production_method:
+        raise ValueError(f"demand {demand_id} was registered for production method {prepared.production_method}, "
+                         f"got {type}")
+    definition = current_type_definition()
+    if prepared.version != definition.version:
+        # the type definition changed since the registration, the demand is validated again with the active version
+        if prepared.production_method not in definition.production_methods:
+            raise ValueError(f"production method {prepared.production_method} of demand {demand_id} does not exist "
+                             f"anymore")
+        try:
+            demand = DemandInformation(prepared.production_method, prepared.parameters, prepared.preferences)
+        except TypeError as e:
+            raise ValueError(f"demand {demand_id} does not match the type definition anymore: {e}") from e
+        prepared = prepare_demand(prepared.production_method, demand)
+    return prepared
+
+
 @dataclass(init=False)
 class ComponentInformation:
     name: str = Field(description="Name of the component")
-    type: ProductionMethods = Field(description="Type of the production method")
-    suppliers: list[SupplierInformation] = Field(description="List of all appropriate supplier parameters")
-    demand: DemandInformation = Field(description="Demand information")
+    # validated against the active type definition, the enum of the schema lists the production methods at startup
+    type: Optional[str] = Field(None, description="Type of the production method, may be omitted if demand_id is "
+                                                  "given", enum=all_production_methods)
+    demand: Optional[DemandInformation] = Field(None, description="Demand information, either demand or demand_id "
+                                                                  "is required")
+    suppliers: list[SupplierInformation] = Field(default_factory=list,
+                                                 description="List of all appropriate supplier parameters")
+    catalog: Optional[str] = Field(None, description="Name of a published supplier catalog, whose suppliers are "
+                                                     "ranked in addition to the given suppliers")
+    demand_id: Optional[str] = Field(None, description="Id of a demand registered at /demands/ in place of the "
+                                                       "demand")
 
-    def __init__(self, name: str, type: ProductionMethods, suppliers: Union[list[dict], list[SupplierInformation]],
-                 demand: Union[dict, DemandInformation]):
+    def __init__(self, name: str, type: Optional[str] = None,
+                 demand: Union[dict, DemandInformation, None] = None,
+                 suppliers: Union[list[dict], list[SupplierInformation]] = None, catalog: Optional[str] = None,
+                 demand_id: Optional[str] = None):
         self.name = name
-        self.type = type
-        if type not in all_production_methods:
-            raise ValueError(f'type must be one of {all_production_methods}, got {type}')
+        # validated and compiled demand, if the component references a registered demand
+        self.prepared: Optional[PreparedDemand] = None
+        if (demand is None) == (demand_id is None):
+            raise ValueError("either demand or demand_id is required")
+        if demand_id is not None:
+            self.prepared = resolve_prepared_demand(demand_id, type)
+            type = self.prepared.production_method
+        self.type = validate_production_method(type)
+        self.demand_id = demand_id
 
         self.suppliers = [s if isinstance(s, SupplierInformation) else SupplierInformation(type, **s) for s in
-                          suppliers]
+                          (suppliers or [])]
+        if self.prepared is not None:
+            self.demand = self.prepared.demand
+        else:
+            self.demand = demand if isinstance(demand, DemandInformation) else DemandInformation(type, **demand)
+
+        self.catalog = catalog
+        if catalog is not None:
+            # the catalog of the tenant of the request, only the name is validated here without accessing the catalog,
+            # it is attached by the admitted request (see recommenderFunctionality.referenced_catalog)
+            self.catalog = resolve_catalog_name(catalog)
+            validate_catalog_name(self.catalog)
+
+
+@dataclass(init=False)
+class DemandRegistration:
+    type: str = Field(description="Type of the production method", enum=all_production_methods)
+    demand: DemandInformation = Field(description="Demand information")
+
+    def __init__(self, type: str, demand: Union[dict, DemandInformation]):
+        self.type = validate_production_method(type)
         self.demand = demand if isinstance(demand, DemandInformation) else DemandInformation(type, **demand)
 
 
+@dataclass
+class RegisteredDemand:
+    demand_id: str = Field(description="Id to reference the demand by demand_id in recommendations")
+    expires_in: float = Field(description="Seconds until the demand is dropped, unless it is used")
+
+
+@dataclass
+class CatalogUpsert:
+    suppliers: list[dict[str, Any]] = Field(description="Suppliers (see SupplierInformation) which are added to the "
+                                                        "catalog or replace the suppliers with the same id")
+
+
+@dataclass
+class CatalogSupplierPatch:
+    parameters: dict[str, Any] = Field(default_factory=dict, description="Changed parameters, None removes a value")
+    preferences: dict[str, Any] = Field(default_factory=dict, description="Changed preferences, None removes a value")
+
+
+@dataclass
+class CatalogUpdateResult:
+    generation: int = Field(description="Published generation of the catalog, which contains the update")
+    suppliers: int = Field(description="Number of suppliers of the catalog")
+    changed: int = Field(description="Number of rows upserted or deleted since the catalog was compacted")
+    compaction_scheduled: bool = Field(default=False, description="True, if the catalog is compacted in the "
+                                                                  "background")
+
+
 @dataclass
 class Score:
     supplier_id: str = Field(description="Name/ID of the supplier")
     score: float = Field(description="matching score, between 0 and 1")
-    failures: ScoreErrors = Field(description="Mapping of parameter to occurred errors")
-    scores_per_category: dict[str, float] = Field(description="score for each preference category")
+    failures: Optional[ScoreErrors] = Field(default=None, description="Mapping of parameter to occurred errors, only "
+                                                                      "provided with diagnostics")
+    scores_per_category: dict[str, float] = Field(default_factory=dict,
+                                                  description="score for each preference category")
 
 
 @dataclass
 class ComponentScore:
     name: str = Field(description="name of the component")
     scores: list[Score] = Field(description="score for each supplier for this component")
+    pruned: int = Field(default=0, description="Number of suppliers omitted, since they cannot reach min_score or "
+                                               "the top_k")
+    complete: bool = Field(default=True, description="False, if the deadline of the request expired or a shard failed "
+                                                     "before all suppliers were evaluated")
+    evaluated: Optional[int] = Field(default=None, description="Number of suppliers evaluated before the deadline, only "
+                                                               "set for requests with a deadline")
+    candidates: Optional[int] = Field(default=None, description="Number of catalog suppliers retrieved by the approximate "
+                                                                "search and scored exactly, only set for approximate "
+                                                                "requests")
 
 
 @dataclass
 class Input:
     components: list[ComponentInformation] = Field(description="List of all parameters from all components")
+    diagnostics: Optional[bool] = Field(default=None, description="Report the failures of each supplier (default). If "
+                                                                  "false, only the scores are computed, the failures "
+                                                                  "of single suppliers can be requested afterwards "
+                                                                  "from /explain/ using the context_id")
+    min_score: Optional[float] = Field(default=None, description="Only suppliers with at least this score are returned")
+    top_k: Optional[conint(ge=1)] = Field(default=None, description="Only the best top_k suppliers of each component "
+                                                                    "are returned")
+    page_size: Optional[conint(ge=1)] = Field(default=None, description="Only the first page_size suppliers of each "
+                                                                        "component are returned, further pages are "
+                                                                        "requested from /recommend/next/")
+    approximate: Optional[bool] = Field(default=None, description="Only the catalog suppliers with valid parameters and "
+                                                                  "the best preference scores on the preference "
+                                                                  "embedding are scored, see "
+                                                                  "RECOMMENDER_APPROXIMATE_CANDIDATES. Faster for huge "
+                                                                  "catalogs, but suppliers may be missing")
+    explainable: Optional[bool] = Field(default=None, description="Keep the ranking on the server for a limited time, "
+                                                                 "such that the failures of single suppliers can be "
+                                                                 "requested from /explain/ using the context_id. By "
+                                                                 "default only if diagnostics is false")
 
 
 @dataclass
 class Output:
     components: list[ComponentScore] = Field(default_factory=list,
                                              description="Scores for each component for each supplier")
+    context_id: Optional[str] = Field(default=None, description="Identifies the ranking on the server for a limited "
+                                                                "time, see /explain/")
+    next: Optional[str] = Field(default=None, description="Cursor of the next page of a paged recommendation, None if "
+                                                          "this is the last page")
+
+
+@dataclass
+class NextPageRequest:
+    next: str = Field(description="Cursor returned with the previous page")
+    page_size: Optional[conint(ge=1)] = Field(default=None, description="Size of the page, by default the page_size "
+                                                                        "of the recommendation")
+
+
+@dataclass
+class ExplainRequest:
+    context_id: str = Field(description="context_id of a previous recommendation")
+    supplier_ids: list[str] = Field(description="Suppliers whose failures are computed")
+    component: Optional[str] = Field(default=None, description="Name of the component, by default all components")
+
+
+@dataclass
+class ShardRequest:
+    input: Input = Field(description="Request with the suppliers of this shard only")
+    shard: conint(ge=0) = Field(description="Index of this shard")
+    shards: conint(ge=1) = Field(description="Number of shards")
+    suppliers: list[conint(ge=0)] = Field(description="Number of suppliers given per component in the request to the "
+                                                      "coordinator, the catalog rows follow these")
+
+
+@dataclass
+class ShardComponentScore:
+    name: str = Field(description="name of the component")
+    indices: list[int] = Field(description="Position of each scored supplier in the request to the coordinator, "
+                                           "followed by the catalog rows")
+    scores: list[Score] = Field(description="score for the best suppliers of this shard")
+    pruned: int = Field(default=0, description="Number of suppliers of this shard omitted, since they cannot reach "
+                                               "min_score or the top_k")
+    evaluated: int = Field(default=0, description="Number of suppliers of this shard")
+
+
+@dataclass
+class ShardOutput:
+    components: list[ShardComponentScore] = Field(default_factory=list, description="Ranking of each component")
+    version: str = Field(default="", description="Version of the type definition of the shard")
@@ -0,0 +1,45 @@
+import threading
+import time
+from collections.abc import Mapping
+from typing import Callable, Iterator
+
+
+class LazyInputTypes(Mapping):
+    """
+    Input types by production method, each generated on its first use. Creating the pydantic dataclasses takes most of
+    the startup of a worker, a worker only generates the types of the production methods it is asked for. Iterating
+    over the values generates all of them, e.g. for the OpenAPI schema.
+    """
+
+    def __init__(self, factories: dict[str, Callable[[], type]]):
+        self._factories = factories
+        self._types: dict[str, type] = {}
+        self._lock = threading.Lock()
+        # seconds spent generating each type
+        self.timings: dict[str, float] = {}
+
+    def __getitem__(self, production_method: str) -> type:
+        input_type = self._types.get(production_method)
+        if input_type is not None:
+            return input_type
+        factory = self._factories[production_method]
+        with self._lock:
+            input_type = self._types.get(production_method)
+            if input_type is None:
+                start = time.perf_counter()
+                input_type = self._types[production_method] = factory()
+                self.timings[production_method] = time.perf_counter() - start
+        return input_type
+
+    def __contains__(self, production_method) -> bool:
+        # without generating the type
+        return production_method in self._factories
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._factories)
+
+    def __len__(self) -> int:
+        return len(self._factories)
+
+    def generated(self) -> list[str]:
+        return list(self._types)
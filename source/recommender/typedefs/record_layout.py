@@ -0,0 +1,117 @@
+import threading
+from collections.abc import Callable
+from dataclasses import fields
+from typing import Any, Optional
+
+from recommender.parameters.parameterMetadata import ParameterMetadata
+from recommender.preferences.preferenceComparison import get_distance_function
+from recommender.preferences.preferenceMetadata import PreferenceMetadata
+from recommender.preferences.preferenceTypes import CustomType, ZonePreference
+from recommender.typedefs.records import InputRecord, to_record_value
+from recommender.typedefs.type_definition import TypeDefinition, TypeDefinitionRegistry
+
+
+class RecordLayout:
+    """
+    Field order and metadata of the records of a single production method. Everything which only depends on the type
+    definition is resolved once, the scoring loop only iterates over these tuples.
+    """
+
+    def __init__(self, definition: TypeDefinition, production_method: str):
+        self.version = definition.version
+        self.production_method = production_method
+        self.categories: list[str] = definition.categories
+
+        demand_type = definition.parameter_input_types['Demand'][production_method]
+        supplier_type = definition.parameter_input_types['Supplier'][production_method]
+        self.parameter_names: tuple[str, ...] = tuple(f.name for f in fields(demand_type))
+        if self.parameter_names != tuple(f.name for f in fields(supplier_type)):
+            raise RuntimeError(f"Parameters of demand datastructure {demand_type.__name__} "
+                               f"and supplier {supplier_type.__name__} do not match.")
+
+        parameter_metadata = definition.parameters()
+        if not all(hasattr(parameter_metadata, p) for p in self.parameter_names):
+            raise RuntimeError(f"Parameters of demand/supplier datastructure {demand_type.__name__} "
+                               f"and metadata_class {type(parameter_metadata).__name__} do not match.")
+        self.parameter_metadata: tuple[ParameterMetadata, ...] = tuple(
+            getattr(parameter_metadata, p) for p in self.parameter_names)
+        self.parameter_applicable: tuple[bool, ...] = tuple(
+            production_method in m.production_method for m in self.parameter_metadata)
+
+        preference_type = definition.preference_input_types[production_method]
+        self.preference_names: tuple[str, ...] = tuple(f.name for f in fields(preference_type))
+        preference_metadata = definition.preferences()
+        if not all(p in preference_metadata.keys() for p in self.preference_names):
+            raise RuntimeError(f"Preferences of demand/supplier datastructure {preference_type.__name__} "
+                               f"and metadata_class {type(preference_metadata).__name__} do not match.")
+        self.preference_metadata: tuple[PreferenceMetadata, ...] = tuple(
+            getattr(preference_metadata, p) for p in self.preference_names)
+        self.preference_applicable: tuple[bool, ...] = tuple(
+            production_method in m.production_method for m in self.preference_metadata)
+        self.preference_distances: tuple[
+            Optional[Callable[[Any, Any, CustomType, Optional[float]], float]], ...] = tuple(
+            get_distance_function(m.preference_type) if isinstance(m.preference_type, CustomType) else None for m in
+            self.preference_metadata)
+
+        # evaluation order of the bounded scoring: zone preferences first, since only their similarity is not bounded
+        # by 1, afterwards category by category, such that upper bounds tighten as early as possible
+        zone_first = sorted(range(len(self.preference_names)), key=lambda i: (
+            not isinstance(self.preference_metadata[i].preference_type, ZonePreference),
+            self.categories.index(self.preference_metadata[i].category), i))
+        self.preference_evaluation_order: tuple[int, ...] = tuple(zone_first)
+        self.preference_unbounded: tuple[bool, ...] = tuple(
+            isinstance(m.preference_type, ZonePreference) for m in self.preference_metadata)
+
+        # (index of the parent value, index of the child, parent, child) of all dependent preferences
+        index = {p: i for i, p in enumerate(self.preference_names)}
+        self.preference_dependencies: list[tuple[int, int, PreferenceMetadata, PreferenceMetadata]] = []
+        for f in fields(preference_metadata):
+            current: PreferenceMetadata = getattr(preference_metadata, f.name)
+            if production_method not in current.production_method or len(current.children) == 0:
+                continue
+            if not hasattr(current.preference_type, 'deduce_importance'):
+                raise RuntimeError(
+                    f"Preference {current.name} of type {current.preference_type.__name__} does not support dependent"
+                    f" preferences. Select a different preference type.")
+            for child in current.children:
+                if child.name in index:
+                    self.preference_dependencies.append((index[current.name], index[child.name], current, child))
+
+    def record(self, id: Optional[str], parameters, preferences) -> InputRecord:
+        """
+        Converts validated input types (or the mappings of a catalog row) into a record
+        """
+        if isinstance(parameters, dict):
+            parameter_values = tuple(to_record_value(parameters.get(p)) for p in self.parameter_names)
+        else:
+            parameter_values = tuple(to_record_value(getattr(parameters, p)) for p in self.parameter_names)
+        if isinstance(preferences, dict):
+            preference_values = tuple(to_record_value(preferences.get(p)) for p in self.preference_names)
+        else:
+            preference_values = tuple(to_record_value(getattr(preferences, p)) for p in self.preference_names)
+        return InputRecord(id, parameter_values, preference_values)
+
+
+_layouts: dict[tuple[str, str], RecordLayout] = {}
+_layouts_lock = threading.Lock()
+
+
+def get_record_layout(definition: TypeDefinition, production_method: str) -> RecordLayout:
+    key = (definition.version, production_method)
+    layout = _layouts.get(key)
+    if layout is None:
+        with _layouts_lock:
+            layout = _layouts.get(key)
+            if layout is None:
+                layout = RecordLayout(definition, production_method)
+                _layouts[key] = layout
+    return layout
+
+
+def _retire_layouts(previous: Optional[TypeDefinition], new: TypeDefinition):
+    with _layouts_lock:
+        for key in [k for k in _layouts if k[0] != new.version]:
+            _layouts.pop(key)
+
+
+TypeDefinitionRegistry.subscribe(_retire_layouts)
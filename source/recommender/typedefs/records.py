@@ -0,0 +1,69 @@
+import math
+from typing import Any, Optional
+
+from common.typedef import Range, RangeInt, RangeFloat
+
+
+class RangeRecord:
+    """
+    Plain immutable range used during scoring, unbounded sides are already expanded to -inf/inf. Ranges are converted
+    once when a demand or supplier is compiled (see to_record_value), which avoids the validation of
+    common.typedef.Range in the comparisons. Being hashable, it can be part of cache keys.
+    """
+    __slots__ = ("min", "max")
+
+    def __init__(self, min: float = -math.inf, max: float = math.inf):
+        object.__setattr__(self, "min", min)
+        object.__setattr__(self, "max", max)
+
+    def __setattr__(self, name: str, value: Any):
+        raise AttributeError(f"'{type(self).__name__}' is immutable")
+
+    def __delattr__(self, name: str):
+        raise AttributeError(f"'{type(self).__name__}' is immutable")
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, RangeRecord):
+            return NotImplemented
+        return self.min == other.min and self.max == other.max
+
+    def __hash__(self) -> int:
+        return hash((self.min, self.max))
+
+    def __reduce__(self):
+        # the default pickling of slots would use __setattr__
+        return RangeRecord, (self.min, self.max)
+
+    def __repr__(self) -> str:
+        # identical to the representation of common.typedef.Range, which is part of the reported errors
+        return f"Range(min={self.min!r}, max={self.max!r})"
+
+
+# range types accepted by the comparison and distance functions
+RangeTypes = (Range, RangeRecord)
+
+
+class InputRecord:
+    """
+    Compact representation of a validated demand or supplier, the values are stored in the order of the fields of the
+    corresponding input types, see recommender.typedefs.record_layout.RecordLayout
+    """
+    __slots__ = ("id", "parameters", "preferences")
+
+    def __init__(self, id: Optional[str], parameters: tuple, preferences: tuple):
+        self.id = id
+        self.parameters = parameters
+        self.preferences = preferences
+
+    def __repr__(self) -> str:
+        return f"InputRecord(id={self.id!r}, parameters={self.parameters!r}, preferences={self.preferences!r})"
+
+
+def to_record_value(value: Any) -> Any:
+    # RangeInt/RangeFloat of the input types or {"min": ..., "max": ...} of a catalog row
+    if isinstance(value, (RangeInt, RangeFloat, Range)):
+        return RangeRecord(-math.inf if value.min is None else value.min, math.inf if value.max is None else value.max)
+    if isinstance(value, dict):
+        low, high = value.get("min"), value.get("max")
+        return RangeRecord(-math.inf if low is None else low, math.inf if high is None else high)
+    return value
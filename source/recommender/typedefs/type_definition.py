@@ -0,0 +1,218 @@
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from collections.abc import Mapping
+from typing import Literal, Optional, Callable
+
+from recommender import RECOMMENDER_ROOT_DIR
+from recommender.importer.artifact import load_type_artifact, read_type_definition, compute_definition_hash
+from recommender.importer.output import output_import_errors, has_errors
+from recommender.importer.processor import extract_global_data, generate_input_metadata_types
+from recommender.parameters.parameterGeneration import generate_demand_supplier_dataclass
+from recommender.parameters.parameterTypeRegistry import ParameterTypeRegistry
+from recommender.preferences.preferenceGeneration import generate_preference_dataclass
+from recommender.preferences.preferenceTypeRegistry import PreferenceTypeRegistry
+from recommender.typedefs.typedef import NO_CATEGORY
+
+
+@dataclass
+class TypeDefinition:
+    """
+    Complete, immutable set of types and registries generated from a single version of the type definition csv file
+    """
+    version: str  # hash of the csv content
+    filename: str
+    categories: list[str]
+    production_methods: list[str]
+    parameters: type  # metadata class of all parameters
+    preferences: type  # metadata class of all preferences
+    # input types by production method, generated on first use if lazy, see LazyInputTypes
+    parameter_input_types: dict[Literal['Demand', 'Supplier'], Mapping[str, type]]
+    preference_input_types: Mapping[str, type]
+    timings: dict[str, float] = field(default_factory=dict)
+    created: float = field(default_factory=time.time)
+
+
+def get_type_definition_path(filename: str) -> str:
+    return os.path.join(RECOMMENDER_ROOT_DIR, filename)
+
+
+def generate_type_definition(filename: str, lazy: bool = False) -> TypeDefinition:
+    """
+    :param filename: csv file relative to the recommender directory
+    :param lazy: If true, the input types of a production method are generated on its first use, which takes most of
+    the time otherwise. The field names are checked by the metadata classes in either case.
+    """
+    timings: dict[str, float] = {}
+    start = time.perf_counter()
+
+    # 1. Read in csv file
+    sep = ";"
+    path = get_type_definition_path(filename)
+    definition_hash = compute_definition_hash(path)
+
+    # 2. - 3. Use the cached processed and validated data if available (built by recommenderTypeArtifact.py), otherwise
+    # perform preprocessing and validation
+    processed_data = load_type_artifact(path, definition_hash=definition_hash)
+    timings["csv_cached"] = float(processed_data is not None)
+    if processed_data is None:
+        processed_data, errors, invalid_names = read_type_definition(path, sep)
+
+        # 4. Error handling
+        if has_errors(errors):
+            error_table = output_import_errors(errors, invalid_names)
+            print("Fatal error in generating input types. The following error(s) occurred: \n" + error_table,
+                  file=sys.stderr, flush=True)
+            raise RuntimeError(
+                f"An fatal error appeared during reading and processing of input fields of {filename}, the following fieldnames are invalid {invalid_names}. Stopping startup of recommender.")
+    timings["read_definition"] = time.perf_counter() - start
+
+    # 5. Generate "categories" and "production_methods"
+    categories, production_methods = extract_global_data(processed_data)
+    categories.append(NO_CATEGORY)
+
+    # 6. Generate Metadataclass for parameters and preferences
+    parameter_metadata, preference_metadata = generate_input_metadata_types(data=processed_data,
+                                                                            production_methods=production_methods)
+    timings["metadata"] = time.perf_counter() - start - timings["read_definition"]
+
+    # 7. generate the preference input types for all production methods = dict: production_method => Type
+    preference_registry = generate_preference_dataclass(preference_metadata, production_methods, lazy=lazy)
+
+    # 8. generate the parameter input types for all production methods
+    parameter_input_types_demand, parameter_input_types_supplier = generate_demand_supplier_dataclass(
+        parameter_metadata, production_methods=production_methods, lazy=lazy)
+
+    # 9. collect each parameter input type = dict: 'demand/supplier',production_method => Type
+    parameter_registry = {'Demand': parameter_input_types_demand, 'Supplier': parameter_input_types_supplier}
+
+    timings["total"] = time.perf_counter() - start
+    timings["input_types"] = timings["total"] - timings["metadata"] - timings["read_definition"]
+
+    return TypeDefinition(version=definition_hash, filename=filename, categories=categories,
+                          production_methods=production_methods, parameters=parameter_metadata,
+                          preferences=preference_metadata, parameter_input_types=parameter_registry,
+                          preference_input_types=preference_registry, timings=timings)
+
+
+# definition used by the current request, set for the whole lifetime of a request such that in-flight requests finish
+# on the version they started with
+_pinned_definition: ContextVar[Optional[TypeDefinition]] = ContextVar("pinned_type_definition", default=None)
+
+
+class TypeDefinitionRegistry:
+    active: Optional[TypeDefinition] = None
+    reload_in_progress: bool = False
+    last_reload_error: Optional[str] = None
+
+    _swap_lock = threading.Lock()
+    _reload_lock = threading.Lock()
+    _listeners: list[Callable[[Optional[TypeDefinition], TypeDefinition], None]] = []
+
+    @classmethod
+    def activate(cls, definition: TypeDefinition):
+        with cls._swap_lock:
+            previous = cls.active
+            # each registry is replaced as a whole, never modified in place
+            ParameterTypeRegistry.swap(definition.parameter_input_types)
+            PreferenceTypeRegistry.swap(definition.preference_input_types)
+            cls.active = definition
+
+        # retire everything that was derived from the previous version
+        if previous is not None and previous.version != definition.version:
+            for listener in list(cls._listeners):
+                listener(previous, definition)
+
+    @classmethod
+    def subscribe(cls, listener: Callable[[Optional[TypeDefinition], TypeDefinition], None]):
+        """
+        Registers a callback (previous, new), which is called after a new version of the type definition is activated.
+        Used by caches and compiled data structures to drop entries of retired versions.
+        """
+        cls._listeners.append(listener)
+
+    @classmethod
+    def reload(cls, filename: Optional[str] = None, background: bool = True) -> bool:
+        """
+        Generates a new type definition and swaps it atomically with the active one.
+        :param filename: csv file relative to the recommender directory, by default the currently active file
+        :param background: If true, the generation runs in a separate thread
+        :return: False if a reload is already in progress, True otherwise
+        """
+        if not cls._reload_lock.acquire(blocking=False):
+            return False
+        cls.reload_in_progress = True
+
+        if filename is None:
+            filename = cls.active.filename if cls.active is not None else os.environ['RECOMMENDER_TYPE_DEFINITION']
+
+        def _reload():
+            try:
+                definition = generate_type_definition(filename)
+                cls.activate(definition)
+                cls.last_reload_error = None
+            except Exception as e:
+                # keep serving the previous version
+                cls.last_reload_error = f"Reloading type definition {filename} failed: {e}"
+                print(cls.last_reload_error, file=sys.stderr, flush=True)
+            finally:
+                cls.reload_in_progress = False
+                cls._reload_lock.release()
+
+        if background:
+            threading.Thread(target=_reload, name="type-definition-reload", daemon=True).start()
+        else:
+            _reload()
+        return True
+
+
+def current_type_definition() -> TypeDefinition:
+    pinned = _pinned_definition.get()
+    return pinned if pinned is not None else TypeDefinitionRegistry.active
+
+
+@contextmanager
+def pinned_type_definition(definition: Optional[TypeDefinition] = None):
+    token = _pinned_definition.set(definition if definition is not None else TypeDefinitionRegistry.active)
+    try:
+        yield _pinned_definition.get()
+    finally:
+        _pinned_definition.reset(token)
+
+
+class TypeDefinitionWatcher:
+    """
+    Polls the csv file of the active type definition and triggers a reload as soon as its content changes
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._failed_version: Optional[str] = None
+        self._thread = threading.Thread(target=self._run, name="type-definition-watcher", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            active = TypeDefinitionRegistry.active
+            if active is None or TypeDefinitionRegistry.reload_in_progress:
+                continue
+            try:
+                version = compute_definition_hash(get_type_definition_path(active.filename))
+            except OSError:
+                continue
+
+            # an invalid file is only reported once, until its content changes again
+            if version != active.version and version != self._failed_version:
+                TypeDefinitionRegistry.reload(active.filename, background=False)
+                if TypeDefinitionRegistry.active.version != version:
+                    self._failed_version = version
@@ -0,0 +1,118 @@
+import math
+
+import pytest
+from fastapi.encoders import jsonable_encoder
+from fastapi.testclient import TestClient
+
+from common.typedef import Range
+from extractor.typedefs.io_types import ComponentParameters, Output as ExtractorOutput
+from extractor.typedefs.parameters import PCBParameters, GenericParameters
+from extractor.typedefs.typedef import Failures, AdditionalParameterInfo, SingleError, ProductionMethod
+from pipeline.io_types import PipelineInput
+from pipeline.pipelineFunctionality import map_extracted_parameters, pipeline_components, recommend_components, \
+    demand_value
+from recommender.__main__ import app
+from recommender.typedefs.type_definition import pinned_type_definition
+
+client = TestClient(app)
+
+FILE = {"type": "brd", "encoding": "utf-8", "content": ""}
+
+
+@pytest.fixture(autouse=True)
+def _pinned():
+    with pinned_type_definition():
+        yield
+
+
+def _extracted(failures: Failures = None, **parameters) -> ComponentParameters:
+    pcb = PCBParameters(production_method=ProductionMethod.PCB_ASSEMBLY, **parameters)
+    return ComponentParameters(name="board", parameters=pcb, failures=failures or Failures(),
+                               additional_info=AdditionalParameterInfo(info_parameter={}, warnings=["hint"]))
+
+
+def _suppliers() -> list[dict]:
+    return [{"id": "small", "parameters": {"length": {"max": 50.0}, "drill_sizes": {"min": 0.5, "max": 2.0}},
+             "preferences": {"balance": 3}},
+            {"id": "large", "parameters": {"length": {"max": 500.0}, "drill_sizes": {"min": 0.1, "max": 5.0},
+                                           "number_layers": 8},
+             "preferences": {"balance": 2}}]
+
+
+def test_mapping():
+    extracted = _extracted(length=100.0, width=80.0, n_layers=4, drill_size=Range(min=0.2, max=3.0),
+                           drill_size_PTH=Range(min=0.3))
+    parameters, skipped = map_extracted_parameters(extracted, "PCB_ASSEMBLY")
+    assert parameters == {"length": 100.0, "width": 80.0, "number_layers": 4, "drill_sizes": {"min": 0.2, "max": 3.0},
+                          "drill_size_PTH": {"min": 0.3, "max": None}}
+    # not extracted, parameters which are not part of the demand (e.g. assembly_sides) are not reported
+    assert skipped == {"height": "not extracted", "drill_size_NPTH": "not extracted", "drill_size_via": "not extracted"}
+
+    # only the bounding box is part of the demand of other production methods
+    parameters, skipped = map_extracted_parameters(extracted, "CUTTING")
+    assert parameters == {"length": 100.0, "width": 80.0} and skipped == {"height": "not extracted"}
+
+
+def test_extraction_failures_are_skipped():
+    failures = Failures(extracting={"n_layers": [SingleError("Cannot process parameter n_layers")]})
+    parameters, skipped = map_extracted_parameters(_extracted(failures, length=10.0, n_layers=2), "PCB_ASSEMBLY")
+    assert "number_layers" not in parameters and parameters["length"] == 10.0
+    assert skipped["number_layers"] == "extraction failed: Cannot process parameter n_layers"
+
+    failed = ComponentParameters(name="board", parameters=None,
+                                 failures=Failures(parsing=[SingleError("Critical error")]),
+                                 additional_info=AdditionalParameterInfo(info_parameter={}, warnings=[]))
+    parameters, skipped = map_extracted_parameters(failed, "CUTTING")
+    assert parameters == {} and skipped == {k: "extraction failed: Critical error" for k in ("length", "width",
+                                                                                           "height")}
+
+    generic = ComponentParameters(name="part", parameters=GenericParameters(
+        production_method=ProductionMethod.GENERIC, length=3.0, width=2.0, height=1.0), failures=Failures(),
+                                  additional_info=AdditionalParameterInfo(info_parameter={}, warnings=[]))
+    assert map_extracted_parameters(generic, "CUTTING") == ({"length": 3.0, "width": 2.0, "height": 1.0}, {})
+
+
+def test_demand_value():
+    assert demand_value(Range(min=0.1, max=0.4), Range[float], None) == {"min": 0.1, "max": 0.4}
+    assert demand_value(Range(min=0.1, max=0.4), float, "min") == 0.1
+    assert demand_value(2.0, Range[float], None) == {"min": 2.0, "max": 2.0}
+    with pytest.raises(ValueError):
+        demand_value(Range(min=0.1), float, None)
+    with pytest.raises(ValueError):
+        demand_value(Range(min=0.1), float, "max")
+    assert demand_value(Range(min=0.1), float, "min") == 0.1 and not math.isinf(
+        demand_value(Range(max=1.0), Range[float], None)["max"])
+
+
+def test_pipeline_matches_recommender():
+    inp = PipelineInput(components=[{"name": "board", "type": "PCB_ASSEMBLY", "files": [FILE],
+                                     "preferences": {"balance": 3}, "parameters": {"width": 60.0},
+                                     "suppliers": _suppliers()}], top_k=2)
+    assert inp.components[0].method == ProductionMethod.PCB_ASSEMBLY
+    failures = Failures(extracting={"n_layers": [SingleError("no layers")]})
+    extracted = ExtractorOutput(components=[_extracted(failures, length=100.0, width=80.0, n_layers=None,
+                                                       drill_size=Range(min=0.2, max=3.0))])
+
+    components, extraction = pipeline_components(inp, extracted)
+    assert extraction[0].parameters == {"length": 100.0, "drill_sizes": {"min": 0.2, "max": 3.0}}
+    assert extraction[0].skipped["number_layers"] == "extraction failed: no layers"
+    assert extraction[0].warnings == ["hint"]
+    output = recommend_components(components, top_k=inp.top_k)
+
+    # same ranking as sending the extracted demand to the recommender
+    demand = {"parameters": {"length": 100.0, "width": 60.0, "drill_sizes": {"min": 0.2, "max": 3.0}},
+              "preferences": {"balance": 3}}
+    expected = client.post("/recommend/", json={"components": [{"name": "board", "type": "PCB_ASSEMBLY",
+                                                                 "demand": demand, "suppliers": _suppliers()}],
+                                                 "top_k": 2}).json()
+    scores = jsonable_encoder(output)["components"][0]["scores"]
+    assert scores == expected["components"][0]["scores"]
+    assert scores[0]["supplier_id"] == "large" and scores[1]["score"] == -1
+
+
+def test_invalid_explicit_parameters():
+    inp = PipelineInput(components=[{"name": "part", "type": "CUTTING", "files": [FILE], "preferences": {},
+                                     "parameters": {"unknown": 1}}])
+    assert inp.components[0].method == ProductionMethod.GENERIC
+    with pytest.raises(TypeError):
+        pipeline_components(inp, ExtractorOutput(components=[_extracted(length=1.0)]))
@@ -0,0 +1,107 @@
+import random
+import uuid
+
+import msgpack
+import pytest
+from fastapi.testclient import TestClient
+
+from recommender.__main__ import app
+from recommender.catalog.catalogColumns import compile_catalog, CatalogColumns
+from recommender.catalog.catalogSharedMemory import unlink_catalog, SharedCatalogRegistry
+from recommender.service.sharding import ShardError, SHARD_PATH
+from recommender.typedefs.io_types import SupplierInformation
+from recommender.typedefs.type_definition import current_type_definition
+
+client = TestClient(app)
+
+# CUTTING suppliers covering the column kinds of a catalog, including missing values and an empty supplier
+CATALOG_SUPPLIERS = [
+    {"id": "s1", "parameters": {"width": {"min": 1.0, "max": 3.0}, "length": {"min": 1.5}, "sighting_area": [1, 2, 3],
+                                "material": ["steel", "copper"], "number_of_shots": 4, "tolerance": 0.1,
+                                "sprue": True},
+     "preferences": {"balance": 3, "contract_volume": {"min": 1, "max": 4}, "amount": 2.5,
+                     "inspection_record": False, "environmental_tech": [True, False]}},
+    {"id": "s2", "parameters": {"width": {"max": 2.0}, "sprue": False, "material": ["steel"], "sighting_area": []},
+     "preferences": {"balance": 2.5, "contract_volume": 3, "amount": {"min": 0.5}}},
+    {"id": "s3", "parameters": {}, "preferences": {}},
+]
+# supplier added by the catalog updates
+NEW_SUPPLIER = {"id": "s4", "parameters": {"width": {"min": 0.5, "max": 2.5}, "material": ["aluminium"],
+                                           "sighting_area": [7]},
+                "preferences": {"balance": 5, "environmental_tech": [False]}}
+
+# headers of the admin endpoints, the tests set HEDY_ADMIN_TOKEN accordingly
+ADMIN_HEADERS = {"X-Admin-Token": "secret"}
+
+
+def sample_input(n_suppliers: int, seed: int) -> dict:
+    # random CUTTING suppliers with a few duplicates, such that the ranking has ties
+    rng = random.Random(seed)
+    suppliers = []
+    for i in range(n_suppliers):
+        preferences = {"balance": rng.choice([1, 2, 3, 5, 100]), "inspection_record": rng.choice([True, False, None]),
+                       "ce_conformity": rng.choice([True, False]),
+                       "amount": {"min": rng.uniform(0, 2), "max": rng.uniform(3, 6)},
+                       "environmental_tech": rng.choice([[True], [False], None])}
+        suppliers.append({"id": f"s{i}", "parameters": {"width": {"min": rng.uniform(0, 2.5), "max": 3.0}},
+                          "preferences": {k: v for k, v in preferences.items() if v is not None}})
+    suppliers += [dict(s, id=f"{s['id']}_copy") for s in suppliers[:3]]
+    demand = {"parameters": {"width": 2.0},
+              "preferences": {"balance": 3, "inspection_record": True, "ce_conformity": True, "amount": 2.5,
+                              "environmental_tech": [True]}}
+    return {"components": [{"name": "c", "type": "CUTTING", "suppliers": suppliers, "demand": demand}]}
+
+
+def shard_transport(failing=(), version=None):
+    # the shards are served by the app under test, the url selects failing shards
+    def transport(url, body, headers, timeout):
+        if url in failing:
+            raise ShardError(f"Shard {url} is not reachable")
+        response = client.post(SHARD_PATH, data=body, headers=headers)
+        if response.status_code != 200:
+            raise ShardError(f"Shard {url} answered with status {response.status_code}")
+        if version is not None:
+            content = msgpack.unpackb(response.content)
+            return msgpack.packb(dict(content, version=version))
+        return response.content
+
+    return transport
+
+
+def unique_catalog_name() -> str:
+    return f"test_{uuid.uuid4().hex[:12]}"
+
+
+@pytest.fixture
+def catalog_name():
+    # unique name of a shared catalog, which is unlinked after the test
+    name = unique_catalog_name()
+    yield name
+    SharedCatalogRegistry.detach_all()
+    unlink_catalog(name)
+
+
+def compile_suppliers(suppliers=None) -> tuple[CatalogColumns, list[SupplierInformation]]:
+    # catalog of the given suppliers, by default CATALOG_SUPPLIERS
+    suppliers = [SupplierInformation("CUTTING", **s) for s in (CATALOG_SUPPLIERS if suppliers is None else suppliers)]
+    return compile_catalog("CUTTING", suppliers, current_type_definition()), suppliers
+
+
+def expected_rows(suppliers: list[dict]) -> list[dict]:
+    # rows of a catalog compiled from scratch
+    catalog, _ = compile_suppliers(suppliers)
+    return [catalog.row(i) for i in range(len(catalog))]
+
+
+def catalog_rows(name: str) -> list[dict]:
+    view = SharedCatalogRegistry.get(name)
+    return [view.row(i) for i in range(len(view))]
+
+
+def catalog_scores(**component) -> list[dict]:
+    # scores of a CUTTING component with the given suppliers or catalog
+    demand = {"parameters": {"width": 2.0}, "preferences": {"balance": 3, "environmental_tech": [True]}}
+    response = client.post("/recommend/", json={"components": [dict(name="c", type="CUTTING", demand=demand,
+                                                                    **component)]})
+    assert response.status_code == 200
+    return response.json()["components"][0]["scores"]
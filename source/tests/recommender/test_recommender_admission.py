@@ -0,0 +1,148 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from recommender.__main__ import app
+from recommender.service.admission import AdmissionController, PriorityClass, AdmissionRejected, preemptible
+from tests.recommender.conftest import sample_input
+
+client = TestClient(app)
+
+
+def _controller(batch_concurrency=1, batch_queue=10, batch_cost=1000, checkpoint_interval=2) -> AdmissionController:
+    return AdmissionController([PriorityClass("interactive", 0, max_concurrency=2, max_queue=10, max_cost=1000),
+                                PriorityClass("batch", 1, max_concurrency=batch_concurrency, max_queue=batch_queue,
+                                              max_cost=batch_cost, preemptible_cost=10)], checkpoint_interval)
+
+
+def _wait_for(condition, timeout=5.0):
+    end = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < end
+        time.sleep(0.005)
+
+
+def test_concurrency_and_queue_limits():
+    controller = _controller(batch_queue=1)
+    release = threading.Event()
+    order = []
+
+    def job(name):
+        order.append(name)
+        release.wait(5)
+        return name
+
+    async def scenario():
+        first = asyncio.create_task(controller.run("batch", 1, job, "b1"))
+        await asyncio.sleep(0.05)
+        second = asyncio.create_task(controller.run("batch", 1, job, "b2"))
+        await asyncio.sleep(0.05)
+        assert controller.metrics()["batch"]["queue_depth"] == 1
+        assert controller.metrics()["batch"]["active"] == 1
+        with pytest.raises(AdmissionRejected):
+            await controller.run("batch", 1, job, "b3")
+        release.set()
+        return await asyncio.gather(first, second)
+
+    assert asyncio.run(scenario()) == ["b1", "b2"]
+    metrics = controller.metrics()["batch"]
+    assert metrics["admitted"] == 2 and metrics["rejected"] == 1 and metrics["active"] == 0
+    assert metrics["wait_time_max"] > 0.0
+
+
+def test_cost_limit():
+    controller = _controller(batch_concurrency=2, batch_cost=10)
+    release = threading.Event()
+
+    async def scenario():
+        first = asyncio.create_task(controller.run("batch", 8, release.wait, 5))
+        await asyncio.sleep(0.05)
+        second = asyncio.create_task(controller.run("batch", 8, release.wait, 5))
+        await asyncio.sleep(0.05)
+        # exceeds the cost budget of the class, although the concurrency limit is not reached
+        assert controller.metrics()["batch"]["queue_depth"] == 1
+        release.set()
+        await asyncio.gather(first, second)
+
+    asyncio.run(scenario())
+
+
+def test_batch_yields_to_interactive():
+    controller = _controller()
+    interactive_running = threading.Event()
+    release_interactive = threading.Event()
+    progress = []
+
+    def batch_job():
+        for i in preemptible(range(100)):
+            progress.append(i)
+            if i == 10:
+                # an interactive request arrives while the batch request is scored
+                interactive_running.wait(5)
+        return len(progress)
+
+    def interactive_job():
+        interactive_running.set()
+        release_interactive.wait(5)
+        return "interactive"
+
+    async def scenario():
+        batch = asyncio.create_task(controller.run("batch", 100, batch_job))
+        await asyncio.get_running_loop().run_in_executor(None, _wait_for, lambda: len(progress) > 5)
+        interactive = asyncio.create_task(controller.run("interactive", 1, interactive_job))
+        await asyncio.get_running_loop().run_in_executor(None, _wait_for,
+                                                         lambda: controller.metrics()["batch"]["paused"] == 1)
+        paused_at = len(progress)
+        await asyncio.sleep(0.05)
+        # paused at the next checkpoint
+        assert len(progress) == paused_at <= 12
+        release_interactive.set()
+        return await asyncio.gather(batch, interactive)
+
+    assert asyncio.run(scenario()) == [100, "interactive"]
+    metrics = controller.metrics()["batch"]
+    assert metrics["preempted"] >= 1 and metrics["paused"] == 0 and metrics["paused_time_total"] > 0.0
+
+
+def test_interactive_admitted_first():
+    controller = _controller()
+    release = threading.Event()
+    order = []
+
+    def job(name):
+        order.append(name)
+        release.wait(5)
+
+    async def scenario():
+        blockers = [asyncio.create_task(controller.run("interactive", 1, job, f"i{i}")) for i in range(2)]
+        await asyncio.sleep(0.05)
+        interactive = asyncio.create_task(controller.run("interactive", 1, job, "i2"))
+        await asyncio.sleep(0.05)
+        batch = asyncio.create_task(controller.run("batch", 1, job, "b"))
+        await asyncio.sleep(0.05)
+        # the interactive class is saturated, the batch request waits for the queued interactive request
+        assert order == ["i0", "i1"]
+        release.set()
+        await asyncio.gather(*blockers, batch, interactive)
+
+    asyncio.run(scenario())
+    assert sorted(order) == ["b", "i0", "i1", "i2"]
+
+
+def test_recommend_priority_header():
+    inp = sample_input(5, 0)
+    expected = client.post("/recommend/", json=inp).json()["components"]
+    before = client.get("/metrics/admission/").json()["batch"]["admitted"]
+
+    # not answered from the response cache
+    inp["components"][0]["name"] = "batch"
+    response = client.post("/recommend/", json=inp, headers={"X-Priority": "batch"})
+    assert response.status_code == 200
+    assert response.json()["components"] == [dict(c, name="batch") for c in expected]
+    assert client.get("/metrics/admission/").json()["batch"]["admitted"] == before + 1
+
+    response = client.post("/recommend/", json=inp, headers={"X-Priority": "urgent"})
+    assert response.status_code == 400
@@ -0,0 +1,153 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+
+import msgpack
+import pytest
+from fastapi.testclient import TestClient
+
+import recommender.__main__ as recommender_main
+from benchmarks.replayBenchmark import load_capture, replay, summarize, main, percentile
+from common.capture import pseudonym, redact_keys, response_hash, TrafficCapture, REDACTED_PREFIX
+from recommender.__main__ import app
+from recommender.service.msgpackTransport import MSGPACK_MEDIA_TYPES
+from recommender.service.responseCache import response_cache
+from tests.recommender.conftest import sample_input
+
+client = TestClient(app)
+
+
+@pytest.fixture()
+def capture(monkeypatch, tmp_path):
+    traffic_capture = recommender_main.traffic_capture
+    monkeypatch.setattr(traffic_capture, "rate", 1.0)
+    monkeypatch.setattr(traffic_capture, "directory", str(tmp_path))
+    yield traffic_capture
+    traffic_capture.close()
+    response_cache.clear()
+
+
+def _entries(directory) -> list[dict]:
+    return load_capture([str(directory)])
+
+
+def test_redaction():
+    redact = redact_keys({"id", "supplier_ids"})
+    body = {"components": [{"name": "c", "suppliers": [{"id": "acme", "parameters": {"id": 1}}]}],
+            "supplier_ids": ["acme", "other"]}
+    redacted = redact(body)
+    supplier_id = redacted["components"][0]["suppliers"][0]["id"]
+    assert supplier_id.startswith(REDACTED_PREFIX) and supplier_id == pseudonym("acme")
+    assert redacted["supplier_ids"] == [pseudonym("acme"), pseudonym("other")]
+    assert redacted["components"][0]["name"] == "c" and redacted["components"][0]["suppliers"][0]["parameters"] == {
+        "id": 1}
+    # applying it again does not change anything, replayed responses are already redacted
+    assert redact(redacted) == redacted
+
+
+def test_response_hash():
+    content = {"components": [{"name": "c", "scores": []}], "context_id": "a"}
+    hashed = response_hash("application/json", json.dumps(content).encode())
+    assert hashed == response_hash(MSGPACK_MEDIA_TYPES[0], msgpack.packb(dict(content, context_id="b")))
+    assert hashed != response_hash("application/json", json.dumps(dict(content, components=[])).encode())
+
+
+def test_capture(capture, tmp_path):
+    inp = sample_input(10, 0)
+    response = client.post("/recommend/", json=inp, headers={"X-Admin-Token": "secret", "X-Priority": "batch"})
+    assert response.status_code == 200
+    msgpack_response = client.post("/recommend/", data=msgpack.packb(dict(inp, top_k=2)),
+                                   headers={"content-type": MSGPACK_MEDIA_TYPES[0], "accept": MSGPACK_MEDIA_TYPES[0]})
+    assert msgpack_response.status_code == 200
+    # other paths are not captured
+    client.get("/metrics/admission/")
+    capture.flush()
+
+    entries = _entries(tmp_path)
+    assert [e["path"] for e in entries] == ["/recommend/", "/recommend/"]
+    first, second = entries
+    assert first["service"] == "recommender" and first["status"] == 200 and first["duration"] > 0
+    assert first["headers"]["x-priority"] == "batch" and "x-admin-token" not in first["headers"]
+    assert second["headers"]["content-type"] == MSGPACK_MEDIA_TYPES[0] and second["body"]["top_k"] == 2
+
+    suppliers = first["body"]["components"][0]["suppliers"]
+    assert [s["id"] for s in suppliers] == [pseudonym(s["id"]) for s in inp["components"][0]["suppliers"]]
+    assert first["response_hash"] == response_hash("application/json", response.content, capture.redact)
+    assert capture.metrics()["captured"] == 2
+
+
+def test_sampling(capture, tmp_path, monkeypatch):
+    monkeypatch.setattr(capture, "rate", 0.0)
+    client.post("/recommend/", json=sample_input(3, 0))
+    capture.flush()
+    assert _entries(tmp_path) == []
+
+
+def test_rotation(tmp_path):
+    # each entry exceeds half of the file size, hence each file contains a single entry
+    capture = TrafficCapture("test", 1.0, str(tmp_path), ["/"], file_size=300, max_files=2)
+    for i in range(6):
+        capture.record("/", {"content-type": "application/json"}, json.dumps({"i": i, "pad": "x" * 100}).encode(), 200,
+                       "application/json", b"{}", 0.1)
+        capture.flush()
+    capture.close()
+    assert len(os.listdir(tmp_path)) == 2
+    assert [e["body"]["i"] for e in _entries(tmp_path)] == [4, 5]
+
+
+def test_replay(capture, tmp_path):
+    for seed in range(3):
+        inp = sample_input(15, seed)
+        client.post("/recommend/", json=inp)
+        client.post("/recommend/", json=dict(inp, diagnostics=False, top_k=3))
+    client.post("/recommend/", json=sample_input(5, 3), headers={"X-Deadline-Ms": "10000"})
+    demand = sample_input(1, 0)["components"][0]
+    demand_id = client.post("/demands/", json={"type": "CUTTING", "demand": demand["demand"]}).json()["demand_id"]
+    client.post("/recommend/", json={"components": [{"name": "c", "demand_id": demand_id,
+                                                     "suppliers": sample_input(6, 4)["components"][0]["suppliers"]}]})
+    capture.flush()
+    capture.close()
+
+    entries = _entries(tmp_path)
+    assert len(entries) == 9
+    recommender_main.PreparedDemandStore.clear()
+    response_cache.clear()
+    results, elapsed = asyncio.run(replay(app, entries, concurrency=4, redact=capture.redact))
+    assert all(r.status == 200 for r in results)
+    assert [r.matched for r in results].count(None) == 1
+    assert all(r.matched is not False for r in results)
+
+    rows = summarize(results, elapsed)
+    assert rows[-1]["path"] == "total" and rows[-1]["requests"] == 9 and rows[-1]["mismatches"] == 0
+    assert rows[-1]["p50"] <= rows[-1]["p99"] <= rows[-1]["max"]
+
+    # a changed result is reported and fails the gate
+    entries[0]["response_hash"] = "changed"
+    with open(tmp_path / "recommender-changed.jsonl", "w", encoding="utf-8") as f:
+        f.writelines(json.dumps(e) + "\n" for e in entries)
+    for name in os.listdir(tmp_path):
+        if name != "recommender-changed.jsonl":
+            os.remove(tmp_path / name)
+    response_cache.clear()
+    assert main([str(tmp_path), "--concurrency", "2"]) == 1
+    assert main([str(tmp_path), "--max-mismatches", "1"]) == 0
+    assert main([str(tmp_path), "--max-mismatches", "1", "--max-p99", "0"]) == 1
+
+
+def test_percentile():
+    values = [float(v) for v in range(1, 101)]
+    assert percentile(values, 50) == 50 and percentile(values, 99) == 99 and percentile(values, 100) == 100
+    assert percentile([3.0], 90) == 3.0
+
+
+def test_capture_without_msgpack():
+    # the extractor does not depend on msgpack, the capture of JSON requests must work without it
+    script = "import sys\n" \
+             "sys.modules['msgpack'] = None\n" \
+             "from common.capture import response_hash, TrafficCapture\n" \
+             "print(response_hash('application/json', b'{\"a\": 1}'))\n"
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, env=env, check=True)
+    assert result.stdout.strip() == response_hash("application/json", b'{"a": 1}')
@@ -0,0 +1,169 @@
+import json
+import os
+import subprocess
+import sys
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from recommender.__main__ import app
+from recommender.catalog import catalogSharedMemory
+from recommender.catalog.catalogSharedMemory import publish_catalog, SharedCatalogRegistry, \
+    SharedCatalog, read_published_generation
+from recommender.catalog.catalogTenants import tenant_catalogs
+from recommender.recommenderFunctionality import SupplierRecords, additional_validation, compile_components, \
+    rank_suppliers
+from recommender.typedefs.io_types import SupplierInformation, Input
+from recommender.typedefs.type_definition import current_type_definition
+from tests.recommender.conftest import CATALOG_SUPPLIERS, compile_suppliers, unique_catalog_name
+
+client = TestClient(app)
+
+def test_compile_roundtrip():
+    catalog, suppliers = compile_suppliers()
+    assert len(catalog) == len(suppliers)
+
+    for i, s in enumerate(suppliers):
+        decoded = SupplierInformation("CUTTING", **catalog.row(i))
+        assert decoded.id == s.id
+        assert decoded.parameters == s.parameters
+        assert decoded.preferences == s.preferences
+
+
+def test_publish_and_attach(catalog_name):
+    catalog, suppliers = compile_suppliers()
+    assert publish_catalog(catalog_name, catalog) == 1
+
+    attached = SharedCatalogRegistry.get(catalog_name)
+    assert attached.type_definition_version == current_type_definition().version
+    assert list(attached.ids) == [s.id for s in suppliers]
+    for i in range(len(attached)):
+        assert attached.row(i) == catalog.row(i)
+
+    # zero-copy, read-only views into the shared segment
+    shared = SharedCatalogRegistry.attached[catalog_name]
+    for a in attached.arrays.values():
+        assert not a.flags.writeable
+        if a.size == 0:
+            continue
+        assert not a.flags.owndata
+        assert np.shares_memory(a, np.frombuffer(shared._shm.buf, dtype=np.uint8))
+
+
+def test_publish_new_generation(catalog_name):
+    catalog, _ = compile_suppliers()
+    publish_catalog(catalog_name, catalog)
+    first = SharedCatalogRegistry.get(catalog_name)
+
+    updated, _ = compile_suppliers(CATALOG_SUPPLIERS[:1])
+    assert publish_catalog(catalog_name, updated) == 2
+    assert read_published_generation(catalog_name) == 2
+
+    # the previous generation stays readable until it is no longer referenced
+    assert len(first) == 3
+    assert first.row(0)["id"] == "s1"
+    assert len(SharedCatalogRegistry.get(catalog_name)) == 1
+    del first
+
+    with pytest.raises(RuntimeError):
+        SharedCatalog(catalog_name, 1)
+
+
+def test_attach_from_other_process(catalog_name):
+    catalog, _ = compile_suppliers()
+    publish_catalog(catalog_name, catalog)
+
+    script = "import sys\n" \
+             "from recommender.catalog.catalogSharedMemory import SharedCatalogRegistry\n" \
+             "catalog = SharedCatalogRegistry.get(sys.argv[1])\n" \
+             "print(','.join(str(i) for i in catalog.ids))\n"
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    result = subprocess.run([sys.executable, "-c", script, catalog_name], capture_output=True, text=True, env=env,
+                            check=True)
+    assert result.stdout.strip() == "s1,s2,s3"
+
+    # the worker exiting does not remove the catalog
+    assert read_published_generation(catalog_name) == 1
+    assert len(SharedCatalogRegistry.get(catalog_name)) == 3
+
+
+def test_recommend_with_catalog(catalog_name):
+    catalog, _ = compile_suppliers()
+    publish_catalog(catalog_name, catalog)
+
+    demand = {"parameters": {"width": 2.0}, "preferences": {}}
+    response = client.post("/recommend/", json={"components": [
+        {"name": "c", "type": "CUTTING", "catalog": catalog_name, "demand": demand}]})
+    assert response.status_code == 200
+    from_catalog = response.json()["components"][0]["scores"]
+
+    response = client.post("/recommend/", json={"components": [
+        {"name": "c", "type": "CUTTING", "suppliers": CATALOG_SUPPLIERS, "demand": demand}]})
+    assert response.status_code == 200
+    assert json.dumps(from_catalog, sort_keys=True) == json.dumps(response.json()["components"][0]["scores"],
+                                                                  sort_keys=True)
+
+
+def test_catalog_rows_decoded_lazily(catalog_name, monkeypatch):
+    catalog, _ = compile_suppliers()
+    publish_catalog(catalog_name, catalog)
+    inp = Input(components=[{"name": "c", "type": "CUTTING", "catalog": catalog_name,
+                             "demand": {"parameters": {"width": 2.5}, "preferences": {}}}], top_k=1)
+    component = compile_components(additional_validation(inp))[0]
+
+    decoded = []
+    getitem = SupplierRecords.__getitem__
+    monkeypatch.setattr(SupplierRecords, "__getitem__", lambda self, index: decoded.append(index) or getitem(self, index))
+    ranking = rank_suppliers(component, top_k=1)
+    # s2 fails the width and is never decoded completely
+    assert len(ranking) == 1 and component.suppliers.supplier_id(1) == "s2" and 1 not in decoded
+    assert component.suppliers.parameters(0).parameters != component.suppliers[0].parameters
+
+
+def test_recommend_with_unknown_catalog():
+    response = client.post("/recommend/", json={"components": [
+        {"name": "c", "type": "CUTTING", "catalog": unique_catalog_name(),
+         "demand": {"parameters": {}, "preferences": {}}}]})
+    assert response.status_code == 422
+
+    response = client.post("/recommend/", json={"components": [
+        {"name": "c", "type": "CUTTING", "catalog": "../invalid", "demand": {"parameters": {}, "preferences": {}}}]})
+    assert response.status_code == 422
+
+
+def test_catalog_not_accessed_by_validation(catalog_name, monkeypatch):
+    catalog, _ = compile_suppliers()
+    publish_catalog(catalog_name, catalog)
+    component = {"name": "c", "type": "PCB_ASSEMBLY", "catalog": catalog_name,
+                 "demand": {"parameters": {}, "preferences": {}}}
+
+    def get(name):
+        raise AssertionError("catalog accessed during the validation")
+
+    with monkeypatch.context() as m:
+        m.setattr(tenant_catalogs, "get", get)
+        Input(components=[component])
+    assert SharedCatalogRegistry.attached_rows(catalog_name) == 0
+
+    # the mismatching production method is reported by the admitted request
+    response = client.post("/recommend/", json={"components": [component]})
+    assert response.status_code == 422 and "production method" in response.json()["detail"]
+
+
+def test_node_lock_without_fcntl(monkeypatch):
+    # Windows: the first byte of the lock file is locked with msvcrt, retried while another process holds it
+    calls = []
+
+    def locking(fileno, mode, nbytes):
+        calls.append((mode, nbytes))
+        if len(calls) == 1:
+            raise OSError("locked by another process")
+
+    monkeypatch.setattr(catalogSharedMemory, "fcntl", None)
+    monkeypatch.setattr(catalogSharedMemory, "msvcrt", SimpleNamespace(locking=locking, LK_NBLCK=2, LK_UNLCK=0),
+                        raising=False)
+    with catalogSharedMemory.node_lock("hedy_catalog_test.lock"):
+        assert calls == [(2, 1), (2, 1)]
+    assert calls[-1] == (0, 1)
@@ -0,0 +1,137 @@
+import os
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from recommender.__main__ import app
+from recommender.catalog.catalogSharedMemory import publish_catalog, unlink_catalog, SharedCatalogRegistry, \
+    SharedCatalog, read_published_generation, read_base_generation, CatalogNotFoundError
+from recommender.catalog.catalogSnapshot import write_snapshot, load_snapshot, restore_catalog, restore_catalogs, \
+    list_snapshots, latest_snapshot, CATALOG_SNAPSHOT_DIR_ENV, CATALOG_SNAPSHOTS_ENV
+from recommender.catalog.catalogUpdates import upsert_suppliers, delete_suppliers, compact_catalog, \
+    CATALOG_COMPACTION_RATIO_ENV
+from recommender.service.responseCache import response_cache
+from recommender.typedefs.type_definition import pinned_type_definition, current_type_definition
+from tests.recommender.conftest import ADMIN_HEADERS, CATALOG_SUPPLIERS, NEW_SUPPLIER, catalog_rows, catalog_scores, \
+    compile_suppliers, expected_rows
+
+client = TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def _snapshot_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv(CATALOG_SNAPSHOT_DIR_ENV, str(tmp_path))
+    monkeypatch.setenv(CATALOG_COMPACTION_RATIO_ENV, "100")
+    monkeypatch.setenv("HEDY_ADMIN_TOKEN", "secret")
+    with pinned_type_definition():
+        yield tmp_path
+    response_cache.clear()
+
+
+def _restart(name: str):
+    # a restart of the node: the shared memory is gone, the snapshots on disk are kept
+    SharedCatalogRegistry.detach_all()
+    unlink_catalog(name)
+    response_cache.clear()
+
+
+def test_snapshot_roundtrip(catalog_name, tmp_path):
+    catalog, _ = compile_suppliers()
+    publish_catalog(catalog_name, catalog)
+    upsert_suppliers(catalog_name, [NEW_SUPPLIER])
+    delete_suppliers(catalog_name, ["s2"])
+
+    snapshot = write_snapshot(catalog_name)
+    assert snapshot.generation == 3 and snapshot.suppliers == 3
+    assert os.path.dirname(snapshot.path) == str(tmp_path / catalog_name)
+    assert snapshot.path.endswith(current_type_definition().version[:16])
+
+    # the delta is compacted into the snapshot, the arrays are mapped from the files
+    loaded = load_snapshot(snapshot.path)
+    assert isinstance(loaded.ids, np.memmap) and all(isinstance(a, np.memmap) for a in loaded.arrays.values())
+    assert [loaded.row(i) for i in range(len(loaded))] == catalog_rows(catalog_name)
+
+    os.remove(os.path.join(snapshot.path, "manifest.json"))
+    with pytest.raises(ValueError):
+        load_snapshot(snapshot.path)
+    assert list_snapshots(catalog_name) == []
+
+
+def test_restore(catalog_name):
+    catalog, _ = compile_suppliers()
+    publish_catalog(catalog_name, catalog)
+    upsert_suppliers(catalog_name, [NEW_SUPPLIER])
+    rows, scores = catalog_rows(catalog_name), catalog_scores(catalog=catalog_name)
+    snapshot = write_snapshot(catalog_name)
+
+    _restart(catalog_name)
+    with pytest.raises(CatalogNotFoundError):
+        SharedCatalogRegistry.get(catalog_name)
+    version = current_type_definition().version
+    assert restore_catalog(catalog_name, "other version") is None
+    assert restore_catalog(catalog_name, version) == 1
+    # already published on this node, e.g. only a worker was restarted
+    assert restore_catalog(catalog_name, version) is None
+
+    attached = SharedCatalog(catalog_name, 1)
+    assert attached.snapshot == os.path.abspath(snapshot.path)
+    assert isinstance(attached.columns.ids, np.memmap)
+    attached.close()
+    assert catalog_rows(catalog_name) == rows and catalog_scores(catalog=catalog_name) == scores
+
+    # the restored generation is the base of further updates
+    upsert_suppliers(catalog_name, [dict(NEW_SUPPLIER, id="s5")])
+    assert read_base_generation(catalog_name, 2) == 1
+    assert catalog_rows(catalog_name) == expected_rows(CATALOG_SUPPLIERS + [NEW_SUPPLIER, dict(NEW_SUPPLIER, id="s5")])
+    assert compact_catalog(catalog_name) == 3
+    assert catalog_rows(catalog_name) == expected_rows(CATALOG_SUPPLIERS + [NEW_SUPPLIER, dict(NEW_SUPPLIER, id="s5")])
+
+
+def test_restore_catalogs(catalog_name, tmp_path):
+    catalog, _ = compile_suppliers()
+    publish_catalog(catalog_name, catalog)
+    write_snapshot(catalog_name)
+    _restart(catalog_name)
+
+    (tmp_path / "invalid name").mkdir()
+    assert restore_catalogs(current_type_definition().version) == {catalog_name: 1}
+    assert restore_catalogs(current_type_definition().version) == {}
+    assert catalog_rows(catalog_name) == expected_rows(CATALOG_SUPPLIERS)
+
+
+def test_prune(catalog_name, monkeypatch):
+    monkeypatch.setenv(CATALOG_SNAPSHOTS_ENV, "1")
+    catalog, _ = compile_suppliers()
+    publish_catalog(catalog_name, catalog)
+    first = write_snapshot(catalog_name).path
+    _restart(catalog_name)
+    restore_catalog(catalog_name, current_type_definition().version)
+
+    # the restored generation maps the first snapshot, it is kept until the generation is replaced
+    upsert_suppliers(catalog_name, [NEW_SUPPLIER])
+    second = write_snapshot(catalog_name).path
+    assert list_snapshots(catalog_name) == [second, first]
+    compact_catalog(catalog_name)
+    third = write_snapshot(catalog_name).path
+    assert list_snapshots(catalog_name) == [third]
+    assert latest_snapshot(catalog_name, current_type_definition().version) == third
+
+
+def test_endpoint(catalog_name):
+    catalog, _ = compile_suppliers()
+    publish_catalog(catalog_name, catalog)
+    url = f"/admin/catalogs/{catalog_name}/snapshot/"
+    assert client.post(url).status_code == 403
+    assert client.post("/admin/catalogs/unknown_catalog/snapshot/", headers=ADMIN_HEADERS).status_code == 404
+    response = client.post(url, headers=ADMIN_HEADERS)
+    assert response.status_code == 200
+    assert response.json()["generation"] == 1 and response.json()["suppliers"] == 3
+
+    # the recommender restores the catalog on startup
+    scores = catalog_scores(catalog=catalog_name)
+    _restart(catalog_name)
+    with TestClient(app) as started:
+        assert read_published_generation(catalog_name) == 1
+        assert started.get("/").status_code == 200
+    assert catalog_scores(catalog=catalog_name) == scores
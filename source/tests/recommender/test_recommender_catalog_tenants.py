@@ -0,0 +1,131 @@
+import os
+import tempfile
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+from recommender.__main__ import app
+from recommender.catalog import catalogTenants
+from recommender.catalog.catalogSharedMemory import publish_catalog, unlink_catalog, SharedCatalogRegistry, \
+    read_published_generation, tenant_catalog_name, catalog_tenant
+from recommender.catalog.catalogSnapshot import list_snapshots, CATALOG_SNAPSHOT_DIR_ENV
+from recommender.catalog.catalogTenants import tenant_catalogs, tenant_scope, resolve_catalog_name, \
+    resident_nbytes, CATALOG_TENANT_QUOTA_ENV, CATALOG_TENANT_QUOTAS_ENV, CATALOG_MEMORY_BUDGET_ENV
+from recommender.catalog.catalogUpdates import upsert_suppliers, CATALOG_COMPACTION_RATIO_ENV
+from recommender.service.responseCache import response_cache
+from recommender.typedefs.type_definition import pinned_type_definition
+from tests.recommender.conftest import CATALOG_SUPPLIERS, NEW_SUPPLIER, compile_suppliers, expected_rows
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def tenants(tmp_path, monkeypatch):
+    # two tenants with unique names, their catalogs are unlinked afterwards
+    monkeypatch.setenv(CATALOG_SNAPSHOT_DIR_ENV, str(tmp_path))
+    monkeypatch.setenv(CATALOG_COMPACTION_RATIO_ENV, "100")
+    monkeypatch.setattr(catalogTenants, "TOUCH_INTERVAL", 0.0)
+    residency = os.path.join(tempfile.gettempdir(), catalogTenants._RESIDENCY_FILE)
+    names = [f"t{uuid.uuid4().hex[:8]}", f"t{uuid.uuid4().hex[:8]}"]
+    with pinned_type_definition():
+        yield names
+    SharedCatalogRegistry.detach_all()
+    for name in os.listdir(tmp_path):
+        unlink_catalog(name)
+    if os.path.exists(residency):
+        os.remove(residency)
+    response_cache.clear()
+
+
+def _publish(tenant: str, catalog: str, suppliers=None) -> str:
+    name = tenant_catalog_name(tenant, catalog)
+    publish_catalog(name, compile_suppliers(suppliers)[0])
+    # the snapshot directory of the catalog is the marker for the cleanup of the fixture
+    os.makedirs(os.path.join(os.environ[CATALOG_SNAPSHOT_DIR_ENV], name), exist_ok=True)
+    tenant_catalogs.admit(name)
+    return name
+
+
+def _recommend(tenant, catalog: str):
+    demand = {"parameters": {"width": 2.0}, "preferences": {"balance": 3}}
+    headers = {"X-Tenant": tenant} if tenant is not None else {}
+    return client.post("/recommend/", headers=headers,
+                       json={"components": [dict(name="c", type="CUTTING", demand=demand, catalog=catalog)]})
+
+
+def test_naming(tenants):
+    name = tenant_catalog_name(tenants[0], "catalog")
+    assert catalog_tenant(name) == tenants[0] and catalog_tenant("shared_catalog") is None
+    with pytest.raises(ValueError):
+        tenant_catalog_name("with_underscore", "catalog")
+
+    with tenant_scope(tenants[0]):
+        assert resolve_catalog_name("catalog") == name
+    assert resolve_catalog_name("shared_catalog") == "shared_catalog"
+    # the catalogs of a tenant are only accessible within its scope
+    with pytest.raises(ValueError):
+        resolve_catalog_name(name)
+
+
+def test_isolation(tenants):
+    _publish(tenants[0], "catalog")
+    response = _recommend(tenants[0], "catalog")
+    assert response.status_code == 200 and len(response.json()["components"][0]["scores"]) == 3
+
+    assert _recommend(tenants[1], "catalog").status_code == 422
+    assert _recommend(None, "catalog").status_code == 422
+    assert _recommend(None, tenant_catalog_name(tenants[0], "catalog")).status_code == 422
+    assert _recommend("invalid_tenant", "catalog").status_code == 400
+
+
+def test_quota(tenants, monkeypatch):
+    first = _publish(tenants[0], "first")
+    size = resident_nbytes(first)
+    monkeypatch.setenv(CATALOG_TENANT_QUOTA_ENV, str(int(size * 1.5)))
+    # the quota of the other tenant allows both catalogs
+    monkeypatch.setenv(CATALOG_TENANT_QUOTAS_ENV, f"{tenants[1]}={size * 2}")
+    _publish(tenants[1], "first")
+    _publish(tenants[1], "second")
+
+    second = _publish(tenants[0], "second")
+    # the least recently used catalog of the tenant is evicted to its snapshot
+    assert read_published_generation(first) is None and len(list_snapshots(first)) == 1
+    assert read_published_generation(second) == 1
+    assert read_published_generation(tenant_catalog_name(tenants[1], "first")) == 1
+
+    # and restored on its next use, which evicts the other one
+    scores = _recommend(tenants[0], "first").json()
+    assert scores["components"][0]["scores"] == _recommend(tenants[0], "second").json()["components"][0]["scores"]
+    metrics = client.get("/metrics/catalog_tenants/").json()
+    tenant = metrics["tenants"][tenants[0]]
+    assert tenant["loads"] == 2 and tenant["evictions"] == 3 and tenant["last_load_seconds"] < 1
+    assert tenant["catalogs"] == 2 and tenant["resident_catalogs"] == 1 and tenant["resident_bytes"] == size
+    assert tenant["quota"] == int(size * 1.5)
+    assert metrics["tenants"][tenants[1]]["resident_catalogs"] == 2
+    assert metrics["tenants"][tenants[1]]["evictions"] == 0
+
+
+def test_budget(tenants, monkeypatch):
+    first = _publish(tenants[0], "catalog")
+    monkeypatch.setenv(CATALOG_MEMORY_BUDGET_ENV, str(int(resident_nbytes(first) * 1.5)))
+    second = _publish(tenants[1], "catalog")
+    # the budget is shared by all tenants
+    assert read_published_generation(first) is None and read_published_generation(second) == 1
+    assert _recommend(tenants[0], "catalog").status_code == 200
+    assert read_published_generation(first) == 1 and read_published_generation(second) is None
+    assert client.get("/metrics/catalog_tenants/").json()["budget"] == int(resident_nbytes(first) * 1.5)
+
+
+def test_evicted_updates(tenants, monkeypatch):
+    first = _publish(tenants[0], "first")
+    monkeypatch.setenv(CATALOG_TENANT_QUOTA_ENV, str(resident_nbytes(first)))
+    upsert_suppliers(first, [NEW_SUPPLIER])
+    tenant_catalogs.touch(first)
+    _publish(tenants[0], "second")
+
+    # the delta is part of the snapshot the catalog was evicted to
+    assert read_published_generation(first) is None
+    with tenant_scope(tenants[0]):
+        view = tenant_catalogs.get(first)
+    assert [view.row(i) for i in range(len(view))] == expected_rows(CATALOG_SUPPLIERS + [NEW_SUPPLIER])
@@ -0,0 +1,160 @@
+import json
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from recommender.__main__ import app
+from recommender.catalog.catalogColumns import concat_catalogs, CatalogOverlay
+from recommender.catalog.catalogSharedMemory import publish_catalog, SharedCatalogRegistry, SharedCatalog, \
+    read_published_generation, read_base_generation
+from recommender.catalog.catalogUpdates import upsert_suppliers, delete_suppliers, patch_supplier, compact_catalog, \
+    compactor, SupplierNotFoundError, CATALOG_COMPACTION_RATIO_ENV
+from recommender.service.responseCache import response_cache
+from recommender.typedefs.type_definition import pinned_type_definition
+from tests.recommender.conftest import ADMIN_HEADERS, CATALOG_SUPPLIERS, NEW_SUPPLIER, catalog_rows, catalog_scores, \
+    compile_suppliers, expected_rows
+
+client = TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def _no_compaction(monkeypatch):
+    # compactions are triggered explicitly, unless a test lowers the ratio
+    monkeypatch.setenv(CATALOG_COMPACTION_RATIO_ENV, "100")
+    monkeypatch.setenv("HEDY_ADMIN_TOKEN", "secret")
+    with pinned_type_definition():
+        yield
+    response_cache.clear()
+
+
+def test_concat_catalogs():
+    first, _ = compile_suppliers()
+    second, _ = compile_suppliers([NEW_SUPPLIER, CATALOG_SUPPLIERS[0]])
+    merged = concat_catalogs([(first, np.array([2, 0])), (second, np.arange(2))])
+    assert [merged.row(i) for i in range(len(merged))] == [first.row(2), first.row(0), second.row(0), second.row(1)]
+    assert merged.vocabularies["parameters.material"] == ["steel", "copper", "aluminium"]
+
+    empty = concat_catalogs([(first, np.zeros(0, dtype=np.int64))])
+    assert len(empty) == 0 and set(empty.arrays) == set(first.arrays)
+
+
+def test_upsert_and_delete(catalog_name):
+    catalog, _ = compile_suppliers()
+    publish_catalog(catalog_name, catalog)
+    base = SharedCatalogRegistry.get(catalog_name)
+
+    changed = dict(CATALOG_SUPPLIERS[1], preferences={"balance": 1})
+    update = upsert_suppliers(catalog_name, [NEW_SUPPLIER, changed])
+    assert update.generation == 2 and update.suppliers == 4 and update.changed == 3
+    assert read_base_generation(catalog_name, 2) == 1
+
+    # the base is not copied, the update only maps the delta
+    view = SharedCatalogRegistry.get(catalog_name)
+    assert isinstance(view, CatalogOverlay) and view.base is base
+    assert list(view.ids) == ["s1", "s3", "s4", "s2"]
+    expected = [CATALOG_SUPPLIERS[0], CATALOG_SUPPLIERS[2], NEW_SUPPLIER, changed]
+    assert catalog_rows(catalog_name) == expected_rows(expected)
+    # rankings reflect the update immediately
+    assert catalog_scores(catalog=catalog_name) == catalog_scores(suppliers=expected)
+
+    update = delete_suppliers(catalog_name, ["s1", "s4"])
+    assert update.suppliers == 2 and read_base_generation(catalog_name, update.generation) == 1
+    assert catalog_rows(catalog_name) == expected_rows([CATALOG_SUPPLIERS[2], changed])
+    assert catalog_scores(catalog=catalog_name) == catalog_scores(suppliers=[CATALOG_SUPPLIERS[2], changed])
+    # the previous delta is unlinked, the base stays
+    with pytest.raises(RuntimeError):
+        SharedCatalog(catalog_name, 2)
+    SharedCatalog(catalog_name, 1).close()
+
+    with pytest.raises(SupplierNotFoundError):
+        delete_suppliers(catalog_name, ["s1"])
+
+
+def test_patch(catalog_name):
+    catalog, _ = compile_suppliers()
+    publish_catalog(catalog_name, catalog)
+    patch_supplier(catalog_name, "s1", {"width": {"min": 2.5}, "tolerance": None}, {"balance": 4})
+    row = catalog_rows(catalog_name)[-1]
+    assert row["id"] == "s1" and row["parameters"]["width"] == {"min": 2.5, "max": None}
+    assert "tolerance" not in row["parameters"] and row["parameters"]["material"] == ["steel", "copper"]
+    assert row["preferences"]["balance"] == 4
+
+    with pytest.raises(SupplierNotFoundError):
+        patch_supplier(catalog_name, "unknown", {}, {})
+    with pytest.raises(ValueError):
+        patch_supplier(catalog_name, "s1", {"width": "wide"}, {})
+
+
+def test_compaction(catalog_name):
+    catalog, _ = compile_suppliers()
+    publish_catalog(catalog_name, catalog)
+    assert compact_catalog(catalog_name) is None
+
+    upsert_suppliers(catalog_name, [NEW_SUPPLIER])
+    delete_suppliers(catalog_name, ["s2"])
+    rows, scores = catalog_rows(catalog_name), catalog_scores(catalog=catalog_name)
+
+    generation = compact_catalog(catalog_name)
+    assert generation == 4 and read_base_generation(catalog_name, generation) is None
+    view = SharedCatalogRegistry.get(catalog_name)
+    assert not isinstance(view, CatalogOverlay)
+    assert catalog_rows(catalog_name) == rows and catalog_scores(catalog=catalog_name) == scores
+    # the base and the delta are unlinked
+    for unreachable in (1, 3):
+        with pytest.raises(RuntimeError):
+            SharedCatalog(catalog_name, unreachable)
+
+    # further updates are based on the compacted generation
+    upsert_suppliers(catalog_name, [CATALOG_SUPPLIERS[1]])
+    assert read_base_generation(catalog_name, 5) == 4
+    assert catalog_rows(catalog_name) == expected_rows([CATALOG_SUPPLIERS[0], CATALOG_SUPPLIERS[2], NEW_SUPPLIER,
+                                                  CATALOG_SUPPLIERS[1]])
+
+
+def test_background_compaction(catalog_name, monkeypatch):
+    catalog, _ = compile_suppliers()
+    publish_catalog(catalog_name, catalog)
+    monkeypatch.setenv(CATALOG_COMPACTION_RATIO_ENV, "0.5")
+    assert not upsert_suppliers(catalog_name, [NEW_SUPPLIER]).compaction_scheduled
+
+    update = upsert_suppliers(catalog_name, [dict(NEW_SUPPLIER, id="s5")])
+    assert update.compaction_scheduled
+    compactor.wait(catalog_name)
+    assert read_published_generation(catalog_name) == 4
+    assert read_base_generation(catalog_name, 4) is None
+    assert list(SharedCatalogRegistry.get(catalog_name).ids) == ["s1", "s2", "s3", "s4", "s5"]
+
+
+def test_endpoints(catalog_name):
+    catalog, _ = compile_suppliers()
+    publish_catalog(catalog_name, catalog)
+    before = catalog_scores(catalog=catalog_name)
+
+    url = f"/admin/catalogs/{catalog_name}/suppliers/"
+    assert client.put(url, json={"suppliers": [NEW_SUPPLIER]}).status_code == 403
+    response = client.put(url, json={"suppliers": [NEW_SUPPLIER]}, headers=ADMIN_HEADERS)
+    assert response.status_code == 200
+    assert response.json() == {"generation": 2, "suppliers": 4, "changed": 1, "compaction_scheduled": False}
+    # the response cache is keyed by the published generation
+    assert catalog_scores(catalog=catalog_name) == catalog_scores(suppliers=CATALOG_SUPPLIERS + [NEW_SUPPLIER]) != \
+           before
+
+    response = client.patch(url + "s2/", json={"preferences": {"balance": 3}}, headers=ADMIN_HEADERS)
+    assert response.status_code == 200 and response.json()["generation"] == 3
+    assert client.patch(url + "unknown/", json={}, headers=ADMIN_HEADERS).status_code == 404
+    assert client.patch(url + "s2/", json={"parameters": {"width": "wide"}}, headers=ADMIN_HEADERS).status_code == 422
+    assert client.put(url, json={"suppliers": [{"id": "x", "parameters": {"unknown": 1}, "preferences": {}}]},
+                      headers=ADMIN_HEADERS).status_code == 422
+
+    response = client.delete(url + "s1/", headers=ADMIN_HEADERS)
+    assert response.status_code == 200 and response.json()["suppliers"] == 3
+    assert client.delete(url + "s1/", headers=ADMIN_HEADERS).status_code == 404
+    assert client.put("/admin/catalogs/unknown_catalog/suppliers/", json={"suppliers": []},
+                      headers=ADMIN_HEADERS).status_code == 404
+
+    response = client.post(f"/admin/catalogs/{catalog_name}/compact/", headers=ADMIN_HEADERS)
+    assert response.json() == {"compacted": True, "generation": 5}
+    assert json.dumps(catalog_scores(catalog=catalog_name)) == json.dumps(catalog_scores(suppliers=[
+        CATALOG_SUPPLIERS[2], NEW_SUPPLIER,
+        dict(CATALOG_SUPPLIERS[1], preferences=dict(CATALOG_SUPPLIERS[1]["preferences"], balance=3))]))
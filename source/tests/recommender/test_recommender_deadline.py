@@ -0,0 +1,78 @@
+import itertools
+import time
+
+from fastapi.testclient import TestClient
+
+import recommender.recommenderFunctionality as functionality
+from recommender.__main__ import app
+from recommender.recommenderFunctionality import rank_components_deadline, compile_components, \
+    additional_validation, rank_components
+from recommender.typedefs.io_types import Input
+from tests.recommender.conftest import sample_input
+
+client = TestClient(app)
+
+
+def _components(n_suppliers: int, seed: int, invalid: int = 0):
+    inp = sample_input(n_suppliers, seed)
+    for s in inp["components"][0]["suppliers"][:invalid]:
+        s["parameters"]["width"] = {"min": 5.0, "max": 6.0}
+    inp["components"].append(dict(inp["components"][0], name="c2"))
+    return compile_components(additional_validation(Input(**inp)))
+
+
+def test_deadline_not_reached():
+    components = _components(40, 0, invalid=5)
+    full = rank_components(components)
+    output = rank_components_deadline(components, time.monotonic() + 60)
+    assert output.components == [type(c)(name=c.name, scores=c.scores, evaluated=43) for c in full.components]
+    assert all(c.complete for c in output.components)
+
+    bounded = rank_components(components, min_score=0.5, top_k=4)
+    output = rank_components_deadline(components, time.monotonic() + 60, min_score=0.5, top_k=4)
+    for c_bounded, c_deadline in zip(bounded.components, output.components):
+        assert c_deadline.scores == c_bounded.scores
+        assert c_deadline.pruned == c_bounded.pruned
+
+
+def test_deadline_expired():
+    output = rank_components_deadline(_components(10, 0), time.monotonic())
+    assert all(not c.complete and c.evaluated == 0 and c.scores == [] for c in output.components)
+
+
+def test_partial_results(monkeypatch):
+    components = _components(100, 1, invalid=60)
+    full = {c.name: {s.supplier_id: s for s in c.scores} for c in rank_components(components).components}
+
+    # each call of the clock advances by one, the deadline expires within the scoring
+    clock = itertools.count()
+    monkeypatch.setattr(functionality.time, "monotonic", lambda: next(clock))
+    output = rank_components_deadline(components, deadline=30)
+
+    for c in output.components:
+        assert not c.complete
+        assert 0 < c.evaluated < 103
+        assert len(c.scores) == c.evaluated
+        # suppliers with valid parameters are scored first
+        n_valid = sum(s.score > -1 for s in full[c.name].values())
+        assert sum(s.score > -1 for s in c.scores) == min(c.evaluated, n_valid)
+        assert all(s == full[c.name][s.supplier_id] for s in c.scores)
+        assert [s.score for s in c.scores] == sorted([s.score for s in c.scores], reverse=True)
+    # components are served round robin
+    assert output.components[0].evaluated - output.components[1].evaluated in (0, functionality.DEADLINE_CHUNK)
+
+
+def test_deadline_header():
+    inp = sample_input(10, 2)
+    full = client.post("/recommend/", json=inp).json()["components"]
+
+    response = client.post("/recommend/", json=inp, headers={"X-Deadline-Ms": "60000"})
+    assert response.status_code == 200
+    components = response.json()["components"]
+    assert [c["scores"] for c in components] == [c["scores"] for c in full]
+    assert all(c["complete"] and c["evaluated"] == 13 for c in components)
+    assert all(c["complete"] and c["evaluated"] is None for c in full)
+
+    assert client.post("/recommend/", json=inp, headers={"X-Deadline-Ms": "0"}).status_code == 400
+    assert client.post("/recommend/", json=dict(inp, page_size=2),
+                       headers={"X-Deadline-Ms": "100"}).status_code == 400
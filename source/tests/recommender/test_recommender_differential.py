@@ -0,0 +1,89 @@
+import copy
+import random
+
+import pytest
+
+from benchmarks.differentialHarness import run_case, random_request, diff_outputs, reference_recommendation
+from recommender.recommenderFunctionality import additional_validation, perform_recommendation
+from recommender.typedefs.io_types import Input
+from recommender.typedefs.type_definition import current_type_definition
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_engines_match_reference(seed):
+    payload = random_request(current_type_definition(), random.Random(seed))
+    assert run_case(payload) == {name: [] for name in run_case(payload)}
+
+
+def _edge_case_payload() -> dict:
+    demand = {"parameters": {"width": 0.0, "length": 3.0},
+              "preferences": {"amount": 0, "contract_volume": 0.0, "duration_liability": 4, "balance": 0,
+                              "environmental_tech": [], "special_requirements": [True, False],
+                              "sustainability_time_price": 0.0, "inspection_record": True, "working_method": None}}
+    suppliers = [
+        {"id": "unbounded", "parameters": {"width": {"min": None, "max": 1.0}, "length": {}},
+         "preferences": {"amount": {"min": 0, "max": 0}, "contract_volume": {"min": None, "max": 0.0},
+                         "duration_liability": {"min": 5}, "balance": 0, "environmental_tech": [],
+                         "special_requirements": [False, False], "sustainability_time_price": 1.0,
+                         "inspection_record": False}},
+        {"id": "mismatch", "parameters": {"width": {"min": 1.0}},
+         "preferences": {"amount": {"min": 2, "max": 3}, "contract_volume": 0, "environmental_tech": [True],
+                         "special_requirements": [True], "inspection_record": None}},
+        {"id": "empty", "parameters": {}, "preferences": {}},
+        {"id": "empty_copy", "parameters": {}, "preferences": {}},
+    ]
+    return {"components": [{"name": "c", "type": "CUTTING", "suppliers": suppliers, "demand": demand}]}
+
+
+def test_edge_cases():
+    payload = _edge_case_payload()
+    assert all(differences == [] for differences in run_case(payload).values())
+
+    output = perform_recommendation(additional_validation(Input(**copy.deepcopy(payload))))
+    scores = {s.supplier_id: s for s in output.components[0].scores}
+    assert [s.supplier_id for s in output.components[0].scores][:2] == ["empty", "empty_copy"]
+    assert scores["mismatch"].score == -1.0
+    # empty choice lists and choice lists of different lengths are reported, not raised
+    assert "special_requirements" in _preference_failures(scores["mismatch"])
+    assert "environmental_tech" in _preference_failures(scores["unbounded"])
+
+
+def _preference_failures(score) -> dict[str, str]:
+    return {p: f for errors in score.failures.preferences.values() for p, f in errors.failures.items()}
+
+
+def test_zone_demand_range_reported_as_range():
+    payload = _edge_case_payload()
+    payload["components"][0]["demand"]["preferences"]["amount"] = {"min": 1, "max": 2}
+    assert all(differences == [] for differences in run_case(payload).values())
+
+    output = perform_recommendation(additional_validation(Input(**payload)))
+    scores = {s.supplier_id: s for s in output.components[0].scores}
+    assert _preference_failures(scores["unbounded"])["amount"].endswith("got 'Range'.")
+
+
+def test_differences_are_reported():
+    inp = additional_validation(Input(**random_request(current_type_definition(), random.Random(3), max_components=1,
+                                                       max_suppliers=8)))
+    expected = reference_recommendation(inp)
+    assert len(expected.components[0].scores) >= 3
+    assert diff_outputs(expected, perform_recommendation(inp)) == []
+
+    actual = copy.deepcopy(expected)
+    actual.components[0].scores[0].score += 1e-12
+    assert len(diff_outputs(expected, actual)) == 1
+    assert diff_outputs(expected, actual, tolerance=1e-9) == []
+
+    actual = copy.deepcopy(expected)
+    scores = actual.components[0].scores
+    scores[0], scores[-1] = scores[-1], scores[0]
+    assert any("position 0" in d for d in diff_outputs(expected, actual))
+
+    actual = copy.deepcopy(expected)
+    actual.components[0].scores[1].failures = None
+    assert len(diff_outputs(expected, actual)) == 1
+    assert diff_outputs(expected, actual, failures=False) == []
+
+    actual = copy.deepcopy(expected)
+    actual.components[0].scores.pop()
+    assert diff_outputs(expected, actual) == [f"component 'c0': expected {len(scores)} scores, got {len(scores) - 1}"]
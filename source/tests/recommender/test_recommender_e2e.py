@@ -1,3 +1,4 @@
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import fields, asdict
 
 import pytest
@@ -331,3 +332,41 @@ def test_dependencies_1():
     assert scores_per_category["MOTIVES_VALUES"] == 1.0  # sustainability_time_price
     assert scores_per_category["FINANCE"] == 0.6944444444444444
     assert scores_per_category["COMPANY_PROFILE"] == 0.6171017361346637
+
+
+def _dependency_input(sustainability_time_price: float) -> Input:
+    suppliers = [empty_supplier_general(f"s{i}") for i in range(20)]
+    demand = empty_demand_general()
+    for supplier in suppliers:
+        supplier.preferences.sustainability_time_price = sustainability_time_price
+        supplier.preferences.environmental_tech = [True, False]
+        supplier.preferences.balance = 1000
+        supplier.preferences.inspection_record = False
+        supplier.preferences.domain_knowledge = 0.0
+    demand.preferences.sustainability_time_price = 1.0
+    demand.preferences.environmental_tech = [False, True]
+    demand.preferences.balance = 100
+    demand.preferences.inspection_record = True
+    demand.preferences.domain_knowledge = 1.0
+    return Input(components=[ComponentInformation(name="test", type="CUTTING", suppliers=suppliers, demand=demand)])
+
+
+def _dependency_scores(sustainability_time_price: float) -> list:
+    out = perform_recommendation(_dependency_input(sustainability_time_price))
+    return [(s.score, s.scores_per_category) for s in out.components[0].scores]
+
+
+def test_dependencies_concurrent():
+    values = [0.0, 0.25, 0.5, 0.75, 1.0]
+    expected = {v: _dependency_scores(v) for v in values}
+
+    metadata = empty_demand_general().preferences.derived_from()
+    importances = {f.name: getattr(metadata, f.name).preference_type.importance for f in fields(metadata)}
+
+    # the dependent preferences of all requests share the metadata, their importances must not leak between requests
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        runs = [values[i % len(values)] for i in range(200)]
+        for v, scores in zip(runs, pool.map(_dependency_scores, runs)):
+            assert scores == expected[v]
+
+    assert importances == {f.name: getattr(metadata, f.name).preference_type.importance for f in fields(metadata)}
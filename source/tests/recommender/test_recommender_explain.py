@@ -0,0 +1,113 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from recommender.__main__ import app
+from recommender.service.rankingContext import RankingContextStore, DEFAULT_RANKING_CONTEXT_MAX_BYTES
+from recommender.service.responseCache import response_cache
+
+client = TestClient(app)
+
+INPUT_JSON = {"components": [
+    {"name": "c1", "type": "CUTTING",
+     "suppliers": [{"id": "s1", "parameters": {"width": {"min": 1.0, "max": 3.0}, "tolerance": 0.1},
+                    "preferences": {"balance": 3, "inspection_record": True}},
+                   {"id": "s2", "parameters": {"width": {"min": 4.0, "max": 5.0}},
+                    "preferences": {"balance": 100}},
+                   {"id": "s3", "parameters": {}, "preferences": {}}],
+     "demand": {"parameters": {"width": 2.0, "tolerance": 0.2}, "preferences": {"balance": 2, "inspection_record": True}}},
+    {"name": "c2", "type": "CUTTING",
+     "suppliers": [{"id": "s1", "parameters": {}, "preferences": {"balance": 1}}],
+     "demand": {"parameters": {}, "preferences": {"balance": 1}}}
+]}
+
+
+@pytest.fixture(autouse=True)
+def _store():
+    yield
+    RankingContextStore.ttl = 300.0
+    RankingContextStore.max_contexts = 1000
+    RankingContextStore.max_bytes = DEFAULT_RANKING_CONTEXT_MAX_BYTES
+    RankingContextStore.clear()
+
+
+def test_recommend_without_diagnostics():
+    full = client.post("/recommend/", json=INPUT_JSON).json()
+    fast = client.post("/recommend/", json=dict(INPUT_JSON, diagnostics=False)).json()
+
+    assert fast["context_id"] is not None
+    for c_full, c_fast in zip(full["components"], fast["components"]):
+        assert [(s["supplier_id"], s["score"], s["scores_per_category"]) for s in c_full["scores"]] == \
+               [(s["supplier_id"], s["score"], s["scores_per_category"]) for s in c_fast["scores"]]
+        assert all(s["failures"] is None for s in c_fast["scores"])
+        assert all(s["failures"] is not None for s in c_full["scores"])
+
+
+def test_explain():
+    full = client.post("/recommend/", json=INPUT_JSON).json()
+    fast = client.post("/recommend/", json=dict(INPUT_JSON, diagnostics=False)).json()
+
+    response = client.post("/explain/", json={"context_id": fast["context_id"], "supplier_ids": ["s2", "s1"]})
+    assert response.status_code == 200
+    explained = response.json()
+    assert explained["context_id"] == fast["context_id"]
+
+    expected = {c["name"]: {s["supplier_id"]: s for s in c["scores"]} for c in full["components"]}
+    assert [s["supplier_id"] for s in explained["components"][0]["scores"]] == ["s2", "s1"]
+    for c in explained["components"]:
+        for s in c["scores"]:
+            assert s == expected[c["name"]][s["supplier_id"]]
+
+    response = client.post("/explain/", json={"context_id": fast["context_id"], "supplier_ids": ["s1"],
+                                              "component": "c2"})
+    assert response.status_code == 200
+    assert [c["name"] for c in response.json()["components"]] == ["c2"]
+
+
+def test_explainable():
+    # the failures are part of the response, the ranking is only kept on request
+    assert client.post("/recommend/", json=INPUT_JSON).json()["context_id"] is None
+    assert client.post("/recommend/", json=dict(INPUT_JSON, diagnostics=False, explainable=False)).json()[
+               "context_id"] is None
+
+    context_id = client.post("/recommend/", json=dict(INPUT_JSON, explainable=True)).json()["context_id"]
+    response = client.post("/explain/", json={"context_id": context_id, "supplier_ids": ["s1"]})
+    assert response.status_code == 200
+
+
+def test_explain_unknown():
+    context_id = client.post("/recommend/", json=dict(INPUT_JSON, explainable=True)).json()["context_id"]
+
+    response = client.post("/explain/", json={"context_id": "unknown", "supplier_ids": ["s1"]})
+    assert response.status_code == 404
+    response = client.post("/explain/", json={"context_id": context_id, "supplier_ids": ["s4"]})
+    assert response.status_code == 404
+    response = client.post("/explain/", json={"context_id": context_id, "supplier_ids": ["s1"], "component": "c3"})
+    assert response.status_code == 404
+
+
+def test_context_expiry(monkeypatch):
+    RankingContextStore.ttl = 0.0
+    context_id = client.post("/recommend/", json=dict(INPUT_JSON, explainable=True)).json()["context_id"]
+    response = client.post("/explain/", json={"context_id": context_id, "supplier_ids": ["s1"]})
+    assert response.status_code == 404
+
+    RankingContextStore.ttl = 300.0
+    RankingContextStore.max_contexts = 2
+    # each request has to create its own context
+    monkeypatch.setattr(response_cache, "ttl", 0.0)
+    ids = [client.post("/recommend/", json=dict(INPUT_JSON, explainable=True)).json()["context_id"] for _ in range(3)]
+    assert RankingContextStore.get(ids[0]) is None
+    assert RankingContextStore.get(ids[2]) is not None
+
+
+def test_context_memory_bound(monkeypatch):
+    monkeypatch.setattr(response_cache, "ttl", 0.0)
+    first = client.post("/recommend/", json=dict(INPUT_JSON, explainable=True)).json()["context_id"]
+    size = RankingContextStore.nbytes()
+    assert size > 0
+
+    # the oldest contexts are dropped once the estimated memory is exceeded
+    RankingContextStore.max_bytes = 2 * size
+    ids = [client.post("/recommend/", json=dict(INPUT_JSON, explainable=True)).json()["context_id"] for _ in range(2)]
+    assert RankingContextStore.get(first) is None
+    assert all(RankingContextStore.get(i) is not None for i in ids) and RankingContextStore.nbytes() == 2 * size
@@ -0,0 +1,51 @@
+import msgpack
+from fastapi.testclient import TestClient
+
+from recommender.__main__ import app
+from recommender.service.msgpackTransport import is_msgpack
+from tests.recommender.conftest import sample_input
+
+client = TestClient(app)
+
+MSGPACK = "application/msgpack"
+
+
+def test_is_msgpack():
+    assert is_msgpack("application/msgpack")
+    assert is_msgpack("application/x-msgpack; charset=binary")
+    assert not is_msgpack("application/json")
+    assert not is_msgpack("")
+
+
+def test_msgpack_request_and_response():
+    inp = sample_input(20, 0)
+    expected = client.post("/recommend/", json=inp).json()
+
+    for accept in ["application/json", MSGPACK]:
+        response = client.post("/recommend/", data=msgpack.packb(inp),
+                               headers={"content-type": MSGPACK, "accept": accept})
+        assert response.status_code == 200
+        if accept == MSGPACK:
+            assert response.headers["content-type"] == MSGPACK
+            output = msgpack.unpackb(response.content)
+        else:
+            output = response.json()
+        output["context_id"] = expected["context_id"]
+        assert output == expected
+
+    # json request, msgpack response
+    response = client.post("/recommend/", json=dict(inp, page_size=5), headers={"accept": MSGPACK})
+    output = msgpack.unpackb(response.content)
+    assert output["next"] is not None
+    response = client.post("/recommend/next/", data=msgpack.packb({"next": output["next"]}),
+                           headers={"content-type": MSGPACK, "accept": MSGPACK})
+    assert msgpack.unpackb(response.content)["components"][0]["scores"] == expected["components"][0]["scores"][5:10]
+
+
+def test_msgpack_invalid_body():
+    response = client.post("/recommend/", data=b"\xc1", headers={"content-type": MSGPACK})
+    assert response.status_code == 400
+
+    response = client.post("/recommend/", data=msgpack.packb({"components": [{"name": 1}]}),
+                           headers={"content-type": MSGPACK})
+    assert response.status_code == 422
@@ -0,0 +1,97 @@
+import json
+import os
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from recommender.__main__ import app, openapi_cache
+from recommender.service.openapiCache import OpenAPICache, install_openapi_cache, schema_key
+from recommender.typedefs.generated_input_types import type_definition_hash, add_input_type_schemas, \
+    startup_input_types, INPUT_TYPES_SCHEMA_KEY
+
+client = TestClient(app)
+
+
+def _app() -> FastAPI:
+    small = FastAPI(title="small")
+    calls = []
+
+    @small.get("/items/")
+    async def items():
+        return []
+
+    generate = small.openapi
+
+    def counting():
+        calls.append(1)
+        return generate()
+
+    small.openapi = counting
+    small.calls = calls
+    return small
+
+
+def test_generated_once_and_stored(tmp_path):
+    small = _app()
+    cache = install_openapi_cache(small, "hash", str(tmp_path))
+    small_client = TestClient(small)
+
+    response = small_client.get("/openapi.json")
+    assert response.status_code == 200 and "/items/" in response.json()["paths"]
+    assert small_client.get("/openapi.json").content == response.content
+    assert small.calls == [1] and cache.source == "generated"
+    assert os.listdir(tmp_path) == [os.path.basename(cache.path)]
+    assert small.openapi() == response.json()
+
+    # further workers load the stored schema
+    other = OpenAPICache(small, "hash", str(tmp_path))
+    assert other.body() == response.content and other.source == "file"
+    assert small.calls == [1]
+
+
+def test_key(tmp_path):
+    small = _app()
+    key = schema_key(small, "hash")
+    assert key == schema_key(small, "hash") and key != schema_key(small, "other")
+
+    @small.get("/more/")
+    async def more():
+        return []
+
+    assert schema_key(small, "hash") != key
+
+
+def test_broken_file_is_replaced(tmp_path):
+    small = _app()
+    cache = OpenAPICache(small, "hash", str(tmp_path))
+    with open(cache.path, "w", encoding="utf-8") as fd:
+        fd.write('{"openapi": ')
+    assert "/items/" in json.loads(cache.body())["paths"]
+    assert cache.source == "generated"
+    with open(cache.path, encoding="utf-8") as fd:
+        assert json.load(fd) == json.loads(cache.body())
+
+
+def test_recommender_schema():
+    response = client.get("/openapi.json")
+    assert response.status_code == 200
+    assert response.content == openapi_cache.body()
+    schema = response.json()
+    assert "/recommend/" in schema["paths"] and "/openapi.json" not in schema["paths"]
+    assert app.openapi() == schema
+    assert openapi_cache.definition_hash == type_definition_hash
+    assert client.get("/docs").status_code == 200
+
+
+def test_input_type_schemas(monkeypatch):
+    # generated without the stored schema, the fields typed Any are described by the union of the input types
+    monkeypatch.setattr(app, "openapi_schema", None)
+    schema = add_input_type_schemas(FastAPI.openapi(app))
+    schemas = schema["components"]["schemas"]
+    supplier = schemas["SupplierInformation"]
+    assert {"parameters", "preferences"} <= set(supplier["required"])
+    refs = [r["$ref"].split("/")[-1] for r in supplier["properties"]["parameters"]["anyOf"]]
+    assert refs == [t.__name__ for t in startup_input_types("Supplier")]
+    assert all(name in schemas for name in refs)
+    assert INPUT_TYPES_SCHEMA_KEY not in supplier["properties"]["preferences"]
+    assert schemas["DemandInformation"]["properties"]["parameters"]["description"] == "Parameters from the demand"
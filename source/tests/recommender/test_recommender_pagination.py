@@ -0,0 +1,87 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import recommender.recommenderFunctionality as functionality
+from recommender.__main__ import app
+from recommender.service.rankingContext import RankingContextStore, decode_cursor, encode_cursor
+from tests.recommender.conftest import sample_input
+
+client = TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def _store():
+    yield
+    RankingContextStore.ttl = 300.0
+    RankingContextStore.clear()
+
+
+def _pages(first: dict, page_size=None) -> list[dict]:
+    pages = [first]
+    while pages[-1]["next"] is not None:
+        response = client.post("/recommend/next/", json={"next": pages[-1]["next"], "page_size": page_size})
+        assert response.status_code == 200
+        pages.append(response.json())
+    return pages
+
+
+@pytest.mark.parametrize("diagnostics", [True, False])
+def test_pages_match_full_ranking(diagnostics):
+    inp = dict(sample_input(30, 0), diagnostics=diagnostics)
+    full = client.post("/recommend/", json=inp).json()["components"][0]["scores"]
+
+    first = client.post("/recommend/", json=dict(inp, page_size=7)).json()
+    pages = _pages(first)
+    assert len(pages) == 5
+    assert all(p["context_id"] == first["context_id"] for p in pages)
+    assert [s for p in pages for s in p["components"][0]["scores"]] == full
+
+    # the page size can be changed while paging
+    pages = _pages(client.post("/recommend/", json=dict(inp, page_size=20)).json(), page_size=5)
+    assert [len(p["components"][0]["scores"]) for p in pages] == [20, 5, 5, 3]
+
+
+def test_pages_with_top_k():
+    inp = sample_input(30, 1)
+    full = client.post("/recommend/", json=inp).json()["components"][0]["scores"]
+
+    pages = _pages(client.post("/recommend/", json=dict(inp, page_size=4, top_k=10)).json())
+    assert [s for p in pages for s in p["components"][0]["scores"]] == full[:10]
+    assert all(p["components"][0]["pruned"] == 23 for p in pages)
+
+
+def test_pages_without_rescoring(monkeypatch):
+    inp = dict(sample_input(30, 2), diagnostics=False)
+    first = client.post("/recommend/", json=dict(inp, page_size=5)).json()
+
+    def fail(*args, **kwargs):
+        raise AssertionError("ranking computed again")
+
+    monkeypatch.setattr(functionality, "rank_suppliers", fail)
+    scored = []
+    original = functionality.score_supplier
+    monkeypatch.setattr(functionality, "score_supplier", lambda *args: scored.append(1) or original(*args))
+    response = client.post("/recommend/next/", json={"next": first["next"]})
+    assert response.status_code == 200
+    # only the suppliers of the page are materialized
+    assert len(scored) == 5
+
+
+def test_invalid_cursor():
+    assert decode_cursor(encode_cursor("abc-_1", 25)) == ("abc-_1", 25)
+    assert decode_cursor("abc") is None
+    assert decode_cursor("abc.x") is None
+
+    response = client.post("/recommend/next/", json={"next": "unknown.5"})
+    assert response.status_code == 404
+
+    # contexts without paging cannot be paged
+    context_id = client.post("/recommend/", json=sample_input(3, 0)).json()["context_id"]
+    response = client.post("/recommend/next/", json={"next": encode_cursor(context_id, 1)})
+    assert response.status_code == 404
+
+    RankingContextStore.clear()
+    RankingContextStore.ttl = 0.0
+    first = client.post("/recommend/", json=dict(sample_input(3, 0), page_size=1)).json()
+    response = client.post("/recommend/next/", json={"next": first["next"]})
+    assert response.status_code == 404
@@ -0,0 +1,103 @@
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from benchmarks.payloads import recommend_payload
+from recommender.__main__ import app
+from recommender.catalog.catalogColumns import compile_catalog
+from recommender.catalog.catalogSharedMemory import publish_catalog, SharedCatalogRegistry
+from recommender.catalog.catalogUpdates import upsert_suppliers, CATALOG_COMPACTION_RATIO_ENV
+from recommender.preferences.preferenceEmbedding import APPROXIMATE_CANDIDATES_ENV, PreferenceEmbedding, \
+    embedding_cache
+from recommender.recommenderFunctionality import additional_validation, compile_components, score_supplier
+from recommender.service.responseCache import response_cache
+from recommender.typedefs.io_types import Input, SupplierInformation
+from recommender.typedefs.type_definition import current_type_definition, pinned_type_definition
+
+client = TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def _pinned(monkeypatch):
+    monkeypatch.setenv(CATALOG_COMPACTION_RATIO_ENV, "100")
+    with pinned_type_definition():
+        yield
+    response_cache.clear()
+
+
+def _payload(seed: int, n_suppliers: int = 60) -> dict:
+    payload = recommend_payload(current_type_definition(), "CUTTING", n_suppliers, seed=seed, fill=0.6)
+    # only the preferences are embedded, the parameters are checked by the exact scoring
+    component = payload["components"][0]
+    for record in [component["demand"]] + component["suppliers"]:
+        record["parameters"] = {}
+    return payload
+
+
+def _publish(name: str, payload: dict):
+    suppliers = [SupplierInformation("CUTTING", **s) for s in payload["components"][0]["suppliers"]]
+    publish_catalog(name, compile_catalog("CUTTING", suppliers, current_type_definition()))
+
+
+def _recommend(name: str, payload: dict, **options) -> dict:
+    component = dict(payload["components"][0], suppliers=[], catalog=name)
+    response = client.post("/recommend/", json={"components": [component], "diagnostics": False, **options})
+    assert response.status_code == 200
+    return response.json()["components"][0]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_scores_match_exact(catalog_name, seed):
+    payload = _payload(seed)
+    _publish(catalog_name, payload)
+    component = compile_components(additional_validation(Input(**dict(payload, components=[dict(
+        payload["components"][0], suppliers=[], catalog=catalog_name)]))))[0]
+
+    embedding = PreferenceEmbedding(component.layout, SharedCatalogRegistry.get(catalog_name))
+    exact = [score_supplier(component, s, diagnostics=False).score for s in component.suppliers]
+    # the preference scores of the embedding are exact, including the dependent preferences
+    assert embedding.scores(component.demand) == pytest.approx(exact, abs=1e-9)
+    ranked = embedding.ranked(component.demand)
+    assert sorted(ranked.tolist()) == list(range(len(exact)))
+    assert [exact[i] for i in ranked] == sorted(exact, reverse=True)
+
+
+def test_approximate_request(catalog_name, monkeypatch):
+    payload = _payload(0)
+    _publish(catalog_name, payload)
+    monkeypatch.setenv(APPROXIMATE_CANDIDATES_ENV, "10")
+
+    exact = _recommend(catalog_name, payload, top_k=2)
+    approximate = _recommend(catalog_name, payload, top_k=2, approximate=True)
+    assert exact["candidates"] is None and approximate["candidates"] == 10
+    assert [s["score"] for s in approximate["scores"]] == [s["score"] for s in exact["scores"]]
+
+    # only the candidates are ranked
+    assert len(_recommend(catalog_name, payload, approximate=True)["scores"]) == 10
+    # up to 4 * top_k candidates
+    assert _recommend(catalog_name, payload, top_k=5, approximate=True)["candidates"] == 20
+
+
+def test_small_catalog_is_exact(catalog_name):
+    payload = _payload(1, n_suppliers=20)
+    _publish(catalog_name, payload)
+    # the catalog has less rows than candidates, everything is scored like in the exact ranking
+    approximate = _recommend(catalog_name, payload, approximate=True)
+    assert approximate["candidates"] == 20
+    assert approximate["scores"] == _recommend(catalog_name, payload)["scores"]
+
+
+def test_updated_catalog(catalog_name):
+    payload = _payload(2, n_suppliers=30)
+    _publish(catalog_name, payload)
+    layout = compile_components(additional_validation(Input(**payload)))[0].layout
+    base = embedding_cache.get(layout, SharedCatalogRegistry.get(catalog_name))
+    assert embedding_cache.get(layout, SharedCatalogRegistry.get(catalog_name)) is base
+
+    upsert_suppliers(catalog_name, _payload(3, n_suppliers=5)["components"][0]["suppliers"][:3])
+    view = SharedCatalogRegistry.get(catalog_name)
+    # the embedding of the base is reused for the overlay
+    updated = embedding_cache.get(layout, view)
+    expected = PreferenceEmbedding(layout, view.compacted())
+    assert updated is not base and len(updated) == len(view)
+    np.testing.assert_array_equal(updated.matrix, expected.matrix)
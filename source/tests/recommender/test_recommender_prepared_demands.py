@@ -0,0 +1,154 @@
+import copy
+
+import pytest
+from fastapi.testclient import TestClient
+
+import recommender.__main__ as recommender_main
+from recommender.__main__ import app, expand_prepared_demands
+from recommender.recommenderFunctionality import additional_validation, compile_components
+from recommender.service.preparedDemands import PreparedDemandStore
+from recommender.service.rankingContext import RankingContextStore
+from recommender.service.responseCache import response_cache
+from recommender.service.sharding import ShardCoordinator
+from recommender.typedefs.io_types import Input
+from tests.recommender.conftest import sample_input, shard_transport
+
+client = TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def _cleanup():
+    yield
+    PreparedDemandStore.clear()
+    RankingContextStore.clear()
+    response_cache.clear()
+
+
+def _register(component: dict) -> str:
+    response = client.post("/demands/", json={"type": component["type"], "demand": component["demand"]})
+    assert response.status_code == 200
+    assert response.json()["expires_in"] == PreparedDemandStore.ttl
+    return response.json()["demand_id"]
+
+
+def _referencing(inp: dict, demand_id: str, with_type: bool = True) -> dict:
+    inp = copy.deepcopy(inp)
+    for c in inp["components"]:
+        c.pop("demand")
+        c["demand_id"] = demand_id
+        if not with_type:
+            c.pop("type")
+    return inp
+
+
+@pytest.mark.parametrize("diagnostics", [True, False])
+def test_recommend_with_demand_id(diagnostics):
+    inp = dict(sample_input(20, 0), diagnostics=diagnostics)
+    expected = client.post("/recommend/", json=inp).json()["components"]
+    demand_id = _register(inp["components"][0])
+
+    for with_type in [True, False]:
+        response = client.post("/recommend/", json=_referencing(inp, demand_id, with_type))
+        assert response.status_code == 200
+        assert response.json()["components"] == expected
+
+
+def test_same_demand_same_id():
+    component = sample_input(1, 0)["components"][0]
+    demand_id = _register(component)
+    assert _register(component) == demand_id
+
+    other = copy.deepcopy(component)
+    other["demand"]["parameters"]["width"] = 2.5
+    assert _register(other) != demand_id
+
+
+def test_demand_compiled_once():
+    inp = sample_input(5, 0)
+    demand_id = _register(inp["components"][0])
+
+    records = []
+    for n in [5, 8]:
+        referencing = _referencing(sample_input(n, 1), demand_id)
+        components = compile_components(additional_validation(Input(**referencing)))
+        records.append(components[0].demand)
+    assert records[0] is records[1]
+    assert records[0].parameters == compile_components(additional_validation(Input(**inp)))[0].demand.parameters
+
+
+def test_invalid_references():
+    inp = sample_input(5, 0)
+    demand_id = _register(inp["components"][0])
+
+    assert client.post("/recommend/", json=_referencing(inp, "unknown")).status_code == 422
+    wrong_type = _referencing(inp, demand_id)
+    wrong_type["components"][0]["type"] = "PCB_ASSEMBLY"
+    assert client.post("/recommend/", json=wrong_type).status_code == 422
+    both = _referencing(inp, demand_id)
+    both["components"][0]["demand"] = inp["components"][0]["demand"]
+    assert client.post("/recommend/", json=both).status_code == 422
+    neither = _referencing(inp, demand_id)
+    neither["components"][0].pop("demand_id")
+    assert client.post("/recommend/", json=neither).status_code == 422
+
+    response = client.post("/demands/", json={"type": "CUTTING", "demand": {"parameters": {"unknown": 1.0},
+                                                                             "preferences": {}}})
+    assert response.status_code == 422
+
+
+def test_delete_demand():
+    inp = sample_input(5, 0)
+    demand_id = _register(inp["components"][0])
+    assert client.delete(f"/demands/{demand_id}/").status_code == 204
+    assert client.delete(f"/demands/{demand_id}/").status_code == 404
+    assert client.post("/recommend/", json=_referencing(inp, demand_id)).status_code == 422
+
+
+def test_expiry_and_limit(monkeypatch):
+    inp = sample_input(5, 0)
+    monkeypatch.setattr(PreparedDemandStore, "ttl", 0.0)
+    demand_id = _register(inp["components"][0])
+    assert PreparedDemandStore.get(demand_id) is None
+
+    monkeypatch.setattr(PreparedDemandStore, "ttl", 60.0)
+    monkeypatch.setattr(PreparedDemandStore, "max_demands", 2)
+    ids = []
+    for width in [1.0, 1.5, 2.0]:
+        component = copy.deepcopy(inp["components"][0])
+        component["demand"]["parameters"]["width"] = width
+        ids.append(_register(component))
+        # the first demand is used and hence kept
+        assert PreparedDemandStore.get(ids[0]) is not None
+    assert PreparedDemandStore.get(ids[1]) is None and PreparedDemandStore.get(ids[2]) is not None
+
+
+def test_prepared_again_after_type_definition_change():
+    inp = sample_input(10, 0)
+    demand_id = _register(inp["components"][0])
+    expected = client.post("/recommend/", json=_referencing(inp, demand_id)).json()["components"]
+
+    # as if registered with a previous version of the type definition
+    PreparedDemandStore.get(demand_id).version = "previous"
+    response_cache.clear()
+    response = client.post("/recommend/", json=_referencing(inp, demand_id))
+    assert response.status_code == 200
+    assert response.json()["components"] == expected
+    assert PreparedDemandStore.get(demand_id).version != "previous"
+
+
+def test_coordinator(monkeypatch):
+    inp = sample_input(12, 0)
+    expected = client.post("/recommend/", json=inp).json()["components"]
+    demand_id = _register(inp["components"][0])
+    referencing = _referencing(inp, demand_id, with_type=False)
+
+    # the shards receive the demand itself
+    expanded = expand_prepared_demands(referencing, Input(**referencing))
+    assert "demand_id" not in expanded["components"][0]
+    assert expanded["components"][0]["type"] == "CUTTING"
+
+    monkeypatch.setattr(recommender_main, "shard_coordinator",
+                        ShardCoordinator(["a", "b"], transport=shard_transport()))
+    response = client.post("/recommend/", json=referencing)
+    assert response.status_code == 200
+    assert response.json()["components"] == expected
@@ -0,0 +1,66 @@
+import pstats
+
+import msgpack
+from fastapi.testclient import TestClient
+
+from common.profiling import PROFILE_FILES
+from recommender.__main__ import app
+from tests.recommender.conftest import sample_input
+
+client = TestClient(app)
+
+
+def test_profiling_requires_admin_token(monkeypatch, tmp_path):
+    monkeypatch.setenv("HEDY_PROFILE_DIR", str(tmp_path))
+    monkeypatch.delenv("HEDY_ADMIN_TOKEN", raising=False)
+
+    response = client.post("/recommend/", json=sample_input(3, 0), headers={"X-Profile": "1"})
+    assert response.status_code == 403
+
+    monkeypatch.setenv("HEDY_ADMIN_TOKEN", "secret")
+    response = client.post("/recommend/", json=sample_input(3, 0), headers={"X-Profile": "1", "X-Admin-Token": "wrong"})
+    assert response.status_code == 403
+
+    # profiling is off by default
+    response = client.post("/recommend/", json=sample_input(3, 0), headers={"X-Admin-Token": "secret"})
+    assert response.status_code == 200
+    assert "X-Profile-Id" not in response.headers
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_profile_request(monkeypatch, tmp_path):
+    monkeypatch.setenv("HEDY_PROFILE_DIR", str(tmp_path))
+    monkeypatch.setenv("HEDY_PROFILE_SAMPLE_INTERVAL", "0.0005")
+    monkeypatch.setenv("HEDY_ADMIN_TOKEN", "secret")
+    headers = {"X-Profile": "1", "X-Admin-Token": "secret"}
+
+    inp = sample_input(200, 0)
+    expected = client.post("/recommend/", json=inp).json()["components"]
+    response = client.post("/recommend/", json=inp, headers=headers)
+    assert response.status_code == 200
+    assert response.json()["components"] == expected
+
+    profile_id = response.headers["X-Profile-Id"]
+    assert profile_id.startswith("recommender-")
+    files = {kind: tmp_path / f"{profile_id}{suffix}" for kind, suffix in PROFILE_FILES.items()}
+    assert all(f.is_file() for f in files.values())
+
+    stats = pstats.Stats(str(files["pstats"]))
+    assert any(name == "score_supplier" for _, _, name in stats.stats.keys())
+    collapsed = files["collapsed"].read_text().splitlines()
+    assert len(collapsed) > 0
+    assert any("score_supplier" in line for line in collapsed)
+    assert files["allocations"].read_text().startswith("duration: ")
+
+    listing = client.get("/admin/profiles/", headers={"X-Admin-Token": "secret"}).json()["profiles"]
+    assert sorted(listing) == sorted(f.name for f in files.values())
+    download = client.get(f"/admin/profiles/{files['collapsed'].name}", headers={"X-Admin-Token": "secret"})
+    assert download.status_code == 200
+    assert download.text.splitlines() == collapsed
+    assert client.get("/admin/profiles/unknown.pstats", headers={"X-Admin-Token": "secret"}).status_code == 404
+    assert client.get("/admin/profiles/", headers={"X-Admin-Token": "wrong"}).status_code == 403
+
+    # msgpack responses carry the profile id as well
+    response = client.post("/recommend/", json=sample_input(3, 0), headers=dict(headers, accept="application/msgpack"))
+    assert response.headers["X-Profile-Id"] != profile_id
+    assert msgpack.unpackb(response.content)["components"]
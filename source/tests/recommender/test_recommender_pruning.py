@@ -0,0 +1,61 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from recommender.__main__ import app
+from recommender.service.rankingContext import RankingContextStore
+from tests.recommender.conftest import sample_input
+
+client = TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def _store():
+    yield
+    RankingContextStore.clear()
+
+
+@pytest.mark.parametrize("diagnostics", [True, False])
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_top_k_matches_full_ranking(seed, diagnostics):
+    inp = dict(sample_input(40, seed), diagnostics=diagnostics)
+    full = client.post("/recommend/", json=inp).json()["components"][0]
+    assert full["pruned"] == 0
+
+    for top_k in [1, 5, 20, 43, 100]:
+        bounded = client.post("/recommend/", json=dict(inp, top_k=top_k)).json()["components"][0]
+        assert bounded["scores"] == full["scores"][:top_k]
+        assert bounded["pruned"] == max(0, 43 - top_k)
+
+
+@pytest.mark.parametrize("seed", [0, 1])
+def test_min_score_matches_full_ranking(seed):
+    inp = sample_input(40, seed)
+    full = client.post("/recommend/", json=inp).json()["components"][0]
+
+    for min_score in [-1.0, 0.0, 0.5, 0.8, 1.5]:
+        bounded = client.post("/recommend/", json=dict(inp, min_score=min_score)).json()["components"][0]
+        expected = [s for s in full["scores"] if s["score"] >= min_score]
+        assert bounded["scores"] == expected
+        assert bounded["pruned"] == len(full["scores"]) - len(expected)
+
+        bounded = client.post("/recommend/", json=dict(inp, min_score=min_score, top_k=3)).json()["components"][0]
+        assert bounded["scores"] == expected[:3]
+
+
+def test_invalid_suppliers_fill_top_k():
+    inp = sample_input(5, 3)
+    for s in inp["components"][0]["suppliers"][:2]:
+        s["parameters"]["width"] = {"min": 5.0, "max": 6.0}
+    full = client.post("/recommend/", json=inp).json()["components"][0]
+    assert [s["score"] for s in full["scores"][-2:]] == [-1.0, -1.0]
+
+    bounded = client.post("/recommend/", json=dict(inp, top_k=8)).json()["components"][0]
+    assert bounded["scores"] == full["scores"][:8]
+    bounded = client.post("/recommend/", json=dict(inp, min_score=-0.5)).json()["components"][0]
+    assert all(s["score"] >= -0.5 for s in bounded["scores"])
+    assert bounded["pruned"] >= 2
+
+
+def test_invalid_top_k():
+    response = client.post("/recommend/", json=dict(sample_input(2, 0), top_k=0))
+    assert response.status_code == 422
@@ -0,0 +1,97 @@
+import copy
+import math
+import pickle
+
+import pytest
+
+from common.typedef import RangeInt, RangeFloat, Range
+from recommender.parameters.parameterComparison import is_in, is_superset, exact_match
+from recommender.preferences.preferenceComparison import distance_zone_preference, get_distance_function, \
+    distance_list_preferences, distance_bool_preferences
+from recommender.preferences.preferenceTypes import ZonePreference, MultipleChoicePreference, BoolPreference
+from recommender.typedefs.io_types import SupplierInformation
+from recommender.typedefs.record_layout import get_record_layout
+from recommender.typedefs.records import RangeRecord, to_record_value, InputRecord
+from recommender.typedefs.type_definition import current_type_definition
+
+
+def test_to_record_value():
+    r = to_record_value(RangeInt(min=1))
+    assert isinstance(r, RangeRecord)
+    assert r.min == 1 and r.max == math.inf
+
+    r = to_record_value(RangeFloat(max=2.5))
+    assert r.min == -math.inf and r.max == 2.5
+
+    assert to_record_value({"min": None, "max": 3}) == RangeRecord(-math.inf, 3)
+    assert to_record_value(Range(min=1, max=2)) == RangeRecord(1, 2)
+    assert to_record_value(3) == 3
+    assert to_record_value([True, False]) == [True, False]
+    assert to_record_value(None) is None
+
+    with pytest.raises(AttributeError):
+        RangeRecord(1, 2).other = 3
+
+
+def test_range_record_is_immutable_and_hashable():
+    r = RangeRecord(1, 2)
+    with pytest.raises(AttributeError):
+        r.min = 0
+    with pytest.raises(AttributeError):
+        del r.max
+    assert hash(r) == hash(RangeRecord(1.0, 2.0)) and r != RangeRecord(1, 3)
+    assert {r: "cached"}[to_record_value(RangeInt(min=1, max=2))] == "cached"
+    assert len({RangeRecord(), to_record_value(RangeFloat()), RangeRecord(max=1)}) == 2
+    assert pickle.loads(pickle.dumps(r)) == r and copy.deepcopy(r) == r
+    assert repr(r) == repr(Range(min=1, max=2))
+
+
+def test_comparisons_on_records():
+    assert is_in(1, RangeRecord(0.2, 1.0)).valid
+    assert not is_in(3, RangeRecord(0.2, 1.0)).valid
+    assert is_in(RangeRecord(0.2, 0.7), RangeRecord(max=1.0)).valid
+    assert is_superset(RangeRecord(min=0.2), 1).valid
+    assert not is_superset(RangeRecord(0.2, 1.0), RangeRecord(0.0, 1.7)).valid
+    assert exact_match(RangeRecord(0.2, 0.4), RangeRecord(0.2, 0.4)).valid
+    assert not exact_match(RangeRecord(0.3, 0.4), RangeRecord(0.2, 0.4)).valid
+
+    # same error messages as for common.typedef.Range
+    assert is_in(3, RangeRecord(0.2, 1.0)).error == is_in(3, Range(0.2, 1.0)).error
+
+
+def test_zone_preference_on_records():
+    b = ZonePreference(importance=1.0)
+    assert distance_zone_preference(70, RangeRecord(50, 100), b) == distance_zone_preference(70, Range(50, 100), b)
+    assert distance_zone_preference(20, RangeRecord(50, 100), b) == distance_zone_preference(20, Range(50, 100), b)
+    assert distance_zone_preference(500, RangeRecord(min=50), b) == 0.0
+    assert distance_zone_preference(20, 50, b) == distance_zone_preference(20, RangeRecord(50, 50), b)
+    assert distance_zone_preference(50, 50, b) == 0.0
+
+
+def test_distance_function_lookup():
+    assert get_distance_function(MultipleChoicePreference()) is distance_list_preferences
+    assert get_distance_function(BoolPreference()) is distance_bool_preferences
+    assert get_distance_function(ZonePreference()) is distance_zone_preference
+
+
+def test_record_layout():
+    definition = current_type_definition()
+    layout = get_record_layout(definition, "CUTTING")
+    assert get_record_layout(definition, "CUTTING") is layout
+    assert get_record_layout(definition, "PCB_ASSEMBLY") is not layout
+
+    supplier = SupplierInformation("CUTTING", "s1", {"width": {"min": 1.0}, "sprue": True}, {"balance": 3})
+    record = layout.record(supplier.id, supplier.parameters, supplier.preferences)
+    assert isinstance(record, InputRecord)
+    assert len(record.parameters) == len(layout.parameter_names)
+    assert len(record.preferences) == len(layout.preference_names)
+
+    values = dict(zip(layout.parameter_names, record.parameters))
+    assert values["width"] == RangeRecord(1.0, math.inf)
+    assert values["sprue"] is True
+    assert dict(zip(layout.preference_names, record.preferences))["balance"] == 3
+
+    # mappings of catalog rows result in the same record
+    from_mapping = layout.record("s1", {"width": {"min": 1.0, "max": None}, "sprue": True}, {"balance": 3})
+    assert from_mapping.parameters == record.parameters
+    assert from_mapping.preferences == record.preferences
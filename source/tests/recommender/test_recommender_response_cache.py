@@ -0,0 +1,139 @@
+import asyncio
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from recommender.__main__ import app
+from recommender.service.responseCache import ResponseCoalescer, request_key, response_cache, etag_matches
+from tests.recommender.conftest import sample_input
+
+client = TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def _cache():
+    response_cache.clear()
+    yield
+    response_cache.clear()
+
+
+def test_request_key():
+    body = {"components": [{"name": "c", "suppliers": [1, 2]}], "diagnostics": True}
+    reordered = json.loads('{"diagnostics": true, "components": [{"suppliers": [1, 2], "name": "c"}]}')
+    assert request_key(body, "v1") == request_key(reordered, "v1")
+    assert request_key(body, "v1") != request_key(body, "v2")
+    assert request_key(body, "v1", {"catalog": 1}) != request_key(body, "v1", {"catalog": 2})
+    assert request_key(body, "v1") != request_key(dict(body, diagnostics=False), "v1")
+
+    assert etag_matches('"abc"', '"abc"')
+    assert etag_matches('"x", W/"abc"', '"abc"')
+    assert etag_matches('*', '"abc"')
+    assert not etag_matches('"abcd"', '"abc"')
+    assert not etag_matches(None, '"abc"')
+
+
+def test_single_flight():
+    coalescer = ResponseCoalescer(ttl=60.0, max_entries=2)
+    calls = []
+
+    async def compute(value):
+        calls.append(value)
+        await asyncio.sleep(0.05)
+        return value
+
+    async def scenario():
+        results = await asyncio.gather(*[coalescer.get_or_compute("k", lambda: compute(1)) for _ in range(5)])
+        assert results == [1] * 5
+        assert await coalescer.get_or_compute("k", lambda: compute(2)) == 1
+        # invalid cache entries are computed again
+        assert await coalescer.get_or_compute("k", lambda: compute(3), valid=lambda r: r != 1) == 3
+
+        await coalescer.get_or_compute("k2", lambda: compute(4))
+        await coalescer.get_or_compute("k3", lambda: compute(5))
+        # evicted, least recently used
+        assert await coalescer.get_or_compute("k", lambda: compute(6)) == 6
+
+    asyncio.run(scenario())
+    assert calls == [1, 3, 4, 5, 6]
+    metrics = coalescer.metrics()
+    assert (metrics["misses"], metrics["coalesced"], metrics["hits"], metrics["cached"]) == (5, 4, 1, 2)
+
+
+def test_single_flight_per_priority():
+    coalescer = ResponseCoalescer(ttl=60.0, max_entries=10)
+    calls = []
+
+    async def compute(value, delay):
+        calls.append(value)
+        await asyncio.sleep(delay)
+        return value
+
+    async def scenario():
+        # the interactive request does not join the slow batch computation, but both share the finished result
+        batch = asyncio.ensure_future(coalescer.get_or_compute("k", lambda: compute("batch", 0.5), flight="batch"))
+        await asyncio.sleep(0.01)
+        interactive = await asyncio.wait_for(
+            coalescer.get_or_compute("k", lambda: compute("interactive", 0.01), flight="interactive"), 0.2)
+        assert interactive == "interactive"
+        assert await coalescer.get_or_compute("k", lambda: compute("repeat", 0.01), flight="batch") == "interactive"
+        assert await batch == "batch"
+
+    asyncio.run(scenario())
+    assert calls == ["batch", "interactive"]
+
+
+def test_failures_are_shared_but_not_cached():
+    coalescer = ResponseCoalescer(ttl=60.0, max_entries=10)
+    calls = []
+
+    async def fail():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        raise RuntimeError("failed")
+
+    async def scenario():
+        results = await asyncio.gather(*[coalescer.get_or_compute("k", fail) for _ in range(3)],
+                                       return_exceptions=True)
+        assert all(isinstance(r, RuntimeError) for r in results)
+        with pytest.raises(RuntimeError):
+            await coalescer.get_or_compute("k", fail)
+
+    asyncio.run(scenario())
+    assert len(calls) == 2
+
+
+def test_recommend_cached():
+    inp = sample_input(10, 0)
+    first = client.post("/recommend/", json=inp)
+    hits = response_cache.metrics()["hits"]
+
+    # same body with a different key order
+    reordered = dict(reversed(list(inp.items())))
+    second = client.post("/recommend/", data=json.dumps(reordered), headers={"content-type": "application/json"})
+    assert second.json() == first.json()
+    assert response_cache.metrics()["hits"] == hits + 1
+    assert second.headers["ETag"] == first.headers["ETag"]
+
+    # conditional request
+    response = client.post("/recommend/", json=inp, headers={"If-None-Match": first.headers["ETag"]})
+    assert response.status_code == 304
+    assert response.content == b""
+
+    # other representation, other options
+    response = client.post("/recommend/", json=inp, headers={"accept": "application/msgpack",
+                                                             "If-None-Match": first.headers["ETag"]})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != first.headers["ETag"]
+    response = client.post("/recommend/", json=dict(inp, diagnostics=False))
+    assert response.headers["ETag"] != first.headers["ETag"]
+    assert response.json()["context_id"] != first.json()["context_id"]
+
+
+def test_deadline_not_cached():
+    # each computation keeps its own ranking context
+    inp = dict(sample_input(5, 1), explainable=True)
+    first = client.post("/recommend/", json=inp, headers={"X-Deadline-Ms": "60000"})
+    second = client.post("/recommend/", json=inp, headers={"X-Deadline-Ms": "60000"})
+    assert "ETag" not in first.headers
+    assert first.json()["context_id"] != second.json()["context_id"]
@@ -0,0 +1,168 @@
+import json
+
+from fastapi.testclient import TestClient
+
+from recommender.__main__ import app
+from recommender.parameters.parameterSelectivity import SelectivityStatistics, SELECTIVITY_WINDOW, selectivity, \
+    default_selectivity_file
+from recommender.recommenderFunctionality import compile_components, additional_validation, rank_components, \
+    validate_parameters, compare_parameters_demand_supplier
+from recommender.typedefs.io_types import Input
+from tests.recommender.conftest import sample_input
+
+client = TestClient(app)
+
+
+def _component(n_suppliers: int = 10, seed: int = 0):
+    inp = sample_input(n_suppliers, seed)
+    component = inp["components"][0]
+    component["demand"]["parameters"].update({"length": 2.0, "height": 1.0})
+    for i, s in enumerate(component["suppliers"]):
+        s["parameters"].update({"length": {"min": 0.0, "max": 1.0 if i % 2 else 3.0}, "height": {"min": 0.0}})
+    return compile_components(additional_validation(Input(**inp)))[0]
+
+
+def _feed(statistics: SelectivityStatistics, component, evaluated: int, failed: dict[str, int]):
+    plan = statistics.plan(component.layout, component.demand)
+    for i in plan.order:
+        plan.evaluated[i] = evaluated
+        plan.failed[i] = failed.get(component.layout.parameter_names[i], 0)
+    statistics.merge(plan)
+
+
+def _ordered_names(plan) -> list[str]:
+    return [plan.names[i] for i in plan.order]
+
+
+def test_plan_order():
+    component = _component()
+    statistics = SelectivityStatistics()
+
+    # without statistics the order of the definition, only the parameters given by the demand
+    plan = statistics.plan(component.layout, component.demand)
+    names = _ordered_names(plan)
+    assert sorted(names) == ["height", "length", "width"]
+    assert names == [n for n in component.layout.parameter_names if n in names]
+
+    _feed(statistics, component, 100, {"length": 60, "height": 5})
+    assert _ordered_names(statistics.plan(component.layout, component.demand)) == ["length", "height", "width"]
+    assert statistics.failure_rate("CUTTING", "length") == 61 / 102
+    assert statistics.failure_rate("CUTTING", "unknown") == 0.5
+    assert statistics.failure_rate("MILLING", "length") == 0.5
+
+
+def test_short_circuit_counts():
+    component = _component()
+    statistics = SelectivityStatistics()
+    _feed(statistics, component, 100, {"length": 60})
+    plan = statistics.plan(component.layout, component.demand)
+    length = component.layout.parameter_names.index("length")
+
+    valid = [validate_parameters(component.layout, component.demand, s, plan) for s in component.suppliers]
+    assert valid == [validate_parameters(component.layout, component.demand, s) for s in component.suppliers]
+    # each rejected supplier is counted once, by the first failing parameter
+    assert plan.order[0] == length and plan.failed[length] > 0
+    assert sum(plan.failed) == valid.count(False)
+    # the suppliers rejected by the length are not checked any further
+    assert plan.evaluated[length] == len(component.suppliers)
+    assert all(plan.evaluated[i] == len(component.suppliers) - plan.failed[length] for i in plan.order[1:2])
+
+
+def test_diagnostics_counts_all_parameters():
+    component = _component()
+    statistics = SelectivityStatistics()
+    _feed(statistics, component, 100, {"length": 60})
+    plan = statistics.plan(component.layout, component.demand)
+
+    for supplier in component.suppliers:
+        valid, errors = compare_parameters_demand_supplier(component.layout, component.demand, supplier, True, plan)
+        assert valid == validate_parameters(component.layout, component.demand, supplier)
+        assert errors is not None
+    assert all(plan.evaluated[i] == len(component.suppliers) for i in plan.order)
+
+
+def test_ranking_unchanged():
+    component = _component(30, 1)
+    expected = rank_components([component]).components
+
+    for diagnostics in [True, False]:
+        for failed in [{}, {"length": 90}, {"width": 90, "height": 50}]:
+            statistics = SelectivityStatistics()
+            _feed(statistics, component, 100, failed)
+            component.plan = statistics.plan(component.layout, component.demand)
+            output = rank_components([component], diagnostics=diagnostics).components
+            assert [s.score for s in output[0].scores] == [s.score for s in expected[0].scores]
+            assert [s.supplier_id for s in output[0].scores] == [s.supplier_id for s in expected[0].scores]
+
+
+def test_window():
+    component = _component()
+    statistics = SelectivityStatistics()
+    _feed(statistics, component, int(SELECTIVITY_WINDOW), {"length": int(SELECTIVITY_WINDOW) // 2})
+    _feed(statistics, component, 2, {"length": 2})
+    evaluated = statistics.snapshot()["CUTTING"]["length"]["evaluated"]
+    assert evaluated == (SELECTIVITY_WINDOW + 2) / 2
+
+
+def test_persistence(tmp_path):
+    path = str(tmp_path / "selectivity.json")
+    component = _component()
+
+    # two workers sharing the file
+    first, second = SelectivityStatistics(path), SelectivityStatistics(path)
+    _feed(first, component, 10, {"length": 4})
+    _feed(second, component, 20, {"length": 6})
+    first.save()
+    second.save()
+    assert second.snapshot()["CUTTING"]["length"]["evaluated"] == 30
+    assert second.snapshot()["CUTTING"]["length"]["failed"] == 10
+    # nothing is added twice
+    first.save()
+    second.save()
+
+    restarted = SelectivityStatistics(path)
+    assert restarted.snapshot() == second.snapshot()
+    assert restarted.failure_rate("CUTTING", "length") == 11 / 32
+
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"statistics": {"CUTTING": {"length": "broken"}}}, f)
+    assert SelectivityStatistics(path).snapshot() == {}
+
+
+def test_background_save(tmp_path, monkeypatch):
+    monkeypatch.delenv("RECOMMENDER_SELECTIVITY_FILE", raising=False)
+    assert default_selectivity_file() is None
+
+    path = str(tmp_path / "selectivity.json")
+    component = _component()
+    statistics = SelectivityStatistics(path, save_interval=0.0)
+    _feed(statistics, component, 10, {"length": 4})
+    statistics.wait()
+    assert SelectivityStatistics(path).snapshot() == statistics.snapshot()
+
+
+def test_failed_save_keeps_observations(tmp_path):
+    blocking = tmp_path / "file"
+    blocking.write_text("")
+    component = _component()
+    statistics = SelectivityStatistics(str(blocking / "selectivity.json"))
+    _feed(statistics, component, 10, {"length": 4})
+    statistics.save()
+
+    # written once the file can be saved
+    statistics.path = str(tmp_path / "selectivity.json")
+    _feed(statistics, component, 5, {"length": 1})
+    statistics.save()
+    assert SelectivityStatistics(statistics.path).snapshot()["CUTTING"]["length"]["evaluated"] == 15
+    assert SelectivityStatistics(statistics.path).snapshot() == statistics.snapshot()
+
+
+def test_metrics_endpoint():
+    selectivity.clear()
+    inp = sample_input(10, 2)
+    inp["components"][0]["name"] = "selectivity"
+    assert client.post("/recommend/", json=dict(inp, diagnostics=False)).status_code == 200
+
+    metrics = client.get("/metrics/parameter_selectivity/").json()
+    assert metrics["CUTTING"]["width"]["evaluated"] == 13
+    assert 0.0 < metrics["CUTTING"]["width"]["failure_rate"] < 1.0
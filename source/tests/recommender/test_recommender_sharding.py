@@ -0,0 +1,156 @@
+import asyncio
+import threading
+import time
+import uuid
+
+import pytest
+import uvicorn
+from fastapi.encoders import jsonable_encoder
+from fastapi.testclient import TestClient
+
+import recommender.__main__ as recommender_main
+from recommender.__main__ import app
+from recommender.catalog.catalogColumns import compile_catalog
+from recommender.catalog.catalogSharedMemory import publish_catalog, unlink_catalog, SharedCatalogRegistry
+from recommender.service.rankingContext import RankingContextStore
+from recommender.service.responseCache import response_cache
+from recommender.service.sharding import ShardCoordinator, ShardError, SHARD_PATH, http_transport
+from recommender.typedefs.io_types import SupplierInformation
+from recommender.typedefs.type_definition import current_type_definition
+from tests.recommender.conftest import sample_input, shard_transport
+
+client = TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def _cleanup():
+    yield
+    RankingContextStore.clear()
+    response_cache.clear()
+
+
+def _single(payload):
+    output = client.post("/recommend/", json=payload).json()
+    return [(c["name"], c["scores"], c["pruned"]) for c in output["components"]]
+
+
+def _sharded(coordinator, payload, **kwargs):
+    output = jsonable_encoder(asyncio.run(coordinator.recommend(payload, **kwargs)))
+    assert output["context_id"] is None
+    return [(c["name"], c["scores"], c["pruned"]) for c in output["components"]], output
+
+
+@pytest.mark.parametrize("shards", [1, 2, 3, 7])
+@pytest.mark.parametrize("options", [{}, {"top_k": 5}, {"min_score": 0.6}, {"diagnostics": False, "top_k": 10}])
+def test_sharded_matches_single_instance(shards, options):
+    payload = dict(sample_input(30, shards), **options)
+    payload["components"].append(dict(sample_input(4, 9)["components"][0], name="small"))
+    coordinator = ShardCoordinator([f"shard{i}" for i in range(shards)], transport=shard_transport())
+
+    merged, output = _sharded(coordinator, payload)
+    assert merged == _single(payload)
+    assert all(c["complete"] and c["evaluated"] is None for c in output["components"])
+
+
+def test_shard_failure_degrades_to_partial_results():
+    payload = sample_input(20, 1)
+    coordinator = ShardCoordinator(["a", "b", "c"], transport=shard_transport(failing=["b"]))
+    merged, output = _sharded(coordinator, payload)
+
+    expected = _single(payload)[0][1]
+    # the suppliers of shard b are missing, the others keep their order
+    missing = {s["id"] for s in payload["components"][0]["suppliers"][1::3]}
+    assert merged[0][1] == [s for s in expected if s["supplier_id"] not in missing]
+    assert output["components"][0]["complete"] is False
+    assert output["components"][0]["evaluated"] == len(expected) - len(missing)
+
+    metrics = coordinator.metrics()
+    assert metrics["b"]["failures"] == 1 and "not reachable" in metrics["b"]["last_error"]
+    assert metrics["a"]["failures"] == 0 and metrics["a"]["requests"] == 1
+
+    coordinator = ShardCoordinator(["a", "b"], transport=shard_transport(failing=["a", "b"]))
+    with pytest.raises(ShardError):
+        asyncio.run(coordinator.recommend(payload))
+
+
+def test_type_definition_mismatch_is_a_failure():
+    coordinator = ShardCoordinator(["a"], transport=shard_transport(version="other"))
+    with pytest.raises(ShardError):
+        asyncio.run(coordinator.recommend(sample_input(3, 0)))
+    assert "type definition" in coordinator.metrics()["a"]["last_error"]
+
+
+def test_sharded_catalog():
+    name = f"test_{uuid.uuid4().hex[:12]}"
+    payload = sample_input(10, 2)
+    rows = [SupplierInformation("CUTTING", **dict(s, id=f"row_{s['id']}"))
+            for s in sample_input(25, 3)["components"][0]["suppliers"]]
+    publish_catalog(name, compile_catalog("CUTTING", rows, current_type_definition()))
+    try:
+        payload["components"][0]["catalog"] = name
+        for shards in [2, 4]:
+            coordinator = ShardCoordinator([f"shard{i}" for i in range(shards)], transport=shard_transport())
+            for options in [{}, {"top_k": 7}]:
+                merged, output = _sharded(coordinator, dict(payload, **options))
+                assert merged == _single(dict(payload, **options))
+                assert len(output["components"][0]["scores"]) == (7 if options else 13 + len(rows))
+    finally:
+        SharedCatalogRegistry.detach_all()
+        unlink_catalog(name)
+
+
+def test_coordinator_endpoint(monkeypatch):
+    payload = sample_input(12, 4)
+    expected = _single(payload)
+    response_cache.clear()
+    monkeypatch.setattr(recommender_main, "shard_coordinator",
+                        ShardCoordinator(["a", "b"], transport=shard_transport(failing=["b"])))
+
+    response = client.post("/recommend/", json=payload)
+    assert response.status_code == 200
+    component = response.json()["components"][0]
+    assert component["complete"] is False
+    assert len(component["scores"]) < len(expected[0][1])
+    assert client.get("/metrics/shards/").json()["b"]["failures"] == 1
+
+    # partial results are not served from the cache
+    client.post("/recommend/", json=payload)
+    assert client.get("/metrics/shards/").json()["b"]["failures"] == 2
+
+    assert client.post("/recommend/", json=dict(payload, page_size=3)).status_code == 400
+
+    monkeypatch.setattr(recommender_main, "shard_coordinator",
+                        ShardCoordinator(["a", "b"], transport=shard_transport(failing=["a", "b"])))
+    response = client.post("/recommend/", json=payload, headers={"X-Deadline-Ms": "10000"})
+    assert response.status_code == 503
+
+
+def test_not_a_coordinator():
+    assert client.get("/metrics/shards/").status_code == 404
+    response = client.post(SHARD_PATH, json={"input": sample_input(2, 0), "shard": 2, "shards": 2, "suppliers": [5]})
+    assert response.status_code == 400
+
+
+def test_http_shards():
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=0, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    end = time.monotonic() + 10
+    while not server.started:
+        assert time.monotonic() < end
+        time.sleep(0.01)
+    try:
+        port = server.servers[0].sockets[0].getsockname()[1]
+        url = f"http://127.0.0.1:{port}"
+        payload = dict(sample_input(15, 5), top_k=6)
+        coordinator = ShardCoordinator([url, url + "/"], transport=http_transport)
+        merged, _ = _sharded(coordinator, payload)
+        assert merged == _single(payload)
+
+        # nothing listens on this port
+        coordinator = ShardCoordinator([url, "http://127.0.0.1:1"], timeout=2.0)
+        merged, output = _sharded(coordinator, payload)
+        assert output["components"][0]["complete"] is False
+    finally:
+        server.should_exit = True
+        thread.join(10)
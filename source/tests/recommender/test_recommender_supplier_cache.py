@@ -0,0 +1,154 @@
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from common.typedef import RangeFloat
+from recommender.__main__ import app
+from recommender.recommenderFunctionality import additional_validation, compile_components
+from recommender.service.responseCache import response_cache
+from recommender.service.supplierCache import SupplierCache, supplier_cache, supplier_key, ENTRY_BASE_SIZE
+from recommender.typedefs.io_types import Input, SupplierInformation
+from tests.recommender.conftest import sample_input
+
+client = TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def _cleanup():
+    supplier_cache.clear()
+    yield
+    supplier_cache.clear()
+    response_cache.clear()
+
+
+def test_key():
+    key, _ = supplier_key("v1", "CUTTING", {"width": 1.0, "length": 2.0}, {})
+    assert key == supplier_key("v1", "CUTTING", {"length": 2.0, "width": 1.0}, {})[0]
+    assert key != supplier_key("v2", "CUTTING", {"width": 1.0, "length": 2.0}, {})[0]
+    assert key != supplier_key("v1", "MILLING", {"width": 1.0, "length": 2.0}, {})[0]
+    assert key != supplier_key("v1", "CUTTING", {"width": 1.5, "length": 2.0}, {})[0]
+
+
+def test_lru_eviction():
+    cache = SupplierCache(max_bytes=3 * ENTRY_BASE_SIZE + 500)
+    for i in range(3):
+        cache.get_or_validate("v", "CUTTING", {"width": i}, {}, lambda: ({}, {}))
+    # the first supplier is used again and kept
+    cache.get_or_validate("v", "CUTTING", {"width": 0}, {}, lambda: ({}, {}))
+    cache.get_or_validate("v", "CUTTING", {"width": 3}, {}, lambda: ({}, {}))
+
+    metrics = cache.metrics()
+    assert metrics["entries"] == 3 and metrics["evictions"] == 1 and metrics["bytes"] <= metrics["max_bytes"]
+    assert metrics["hits"] == 1 and metrics["misses"] == 4 and metrics["hit_ratio"] == 0.2
+    cache.get_or_validate("v", "CUTTING", {"width": 0}, {}, lambda: ({}, {}))
+    assert cache.metrics()["hits"] == 2
+    cache.get_or_validate("v", "CUTTING", {"width": 1}, {}, lambda: ({}, {}))
+    assert cache.metrics()["misses"] == 5
+
+
+def test_invalid_suppliers_not_cached():
+    cache = SupplierCache(max_bytes=1 << 20)
+
+    def invalid():
+        raise TypeError("unexpected keyword argument")
+
+    for _ in range(2):
+        with pytest.raises(TypeError):
+            cache.get_or_validate("v", "CUTTING", {"unknown": 1}, {}, invalid)
+    assert cache.metrics()["entries"] == 0 and cache.metrics()["misses"] == 2
+
+
+def test_same_values_different_ids():
+    inp = sample_input(5, 0)
+    hits = supplier_cache.metrics()["hits"]
+    # the last three suppliers are copies of the first three with other ids
+    components = compile_components(additional_validation(Input(**inp)))
+    assert supplier_cache.metrics()["entries"] == 5 and supplier_cache.metrics()["hits"] == hits + 3
+    suppliers = components[0].suppliers
+    assert [s.id for s in suppliers] == [s["id"] for s in inp["components"][0]["suppliers"]]
+    assert suppliers[5].parameters is suppliers[0].parameters
+
+    components = compile_components(additional_validation(Input(**inp)))
+    assert supplier_cache.metrics()["hits"] == hits + 11
+    assert components[0].suppliers[0].parameters is suppliers[0].parameters
+
+
+def test_modified_suppliers_are_not_shared():
+    inp = sample_input(1, 0)
+    inp["components"][0]["suppliers"] = [inp["components"][0]["suppliers"][0]] * 2
+    component = Input(**inp).components[0]
+    first, second = component.suppliers
+    first.parameters.width = RangeFloat(5.0, 6.0)
+
+    # the other supplier and later requests still see the values sent
+    assert second.parameters.width != first.parameters.width
+    compiled = compile_components(additional_validation(Input(**inp)))[0]
+    assert compiled.suppliers[0].parameters == compiled.suppliers[1].parameters
+
+    records = compile_components(additional_validation(Input(components=[component])))[0].suppliers
+    assert records[0].parameters != records[1].parameters
+    assert records[1].parameters == compiled.suppliers[1].parameters
+
+
+def test_nested_values_are_not_shared():
+    inp = sample_input(1, 0)
+    supplier = Input(**inp).components[0].suppliers[0]
+    validated = supplier.validated
+    supplier.parameters.width.min = 2.9
+
+    # the supplier received copies on the first access, the nested range of the cached supplier is not modified
+    assert supplier.validated is None and validated.parameters.width.min != 2.9
+    other = Input(**inp).components[0].suppliers[0]
+    assert other.validated is validated
+    assert other.parameters.width.min != 2.9 and other.parameters.width is not validated.parameters.width
+
+
+def test_hits_share_values():
+    inp = sample_input(1, 0)
+    first, second = (Input(**inp).components[0].suppliers[0] for _ in range(2))
+    # neither copied nor validated again as long as the values are not accessed
+    assert vars(first)["parameters"] is vars(second)["parameters"] is first.validated.parameters
+    assert vars(first)["preferences"] is vars(second)["preferences"] is first.validated.preferences
+
+
+def test_hits_cheaper_than_validation(monkeypatch):
+    supplier = sample_input(1, 0)["components"][0]["suppliers"][0]
+
+    def construct() -> float:
+        start = time.perf_counter()
+        for _ in range(200):
+            SupplierInformation("CUTTING", **supplier)
+        return time.perf_counter() - start
+
+    construct()
+    hit = min(construct() for _ in range(3))
+    monkeypatch.setattr(supplier_cache, "max_bytes", 0)
+    validation = min(construct() for _ in range(3))
+    assert hit < 0.5 * validation
+
+
+@pytest.mark.parametrize("diagnostics", [True, False])
+def test_recommendation_unchanged(monkeypatch, diagnostics):
+    inp = dict(sample_input(30, 3), diagnostics=diagnostics)
+    monkeypatch.setattr(supplier_cache, "max_bytes", 0)
+    expected = client.post("/recommend/", json=inp).json()["components"]
+    assert supplier_cache.metrics()["entries"] == 0
+
+    monkeypatch.setattr(supplier_cache, "max_bytes", 1 << 20)
+    for _ in range(2):
+        response_cache.clear()
+        assert client.post("/recommend/", json=inp).json()["components"] == expected
+
+
+def test_metrics_endpoint():
+    inp = sample_input(10, 4)
+    before = client.get("/metrics/supplier_cache/").json()
+    client.post("/recommend/", json=inp)
+    response_cache.clear()
+    client.post("/recommend/", json=inp)
+
+    metrics = client.get("/metrics/supplier_cache/").json()
+    assert metrics["entries"] == 10
+    assert metrics["misses"] - before["misses"] == 10 and metrics["hits"] - before["hits"] == 16
+    assert 0.0 < metrics["bytes"] <= metrics["max_bytes"]
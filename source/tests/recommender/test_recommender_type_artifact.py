@@ -0,0 +1,95 @@
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import fields
+
+import pytest
+
+from recommender import RECOMMENDER_ROOT_DIR
+from recommender.importer.artifact import build_type_artifact, load_type_artifact, read_type_definition, \
+    compute_definition_hash, get_artifact_path
+from recommender.importer.typedef import ParameterData, PreferenceData
+from recommender.typedefs.lazy_types import LazyInputTypes
+from recommender.typedefs.type_definition import generate_type_definition
+
+TEST_DEFINITION = os.path.join(RECOMMENDER_ROOT_DIR, "Meta_Fields_Recommender_Test.csv")
+
+
+@pytest.fixture
+def _definition_copy(tmp_path):
+    path = os.path.join(tmp_path, "Definition.csv")
+    shutil.copyfile(TEST_DEFINITION, path)
+    return path
+
+
+def test_artifact_roundtrip(_definition_copy, tmp_path):
+    artifact_path = build_type_artifact(_definition_copy, directory=str(tmp_path))
+    assert os.path.isfile(artifact_path)
+
+    loaded = load_type_artifact(_definition_copy, directory=str(tmp_path))
+    expected, _, _ = read_type_definition(_definition_copy)
+
+    assert loaded is not None
+    assert len(loaded) == len(expected)
+    for d_loaded, d_expected in zip(loaded, expected):
+        assert type(d_loaded) in (ParameterData, PreferenceData)
+        assert d_loaded == d_expected
+
+
+def test_artifact_missing(_definition_copy, tmp_path):
+    assert load_type_artifact(_definition_copy, directory=str(tmp_path)) is None
+
+
+def test_artifact_changed_definition(_definition_copy, tmp_path):
+    build_type_artifact(_definition_copy, directory=str(tmp_path))
+    old_hash = compute_definition_hash(_definition_copy)
+
+    with open(_definition_copy, "a") as fd:
+        fd.write("\n")
+
+    assert compute_definition_hash(_definition_copy) != old_hash
+    assert load_type_artifact(_definition_copy, directory=str(tmp_path)) is None
+
+
+def test_artifact_corrupted(_definition_copy, tmp_path):
+    artifact_path = get_artifact_path(compute_definition_hash(_definition_copy), _definition_copy, str(tmp_path))
+    os.makedirs(os.path.dirname(artifact_path), exist_ok=True)
+    with open(artifact_path, "wb") as fd:
+        fd.write(b"no pickle")
+
+    assert load_type_artifact(_definition_copy, directory=str(tmp_path)) is None
+
+
+def test_artifact_invalid_definition(tmp_path):
+    path = os.path.join(tmp_path, "Invalid.csv")
+    with open(TEST_DEFINITION, encoding="utf-8-sig") as fd:
+        header = fd.readline()
+    with open(path, "w") as fd:
+        fd.write(header)
+        fd.write("long name;ALL;class;CATEGORY;invalid name;EXACT;int;int;Parameter;;-\n")
+
+    with pytest.raises(RuntimeError):
+        build_type_artifact(path, directory=str(tmp_path))
+    assert load_type_artifact(path, directory=str(tmp_path)) is None
+
+
+def test_lazy_input_types():
+    lazy = generate_type_definition("Meta_Fields_Recommender_Test.csv", lazy=True)
+    supplier_types = lazy.parameter_input_types['Supplier']
+    assert isinstance(supplier_types, LazyInputTypes) and supplier_types.generated() == []
+    assert list(supplier_types) == lazy.production_methods and "CUTTING" in supplier_types
+    assert supplier_types.generated() == []
+
+    # only the types of the requested production method are generated, each once
+    with ThreadPoolExecutor(4) as pool:
+        generated = list(pool.map(lambda _: supplier_types["CUTTING"], range(8)))
+    assert all(t is generated[0] for t in generated) and supplier_types.generated() == ["CUTTING"]
+    assert lazy.preference_input_types.generated() == []
+
+    eager = generate_type_definition("Meta_Fields_Recommender_Test.csv")
+    for method in eager.production_methods:
+        assert [f.name for f in fields(lazy.preference_input_types[method])] == \
+               [f.name for f in fields(eager.preference_input_types[method])]
+        for kind in ('Demand', 'Supplier'):
+            assert [(f.name, f.type) for f in fields(lazy.parameter_input_types[kind][method])] == \
+                   [(f.name, f.type) for f in fields(eager.parameter_input_types[kind][method])]
@@ -0,0 +1,155 @@
+import os
+import shutil
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from common.admin import ADMIN_TOKEN_ENV, ADMIN_TOKEN_HEADER
+from recommender import RECOMMENDER_ROOT_DIR
+from recommender.__main__ import app
+from recommender.parameters.parameterTypeRegistry import ParameterTypeRegistry
+from recommender.typedefs.generated_input_types import startup_type_definition
+from recommender.typedefs.io_types import SupplierInformation
+from recommender.typedefs.type_definition import TypeDefinitionRegistry, current_type_definition, \
+    pinned_type_definition, TypeDefinitionWatcher
+
+client = TestClient(app)
+
+ADDITIONAL_PARAMETER = "Reload test;CUTTING;class Test;GENRELL_PRODUCT_PARAMETER;reload_parameter;EXACT;int;int;" \
+                       "Parameter;;-\n"
+
+
+@pytest.fixture
+def _extended_definition(tmp_path):
+    path = os.path.join(tmp_path, "Extended.csv")
+    shutil.copyfile(os.path.join(RECOMMENDER_ROOT_DIR, startup_type_definition.filename), path)
+    with open(path, "a", encoding="utf-8") as fd:
+        fd.write(ADDITIONAL_PARAMETER)
+    yield path
+    TypeDefinitionRegistry.activate(startup_type_definition)
+
+
+def test_reload_swaps_registries(_extended_definition):
+    retired = []
+    TypeDefinitionRegistry.subscribe(lambda previous, new: retired.append((previous.version, new.version)))
+
+    assert TypeDefinitionRegistry.reload(_extended_definition, background=False)
+
+    active = TypeDefinitionRegistry.active
+    assert active.version != startup_type_definition.version
+    assert current_type_definition() is active
+    assert ParameterTypeRegistry.registry is active.parameter_input_types
+    assert (startup_type_definition.version, active.version) in retired
+
+    supplier = SupplierInformation("CUTTING", "s1", {"reload_parameter": 3}, {})
+    assert supplier.parameters.reload_parameter == 3
+
+    input_json = {"components": [{"name": "c", "type": "CUTTING",
+                                  "suppliers": [{"id": "s1", "parameters": {"reload_parameter": 3}, "preferences": {}},
+                                                {"id": "s2", "parameters": {"reload_parameter": 4}, "preferences": {}}],
+                                  "demand": {"parameters": {"reload_parameter": 3}, "preferences": {}}}]}
+    response = client.post("/recommend/", json=input_json)
+    assert response.status_code == 200
+    scores = response.json()["components"][0]["scores"]
+    assert [s["supplier_id"] for s in scores] == ["s1", "s2"]
+    assert scores[1]["score"] == -1.0
+
+
+def test_reload_in_flight_requests_keep_version(_extended_definition):
+    with pinned_type_definition() as pinned:
+        TypeDefinitionRegistry.reload(_extended_definition, background=False)
+        assert TypeDefinitionRegistry.active is not pinned
+        assert current_type_definition() is pinned
+
+        with pytest.raises(TypeError):
+            SupplierInformation("CUTTING", "s1", {"reload_parameter": 3}, {})
+
+    assert current_type_definition() is TypeDefinitionRegistry.active
+
+
+def test_reload_adds_production_method(_extended_definition):
+    # the production methods of the requests are validated against the active type definition, not the startup one
+    with open(_extended_definition, "a", encoding="utf-8") as fd:
+        fd.write(ADDITIONAL_PARAMETER.replace("CUTTING", "RELOAD_METHOD").replace("reload_parameter", "reload_method"))
+    assert TypeDefinitionRegistry.reload(_extended_definition, background=False)
+    assert "RELOAD_METHOD" in TypeDefinitionRegistry.active.production_methods
+
+    component = {"name": "c", "type": "RELOAD_METHOD",
+                 "suppliers": [{"id": "s1", "parameters": {"reload_method": 3}, "preferences": {}}],
+                 "demand": {"parameters": {"reload_method": 3}, "preferences": {}}}
+    response = client.post("/recommend/", json={"components": [component]})
+    assert response.status_code == 200
+    assert response.json()["components"][0]["scores"][0]["score"] == 1.0
+
+    response = client.post("/demands/", json={"type": "RELOAD_METHOD", "demand": component["demand"]})
+    assert response.status_code == 200
+
+    # unknown once the previous version is active again
+    TypeDefinitionRegistry.activate(startup_type_definition)
+    assert client.post("/recommend/", json={"components": [component]}).status_code == 422
+
+
+def test_reload_invalid_definition_keeps_version(tmp_path):
+    path = os.path.join(tmp_path, "Invalid.csv")
+    with open(os.path.join(RECOMMENDER_ROOT_DIR, startup_type_definition.filename), encoding="utf-8") as fd:
+        header = fd.readline()
+    with open(path, "w", encoding="utf-8") as fd:
+        fd.write(header)
+        fd.write("long name;ALL;class;CATEGORY;invalid name;EXACT;int;int;Parameter;;-\n")
+
+    TypeDefinitionRegistry.reload(path, background=False)
+
+    assert TypeDefinitionRegistry.active is startup_type_definition
+    assert TypeDefinitionRegistry.last_reload_error is not None
+
+
+def test_reload_watcher(_extended_definition):
+    TypeDefinitionRegistry.reload(_extended_definition, background=False)
+    version = TypeDefinitionRegistry.active.version
+
+    watcher = TypeDefinitionWatcher(0.01)
+    watcher.start()
+    try:
+        with open(_extended_definition, "a", encoding="utf-8") as fd:
+            fd.write(ADDITIONAL_PARAMETER.replace("reload_parameter", "reload_parameter_2"))
+
+        deadline = time.time() + 10
+        while TypeDefinitionRegistry.active.version == version and time.time() < deadline:
+            time.sleep(0.01)
+    finally:
+        watcher.stop()
+
+    assert TypeDefinitionRegistry.active.version != version
+    assert "reload_parameter_2" in TypeDefinitionRegistry.active.parameter_input_types['Supplier']['CUTTING'] \
+        .__dataclass_fields__
+
+
+def test_reload_endpoint_requires_token(monkeypatch):
+    monkeypatch.delenv(ADMIN_TOKEN_ENV, raising=False)
+    assert client.post("/admin/type_definition/reload/").status_code == 403
+
+    monkeypatch.setenv(ADMIN_TOKEN_ENV, "secret")
+    assert client.post("/admin/type_definition/reload/", headers={ADMIN_TOKEN_HEADER: "wrong"}).status_code == 403
+
+
+def test_reload_endpoint(monkeypatch):
+    monkeypatch.setenv(ADMIN_TOKEN_ENV, "secret")
+    headers = {ADMIN_TOKEN_HEADER: "secret"}
+
+    response = client.post("/admin/type_definition/reload/", headers=headers)
+    assert response.status_code == 202
+    assert response.json()["active_version"] == startup_type_definition.version
+
+    deadline = time.time() + 10
+    while TypeDefinitionRegistry.reload_in_progress and time.time() < deadline:
+        time.sleep(0.01)
+
+    status = client.get("/admin/type_definition/", headers=headers).json()
+    assert status["version"] == startup_type_definition.version
+    assert status["last_reload_error"] is None
+
+    response = client.post("/admin/type_definition/reload/", headers=headers, params={"filename": "../other.csv"})
+    assert response.status_code == 400
+
+    TypeDefinitionRegistry.activate(startup_type_definition)